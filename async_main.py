@@ -0,0 +1,253 @@
+# Импорты библиотек
+import asyncio
+import collections
+import concurrent.futures
+import time
+import typing as tp
+
+import telebot
+from telebot.async_telebot import AsyncTeleBot
+
+# Импорты файлов
+from portfolio_database import PortfolioDatabase
+from bot_chat_session import BotChatSession
+from job_scheduler import JobScheduler, add_maintenance_jobs
+from metrics import BotMetrics
+from metrics_server import start_metrics_server
+from portfolio_analytics import PortfolioAnalytics
+from price_feed import CsvReplayProvider, PriceFeedService, QuoteCache
+from session_store import SessionStore, DiskSessionStore
+
+
+class AsyncMessagePipeline:
+    """
+    Класс для асинхронной обработки сообщений пользователей.
+    (Сообщения разных чатов обрабатываются параллельно, а сообщения одного чата - строго по очереди).
+    """
+
+    def __init__(self, bot: AsyncTeleBot, portfolio_database: PortfolioDatabase,
+                 session_store: tp.Optional[SessionStore] = None, database_workers: int = 4,
+                 metrics: tp.Optional[BotMetrics] = None) -> None:
+        """
+        Функция для инициализации конвейера обработки сообщений.
+
+        :param bot: Экземпляр асинхронного бота.
+        :param portfolio_database: База данных с портфелями пользователей.
+        :param session_store: Хранилище сессий пользователей (None - сессии хранятся только в памяти).
+        :param database_workers: Количество потоков для работы с базой данных.
+        :param metrics: Метрики бота для измерения времени отправки ответов (None - время не измеряется).
+        """
+
+        # Сохраняем бота, базу данных и метрики
+        self.bot = bot
+        self.portfolio_database = portfolio_database
+        self.metrics = metrics
+
+        # Хранилище сессий пользователей
+        if session_store is None:
+            session_store = SessionStore(lambda chat_id: BotChatSession(chat_id, portfolio_database),
+                                         max_sessions=10000, ttl=None)
+        self.session_store = session_store
+
+        # Очереди необработанных сообщений для каждого чата
+        # (Очередь существует только пока для чата запущен обработчик)
+        self.chat_queues: dict[int, collections.deque[str]] = {}
+
+        # Множество запущенных обработчиков чатов (храним ссылки, чтобы задачи не были удалены сборщиком мусора)
+        self.chat_tasks: set[asyncio.Task] = set()
+
+        # Пул потоков для работы с базой данных, чтобы не блокировать цикл событий
+        # (PortfolioDatabase выделяет каждому потоку своё подключение, поэтому потоки не мешают друг другу)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=database_workers,
+                                                              thread_name_prefix="portfolio_database")
+
+        # Регистрируем обработчик текстовых сообщений
+        self.bot.register_message_handler(self.message_handler, content_types=["text"])
+
+    async def message_handler(self, message: telebot.types.Message) -> None:
+        """
+        Функция для приёма пользовательского ввода.
+        (Сообщение только ставится в очередь своего чата, поэтому функция не блокирует другие чаты).
+
+        :param message: Сообщение пользователя, содержащее текст ввода.
+        """
+
+        # Получаем очередь сообщений данного чата
+        chat_queue = self.chat_queues.get(message.chat.id)
+
+        # Если для данного чата нет запущенного обработчика, то создаём очередь и запускаем обработчик
+        if chat_queue is None:
+            chat_queue = self.chat_queues[message.chat.id] = collections.deque()
+            chat_task = asyncio.create_task(self.chat_worker(message.chat.id))
+            self.chat_tasks.add(chat_task)
+            chat_task.add_done_callback(self.chat_tasks.discard)
+
+        # Ставим сообщение в очередь чата
+        chat_queue.append(message.text)
+
+    async def chat_worker(self, chat_id: int) -> None:
+        """
+        Функция для последовательной обработки очереди сообщений одного чата.
+
+        :param chat_id: ID чата.
+        """
+
+        # Получаем очередь сообщений чата и цикл событий
+        chat_queue = self.chat_queues[chat_id]
+        loop = asyncio.get_running_loop()
+
+        # Обрабатываем сообщения, пока очередь не опустеет
+        # (Проверка и удаление очереди происходят без ожидания, поэтому новое сообщение не может быть потеряно)
+        while chat_queue:
+
+            # Забираем все накопившиеся сообщения чата (например, пока отправлялись ответы на предыдущие):
+            # они обрабатываются одним пакетом с одной фиксацией базы данных
+            user_message_texts = list(chat_queue)
+            chat_queue.clear()
+
+            try:
+                # Обрабатываем сообщения в пуле потоков, т.к. обработка и восстановление сессии обращаются к диску
+                bot_outputs: list[str] = await loop.run_in_executor(self.executor, self.process_messages,
+                                                                    chat_id, user_message_texts)
+
+                # Перебираем все ответы бота и отправляем их в чат пользователю
+                for bot_output in bot_outputs:
+                    await self.send_message(chat_id, bot_output)
+
+            # Ошибка при обработке сообщений не должна останавливать обработку всего чата
+            except Exception:
+                telebot.logger.exception("Ошибка при обработке сообщения чата %s", chat_id)
+
+        # Удаляем пустую очередь чата
+        del self.chat_queues[chat_id]
+
+    async def send_message(self, chat_id: int, message_text: str) -> None:
+        """
+        Функция для отправки ответа бота (с измерением времени, если метрики заданы).
+
+        :param chat_id: ID чата.
+        :param message_text: Текст ответа.
+        """
+
+        if self.metrics is None:
+            await self.bot.send_message(chat_id, message_text)
+            return
+
+        start_time = time.perf_counter()
+        outcome = "error"
+        try:
+            await self.bot.send_message(chat_id, message_text)
+            outcome = "ok"
+        finally:
+            self.metrics.send_message_seconds.observe(time.perf_counter() - start_time, (outcome,))
+
+    def process_messages(self, chat_id: int, user_message_texts: list[str]) -> list[str]:
+        """
+        Функция для обработки накопившихся сообщений в сессии чата (выполняется в пуле потоков).
+
+        :param chat_id: ID чата.
+        :param user_message_texts: Сообщения пользователя в порядке поступления.
+        :return: Список, содержащий строки с ответами бота на все сообщения.
+        """
+
+        # Получаем сессию чата и отправляем ей сообщения пользователя одним пакетом
+        # (Одно сообщение обрабатывается без пакета: ему нечего объединять, а при групповой фиксации его запись
+        # фиксируется вместе с операциями других чатов)
+        session = self.session_store.get_session(chat_id)
+        if len(user_message_texts) == 1:
+            return session.processing(user_message_texts[0])
+        return session.process_messages(user_message_texts)
+
+    async def wait_idle(self) -> None:
+        """
+        Функция для ожидания обработки всех сообщений, поставленных в очередь.
+        """
+
+        # Ждём завершения всех обработчиков чатов (в том числе запущенных во время ожидания)
+        while self.chat_tasks:
+            await asyncio.gather(*self.chat_tasks)
+
+    async def close(self) -> None:
+        """
+        Функция для корректного завершения работы конвейера.
+        """
+
+        # Дожидаемся обработки оставшихся сообщений, останавливаем пул потоков и сохраняем сессии
+        await self.wait_idle()
+        self.executor.shutdown(wait=True)
+        self.session_store.close()
+
+
+async def run_bot(metrics_port: int = 9464, prices_path: tp.Optional[str] = None,
+                  prices_interval: float = 5.0) -> None:
+    """
+    Функция для запуска бота в асинхронном режиме.
+
+    :param metrics_port: Порт локального сервера метрик.
+    :param prices_path: CSV-файл с ценами для сервиса котировок (None - цены неизвестны, портфели оцениваются
+    по стоимости покупки).
+    :param prices_interval: Период обновления котировок в секундах.
+    """
+
+    # Импортируем токен только при запуске бота
+    # (Это позволяет использовать конвейер без файла с токеном, например, в нагрузочных тестах)
+    import get_token
+
+    # Создаём экземпляр асинхронного бота, базу данных, хранилище сессий и конвейер обработки сообщений
+    bot = AsyncTeleBot(get_token.TOKEN)
+    metrics = BotMetrics()
+    BotChatSession.metrics = metrics
+    analytics = PortfolioAnalytics()
+    portfolio_database = PortfolioDatabase(metrics=metrics, analytics=analytics)
+    analytics.start_loading(portfolio_database)
+    metrics.registry.gauges_from_metrics("bot_analytics", analytics.get_metrics)
+
+    # Общая таблица котировок (агрегаты рейтинга пересчитываются при каждом обновлении цен) и сервис котировок,
+    # обновляющий в ней цены бумаг из портфелей
+    # (Плановые обновления запускает планировщик заданий, а поток сервиса обновляет котировки вне очереди)
+    quote_cache = QuoteCache()
+    quote_cache.add_listener(analytics.on_prices)
+    metrics.registry.gauges_from_metrics("bot_quote_cache", quote_cache.get_metrics)
+    price_feed = PriceFeedService(CsvReplayProvider(prices_path), quote_cache, portfolio_database.get_held_symbols,
+                                  None).start() if prices_path is not None else None
+    if price_feed is not None:
+        metrics.registry.gauges_from_metrics("bot_price_feed", price_feed.get_metrics)
+
+    session_store = SessionStore(lambda chat_id: BotChatSession(chat_id, portfolio_database),
+                                 max_sessions=10000, ttl=3600.0, disk_store=DiskSessionStore("sessions.db"))
+    metrics.watch_session_store(session_store.__len__)
+    pipeline = AsyncMessagePipeline(bot, portfolio_database, session_store, metrics=metrics)
+    metrics_server = start_metrics_server(metrics.registry, port=metrics_port)
+
+    # Планировщик фоновых заданий (запуски откладываются, пока у многих чатов есть необработанные сообщения,
+    # а два потока не дают долгому обслуживанию базы данных задерживать обновление котировок)
+    job_scheduler = JobScheduler(max_workers=2, busy=lambda: len(pipeline.chat_queues) > 100, metrics=metrics)
+    add_maintenance_jobs(job_scheduler, portfolio_database, session_store, quote_cache, price_feed, prices_interval)
+    metrics.registry.gauges_from_metrics("bot_jobs", job_scheduler.get_metrics)
+    job_scheduler.start()
+
+    # Запускаем бота и при остановке дожидаемся обработки уже полученных сообщений
+    try:
+        await bot.infinity_polling()
+    finally:
+        job_scheduler.close()
+        if price_feed is not None:
+            price_feed.stop()
+        await pipeline.close()
+        portfolio_database.close()
+        metrics_server.close()
+
+
+# Запускаем бота
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Запуск бота в асинхронном режиме")
+    parser.add_argument("--metrics-port", type=int, default=9464, help="порт локального сервера метрик (0 - любой)")
+    parser.add_argument("--prices-csv", default=None,
+                        help="CSV-файл с ценами (timestamp,symbol,price) для сервиса котировок")
+    parser.add_argument("--prices-interval", type=float, default=5.0, help="период обновления котировок в секундах")
+    args = parser.parse_args()
+
+    print("Telegram-бот запущен в асинхронном режиме...")
+    asyncio.run(run_bot(args.metrics_port, args.prices_csv, args.prices_interval))
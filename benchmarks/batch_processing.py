@@ -0,0 +1,149 @@
+"""
+Пакетная обработка сообщений чата (BotChatSession.process_messages) в сравнении с обработкой по одному сообщению.
+
+Пользователи присылают сообщения пачками (например, вставляют несколько команд сразу): пачка - это несколько
+созданий портфелей (/create_new_portfolio и имя портфеля), каждое четвёртое имя повторяет предыдущее. Пачки разных
+чатов обрабатываются несколькими потоками (как пулом потоков async_main.py). Варианты обработки пачки:
+    - по одному сообщению (BotChatSession.processing, фиксация на каждое создание портфеля);
+    - по одному сообщению с групповой фиксацией (одна транзакция на операции разных чатов);
+    - одним пакетом (BotChatSession.process_messages, одна фиксация на пачку).
+Для каждого размера пачки измеряется задержка пачки (от начала её обработки до готовности всех ответов, т.е. до их
+отправки, p50 и p99) и первого ответа (p50), пропускная способность и количество фиксаций транзакций базы данных
+(по метрике bot_database_commit_seconds). По-умолчанию используется synchronous = FULL (синхронизация с диском
+при каждой фиксации), как в benchmarks/group_commit.py.
+
+Запуск из корня репозитория:
+    python -m benchmarks.batch_processing --chats 200 --bursts 5 --threads 4 --burst-sizes 1,2,5,10
+"""
+
+# Импорты библиотек
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+# Импорты файлов
+from bot_chat_session import BotChatSession
+from metrics import BotMetrics
+from portfolio_database import PortfolioDatabase
+
+# Варианты обработки: (название, обработка пачкой, групповая фиксация)
+VARIANTS: list[tuple[str, bool, bool]] = [
+    ("по одному сообщению", False, False),
+    ("по одному сообщению, групповая фиксация", False, True),
+    ("пакетом", True, False),
+]
+
+
+def make_burst(burst_index: int, portfolio_count: int) -> list[str]:
+    """
+    Функция для создания пачки сообщений: несколько созданий портфелей подряд.
+
+    :param burst_index: Номер пачки чата (имена портфелей разных пачек различаются).
+    :param portfolio_count: Количество созданий портфелей в пачке.
+    :return: Сообщения пачки.
+    """
+
+    messages: list[str] = []
+    for number in range(portfolio_count):
+        # Каждое четвёртое имя повторяет предыдущее, поэтому часть созданий заканчивается ошибкой повтора имени
+        name_number = number - 1 if number % 4 == 3 else number
+        messages += ["/create_new_portfolio", f"Портфель {burst_index}-{name_number}"]
+    return messages
+
+
+def run(batched: bool, group_commit: bool, chat_count: int, burst_count: int, portfolio_count: int,
+        thread_count: int, synchronous: str) -> dict[str, float]:
+    """
+    Функция для обработки пачек сообщений всех чатов и измерения задержек.
+
+    :param batched: Обрабатывать ли пачку одним пакетом.
+    :param group_commit: Включена ли групповая фиксация.
+    :param chat_count: Количество чатов.
+    :param burst_count: Количество пачек каждого чата.
+    :param portfolio_count: Количество созданий портфелей в пачке.
+    :param thread_count: Количество потоков обработки.
+    :param synchronous: Значение настройки synchronous для подключений.
+    :return: Словарь с результатами.
+    """
+
+    metrics = BotMetrics()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        portfolio_database = PortfolioDatabase(os.path.join(temp_dir, "portfolios.db"), group_commit=group_commit,
+                                               pragmas={"synchronous": synchronous}, metrics=metrics)
+        sessions = [BotChatSession(chat_id, portfolio_database) for chat_id in range(chat_count)]
+        bursts = [make_burst(burst_index, portfolio_count) for burst_index in range(burst_count)]
+        burst_latencies: list[float] = []
+        first_reply_latencies: list[float] = []
+
+        # Пачки чатов потока обрабатываются по очереди: сначала первые пачки всех чатов, затем вторые и т.д.
+        def worker(thread_index: int) -> None:
+            for burst in bursts:
+                for session in sessions[thread_index::thread_count]:
+                    start_time = time.perf_counter()
+                    if batched:
+                        bot_outputs = session.process_messages(burst)
+                        first_reply_latencies.append(time.perf_counter() - start_time)
+                    else:
+                        bot_outputs = session.processing(burst[0])
+                        first_reply_latencies.append(time.perf_counter() - start_time)
+                        for user_message_text in burst[1:]:
+                            bot_outputs += session.processing(user_message_text)
+                    burst_latencies.append(time.perf_counter() - start_time)
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(thread_count)]
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - start_time
+
+        # Количество фиксаций - количество значений гистограммы времени фиксаций во всех режимах
+        commit_count = sum(sum(counts[:-1]) for counts in metrics.commit_seconds.get_values().values())
+        portfolio_count_in_database = sum(len(portfolio_database.get_user_portfolios(chat_id))
+                                          for chat_id in range(chat_count))
+        portfolio_database.close()
+
+    burst_latencies.sort()
+    first_reply_latencies.sort()
+    message_count = chat_count * burst_count * len(bursts[0])
+    return {
+        "burst_p50": burst_latencies[len(burst_latencies) // 2],
+        "burst_p99": burst_latencies[int(len(burst_latencies) * 0.99)],
+        "first_reply_p50": first_reply_latencies[len(first_reply_latencies) // 2],
+        "messages_per_second": message_count / seconds,
+        "commits": commit_count,
+        "commits_per_message": commit_count / message_count,
+        "portfolios": portfolio_count_in_database,
+    }
+
+
+def main() -> None:
+    """
+    Функция для запуска бенчмарка из командной строки.
+    """
+
+    parser = argparse.ArgumentParser(description="Пакетная обработка сообщений чата и обработка по одному сообщению")
+    parser.add_argument("--chats", type=int, default=200, help="количество чатов")
+    parser.add_argument("--bursts", type=int, default=5, help="количество пачек каждого чата")
+    parser.add_argument("--threads", type=int, default=4, help="количество потоков обработки")
+    parser.add_argument("--burst-sizes", default="1,2,5,10", help="количества созданий портфелей в пачке через запятую")
+    parser.add_argument("--synchronous", default="FULL", help="значение PRAGMA synchronous")
+    args = parser.parse_args()
+
+    for portfolio_count in (int(size) for size in args.burst_sizes.split(",")):
+        print(f"пачка из {portfolio_count * 2} сообщений ({portfolio_count} созданий портфелей):")
+        for name, batched, group_commit in VARIANTS:
+            results = run(batched, group_commit, args.chats, args.bursts, portfolio_count, args.threads,
+                          args.synchronous)
+            print(f"    {name}: пачка p50 {results['burst_p50'] * 1e3:.2f} мс, "
+                  f"p99 {results['burst_p99'] * 1e3:.2f} мс, "
+                  f"первый ответ p50 {results['first_reply_p50'] * 1e3:.2f} мс, "
+                  f"{results['messages_per_second']:,.0f} сообщений/с, фиксаций {results['commits']:,} "
+                  f"({results['commits_per_message']:.2f} на сообщение), портфелей {results['portfolios']:,}")
+
+
+if __name__ == "__main__":
+    main()
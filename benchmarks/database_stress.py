@@ -0,0 +1,166 @@
+"""
+Многопоточный стресс-тест PortfolioDatabase.
+
+Каждый поток выполняет смесь запросов бота (проверка наличия портфелей, создание портфеля и попытка создать
+портфель с тем же именем) через общий экземпляр PortfolioDatabase. Тест проверяет, что при росте количества потоков
+не возникает ошибок (например, "Recursive use of cursors not allowed" из-за общего курсора), и измеряет
+количество операций в секунду. Затем проверяется одновременное первое обращение потоков к новой базе данных
+(схема создаётся при первом запросе, и подключения других потоков не должны получить схему до её создания).
+
+Запуск из корня репозитория:
+    python -m benchmarks.database_stress --threads 1 2 4 8 16
+"""
+
+# Импорты библиотек
+import argparse
+import os
+import tempfile
+import threading
+import time
+import typing as tp
+
+# Импорты файлов
+from portfolio_database import PortfolioDatabase
+
+
+def worker(portfolio_database: PortfolioDatabase, user_ids: range, errors: list[str], lock: threading.Lock) -> int:
+    """
+    Функция одного потока стресс-теста.
+
+    :param portfolio_database: База данных портфелей.
+    :param user_ids: ID пользователей, с которыми работает поток.
+    :param errors: Список для записи ошибок.
+    :param lock: Блокировка для записи ошибок.
+    :return: Количество выполненных операций.
+    """
+
+    operations = 0
+    for user_id in user_ids:
+        try:
+            # Проверяем наличие портфелей, создаём портфель и пытаемся создать его повторно
+            portfolio_database.is_user_has_portfolio(user_id)
+            if portfolio_database.add_new_portfolio("Портфель", user_id) != 0:
+                raise RuntimeError(f"портфель пользователя {user_id} не создан")
+            if portfolio_database.add_new_portfolio("Портфель", user_id) != 1:
+                raise RuntimeError(f"повторное имя портфеля пользователя {user_id} не обнаружено")
+            if not portfolio_database.is_user_has_portfolio_name("Портфель", user_id):
+                raise RuntimeError(f"портфель пользователя {user_id} не найден")
+            operations += 4
+        except Exception as error:
+            with lock:
+                errors.append(f"{type(error).__name__}: {error}")
+    return operations
+
+
+def run(thread_count: int, users_per_thread: int, pool_size: tp.Optional[int]) -> dict[str, tp.Any]:
+    """
+    Функция для запуска стресс-теста с заданным количеством потоков.
+
+    :param thread_count: Количество потоков.
+    :param users_per_thread: Количество пользователей на один поток.
+    :param pool_size: Размер пула подключений (None - подключение на поток).
+    :return: Словарь с результатами.
+    """
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        portfolio_database = PortfolioDatabase(os.path.join(temp_dir, "portfolios.db"), pool_size)
+        errors: list[str] = []
+        lock = threading.Lock()
+        operation_counts = [0] * thread_count
+
+        def run_worker(index: int) -> None:
+            first_user_id = index * users_per_thread
+            operation_counts[index] = worker(portfolio_database,
+                                             range(first_user_id, first_user_id + users_per_thread), errors, lock)
+
+        threads = [threading.Thread(target=run_worker, args=(index,)) for index in range(thread_count)]
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - start_time
+        portfolio_database.close()
+
+    return {"threads": thread_count, "operations": sum(operation_counts), "errors": len(errors),
+            "first_error": errors[0] if errors else "", "operations_per_second": sum(operation_counts) / seconds}
+
+
+def run_fresh_starts(thread_count: int, start_count: int, pool_size: tp.Optional[int]) -> dict[str, tp.Any]:
+    """
+    Функция для проверки одновременного первого обращения потоков к новой базе данных (как при запуске бота,
+    когда несколько потоков обрабатывают первые сообщения одновременно).
+
+    :param thread_count: Количество потоков.
+    :param start_count: Количество запусков, каждый - с новой базой данных.
+    :param pool_size: Размер пула подключений (None - подключение на поток).
+    :return: Словарь с результатами.
+    """
+
+    failed_starts = 0
+    errors: list[str] = []
+    lock = threading.Lock()
+    for _ in range(start_count):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            portfolio_database = PortfolioDatabase(os.path.join(temp_dir, "portfolios.db"), pool_size)
+            error_count = len(errors)
+
+            # Потоки начинают одновременно, поэтому первые запросы всех потоков (добавление портфеля, запрос
+            # которого зависит от уникального индекса схемы) приходятся на создание схемы
+            barrier = threading.Barrier(thread_count)
+
+            def run_worker(index: int) -> None:
+                barrier.wait()
+                try:
+                    if portfolio_database.add_new_portfolio("Портфель", index) != 0:
+                        raise RuntimeError(f"портфель пользователя {index} не создан")
+                except Exception as error:
+                    with lock:
+                        errors.append(f"{type(error).__name__}: {error}")
+
+            threads = [threading.Thread(target=run_worker, args=(index,)) for index in range(thread_count)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            portfolio_database.close()
+            failed_starts += len(errors) > error_count
+
+    return {"threads": thread_count, "starts": start_count, "failed_starts": failed_starts,
+            "first_error": errors[0] if errors else ""}
+
+
+def main() -> None:
+    """
+    Функция для запуска стресс-теста из командной строки.
+    """
+
+    parser = argparse.ArgumentParser(description="Многопоточный стресс-тест базы данных портфелей")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="количество потоков")
+    parser.add_argument("--users", type=int, default=500, help="количество пользователей на один поток")
+    parser.add_argument("--pool-size", type=int, default=None, help="размер пула подключений (по-умолчанию - "
+                                                                    "подключение на поток)")
+    parser.add_argument("--fresh-starts", type=int, default=50, help="количество запусков с новой базой данных "
+                                                                     "для проверки первого обращения потоков")
+    args = parser.parse_args()
+
+    failed = False
+    for thread_count in args.threads:
+        results = run(thread_count, args.users, args.pool_size)
+        failed = failed or results["errors"] > 0
+        print("потоков: {threads:>3}, операций: {operations}, ошибок: {errors}, "
+              "{operations_per_second:,.0f} операций/с {first_error}".format(**results))
+
+    # Одновременное первое обращение к новой базе данных наибольшим количеством потоков
+    if args.fresh_starts > 0:
+        results = run_fresh_starts(max(args.threads), args.fresh_starts, args.pool_size)
+        failed = failed or results["failed_starts"] > 0
+        print("новая база данных, потоков: {threads}, запусков: {starts}, с ошибками: {failed_starts} "
+              "{first_error}".format(**results))
+
+    # Возвращаем ненулевой код, если были ошибки
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Локальная замена Telegram Bot API для нагрузочных тестов.
+
+Сервер поддерживает методы, которые использует бот (getMe, getUpdates, sendMessage), и позволяет
+подставлять в очередь входящих обновлений сообщения от искусственных пользователей.
+При заданных ограничениях частоты sendMessage, как и настоящий API, отвечает 429 Too Many Requests с retry_after.
+"""
+
+# Импорты библиотек
+import email.parser
+import email.policy
+import http.server
+import json
+import math
+import threading
+import time
+import typing as tp
+import urllib.parse
+
+# Импорты файлов
+from send_scheduler import TokenBucket
+
+
+class FakeTelegramApiServer(http.server.ThreadingHTTPServer):
+    """
+    HTTP-сервер с увеличенной очередью входящих подключений (бот может открыть сразу много подключений).
+    """
+
+    request_queue_size = 1024
+
+
+class TooManyRequestsError(Exception):
+    """
+    Ошибка превышения ограничения частоты сообщений (ответ 429).
+    """
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f"Too Many Requests: retry after {retry_after}")
+        self.retry_after = retry_after
+
+
+class FakeTelegramApi:
+    """
+    Класс локального сервера, имитирующего Telegram Bot API.
+    """
+
+    def __init__(self, on_send_message: tp.Optional[tp.Callable[[int, str], None]] = None,
+                 chat_rate_limit: tp.Optional[tuple[float, float]] = None,
+                 global_rate_limit: tp.Optional[tuple[float, float]] = None) -> None:
+        """
+        Функция для инициализации сервера.
+
+        :param on_send_message: Функция, вызываемая при каждом отправленном ботом сообщении (ID чата, текст).
+        :param chat_rate_limit: Ограничение частоты сообщений в один чат (сообщений в секунду, всплеск)
+        (None - без ограничения).
+        :param global_rate_limit: Ограничение частоты всех сообщений бота (сообщений в секунду, всплеск)
+        (None - без ограничения).
+        """
+
+        # Сохраняем обработчик отправленных сообщений
+        self.on_send_message = on_send_message
+
+        # Ограничители частоты сообщений (чатов и всего бота) и счётчик ответов 429
+        self.chat_rate_limit = chat_rate_limit
+        self.chat_buckets: dict[int, TokenBucket] = {}
+        self.global_bucket = TokenBucket(*global_rate_limit) if global_rate_limit is not None else None
+        self.rejected_message_count = 0
+        self.rate_limit_lock = threading.Lock()
+
+        # Очередь входящих обновлений и условие для ожидания новых обновлений (long polling)
+        self.updates: list[dict] = []
+        self.updates_condition = threading.Condition()
+        self.next_update_id = 1
+
+        # Счётчик отправленных ботом сообщений
+        self.sent_message_count = 0
+        self.sent_message_lock = threading.Lock()
+
+        # Создаём HTTP-сервер на свободном локальном порту
+        self.server = FakeTelegramApiServer(("127.0.0.1", 0), self._make_request_handler())
+        self.server.daemon_threads = True
+        self.thread: tp.Optional[threading.Thread] = None
+
+    @property
+    def api_url(self) -> str:
+        """
+        Шаблон адреса API в формате telebot (apihelper.API_URL / asyncio_helper.API_URL).
+        """
+
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/bot{{0}}/{{1}}"
+
+    def start(self) -> "FakeTelegramApi":
+        """
+        Функция для запуска сервера в фоновом потоке.
+        """
+
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake_telegram_api", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Функция для остановки сервера.
+        """
+
+        # Будим ожидающие запросы getUpdates и останавливаем сервер
+        with self.updates_condition:
+            self.updates_condition.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def push_message(self, chat_id: int, message_text: str) -> None:
+        """
+        Функция для добавления входящего текстового сообщения от пользователя.
+
+        :param chat_id: ID чата (совпадает с ID пользователя).
+        :param message_text: Текст сообщения.
+        """
+
+        with self.updates_condition:
+            update_id = self.next_update_id
+            self.next_update_id += 1
+            self.updates.append({
+                "update_id": update_id,
+                "message": {
+                    "message_id": update_id,
+                    "from": {"id": chat_id, "is_bot": False, "first_name": f"user_{chat_id}"},
+                    "chat": {"id": chat_id, "type": "private"},
+                    "date": int(time.time()),
+                    "text": message_text,
+                },
+            })
+            self.updates_condition.notify_all()
+
+    def get_updates(self, offset: int, limit: int, timeout: float) -> list[dict]:
+        """
+        Функция для получения обновлений с ожиданием (аналог метода getUpdates).
+
+        :param offset: ID первого обновления, которое нужно вернуть.
+        :param limit: Максимальное количество обновлений.
+        :param timeout: Максимальное время ожидания новых обновлений в секундах.
+        :return: Список обновлений.
+        """
+
+        deadline = time.monotonic() + timeout
+        with self.updates_condition:
+            while True:
+                # Удаляем подтверждённые ботом обновления
+                while self.updates and self.updates[0]["update_id"] < offset:
+                    self.updates.pop(0)
+
+                # Если есть новые обновления или время ожидания истекло, то возвращаем результат
+                remaining = deadline - time.monotonic()
+                if self.updates or remaining <= 0:
+                    return self.updates[:limit]
+                self.updates_condition.wait(remaining)
+
+    def send_message(self, chat_id: int, message_text: str) -> dict:
+        """
+        Функция для обработки отправки сообщения ботом (аналог метода sendMessage).
+
+        :param chat_id: ID чата.
+        :param message_text: Текст сообщения.
+        :return: Отправленное сообщение в формате Telegram Bot API.
+        """
+
+        self.check_rate_limits(chat_id)
+
+        with self.sent_message_lock:
+            self.sent_message_count += 1
+            message_id = self.sent_message_count
+
+        if self.on_send_message is not None:
+            self.on_send_message(chat_id, message_text)
+
+        return {
+            "message_id": message_id,
+            "from": {"id": 1, "is_bot": True, "first_name": "fake_bot", "username": "fake_bot"},
+            "chat": {"id": chat_id, "type": "private"},
+            "date": int(time.time()),
+            "text": message_text,
+        }
+
+    def check_rate_limits(self, chat_id: int) -> None:
+        """
+        Функция для проверки ограничений частоты сообщений.
+        (Время запрета, как и в настоящем API, - целое число секунд).
+
+        :param chat_id: ID чата.
+        """
+
+        now = time.monotonic()
+        with self.rate_limit_lock:
+            buckets = [] if self.global_bucket is None else [self.global_bucket]
+            if self.chat_rate_limit is not None:
+                chat_bucket = self.chat_buckets.get(chat_id)
+                if chat_bucket is None:
+                    chat_bucket = self.chat_buckets[chat_id] = TokenBucket(*self.chat_rate_limit)
+                buckets.append(chat_bucket)
+
+            wait_time = max((bucket.get_wait_time(now) for bucket in buckets), default=0.0)
+            if wait_time > 0:
+                self.rejected_message_count += 1
+                raise TooManyRequestsError(math.ceil(wait_time))
+            for bucket in buckets:
+                bucket.take(now)
+
+    def call_method(self, method_name: str, params: dict[str, str]) -> tp.Any:
+        """
+        Функция для выполнения метода API.
+
+        :param method_name: Имя метода.
+        :param params: Параметры запроса.
+        :return: Результат метода.
+        """
+
+        if method_name == "getUpdates":
+            return self.get_updates(int(params.get("offset", 0)), int(params.get("limit", 100)),
+                                    min(float(params.get("timeout", 0)), 1.0))
+
+        elif method_name == "sendMessage":
+            return self.send_message(int(params["chat_id"]), params.get("text", ""))
+
+        elif method_name == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "fake_bot", "username": "fake_bot"}
+
+        # Остальные методы (deleteWebhook и т.п.) просто считаем успешными
+        return True
+
+    def _make_request_handler(self) -> type:
+        """
+        Функция для создания класса обработчика HTTP-запросов, связанного с данным сервером.
+        """
+
+        api = self
+
+        class RequestHandler(http.server.BaseHTTPRequestHandler):
+
+            # Используем keep-alive, как и настоящий API, и отключаем алгоритм Нейгла
+            # (иначе заголовки и тело ответа, отправленные отдельно, задерживаются на десятки миллисекунд)
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self) -> None:
+                self.handle_api_request()
+
+            def do_POST(self) -> None:
+                self.handle_api_request()
+
+            def handle_api_request(self) -> None:
+                # Разбираем адрес вида /bot<token>/<method>
+                url = urllib.parse.urlsplit(self.path)
+                method_name = url.path.rsplit("/", 1)[-1]
+
+                # Собираем параметры из строки запроса и тела запроса
+                params = {key: values[0] for key, values in urllib.parse.parse_qs(url.query).items()}
+                params.update(self.read_body_params())
+
+                try:
+                    result = api.call_method(method_name, params)
+                except TooManyRequestsError as error:
+                    self.send_json({"ok": False, "error_code": 429, "description": str(error),
+                                    "parameters": {"retry_after": error.retry_after}}, 429)
+                    return
+                self.send_json({"ok": True, "result": result})
+
+            def read_body_params(self) -> dict[str, str]:
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                content_type = self.headers.get("Content-Type", "")
+
+                if not body:
+                    return {}
+                elif content_type.startswith("application/json"):
+                    return {key: str(value) for key, value in json.loads(body).items()}
+                elif content_type.startswith("multipart/form-data"):
+                    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+                        b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body)
+                    return {part.get_param("name", header="content-disposition"): part.get_content()
+                            for part in message.iter_parts()}
+                else:
+                    return {key: values[0] for key, values in urllib.parse.parse_qs(body.decode()).items()}
+
+            def send_json(self, data: dict, status: int = 200) -> None:
+                payload = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format: str, *args: tp.Any) -> None:
+                # Не засоряем вывод логами каждого запроса
+                pass
+
+        return RequestHandler
@@ -0,0 +1,138 @@
+"""
+Микробенчмарк диспетчеризации сообщений в BotChatSession: старый движок (цепочка сравнений строк со списком
+действий и рекурсией) против таблицы переходов.
+
+База данных заменена заглушкой в памяти, чтобы измерялась только работа конечного автомата.
+
+Запуск из корня репозитория:
+    python -m benchmarks.fsm_dispatch --rounds 200000
+"""
+
+# Импорты библиотек
+import argparse
+import time
+import typing as tp
+
+# Импорты файлов
+import text
+from bot_chat_session import BotChatSession
+
+# Последовательность сообщений одного раунда (вместе с повторяющимся именем и отменой создания портфеля)
+MESSAGES: list[str] = [
+    "/start",
+    "/main_menu",
+    "hello",
+    "/create_new_portfolio",
+    "Портфель",
+    "/create_new_portfolio",
+    "Портфель",
+    "/main_menu",
+]
+
+
+class InMemoryPortfolioDatabase:
+    """
+    Класс заглушки базы данных портфелей в памяти.
+    """
+
+    def __init__(self) -> None:
+        self.portfolio_names: set[tuple[str, int]] = set()
+
+    def add_new_portfolio(self, new_portfolio_name: str, user_id: int) -> int:
+        if (new_portfolio_name, user_id) in self.portfolio_names:
+            return 1
+        self.portfolio_names.add((new_portfolio_name, user_id))
+        return 0
+
+
+class LegacyBotChatSession:
+    """
+    Копия исходного движка BotChatSession.processing (для сравнения).
+    """
+
+    def __init__(self, user_id: int, portfolio_database: InMemoryPortfolioDatabase) -> None:
+        self.user_id = user_id
+        self.portfolio_database = portfolio_database
+        self.action_list = ["main_menu"]
+
+    def processing(self, user_message_text: str) -> tp.Optional[list[tp.Any]]:
+        if self.get_action(0) == "main_menu":
+            if user_message_text == "/start":
+                return [text.welcome_message]
+            elif user_message_text == "/main_menu":
+                return [text.start_main_menu]
+            elif user_message_text == "/create_new_portfolio":
+                self.action_list = ["create_new_portfolio"]
+                return self.processing(user_message_text)
+            elif user_message_text == "/delete_portfolio":
+                self.action_list = ["delete_portfolio"]
+                return self.processing(user_message_text)
+            else:
+                return [text.main_menu_failed_recognize_input]
+        elif self.get_action(0) == "create_new_portfolio":
+            if user_message_text == "/create_new_portfolio":
+                self.action_list.append("set_new_portfolio_name")
+                return [text.ask_new_portfolio_name]
+            elif user_message_text == "/main_menu":
+                self.action_list = ["main_menu"]
+                bot_outputs: list[tp.Any] = [text.stop_portfolio_creation]
+                bot_outputs.append(self.processing("/main_menu"))
+                return bot_outputs
+            elif self.get_action(1) == "set_new_portfolio_name":
+                new_portfolio_name = user_message_text
+                result = self.portfolio_database.add_new_portfolio(new_portfolio_name, self.user_id)
+                if result == 0:
+                    self.action_list = ["main_menu"]
+                    bot_outputs = [text.successful_new_portfolio_creation.format(new_portfolio_name=new_portfolio_name)]
+                    bot_outputs.append(self.processing("/main_menu"))
+                    return bot_outputs
+                elif result == 1:
+                    return [text.repeated_portfolio_name_error]
+        elif self.get_action(0) == "delete_portfolio":
+            pass
+        return None
+
+    def get_action(self, position: int) -> str:
+        try:
+            return self.action_list[position]
+        except IndexError:
+            return "none"
+
+
+def measure(session_class: type, rounds: int) -> float:
+    """
+    Функция для измерения скорости диспетчеризации.
+
+    :param session_class: Класс сессии.
+    :param rounds: Количество раундов (каждый раунд - новая сессия и вся последовательность сообщений).
+    :return: Количество обработанных сообщений в секунду.
+    """
+
+    # Сессии создаются заранее, чтобы измерялась только обработка сообщений
+    portfolio_database = InMemoryPortfolioDatabase()
+    sessions = [session_class(user_id, portfolio_database) for user_id in range(rounds)]
+
+    start_time = time.perf_counter()
+    for session in sessions:
+        for user_message_text in MESSAGES:
+            session.processing(user_message_text)
+    return rounds * len(MESSAGES) / (time.perf_counter() - start_time)
+
+
+def main() -> None:
+    """
+    Функция для запуска микробенчмарка из командной строки.
+    """
+
+    parser = argparse.ArgumentParser(description="Скорость диспетчеризации конечного автомата сессии")
+    parser.add_argument("--rounds", type=int, default=200_000, help="количество раундов")
+    args = parser.parse_args()
+
+    legacy_rate = measure(LegacyBotChatSession, args.rounds)
+    table_rate = measure(BotChatSession, args.rounds)
+    print(f"старый движок:     {legacy_rate:,.0f} сообщ./с")
+    print(f"таблица переходов: {table_rate:,.0f} сообщ./с ({table_rate / legacy_rate:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
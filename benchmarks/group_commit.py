@@ -0,0 +1,83 @@
+"""
+Бенчмарк добавления портфелей с групповой фиксацией и без неё.
+
+Несколько потоков (как рабочие потоки telebot) одновременно создают портфели. Без групповой фиксации каждая операция
+фиксируется отдельной транзакцией, с групповой фиксацией - одной транзакцией на группу операций.
+Для наглядности по-умолчанию используется synchronous = FULL (синхронизация с диском при каждой фиксации).
+
+Запуск из корня репозитория:
+    python -m benchmarks.group_commit --threads 16 --inserts 500
+"""
+
+# Импорты библиотек
+import argparse
+import os
+import tempfile
+import threading
+import time
+import typing as tp
+
+# Импорты файлов
+from portfolio_database import PortfolioDatabase
+
+
+def run(group_commit: bool, thread_count: int, inserts_per_thread: int, synchronous: str,
+        max_delay_ms: float) -> dict[str, tp.Any]:
+    """
+    Функция для измерения скорости добавления портфелей.
+
+    :param group_commit: Включена ли групповая фиксация.
+    :param thread_count: Количество потоков.
+    :param inserts_per_thread: Количество добавляемых портфелей на один поток.
+    :param synchronous: Значение настройки synchronous для подключений.
+    :param max_delay_ms: Максимальное время ожидания фиксации группы в миллисекундах.
+    :return: Словарь с результатами.
+    """
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        portfolio_database = PortfolioDatabase(os.path.join(temp_dir, "portfolios.db"), group_commit=group_commit,
+                                               max_delay_ms=max_delay_ms, pragmas={"synchronous": synchronous})
+        result_codes: list[int] = []
+
+        def worker(index: int) -> None:
+            # Каждый второй портфель добавляется повторно, чтобы проверить код результата для повторяющегося имени
+            for number in range(inserts_per_thread):
+                user_id = index * inserts_per_thread + number // 2
+                result_codes.append(portfolio_database.add_new_portfolio("Портфель", user_id))
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(thread_count)]
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - start_time
+
+        # Без групповой фиксации каждая операция фиксируется отдельно
+        commits = portfolio_database.group_commit_writer.batch_count if group_commit else len(result_codes)
+        portfolio_database.close()
+
+    return {"group_commit": group_commit, "inserts_per_second": len(result_codes) / seconds,
+            "created": result_codes.count(0), "duplicates": result_codes.count(1), "commits": commits}
+
+
+def main() -> None:
+    """
+    Функция для запуска бенчмарка из командной строки.
+    """
+
+    parser = argparse.ArgumentParser(description="Скорость добавления портфелей с групповой фиксацией и без неё")
+    parser.add_argument("--threads", type=int, default=16, help="количество потоков")
+    parser.add_argument("--inserts", type=int, default=500, help="количество операций на один поток")
+    parser.add_argument("--synchronous", default="FULL", help="значение PRAGMA synchronous")
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="максимальное время ожидания фиксации группы")
+    args = parser.parse_args()
+
+    for group_commit in (False, True):
+        results = run(group_commit, args.threads, args.inserts, args.synchronous, args.delay_ms)
+        print(", ".join(f"{key} = {value:,.0f}" if isinstance(value, float) else f"{key} = {value}"
+                        for key, value in results.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Накладные расходы метрик горячего пути: обработка сообщений без метрик и с ними.
+
+Каждое сообщение проходит путь обработчика main.py: получение сессии из SessionStore, BotChatSession.processing
+(с запросами к базе данных портфелей) и отправку ответов через локальную замену Telegram Bot API
+(HTTP-запрос sendMessage по постоянному подключению; с метриками функция отправки обёрнута BotMetrics.timed_send).
+Прогоны без метрик и с ними чередуются, а для сравнения берётся лучшее время каждого режима.
+
+Сначала сценарий прогоняется без отправки ответов: так измеряется время, которое метрики добавляют к сообщению.
+Затем - с отправкой: разброс задержек сети сопоставим с накладными расходами, поэтому кроме измеренной разницы
+выводится оценка по добавленному времени.
+
+Измеренные накладные расходы (--users 1000 --repeats 5, Python 3.11, 1 ядро): без отправки метрики добавляют
+4-5 мкс процессорного времени к 11-15 мкс обработки сообщения, т.е. 30-40% (большая часть - BotMetrics.timed_send
+и Histogram.observe, 0.7-1.6 мкс на каждое измерение). С отправкой по HTTP это около 1.2% времени сообщения
+(оценка по добавленному времени, измеренная разница - в пределах разброса задержек сети), поэтому цель
+"меньше 2%" выполняется только для полного пути с отправкой ответов, а не для ядра обработки.
+
+Запуск из корня репозитория:
+    python -m benchmarks.instrumentation_overhead --users 500 --repeats 5
+"""
+
+# Импорты библиотек
+import argparse
+import http.client
+import json
+import os
+import socket
+import tempfile
+import time
+import typing as tp
+
+# Импорты файлов
+from benchmarks.fake_telegram_api import FakeTelegramApi
+from bot_chat_session import BotChatSession
+from metrics import BotMetrics
+from portfolio_database import PortfolioDatabase
+from session_store import SessionStore
+
+# Сообщения сценария одного пользователя (с созданием портфеля и повторяющимся именем)
+SCENARIO: list[str] = [
+    "/start",
+    "/main_menu",
+    "hello",
+    "/create_new_portfolio",
+    "Портфель",
+    "/create_new_portfolio",
+    "Портфель",
+    "/main_menu",
+]
+
+
+def make_http_send(api: FakeTelegramApi) -> tp.Callable[[int, str], None]:
+    """
+    Функция для создания функции отправки сообщения через локальную замену Telegram Bot API.
+
+    :param api: Локальная замена Telegram Bot API.
+    :return: Функция отправки сообщения (ID чата, текст).
+    """
+
+    host, port = api.server.server_address[:2]
+    connection = http.client.HTTPConnection(host, port)
+    connection.connect()
+    connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def send(chat_id: int, message_text: str) -> None:
+        body = json.dumps({"chat_id": chat_id, "text": message_text})
+        connection.request("POST", "/botTOKEN/sendMessage", body, {"Content-Type": "application/json"})
+        connection.getresponse().read()
+
+    return send
+
+
+def run(instrumented: bool, user_count: int,
+        api: tp.Optional[FakeTelegramApi]) -> tuple[float, tp.Optional[BotMetrics]]:
+    """
+    Функция для прогона сценария всеми пользователями.
+
+    :param instrumented: Включены ли метрики.
+    :param user_count: Количество пользователей.
+    :param api: Локальная замена Telegram Bot API (None - ответы не отправляются).
+    :return: Время прогона в секундах и метрики (None, если они выключены).
+    """
+
+    metrics = BotMetrics() if instrumented else None
+    BotChatSession.metrics = metrics
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        portfolio_database = PortfolioDatabase(os.path.join(temp_dir, "portfolios.db"), metrics=metrics)
+        session_store = SessionStore(lambda chat_id: BotChatSession(chat_id, portfolio_database), ttl=None)
+
+        # Функция отправки сообщения (без API - заглушка)
+        def send(chat_id: int, message_text: str) -> None:
+            pass
+
+        if api is not None:
+            send = make_http_send(api)
+
+        if metrics is not None:
+            metrics.watch_session_store(session_store.__len__)
+            send = metrics.timed_send(send)
+
+        start_time = time.perf_counter()
+        for user_message_text in SCENARIO:
+            for chat_id in range(user_count):
+                for bot_output in session_store.get_session(chat_id).processing(user_message_text):
+                    send(chat_id, bot_output)
+        seconds = time.perf_counter() - start_time
+
+        session_store.close()
+        portfolio_database.close()
+
+    BotChatSession.metrics = None
+    return seconds, metrics
+
+
+def measure(user_count: int, repeats: int,
+            api: tp.Optional[FakeTelegramApi]) -> tuple[float, float, tp.Optional[BotMetrics]]:
+    """
+    Функция для чередующихся прогонов без метрик и с ними.
+
+    :param user_count: Количество пользователей.
+    :param repeats: Количество прогонов каждого режима.
+    :param api: Локальная замена Telegram Bot API (None - ответы не отправляются).
+    :return: Лучшее время прогона без метрик и с ними в секундах и метрики последнего прогона.
+    """
+
+    plain_times: list[float] = []
+    instrumented_times: list[float] = []
+    metrics: tp.Optional[BotMetrics] = None
+    for _ in range(repeats):
+        plain_times.append(run(False, user_count, api)[0])
+        seconds, metrics = run(True, user_count, api)
+        instrumented_times.append(seconds)
+
+    # Лучшее время меньше всего зависит от посторонней нагрузки на машину
+    return min(plain_times), min(instrumented_times), metrics
+
+
+def main() -> None:
+    """
+    Функция для запуска бенчмарка из командной строки.
+    """
+
+    parser = argparse.ArgumentParser(description="Накладные расходы метрик горячего пути")
+    parser.add_argument("--users", type=int, default=500, help="количество пользователей")
+    parser.add_argument("--repeats", type=int, default=7, help="количество прогонов каждого режима")
+    parser.add_argument("--show-metrics", action="store_true", help="вывести метрики последнего прогона")
+    args = parser.parse_args()
+    message_count = args.users * len(SCENARIO)
+
+    # Без отправки ответов измеряется только работа процессора: время, добавляемое метриками к сообщению,
+    # здесь стабильно, т.к. не зависит от задержек сети
+    plain_time, instrumented_time, _ = measure(args.users, args.repeats, None)
+    added_time = (instrumented_time - plain_time) / message_count
+    print(f"без отправки: {message_count / plain_time:,.0f} -> {message_count / instrumented_time:,.0f} сообщ./с, "
+          f"+{added_time * 1e6:.2f} мкс на сообщение ({(instrumented_time / plain_time - 1) * 100:.1f}%)")
+
+    # С отправкой через HTTP измеряется весь путь обработчика, как в main.py
+    api = FakeTelegramApi().start()
+    plain_time, instrumented_time, metrics = measure(args.users, args.repeats, api)
+    api.stop()
+    print(f"с отправкой:  {message_count / plain_time:,.0f} -> {message_count / instrumented_time:,.0f} сообщ./с, "
+          f"измерено {(instrumented_time / plain_time - 1) * 100:.2f}%, "
+          f"по добавленному времени {added_time * message_count / plain_time * 100:.2f}%")
+
+    # Выводим метрики последнего прогона для проверки формата
+    if args.show_metrics and metrics is not None:
+        print()
+        print(metrics.registry.render(), end="")
+
+
+if __name__ == "__main__":
+    main()
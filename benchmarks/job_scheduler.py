@@ -0,0 +1,162 @@
+"""
+Фоновые задания (job_scheduler.py): запись снимка стоимости портфелей и влияние заданий на обработку сообщений.
+
+Измеряется:
+    - снимок стоимости всех портфелей на конец дня (PortfolioDatabase.save_daily_snapshot, одна транзакция)
+      в сравнении с записью стоимости каждого портфеля отдельной транзакцией;
+    - задержка обработки сообщений (от времени поступления до готовности ответов, p50 и p99), поступающих пачками
+      с постоянной частотой: без фоновых заданий, со снимком стоимости в планировщике заданий и со снимком,
+      запуск которого откладывается, а запись приостанавливается (JobScheduler.pause_while_busy), пока есть
+      необработанные сообщения (параметр busy планировщика).
+
+Запуск из корня репозитория:
+    python -m benchmarks.job_scheduler --portfolios 100000 --positions 10
+"""
+
+# Импорты библиотек
+import argparse
+import gc
+import os
+import random
+import tempfile
+import time
+import typing as tp
+
+# Импорты файлов
+from benchmarks.portfolio_valuation import SYMBOL_COUNT, fill_database
+from bot_chat_session import BotChatSession
+from job_scheduler import JobScheduler
+from portfolio_database import PortfolioDatabase
+from session_store import SessionStore
+
+# Сообщения сценария навигации по меню (обработка без изменения базы данных)
+MENU_MESSAGES = ["/main_menu", "/create_new_portfolio", "/main_menu", "/start"]
+
+
+def write_snapshot_per_portfolio(portfolio_database: PortfolioDatabase, prices: dict[str, float],
+                                 portfolio_count: int) -> int:
+    """
+    Функция для записи снимка стоимости портфелей отдельной транзакцией на каждый портфель.
+
+    :param portfolio_database: База данных портфелей.
+    :param prices: Словарь {тикер: цена}.
+    :param portfolio_count: Количество записываемых портфелей.
+    :return: Количество записанных портфелей.
+    """
+
+    valuation = portfolio_database.value_portfolios(prices)
+    with portfolio_database.pool.connection() as connection:
+        for portfolio_id, value, cost_basis in zip(valuation.portfolio_ids[:portfolio_count],
+                                                   valuation.values.tolist(), valuation.cost_bases.tolist()):
+            connection.execute("""
+            INSERT OR REPLACE INTO portfolio_snapshots (portfolio_id, snapshot_date, value, cost_basis)
+            VALUES (?, '2000-01-01', ?, ?)
+            """, (portfolio_id, value, cost_basis))
+            connection.commit()
+    return min(portfolio_count, len(valuation.portfolio_ids))
+
+
+def replay_bursts(session_store: SessionStore, burst_size: int, burst_interval: float, duration: float,
+                  state: dict[str, int]) -> list[float]:
+    """
+    Функция для обработки сообщений, поступающих пачками, с измерением задержки каждого сообщения.
+
+    :param session_store: Хранилище сессий.
+    :param burst_size: Количество сообщений в пачке (сообщения разных чатов).
+    :param burst_interval: Интервал между пачками в секундах.
+    :param duration: Длительность в секундах.
+    :param state: Словарь с количеством необработанных сообщений ("backlog"), обновляемый во время обработки.
+    :return: Задержки сообщений в секундах.
+    """
+
+    latencies: list[float] = []
+    start_time = time.perf_counter()
+    burst_index = 0
+    while burst_index * burst_interval < duration:
+        arrival_time = start_time + burst_index * burst_interval
+        delay = arrival_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+        state["backlog"] = burst_size
+        for message_index in range(burst_size):
+            session_store.get_session(message_index).processing(MENU_MESSAGES[burst_index % len(MENU_MESSAGES)])
+            state["backlog"] -= 1
+            latencies.append(time.perf_counter() - arrival_time)
+        burst_index += 1
+    return latencies
+
+
+def main() -> None:
+    """
+    Функция для запуска бенчмарка из командной строки.
+    """
+
+    parser = argparse.ArgumentParser(description="Фоновые задания: снимок стоимости портфелей и задержка сообщений")
+    parser.add_argument("--portfolios", type=int, default=100_000, help="количество портфелей")
+    parser.add_argument("--positions", type=int, default=10, help="количество позиций в портфеле")
+    parser.add_argument("--single-portfolios", type=int, default=5000,
+                        help="количество портфелей для записи отдельными транзакциями")
+    parser.add_argument("--burst-size", type=int, default=200, help="количество сообщений в пачке")
+    parser.add_argument("--burst-interval", type=float, default=0.05, help="интервал между пачками в секундах")
+    parser.add_argument("--duration", type=float, default=10.0, help="длительность каждого варианта в секундах")
+    parser.add_argument("--job-interval", type=float, default=1.0, help="интервал запуска снимка в секундах")
+    args = parser.parse_args()
+
+    random.seed(1)
+    prices = {f"S{index}": random.uniform(10, 200) for index in range(SYMBOL_COUNT)}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        portfolio_database = PortfolioDatabase(os.path.join(temp_dir, "portfolios.db"))
+        fill_database(portfolio_database, args.portfolios, args.positions)
+        portfolio_database.value_portfolios(prices)
+
+        # Снимок стоимости: одна транзакция на все портфели и отдельные транзакции на каждый портфель
+        start_time = time.perf_counter()
+        written_count = portfolio_database.save_daily_snapshot(prices)
+        snapshot_seconds = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        single_count = write_snapshot_per_portfolio(portfolio_database, prices, args.single_portfolios)
+        single_seconds = time.perf_counter() - start_time
+        print(f"снимок {written_count:,} портфелей одной транзакцией: {snapshot_seconds:.2f} с "
+              f"({written_count / snapshot_seconds:,.0f} портфелей/с), отдельными транзакциями: "
+              f"{single_count / single_seconds:,.0f} портфелей/с (x{written_count / snapshot_seconds / (single_count / single_seconds):,.1f})")
+
+        # Задержка сообщений без заданий, со снимком и со снимком, откладываемым при необработанных сообщениях
+        session_store = SessionStore(lambda chat_id: BotChatSession(chat_id, portfolio_database),
+                                     max_sessions=1_000_000, ttl=None)
+        variants: list[tuple[str, bool, bool]] = [
+            ("без заданий", False, False),
+            ("снимок в фоне", True, False),
+            ("снимок в фоне, откладывается и приостанавливается при необработанных сообщениях", True, True),
+        ]
+        for name, with_job, with_busy in variants:
+            # Сессии чатов создаются до измерения, а мусор собирается, чтобы варианты начинались одинаково
+            state = {"backlog": 0}
+            replay_bursts(session_store, args.burst_size, args.burst_interval, args.burst_interval, state)
+            gc.collect()
+            busy: tp.Optional[tp.Callable[[], bool]] = (lambda: state["backlog"] > 0) if with_busy else None
+            job_scheduler = JobScheduler(busy=busy, defer_delay=0.001)
+            pause = job_scheduler.pause_while_busy if with_busy else None
+            if with_job:
+                job_scheduler.add_interval_job("daily_snapshot",
+                                               lambda: portfolio_database.save_daily_snapshot(prices, pause=pause),
+                                               args.job_interval, run_immediately=True, max_defer=args.job_interval)
+            job_scheduler.start()
+            latencies = sorted(replay_bursts(session_store, args.burst_size, args.burst_interval, args.duration,
+                                             state))
+            job_scheduler.close()
+
+            job_metrics = job_scheduler.get_job_metrics().get("daily_snapshot")
+            jobs = f", запусков снимка {job_metrics['runs']} (отложено {job_metrics['deferred']}, средняя " \
+                   f"длительность {job_metrics['average_seconds']:.2f} с)" if job_metrics is not None else ""
+            print(f"{name}: p50 {latencies[len(latencies) // 2] * 1e3:.2f} мс, "
+                  f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:.2f} мс, "
+                  f"максимум {latencies[-1] * 1e3:.2f} мс{jobs}")
+
+        session_store.close()
+        portfolio_database.close()
+
+
+if __name__ == "__main__":
+    main()
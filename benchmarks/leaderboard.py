@@ -0,0 +1,153 @@
+"""
+Рейтинги портфелей: инкрементальное обновление агрегатов в сравнении с полным пересчётом.
+
+База данных заполняется портфелями с позициями, а агрегаты рейтингов загружаются из неё. Измеряется:
+    - изменение цен части тикеров: PortfolioAnalytics.on_prices (пересчитываются только портфели с этими тикерами,
+      а если их слишком много - рейтинги строятся заново сортировкой) в сравнении с полным пересчётом агрегатов
+      (PortfolioAnalytics.recompute) и с оценкой всех портфелей одним векторным проходом NumPy и сортировкой
+      (расчёт рейтинга по запросу);
+    - сделка: PortfolioAnalytics.on_position_change в сравнении с теми же полными пересчётами;
+    - чтение: топ портфелей, сводка пользователя и процентили доходности из упорядоченных индексов.
+В конце агрегаты после инкрементальных обновлений сравниваются с полным пересчётом.
+
+Запуск из корня репозитория:
+    python -m benchmarks.leaderboard --portfolios 100000 --positions 10
+"""
+
+# Импорты библиотек
+import argparse
+import os
+import random
+import tempfile
+import time
+import typing as tp
+
+import numpy as np
+
+# Импорты файлов
+from benchmarks.portfolio_valuation import SYMBOL_COUNT, fill_database
+from portfolio_analytics import PortfolioAnalytics
+from portfolio_database import PortfolioDatabase
+
+
+def measure(function: tp.Callable[[], tp.Any], count: int) -> float:
+    """
+    Функция для измерения среднего времени вызова функции.
+
+    :param function: Функция.
+    :param count: Количество вызовов.
+    :return: Среднее время вызова в секундах.
+    """
+
+    start_time = time.perf_counter()
+    for _ in range(count):
+        function()
+    return (time.perf_counter() - start_time) / count
+
+
+def format_seconds(seconds: float) -> str:
+    """
+    Функция для вывода времени в подходящих единицах.
+
+    :param seconds: Время в секундах.
+    :return: Строка со временем.
+    """
+
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:,.1f} мс"
+    return f"{seconds * 1e6:,.1f} мкс"
+
+
+def main() -> None:
+    """
+    Функция для запуска бенчмарка из командной строки.
+    """
+
+    parser = argparse.ArgumentParser(description="Инкрементальное обновление рейтингов портфелей")
+    parser.add_argument("--portfolios", type=int, default=100_000, help="количество портфелей")
+    parser.add_argument("--positions", type=int, default=10, help="количество позиций в портфеле")
+    parser.add_argument("--changed-symbols", type=int, nargs="+", default=[1, 5, 50],
+                        help="количества тикеров с новой ценой за раз")
+    parser.add_argument("--ticks", type=int, default=20, help="количество изменений цен каждого размера")
+    parser.add_argument("--trades", type=int, default=1000, help="количество сделок")
+    parser.add_argument("--recomputes", type=int, default=3, help="количество полных пересчётов")
+    args = parser.parse_args()
+
+    random.seed(1)
+    symbols = [f"S{index}" for index in range(SYMBOL_COUNT)]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        portfolio_database = PortfolioDatabase(os.path.join(temp_dir, "portfolios.db"))
+        fill_database(portfolio_database, args.portfolios, args.positions)
+        prices = {symbol: random.uniform(10, 200) for symbol in symbols}
+
+        analytics = PortfolioAnalytics()
+        start_time = time.perf_counter()
+        analytics.load(portfolio_database, prices)
+        print(f"загрузка агрегатов: {time.perf_counter() - start_time:.2f} с "
+              f"({args.portfolios:,} портфелей, {args.portfolios * args.positions:,} позиций)")
+
+        # Полный пересчёт: агрегатов в памяти и векторная оценка всех портфелей с сортировкой по стоимости
+        recompute_seconds = measure(analytics.recompute, args.recomputes)
+        portfolio_database.value_portfolios(prices)
+
+        def value_and_sort() -> None:
+            valuation = portfolio_database.value_portfolios(prices)
+            order = np.argsort(-valuation.values, kind="stable")
+            returns = np.divide(valuation.pnl, valuation.cost_bases, out=np.zeros_like(valuation.pnl),
+                                where=valuation.cost_bases > 0)
+            np.percentile(returns, [10, 25, 50, 75, 90])
+            order[:10].tolist()
+
+        vectorized_seconds = measure(value_and_sort, args.recomputes)
+        print(f"полный пересчёт агрегатов: {format_seconds(recompute_seconds)}, "
+              f"оценка NumPy с сортировкой: {format_seconds(vectorized_seconds)}")
+
+        # Изменение цен части тикеров (цены меняются на несколько процентов, как между обновлениями котировок)
+        for changed_symbols in args.changed_symbols:
+            ticks = []
+            for _ in range(args.ticks):
+                ticks.append({symbol: prices[symbol] * random.uniform(0.97, 1.03)
+                              for symbol in random.sample(symbols, changed_symbols)})
+                prices.update(ticks[-1])
+            revalued_before = analytics.revalued_portfolios
+            rebuilds_before = analytics.ranking_rebuilds
+            tick_iterator = iter(ticks)
+            tick_seconds = measure(lambda: analytics.on_prices(next(tick_iterator)), args.ticks)
+            revalued = (analytics.revalued_portfolios - revalued_before) / args.ticks
+            rebuilt = ", рейтинги построены заново" if analytics.ranking_rebuilds > rebuilds_before else ""
+            print(f"новые цены {changed_symbols} тикеров: {format_seconds(tick_seconds)} "
+                  f"({revalued:,.0f} портфелей{rebuilt}), ускорение относительно полного пересчёта "
+                  f"x{recompute_seconds / tick_seconds:,.1f}, оценки NumPy x{vectorized_seconds / tick_seconds:,.1f}")
+
+        # Сделки (позиции задаются так же, как после сделки в базе данных)
+        portfolio_ids = list(analytics.portfolios)
+        trades = [(random.choice(portfolio_ids), random.choice(symbols), float(random.randint(1, 100)),
+                   random.uniform(100, 10000)) for _ in range(args.trades)]
+        trade_iterator = iter(trades)
+        trade_seconds = measure(lambda: analytics.on_position_change(*next(trade_iterator)), args.trades)
+        print(f"сделка: {format_seconds(trade_seconds)}, ускорение относительно полного пересчёта "
+              f"x{recompute_seconds / trade_seconds:,.0f}, оценки NumPy x{vectorized_seconds / trade_seconds:,.0f}")
+
+        # Чтение рейтингов
+        user_ids = [analytics.portfolios[portfolio_id][1] for portfolio_id in random.sample(portfolio_ids, 1000)]
+        user_iterator = iter(user_ids * 10)
+        print(f"топ-10 портфелей: {format_seconds(measure(lambda: analytics.get_top_portfolios(10), 1000))}, "
+              f"сводка пользователя: "
+              f"{format_seconds(measure(lambda: analytics.get_user_summary(next(user_iterator)), 1000))}, "
+              f"процентили доходности: {format_seconds(measure(analytics.get_return_percentiles, 1000))}")
+
+        # Сравниваем инкрементальные агрегаты с полным пересчётом
+        incremental = {portfolio_id: portfolio[2] for portfolio_id, portfolio in analytics.portfolios.items()}
+        incremental_top = [portfolio.portfolio_id for portfolio in analytics.get_top_portfolios(100)]
+        analytics.recompute()
+        max_error = max(abs(value - analytics.portfolios[portfolio_id][2])
+                        for portfolio_id, value in incremental.items())
+        same_top = incremental_top == [portfolio.portfolio_id for portfolio in analytics.get_top_portfolios(100)]
+        print(f"расхождение с полным пересчётом: {max_error:.2e}, топ-100 совпадает: {'да' if same_top else 'нет'}")
+
+        portfolio_database.close()
+
+
+if __name__ == "__main__":
+    main()
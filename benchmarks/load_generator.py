@@ -0,0 +1,246 @@
+"""
+Нагрузочный тест бота: синхронный режим (main.py) против асинхронного (async_main.py).
+
+Тысячи искусственных чатов проходят сценарий создания портфеля через локальную замену Telegram Bot API.
+Каждый чат отправляет следующее сообщение только после получения всех ответов на предыдущее.
+Для каждого режима выводятся пропускная способность (сообщений в секунду) и задержки ответа (p50 и p99).
+
+Запуск из корня репозитория:
+    python -m benchmarks.load_generator --chats 2000
+"""
+
+# Импорты библиотек
+import argparse
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import typing as tp
+
+import telebot
+from telebot import apihelper, asyncio_helper
+from telebot.async_telebot import AsyncTeleBot
+
+# Импорты файлов
+from async_main import AsyncMessagePipeline
+from benchmarks.fake_telegram_api import FakeTelegramApi
+from bot_chat_session import BotChatSession
+from portfolio_database import PortfolioDatabase
+from session_store import SessionStore
+
+# Токен искусственного бота
+FAKE_TOKEN = "123456:FAKE_TOKEN"
+
+# Сценарий одного чата: сообщение пользователя и ожидаемое количество ответов бота на него
+SCENARIO: list[tuple[str, int]] = [
+    ("/start", 1),
+    ("/create_new_portfolio", 1),
+    ("Портфель {chat_id}", 2),
+]
+
+
+class LoadGenerator:
+    """
+    Класс для воспроизведения сценария множеством искусственных чатов и сбора задержек.
+    """
+
+    def __init__(self, api: FakeTelegramApi, chat_count: int, first_chat_id: int = 1_000_000) -> None:
+        """
+        Функция для инициализации генератора нагрузки.
+
+        :param api: Локальная замена Telegram Bot API.
+        :param chat_count: Количество искусственных чатов.
+        :param first_chat_id: ID первого чата.
+        """
+
+        self.api = api
+        self.chat_ids = range(first_chat_id, first_chat_id + chat_count)
+
+        # Состояние каждого чата: [номер шага сценария, время отправки сообщения, сколько ответов ещё ожидается]
+        self.chat_states: dict[int, list[tp.Any]] = {}
+        self.lock = threading.Lock()
+
+        # Задержки ответов на каждое сообщение (в секундах) и событие завершения всех сценариев
+        self.latencies: list[float] = []
+        self.unfinished_chats = chat_count
+        self.finished = threading.Event()
+
+    def start(self) -> None:
+        """
+        Функция для отправки первого сообщения сценария от каждого чата.
+        """
+
+        with self.lock:
+            for chat_id in self.chat_ids:
+                self.chat_states[chat_id] = [0, 0.0, 0]
+                self._send_step(chat_id)
+
+    def on_send_message(self, chat_id: int, message_text: str) -> None:
+        """
+        Функция, вызываемая при получении ответа бота.
+
+        :param chat_id: ID чата.
+        :param message_text: Текст ответа.
+        """
+
+        with self.lock:
+            chat_state = self.chat_states[chat_id]
+            chat_state[2] -= 1
+
+            # Если получены ещё не все ответы на текущее сообщение, то ждём дальше
+            if chat_state[2] > 0:
+                return
+
+            # Записываем задержку ответа и переходим к следующему шагу сценария
+            self.latencies.append(time.perf_counter() - chat_state[1])
+            chat_state[0] += 1
+
+            if chat_state[0] < len(SCENARIO):
+                self._send_step(chat_id)
+            else:
+                self.unfinished_chats -= 1
+                if self.unfinished_chats == 0:
+                    self.finished.set()
+
+    def _send_step(self, chat_id: int) -> None:
+        """
+        Функция для отправки текущего сообщения сценария от заданного чата.
+
+        :param chat_id: ID чата.
+        """
+
+        chat_state = self.chat_states[chat_id]
+        message_template, reply_count = SCENARIO[chat_state[0]]
+        chat_state[1] = time.perf_counter()
+        chat_state[2] = reply_count
+        self.api.push_message(chat_id, message_template.format(chat_id=chat_id))
+
+    def get_results(self, mode: str, seconds: float) -> dict[str, tp.Any]:
+        """
+        Функция для подсчёта итоговых метрик.
+
+        :param mode: Название режима работы бота.
+        :param seconds: Общее время теста в секундах.
+        :return: Словарь с метриками.
+        """
+
+        latencies = sorted(self.latencies)
+
+        def percentile(fraction: float) -> float:
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000 if latencies else 0.0
+
+        return {
+            "mode": mode,
+            "messages": len(latencies),
+            "expected_messages": len(self.chat_ids) * len(SCENARIO),
+            "seconds": round(seconds, 3),
+            "throughput": round(len(latencies) / seconds, 1) if seconds else 0.0,
+            "p50_ms": round(percentile(0.50), 2),
+            "p99_ms": round(percentile(0.99), 2),
+        }
+
+
+def run_sync_mode(db_path: str, chat_count: int, max_seconds: float) -> dict[str, tp.Any]:
+    """
+    Функция для нагрузочного теста синхронного режима (TeleBot + infinity_polling, как в main.py).
+
+    :param db_path: Путь к файлу базы данных.
+    :param chat_count: Количество искусственных чатов.
+    :param max_seconds: Максимальная длительность теста в секундах.
+    :return: Словарь с метриками.
+    """
+
+    api = FakeTelegramApi()
+    load_generator = LoadGenerator(api, chat_count)
+    api.on_send_message = load_generator.on_send_message
+    api.start()
+    apihelper.API_URL = api.api_url
+
+    bot = telebot.TeleBot(FAKE_TOKEN)
+    portfolio_database = PortfolioDatabase(db_path)
+    session_store = SessionStore(lambda chat_id: BotChatSession(chat_id, portfolio_database), ttl=None)
+
+    # Обработчик повторяет main.message_handler
+    def message_handler(message: telebot.types.Message) -> None:
+        for bot_output in session_store.get_session(message.chat.id).processing(message.text):
+            bot.send_message(message.chat.id, bot_output)
+
+    bot.register_message_handler(message_handler, content_types=["text"])
+    polling_thread = threading.Thread(target=bot.infinity_polling, kwargs={"long_polling_timeout": 1}, daemon=True)
+    polling_thread.start()
+
+    start_time = time.perf_counter()
+    load_generator.start()
+    load_generator.finished.wait(max_seconds)
+    seconds = time.perf_counter() - start_time
+
+    bot.stop_polling()
+    polling_thread.join()
+    api.stop()
+    return load_generator.get_results("sync", seconds)
+
+
+def run_async_mode(db_path: str, chat_count: int, max_seconds: float) -> dict[str, tp.Any]:
+    """
+    Функция для нагрузочного теста асинхронного режима (AsyncTeleBot + AsyncMessagePipeline).
+
+    :param db_path: Путь к файлу базы данных.
+    :param chat_count: Количество искусственных чатов.
+    :param max_seconds: Максимальная длительность теста в секундах.
+    :return: Словарь с метриками.
+    """
+
+    api = FakeTelegramApi()
+    load_generator = LoadGenerator(api, chat_count)
+    api.on_send_message = load_generator.on_send_message
+    api.start()
+    asyncio_helper.API_URL = api.api_url
+
+    async def run() -> float:
+        bot = AsyncTeleBot(FAKE_TOKEN)
+        pipeline = AsyncMessagePipeline(bot, PortfolioDatabase(db_path))
+        polling_task = asyncio.create_task(bot.infinity_polling(timeout=1))
+
+        start_time = time.perf_counter()
+        load_generator.start()
+        await asyncio.get_running_loop().run_in_executor(None, load_generator.finished.wait, max_seconds)
+        seconds = time.perf_counter() - start_time
+
+        # У AsyncTeleBot нет метода остановки опроса, поэтому отменяем задачу опроса
+        polling_task.cancel()
+        await asyncio.gather(polling_task, return_exceptions=True)
+        await pipeline.close()
+        return seconds
+
+    seconds = asyncio.run(run())
+    api.stop()
+    return load_generator.get_results("async", seconds)
+
+
+def main() -> None:
+    """
+    Функция для запуска нагрузочного теста из командной строки.
+    """
+
+    parser = argparse.ArgumentParser(description="Нагрузочный тест синхронного и асинхронного режимов бота")
+    parser.add_argument("--chats", type=int, default=2000, help="количество искусственных чатов")
+    parser.add_argument("--max-seconds", type=float, default=120.0, help="максимальная длительность одного режима")
+    parser.add_argument("--mode", choices=["sync", "async", "both"], default="both", help="проверяемый режим")
+    args = parser.parse_args()
+
+    modes = {"sync": run_sync_mode, "async": run_async_mode}
+    for mode, run_mode in modes.items():
+        if args.mode not in (mode, "both"):
+            continue
+
+        # Каждый режим работает со своей временной базой данных
+        with tempfile.TemporaryDirectory() as temp_dir:
+            results = run_mode(os.path.join(temp_dir, "portfolios.db"), args.chats, args.max_seconds)
+
+        print("{mode:>5}: {messages}/{expected_messages} сообщений за {seconds} с, {throughput} сообщ./с, "
+              "p50 = {p50_ms} мс, p99 = {p99_ms} мс".format(**results))
+
+
+if __name__ == "__main__":
+    main()
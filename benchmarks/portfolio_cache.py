@@ -0,0 +1,100 @@
+"""
+Количество запросов к базе данных на одно сообщение без кэша списков портфелей и с ним.
+
+Каждый пользователь несколько раз проходит сценарий бота: запуск и главное меню (обработчик главного меню проверяет,
+есть ли у пользователя портфели), создание портфеля и повторная попытка создать портфель с тем же именем.
+Сообщения обрабатываются сессиями BotChatSession, а SQL-запросы считаются через trace callback подключения.
+
+Запуск из корня репозитория:
+    python -m benchmarks.portfolio_cache --users 1000 --rounds 5
+"""
+
+# Импорты библиотек
+import argparse
+import os
+import tempfile
+import time
+import typing as tp
+
+# Импорты файлов
+from bot_chat_session import BotChatSession
+from portfolio_database import PortfolioDatabase
+
+# Сообщения одного прохода сценария ({round} - номер прохода, чтобы каждый проход создавал новый портфель)
+SCENARIO: list[str] = [
+    "/start",
+    "/main_menu",
+    "/create_new_portfolio",
+    "Портфель {round}",
+    "/create_new_portfolio",
+    "Портфель {round}",
+    "/main_menu",
+    "/main_menu",
+]
+
+# Команды, при которых обработчик главного меню проверяет наличие портфелей у пользователя
+MAIN_MENU_COMMANDS = ("/start", "/main_menu")
+
+
+def run(cache_size: int, user_count: int, round_count: int) -> dict[str, tp.Any]:
+    """
+    Функция для прогона сценария.
+
+    :param cache_size: Размер кэша списков портфелей (0 - без кэша).
+    :param user_count: Количество пользователей.
+    :param round_count: Количество проходов сценария каждым пользователем.
+    :return: Словарь с результатами.
+    """
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        portfolio_database = PortfolioDatabase(os.path.join(temp_dir, "portfolios.db"), cache_size=cache_size)
+        sessions = [BotChatSession(user_id, portfolio_database) for user_id in range(user_count)]
+
+        # Считаем только запросы к данным (без управления транзакциями)
+        query_count = 0
+
+        def count_query(statement: str) -> None:
+            nonlocal query_count
+            if statement.lstrip()[:6].upper() in ("SELECT", "INSERT", "DELETE", "UPDATE"):
+                query_count += 1
+
+        message_count = 0
+        with portfolio_database.pool.connection() as connection:
+            connection.set_trace_callback(count_query)
+            start_time = time.perf_counter()
+            for round_number in range(round_count):
+                for session in sessions:
+                    for message_text in SCENARIO:
+                        if message_text in MAIN_MENU_COMMANDS:
+                            portfolio_database.is_user_has_portfolio(session.user_id)
+                        session.processing(message_text.format(round=round_number))
+                        message_count += 1
+            seconds = time.perf_counter() - start_time
+            connection.set_trace_callback(None)
+
+        metrics = portfolio_database.portfolio_cache.get_metrics() if portfolio_database.portfolio_cache else {}
+        portfolio_database.close()
+
+    return {"queries_per_message": query_count / message_count, "messages_per_second": message_count / seconds,
+            "hit_rate": metrics.get("hit_rate", 0.0)}
+
+
+def main() -> None:
+    """
+    Функция для запуска сравнения из командной строки.
+    """
+
+    parser = argparse.ArgumentParser(description="Запросы к базе данных на сообщение без кэша и с кэшем портфелей")
+    parser.add_argument("--users", type=int, default=1000, help="количество пользователей")
+    parser.add_argument("--rounds", type=int, default=5, help="количество проходов сценария")
+    parser.add_argument("--cache-size", type=int, default=10000, help="размер кэша списков портфелей")
+    args = parser.parse_args()
+
+    for name, cache_size in (("без кэша", 0), ("с кэшем", args.cache_size)):
+        results = run(cache_size, args.users, args.rounds)
+        print(f"{name:>8}: {results['queries_per_message']:.3f} запросов/сообщение, "
+              f"{results['messages_per_second']:,.0f} сообщений/с, попаданий в кэш: {results['hit_rate']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
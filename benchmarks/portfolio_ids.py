@@ -0,0 +1,116 @@
+"""
+Сравнение генераторов ID портфелей.
+
+Для каждого генератора измеряется:
+    - скорость генерации ID (ID/с) без обращения к базе данных;
+    - скорость добавления портфелей в базу данных, уже содержащую портфели со старыми случайными ID
+      (с небольшим кэшем страниц, чтобы была видна локальность добавления в индекс по ID портфеля);
+    - количество и заполненность листовых страниц индекса по ID портфеля после добавления.
+
+Запуск из корня репозитория:
+    python -m benchmarks.portfolio_ids --rows 1000000 --inserts 200000
+"""
+
+# Импорты библиотек
+import argparse
+import os
+import tempfile
+import time
+import typing as tp
+
+# Импорты файлов
+from portfolio_database import PortfolioDatabase
+from portfolio_id_generator import ID_GENERATORS, PortfolioIdGenerator, RowidIdGenerator
+
+# Индекс, который SQLite создаёт для уникального столбца portfolio_id
+ID_INDEX_NAME = "sqlite_autoindex_portfolio_info_1"
+
+
+def measure_generation(id_generator: PortfolioIdGenerator, count: int) -> float:
+    """
+    Функция для измерения скорости генерации ID.
+
+    :param id_generator: Генератор ID портфелей.
+    :param count: Количество ID.
+    :return: Количество ID в секунду.
+    """
+
+    generate = id_generator.generate
+    start_time = time.perf_counter()
+    for user_id in range(count):
+        generate("Портфель", user_id)
+    return count / (time.perf_counter() - start_time)
+
+
+def measure_inserts(id_generator: PortfolioIdGenerator, db_path: str, row_count: int, insert_count: int,
+                    batch_size: int, cache_size: int) -> dict[str, tp.Any]:
+    """
+    Функция для измерения скорости добавления портфелей и состояния индекса по ID портфеля.
+
+    :param id_generator: Генератор ID портфелей.
+    :param db_path: Путь к файлу базы данных.
+    :param row_count: Количество портфелей, добавляемых перед измерением.
+    :param insert_count: Количество добавляемых портфелей.
+    :param batch_size: Количество портфелей в одной транзакции.
+    :param cache_size: Размер кэша страниц подключения в КиБ.
+    :return: Словарь с результатами.
+    """
+
+    portfolio_database = PortfolioDatabase(db_path, pragmas={"cache_size": -cache_size}, id_generator=id_generator)
+    with portfolio_database.pool.connection() as connection:
+
+        # Заполняем базу данных портфелями со старыми 10-символьными случайными ID
+        # (При миллионе 40-битных ID повторы вполне вероятны, поэтому повторы пропускаются)
+        connection.execute("""
+        WITH RECURSIVE numbers(value) AS (SELECT 0 UNION ALL SELECT value + 1 FROM numbers WHERE value + 1 < ?)
+        INSERT OR IGNORE INTO portfolio_info (portfolio_id, portfolio_name, user_id)
+        SELECT lower(hex(randomblob(5))), 'Портфель', value FROM numbers
+        """, (row_count,))
+        connection.commit()
+
+        # Добавляем портфели новых пользователей группами (как при групповой фиксации)
+        start_time = time.perf_counter()
+        for first_user_id in range(row_count, row_count + insert_count, batch_size):
+            for user_id in range(first_user_id, min(first_user_id + batch_size, row_count + insert_count)):
+                portfolio_database._add_new_portfolio(connection, "Портфель", user_id)
+            connection.commit()
+        seconds = time.perf_counter() - start_time
+
+        # Получаем количество и заполненность листовых страниц индекса по ID портфеля
+        # (Для целочисленных ID поиск идёт по тому же индексу, т.к. portfolio_id остаётся текстовым столбцом)
+        leaf_pages, fill = connection.execute("""
+        SELECT COUNT(*), SUM(pgsize - unused) * 1.0 / SUM(pgsize) FROM dbstat WHERE name = ? AND pagetype = 'leaf'
+        """, (ID_INDEX_NAME,)).fetchone()
+
+    portfolio_database.close()
+    return {"inserts_per_second": insert_count / seconds, "leaf_pages": leaf_pages, "fill": fill}
+
+
+def main() -> None:
+    """
+    Функция для запуска сравнения из командной строки.
+    """
+
+    parser = argparse.ArgumentParser(description="Сравнение генераторов ID портфелей")
+    parser.add_argument("--ids", type=int, default=200_000, help="количество ID для измерения скорости генерации")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="количество портфелей перед добавлением")
+    parser.add_argument("--inserts", type=int, default=200_000, help="количество добавляемых портфелей")
+    parser.add_argument("--batch-size", type=int, default=64, help="количество портфелей в одной транзакции")
+    parser.add_argument("--cache-size", type=int, default=2000, help="размер кэша страниц в КиБ")
+    args = parser.parse_args()
+
+    for name, generator_class in ID_GENERATORS.items():
+        # ID по ключу строки назначаются базой данных, поэтому измеряем только добавление
+        generation = "—" if generator_class is RowidIdGenerator else \
+            f"{measure_generation(generator_class(), args.ids):,.0f} ID/с"
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            results = measure_inserts(generator_class(), os.path.join(temp_dir, "portfolios.db"), args.rows,
+                                      args.inserts, args.batch_size, args.cache_size)
+
+        print(f"{name:>12}: генерация {generation:>14}, добавление {results['inserts_per_second']:,.0f} портфелей/с, "
+              f"листовых страниц индекса ID: {results['leaf_pages']:,}, заполненность: {results['fill']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
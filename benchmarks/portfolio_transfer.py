@@ -0,0 +1,100 @@
+"""
+Скорость массового переноса портфелей: выгрузка и загрузка в форматах CSV, JSONL и двоичном
+(строк в секунду) в сравнении с добавлением портфелей по одному через add_new_portfolio.
+
+База данных заполняется портфелями, которые выгружаются в файл каждого формата и загружаются в пустую базу данных.
+Для загрузки также измеряется пиковый объём памяти Python (tracemalloc): он не должен зависеть от количества строк.
+
+Запуск из корня репозитория:
+    python -m benchmarks.portfolio_transfer --rows 1000000
+"""
+
+# Импорты библиотек
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+# Импорты файлов
+from benchmarks.query_plans import fill_database
+from portfolio_database import PortfolioDatabase
+from portfolio_transfer import FORMATS, export_portfolios, import_portfolios
+
+# Расширения файлов форматов
+FORMAT_EXTENSIONS = {"csv": ".csv", "jsonl": ".jsonl", "binary": ".vipf"}
+
+
+def measure_single_inserts(temp_dir: str, row_count: int) -> float:
+    """
+    Функция для измерения скорости добавления портфелей по одному (как при создании портфелей через бота).
+
+    :param temp_dir: Временная папка.
+    :param row_count: Количество портфелей.
+    :return: Строк в секунду.
+    """
+
+    portfolio_database = PortfolioDatabase(os.path.join(temp_dir, "single.db"))
+    start_time = time.perf_counter()
+    for index in range(row_count):
+        portfolio_database.add_new_portfolio(f"Портфель {index % 5}", index // 5)
+    seconds = time.perf_counter() - start_time
+    portfolio_database.close()
+    return row_count / seconds
+
+
+def main() -> None:
+    """
+    Функция для запуска бенчмарка из командной строки.
+    """
+
+    parser = argparse.ArgumentParser(description="Скорость массовой выгрузки и загрузки портфелей")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="количество портфелей")
+    parser.add_argument("--single-rows", type=int, default=20_000,
+                        help="количество портфелей для добавления по одному")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="количество портфелей в одной транзакции")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        print(f"по одному (add_new_portfolio): {measure_single_inserts(temp_dir, args.single_rows):,.0f} строк/с")
+
+        source_database = PortfolioDatabase(os.path.join(temp_dir, "source.db"))
+        fill_database(source_database, args.rows)
+
+        for format_name in FORMATS:
+            path = os.path.join(temp_dir, "portfolios" + FORMAT_EXTENSIONS[format_name])
+
+            start_time = time.perf_counter()
+            export_portfolios(source_database, path)
+            export_seconds = time.perf_counter() - start_time
+
+            # Загружаем в пустую базу данных, затем повторно (все портфели пропускаются как повторы)
+            target_database = PortfolioDatabase(os.path.join(temp_dir, f"target_{format_name}.db"))
+            start_time = time.perf_counter()
+            imported_count, _ = import_portfolios(target_database, path, chunk_size=args.chunk_size)
+            import_seconds = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            _, skipped_count = import_portfolios(target_database, path, chunk_size=args.chunk_size)
+            reimport_seconds = time.perf_counter() - start_time
+            target_database.close()
+
+            # Пиковую память измеряем отдельной загрузкой, т.к. tracemalloc замедляет выполнение
+            memory_database = PortfolioDatabase(os.path.join(temp_dir, f"memory_{format_name}.db"))
+            tracemalloc.start()
+            import_portfolios(memory_database, path, chunk_size=args.chunk_size)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            memory_database.close()
+
+            print(f"{format_name:>6}: файл {os.path.getsize(path) / 2 ** 20:,.1f} МБ, "
+                  f"выгрузка {args.rows / export_seconds:,.0f} строк/с, "
+                  f"загрузка {imported_count / import_seconds:,.0f} строк/с "
+                  f"(пик памяти {peak_memory / 2 ** 20:.1f} МБ), "
+                  f"повторная загрузка {skipped_count / reimport_seconds:,.0f} строк/с")
+
+        source_database.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Бенчмарк оценки портфелей: 100 тыс. портфелей по 50 позиций.
+
+Измеряется:
+    - загрузка снимка позиций из таблицы holdings;
+    - оценка всех портфелей одним векторным проходом NumPy и тем же расчётом циклом Python;
+    - оценка одного портфеля;
+    - сделки с обновлением снимка (без повторной загрузки позиций).
+
+Запуск из корня репозитория:
+    python -m benchmarks.portfolio_valuation --portfolios 100000 --positions 50
+"""
+
+# Импорты библиотек
+import argparse
+import os
+import random
+import tempfile
+import time
+
+# Импорты файлов
+from portfolio_database import PortfolioDatabase
+
+# Количество разных тикеров
+SYMBOL_COUNT = 500
+
+
+def fill_database(portfolio_database: PortfolioDatabase, portfolio_count: int, position_count: int) -> None:
+    """
+    Функция для заполнения базы данных портфелями и их позициями.
+
+    :param portfolio_database: База данных портфелей.
+    :param portfolio_count: Количество портфелей.
+    :param position_count: Количество позиций в каждом портфеле (не больше SYMBOL_COUNT / 10).
+    """
+
+    with portfolio_database.pool.connection() as connection:
+        connection.execute("""
+        WITH RECURSIVE numbers(value) AS (SELECT 0 UNION ALL SELECT value + 1 FROM numbers WHERE value + 1 < ?)
+        INSERT INTO portfolio_info (portfolio_id, portfolio_name, user_id)
+        SELECT printf('p%08d', value), 'Портфель', value FROM numbers
+        """, (portfolio_count,))
+
+        # Тикеры позиций одного портфеля различны: (номер портфеля + 10 * номер позиции) % SYMBOL_COUNT
+        connection.execute("""
+        WITH RECURSIVE
+            portfolios(value) AS (SELECT 0 UNION ALL SELECT value + 1 FROM portfolios WHERE value + 1 < ?1),
+            positions(value) AS (SELECT 0 UNION ALL SELECT value + 1 FROM positions WHERE value + 1 < ?2)
+        INSERT INTO holdings (portfolio_id, symbol, quantity, cost_basis)
+        SELECT printf('p%08d', portfolios.value), 'S' || ((portfolios.value + 10 * positions.value) % ?3),
+               1 + abs(random() % 100), 100 + abs(random() % 10000)
+        FROM portfolios, positions
+        """, (portfolio_count, position_count, SYMBOL_COUNT))
+        connection.commit()
+
+
+def value_with_python(positions: list[tuple[str, str, float, float]], prices: dict[str, float]) -> dict[str, float]:
+    """
+    Функция для оценки всех портфелей циклом Python (для сравнения с векторной оценкой).
+
+    :param positions: Позиции (ID портфеля, тикер, количество бумаг, стоимость покупки).
+    :param prices: Словарь {тикер: цена}.
+    :return: Словарь {ID портфеля: стоимость}.
+    """
+
+    values: dict[str, float] = {}
+    for portfolio_id, symbol, quantity, cost_basis in positions:
+        price = prices.get(symbol)
+        values[portfolio_id] = values.get(portfolio_id, 0.0) + (quantity * price if price is not None else cost_basis)
+    return values
+
+
+def main() -> None:
+    """
+    Функция для запуска бенчмарка из командной строки.
+    """
+
+    parser = argparse.ArgumentParser(description="Бенчмарк оценки портфелей")
+    parser.add_argument("--portfolios", type=int, default=100_000, help="количество портфелей")
+    parser.add_argument("--positions", type=int, default=50, help="количество позиций в портфеле")
+    parser.add_argument("--trades", type=int, default=1000, help="количество сделок")
+    args = parser.parse_args()
+
+    prices = {f"S{index}": 100.0 + index for index in range(SYMBOL_COUNT)}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        portfolio_database = PortfolioDatabase(os.path.join(temp_dir, "portfolios.db"))
+
+        start_time = time.perf_counter()
+        fill_database(portfolio_database, args.portfolios, args.positions)
+        print(f"заполнение {args.portfolios * args.positions:,} позиций: {time.perf_counter() - start_time:.1f} с")
+
+        start_time = time.perf_counter()
+        with portfolio_database.position_snapshot_lock:
+            snapshot = portfolio_database.get_position_snapshot()
+        print(f"загрузка снимка: {time.perf_counter() - start_time:.2f} с")
+
+        # Оценка всех портфелей (первая оценка - прогрев)
+        portfolio_database.value_portfolios(prices)
+        start_time = time.perf_counter()
+        valuation = portfolio_database.value_portfolios(prices)
+        numpy_seconds = time.perf_counter() - start_time
+        print(f"оценка всех портфелей (NumPy): {numpy_seconds * 1000:.1f} мс, "
+              f"суммарная стоимость: {valuation.values.sum():,.0f}")
+
+        positions = [(snapshot.portfolio_ids[portfolio], snapshot.symbols[symbol], quantity, cost_basis)
+                     for portfolio, symbol, quantity, cost_basis in
+                     zip(snapshot.position_portfolios[:len(snapshot)].tolist(),
+                         snapshot.position_symbols[:len(snapshot)].tolist(),
+                         snapshot.quantities[:len(snapshot)].tolist(), snapshot.cost_bases[:len(snapshot)].tolist())]
+        start_time = time.perf_counter()
+        python_values = value_with_python(positions, prices)
+        python_seconds = time.perf_counter() - start_time
+        print(f"оценка всех портфелей (цикл Python): {python_seconds * 1000:.1f} мс "
+              f"(в {python_seconds / numpy_seconds:.1f} раз медленнее), "
+              f"суммарная стоимость: {sum(python_values.values()):,.0f}")
+
+        # Оценка одного портфеля
+        portfolio_ids = [f"p{random.randrange(args.portfolios):08d}" for _ in range(1000)]
+        start_time = time.perf_counter()
+        for portfolio_id in portfolio_ids:
+            portfolio_database.value_portfolio(portfolio_id, prices)
+        print(f"оценка одного портфеля: {(time.perf_counter() - start_time) / len(portfolio_ids) * 1e6:.0f} мкс")
+
+        # Сделки: позиция изменяется в базе данных и в снимке, повторная загрузка не нужна
+        start_time = time.perf_counter()
+        for _ in range(args.trades):
+            portfolio_database.buy(f"p{random.randrange(args.portfolios):08d}",
+                                   f"S{random.randrange(SYMBOL_COUNT)}", 1, 100.0)
+        trade_seconds = (time.perf_counter() - start_time) / args.trades
+        valuation = portfolio_database.value_portfolios(prices)
+        print(f"сделка с обновлением снимка: {trade_seconds * 1e6:.0f} мкс, "
+              f"позиций в снимке после сделок: {len(snapshot):,}")
+
+        portfolio_database.close()
+
+
+if __name__ == "__main__":
+    main()
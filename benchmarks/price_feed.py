@@ -0,0 +1,137 @@
+"""
+Бенчмарк сервиса котировок: оценка портфеля с запросом цен у источника на каждый запрос пользователя против
+чтения цен из общей таблицы котировок, которую сервис обновляет по расписанию.
+
+Источник котировок - воспроизведение CSV-файла со случайным блужданием цен и искусственной задержкой запроса
+(имитация сетевого источника). Выводятся запросы в секунду, задержки, метрики длительности обновлений и возраста
+выданных котировок.
+
+Запуск из корня репозитория:
+    python -m benchmarks.price_feed --portfolios 1000 --seconds 5
+"""
+
+# Импорты библиотек
+import argparse
+import csv
+import os
+import random
+import tempfile
+import threading
+import time
+
+# Импорты файлов
+from portfolio_database import PortfolioDatabase
+from price_feed import CsvReplayProvider, PriceFeedService, QuoteCache
+from benchmarks.portfolio_valuation import SYMBOL_COUNT, fill_database
+
+
+def write_prices_csv(path: str, step_count: int) -> None:
+    """
+    Функция для создания CSV-файла с ценами (случайное блуждание каждого тикера).
+
+    :param path: Путь к файлу.
+    :param step_count: Количество моментов времени.
+    """
+
+    prices = [100.0 + index for index in range(SYMBOL_COUNT)]
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["timestamp", "symbol", "price"])
+        for step in range(step_count):
+            for index in range(SYMBOL_COUNT):
+                prices[index] *= 1 + random.gauss(0, 0.01)
+                writer.writerow([step, f"S{index}", f"{prices[index]:.4f}"])
+
+
+def run_readers(portfolio_database: PortfolioDatabase, portfolio_count: int, thread_count: int, seconds: float,
+                get_prices) -> tuple[int, list[float]]:
+    """
+    Функция для оценки случайных портфелей из нескольких потоков в течение заданного времени.
+
+    :param portfolio_database: База данных портфелей.
+    :param portfolio_count: Количество портфелей.
+    :param thread_count: Количество потоков.
+    :param seconds: Длительность в секундах.
+    :param get_prices: Функция, возвращающая источник цен для оценки портфеля с заданным ID.
+    :return: Количество оценок и список их длительностей в секундах.
+    """
+
+    latencies: list[float] = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def reader() -> None:
+        thread_latencies: list[float] = []
+        while time.monotonic() < deadline:
+            portfolio_id = f"p{random.randrange(portfolio_count):08d}"
+            start_time = time.perf_counter()
+            portfolio_database.value_portfolio(portfolio_id, get_prices(portfolio_id))
+            thread_latencies.append(time.perf_counter() - start_time)
+        with lock:
+            latencies.extend(thread_latencies)
+
+    threads = [threading.Thread(target=reader) for _ in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(latencies), sorted(latencies)
+
+
+def main() -> None:
+    """
+    Функция для запуска бенчмарка из командной строки.
+    """
+
+    parser = argparse.ArgumentParser(description="Бенчмарк сервиса котировок")
+    parser.add_argument("--portfolios", type=int, default=1000, help="количество портфелей")
+    parser.add_argument("--positions", type=int, default=50, help="количество позиций в портфеле")
+    parser.add_argument("--threads", type=int, default=8, help="количество потоков обработчиков")
+    parser.add_argument("--seconds", type=float, default=5.0, help="длительность каждого режима в секундах")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="задержка запроса к источнику в мс")
+    parser.add_argument("--interval", type=float, default=1.0, help="период обновления котировок в секундах")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        csv_path = os.path.join(temp_dir, "prices.csv")
+        write_prices_csv(csv_path, 100)
+        provider = CsvReplayProvider(csv_path, latency=args.latency_ms / 1000)
+
+        portfolio_database = PortfolioDatabase(os.path.join(temp_dir, "portfolios.db"))
+        fill_database(portfolio_database, args.portfolios, args.positions)
+
+        # Запрос цен у источника на каждую оценку
+        def fetch_prices(portfolio_id: str) -> dict[str, float]:
+            return provider.get_prices([symbol for symbol, _, _ in portfolio_database.get_holdings(portfolio_id)])
+
+        count, latencies = run_readers(portfolio_database, args.portfolios, args.threads, args.seconds, fetch_prices)
+        print(f"запрос к источнику на каждую оценку: {count / args.seconds:,.0f} оценок/с, "
+              f"p50 {latencies[len(latencies) // 2] * 1000:.2f} мс, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} мс")
+
+        # Общая таблица котировок, обновляемая сервисом
+        quote_cache = QuoteCache(ttl=args.interval * 2, stale_ttl=args.interval * 10)
+        service = PriceFeedService(provider, quote_cache, portfolio_database.get_held_symbols, args.interval)
+        service.refresh()
+        service.start()
+        count, latencies = run_readers(portfolio_database, args.portfolios, args.threads, args.seconds,
+                                       lambda portfolio_id: quote_cache)
+        service.stop()
+        print(f"общая таблица котировок:             {count / args.seconds:,.0f} оценок/с, "
+              f"p50 {latencies[len(latencies) // 2] * 1000:.2f} мс, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} мс")
+
+        service_metrics = service.get_metrics()
+        cache_metrics = quote_cache.get_metrics()
+        print(f"обновлений: {service_metrics['refreshes']}, средняя длительность обновления "
+              f"{service_metrics['average_refresh_seconds'] * 1000:.1f} мс, "
+              f"максимальная {service_metrics['max_refresh_seconds'] * 1000:.1f} мс")
+        print(f"выдано котировок: свежих {cache_metrics['fresh_hits']:,}, устаревших {cache_metrics['stale_hits']:,}, "
+              f"промахов {cache_metrics['misses']:,}, средний возраст {cache_metrics['average_staleness']:.2f} с, "
+              f"максимальный {cache_metrics['max_staleness']:.2f} с")
+
+        portfolio_database.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Бенчмарк хранилища истории цен: запросы свечей за случайные периоды из отображённых в память файлов столбцов
+против той же выборки из таблицы SQLite с первичным ключом (тикер, время).
+
+Измеряется пропускная способность (свечей в секунду) выборки цен закрытия за период с расчётом средней цены,
+для SQLite - с выгрузкой строк в Python и с расчётом средней в самом запросе. Отдельно измеряется расчёт
+доходности и просадки портфеля по истории цен.
+
+Запуск из корня репозитория:
+    python -m benchmarks.price_history --symbols 10 --bars 500000 --range-bars 10000
+"""
+
+# Импорты библиотек
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+# Импорты файлов
+from portfolio_database import PortfolioDatabase
+from price_history import PriceHistoryStore
+
+# Время первой свечи (секунды Unix) и шаг свечей (минутные свечи)
+FIRST_TIMESTAMP = 1_600_000_000
+BAR_SECONDS = 60
+
+
+def generate_bars(bar_count: int) -> tuple[np.ndarray, ...]:
+    """
+    Функция для генерации минутных свечей (случайное блуждание цены).
+
+    :param bar_count: Количество свечей.
+    :return: Столбцы времени, цен открытия, максимальных, минимальных цен и цен закрытия.
+    """
+
+    timestamps = FIRST_TIMESTAMP + BAR_SECONDS * np.arange(bar_count, dtype=np.int64)
+    closes = 100 * np.cumprod(1 + np.random.normal(0, 0.001, bar_count))
+    opens = np.concatenate(([100.0], closes[:-1]))
+    spread = np.abs(np.random.normal(0, 0.0005, bar_count)) * closes
+    return timestamps, opens, np.maximum(opens, closes) + spread, np.minimum(opens, closes) - spread, closes
+
+
+def run_queries(query, symbols: list[str], bar_count: int, range_bars: int, query_count: int) -> tuple[float, float]:
+    """
+    Функция для выполнения запросов за случайные периоды.
+
+    :param query: Функция (тикер, начало, конец) -> средняя цена закрытия.
+    :param symbols: Тикеры.
+    :param bar_count: Количество свечей каждой бумаги.
+    :param range_bars: Количество свечей в периоде запроса.
+    :param query_count: Количество запросов.
+    :return: Количество свечей в секунду и среднее время запроса в секундах.
+    """
+
+    random.seed(1)
+    ranges = []
+    for _ in range(query_count):
+        first = random.randrange(bar_count - range_bars)
+        ranges.append((random.choice(symbols), FIRST_TIMESTAMP + BAR_SECONDS * first,
+                       FIRST_TIMESTAMP + BAR_SECONDS * (first + range_bars)))
+
+    start_time = time.perf_counter()
+    for symbol, start, end in ranges:
+        query(symbol, start, end)
+    seconds = time.perf_counter() - start_time
+    return query_count * range_bars / seconds, seconds / query_count
+
+
+def main() -> None:
+    """
+    Функция для запуска бенчмарка из командной строки.
+    """
+
+    parser = argparse.ArgumentParser(description="Бенчмарк хранилища истории цен")
+    parser.add_argument("--symbols", type=int, default=10, help="количество бумаг")
+    parser.add_argument("--bars", type=int, default=500_000, help="количество свечей каждой бумаги")
+    parser.add_argument("--range-bars", type=int, default=10_000, help="количество свечей в периоде запроса")
+    parser.add_argument("--queries", type=int, default=1000, help="количество запросов")
+    parser.add_argument("--trades", type=int, default=200, help="количество сделок портфеля для расчёта доходности")
+    args = parser.parse_args()
+
+    symbols = [f"S{index}" for index in range(args.symbols)]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = PriceHistoryStore(os.path.join(temp_dir, "history"))
+        connection = sqlite3.connect(os.path.join(temp_dir, "history.db"))
+        connection.execute("""
+        CREATE TABLE price_history (
+            symbol TEXT NOT NULL,
+            timestamp INTEGER NOT NULL,
+            open REAL NOT NULL,
+            high REAL NOT NULL,
+            low REAL NOT NULL,
+            close REAL NOT NULL,
+            PRIMARY KEY (symbol, timestamp)
+        ) WITHOUT ROWID
+        """)
+
+        # Заполнение хранилища и таблицы одинаковыми свечами
+        store_seconds = sqlite_seconds = 0.0
+        for symbol in symbols:
+            bars = generate_bars(args.bars)
+            start_time = time.perf_counter()
+            store.append(symbol, *bars)
+            store_seconds += time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            connection.executemany("INSERT INTO price_history VALUES (?, ?, ?, ?, ?, ?)",
+                                   ((symbol, *row) for row in zip(*(column.tolist() for column in bars))))
+            connection.commit()
+            sqlite_seconds += time.perf_counter() - start_time
+        row_count = args.symbols * args.bars
+        print(f"запись {row_count:,} свечей: хранилище {row_count / store_seconds:,.0f} свечей/с, "
+              f"SQLite {row_count / sqlite_seconds:,.0f} свечей/с")
+
+        # Запросы за период
+        def query_store(symbol: str, start: int, end: int) -> float:
+            return float(store.get_range(symbol, start, end).close.mean())
+
+        def query_sqlite_rows(symbol: str, start: int, end: int) -> float:
+            cursor = connection.execute("""
+            SELECT close FROM price_history WHERE symbol = ? AND timestamp >= ? AND timestamp < ?
+            """, (symbol, start, end))
+            return float(np.fromiter((row[0] for row in cursor), dtype=np.float64).mean())
+
+        def query_sqlite_aggregate(symbol: str, start: int, end: int) -> float:
+            return connection.execute("""
+            SELECT avg(close) FROM price_history WHERE symbol = ? AND timestamp >= ? AND timestamp < ?
+            """, (symbol, start, end)).fetchone()[0]
+
+        for name, query in (("хранилище (отображение в память)", query_store),
+                            ("SQLite, выгрузка строк", query_sqlite_rows),
+                            ("SQLite, avg() в запросе", query_sqlite_aggregate)):
+            query(symbols[0], FIRST_TIMESTAMP, FIRST_TIMESTAMP + BAR_SECONDS * args.range_bars)
+            throughput, latency = run_queries(query, symbols, args.bars, args.range_bars, args.queries)
+            print(f"{name}: {throughput:,.0f} свечей/с, {latency * 1000:.3f} мс на запрос")
+
+        # Доходность портфеля со сделками, равномерно распределёнными по истории
+        portfolio_database = PortfolioDatabase(os.path.join(temp_dir, "portfolios.db"), price_history=store)
+        portfolio_database.add_new_portfolio("Портфель", 1)
+        portfolio_id = portfolio_database.get_user_portfolios(1)["Портфель"]
+        with portfolio_database.pool.connection() as portfolio_connection:
+            portfolio_connection.executemany("""
+            INSERT INTO transactions (portfolio_id, symbol, quantity, price, executed_at) VALUES (?, ?, ?, ?, ?)
+            """, [(portfolio_id, random.choice(symbols), 10.0, 100.0,
+                   FIRST_TIMESTAMP + BAR_SECONDS * (args.bars * index // args.trades))
+                  for index in range(args.trades)])
+            portfolio_connection.commit()
+
+        start_time = time.perf_counter()
+        performance = portfolio_database.get_performance(portfolio_id)
+        print(f"доходность портфеля ({args.trades} сделок, {len(performance.timestamps):,} моментов времени): "
+              f"{(time.perf_counter() - start_time) * 1000:.1f} мс, "
+              f"доходность {performance.time_weighted_return:.2%}, просадка {performance.max_drawdown:.2%}")
+
+        portfolio_database.close()
+        connection.close()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Проверка планов запросов PortfolioDatabase на большой таблице портфелей.
+
+Скрипт заполняет базу данных заданным количеством портфелей (по-умолчанию 10 млн), выполняет горячие методы
+PortfolioDatabase, перехватывая их SQL-запросы, и для каждого запроса получает план (EXPLAIN QUERY PLAN).
+Если хотя бы один запрос выполняет полный просмотр таблицы (SCAN без индекса), то скрипт завершается с кодом 1.
+Также выводится время выполнения каждого метода.
+
+Запуск из корня репозитория:
+    python -m benchmarks.query_plans --rows 10000000
+"""
+
+# Импорты библиотек
+import argparse
+import os
+import tempfile
+import time
+import typing as tp
+
+# Импорты файлов
+from portfolio_database import PortfolioDatabase
+
+# Количество портфелей у одного пользователя в тестовой базе данных
+PORTFOLIOS_PER_USER = 5
+
+
+def fill_database(portfolio_database: PortfolioDatabase, row_count: int) -> None:
+    """
+    Функция для заполнения базы данных тестовыми портфелями одним запросом.
+
+    :param portfolio_database: База данных портфелей.
+    :param row_count: Количество портфелей.
+    """
+
+    with portfolio_database.pool.connection() as connection:
+        connection.execute("""
+        WITH RECURSIVE numbers(value) AS (SELECT 0 UNION ALL SELECT value + 1 FROM numbers WHERE value + 1 < ?)
+        INSERT INTO portfolio_info (portfolio_id, portfolio_name, user_id)
+        SELECT printf('%010x', value), 'Портфель ' || (value % ?), value / ? FROM numbers
+        """, (row_count, PORTFOLIOS_PER_USER, PORTFOLIOS_PER_USER))
+        connection.commit()
+        connection.execute("ANALYZE")
+
+
+def trace_method(portfolio_database: PortfolioDatabase, method: tp.Callable[[], tp.Any]) -> tuple[list[str], float]:
+    """
+    Функция для выполнения метода с перехватом выполненных им SQL-запросов.
+
+    :param portfolio_database: База данных портфелей.
+    :param method: Вызываемый метод (без аргументов).
+    :return: Список SQL-запросов (с подставленными параметрами) и время выполнения метода в секундах.
+    """
+
+    statements: list[str] = []
+    with portfolio_database.pool.connection() as connection:
+        connection.set_trace_callback(statements.append)
+        try:
+            start_time = time.perf_counter()
+            method()
+            seconds = time.perf_counter() - start_time
+        finally:
+            connection.set_trace_callback(None)
+    return statements, seconds
+
+
+def get_full_scans(portfolio_database: PortfolioDatabase, statement: str) -> list[str]:
+    """
+    Функция для поиска полных просмотров таблиц в плане запроса.
+
+    :param portfolio_database: База данных портфелей.
+    :param statement: SQL-запрос.
+    :return: Строки плана запроса с полным просмотром таблицы.
+    """
+
+    with portfolio_database.pool.connection() as connection:
+        plan = connection.execute("EXPLAIN QUERY PLAN " + statement).fetchall()
+    return [row[-1] for row in plan if row[-1].startswith("SCAN") and "CONSTANT ROW" not in row[-1]]
+
+
+def main() -> None:
+    """
+    Функция для запуска проверки из командной строки.
+    """
+
+    parser = argparse.ArgumentParser(description="Проверка планов запросов базы данных портфелей")
+    parser.add_argument("--rows", type=int, default=10_000_000, help="количество портфелей в базе данных")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Кэш списков портфелей отключаем, чтобы каждый метод выполнял свои запросы
+        portfolio_database = PortfolioDatabase(os.path.join(temp_dir, "portfolios.db"), cache_size=0)
+
+        start_time = time.perf_counter()
+        fill_database(portfolio_database, args.rows)
+        print(f"заполнение {args.rows:,} портфелей: {time.perf_counter() - start_time:.1f} с")
+
+        # Горячие методы бота (пользователь из середины таблицы)
+        user_id = args.rows // PORTFOLIOS_PER_USER // 2
+        methods: dict[str, tp.Callable[[], tp.Any]] = {
+            "is_portfolio_id_in_database": lambda: portfolio_database.is_portfolio_id_in_database(
+                f"{user_id * PORTFOLIOS_PER_USER:010x}"),
+            "is_user_has_portfolio": lambda: portfolio_database.is_user_has_portfolio(user_id),
+            "is_user_has_portfolio_name": lambda: portfolio_database.is_user_has_portfolio_name("Портфель 1", user_id),
+            "add_new_portfolio (новое имя)": lambda: portfolio_database.add_new_portfolio("Новый портфель", user_id),
+            "add_new_portfolio (повтор имени)": lambda: portfolio_database.add_new_portfolio("Портфель 1", user_id),
+            "delete_portfolio": lambda: portfolio_database.delete_portfolio(f"{user_id * PORTFOLIOS_PER_USER:010x}"),
+        }
+
+        failed = False
+        for method_name, method in methods.items():
+            statements, seconds = trace_method(portfolio_database, method)
+            print(f"{method_name}: {seconds * 1000:.3f} мс")
+            for statement in statements:
+                if statement.split(None, 1)[0].upper() in ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE"):
+                    continue
+                full_scans = get_full_scans(portfolio_database, statement)
+                failed = failed or bool(full_scans)
+                print(f"    {' '.join(statement.split())}")
+                for full_scan in full_scans:
+                    print(f"        ПОЛНЫЙ ПРОСМОТР: {full_scan}")
+
+        portfolio_database.close()
+
+    # Возвращаем ненулевой код, если какой-то запрос просматривает всю таблицу
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
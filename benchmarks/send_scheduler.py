@@ -0,0 +1,162 @@
+"""
+Бенчмарк отправки ответов бота через локальную замену Telegram Bot API с ограничениями частоты сообщений
+(по-умолчанию как у Telegram: 1 сообщение в секунду в чат со всплеском 3 и 30 сообщений в секунду всего).
+
+Сравниваются:
+    - прямая отправка из обработчика (как в main.message_handler) с ожиданием retry_after после ответа 429
+      в потоке обработчика;
+    - планировщик отправки (send_scheduler.SendScheduler): обработчик только ставит ответы в очередь.
+
+Каждый чат присылает несколько сообщений подряд, на каждое бот отвечает несколькими сообщениями.
+Выводятся отправленные сообщения в секунду, ответы 429, задержка приёма сообщений обработчиками
+и задержка доставки ответов (p50 и p99).
+
+Запуск из корня репозитория:
+    python -m benchmarks.send_scheduler --chats 100 --rounds 2 --outputs 3
+"""
+
+# Импорты библиотек
+import argparse
+import concurrent.futures
+import threading
+import time
+
+import telebot
+from telebot import apihelper
+
+# Импорты файлов
+from benchmarks.fake_telegram_api import FakeTelegramApi
+from send_scheduler import COALESCE_SEPARATOR, SendScheduler, get_retry_after
+
+# Токен искусственного бота
+FAKE_TOKEN = "123456:FAKE_TOKEN"
+
+
+class DeliveryTracker:
+    """
+    Класс для учёта времени доставки ответов (ответ - строка "ID чата:номер сообщения:номер ответа").
+    """
+
+    def __init__(self) -> None:
+        self.received_at: dict[tuple[int, int], float] = {}
+        self.delivery_latencies: list[float] = []
+        self.lock = threading.Lock()
+
+    def on_send_message(self, chat_id: int, message_text: str) -> None:
+        """
+        Функция, вызываемая локальной заменой API при каждом отправленном сообщении.
+        (Объединённое сообщение содержит несколько ответов).
+        """
+
+        now = time.perf_counter()
+        with self.lock:
+            for output in message_text.split(COALESCE_SEPARATOR):
+                _, round_index, _ = output.split(":")
+                self.delivery_latencies.append(now - self.received_at[(chat_id, int(round_index))])
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """
+    Функция для получения перцентиля.
+
+    :param values: Значения.
+    :param fraction: Доля (например, 0.99).
+    :return: Значение перцентиля (0, если значений нет).
+    """
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def run_mode(mode: str, args: argparse.Namespace) -> None:
+    """
+    Функция для запуска одного режима отправки и вывода его метрик.
+
+    :param mode: Режим ("direct" - прямая отправка, "scheduler" - планировщик отправки).
+    :param args: Аргументы командной строки.
+    """
+
+    tracker = DeliveryTracker()
+    api = FakeTelegramApi(tracker.on_send_message, chat_rate_limit=(args.chat_rate, args.chat_burst),
+                          global_rate_limit=(args.global_rate, args.global_rate)).start()
+    apihelper.API_URL = api.api_url
+    bot = telebot.TeleBot(FAKE_TOKEN)
+
+    send_scheduler = SendScheduler(bot.send_message, args.chat_rate, args.chat_burst, args.global_rate,
+                                   args.global_rate) if mode == "scheduler" else None
+    intake_latencies: list[float] = []
+
+    def send_directly(chat_id: int, message_text: str) -> None:
+        # Повторяем отправку после ответа 429, блокируя поток обработчика
+        while True:
+            try:
+                bot.send_message(chat_id, message_text)
+                return
+            except Exception as error:
+                retry_after = get_retry_after(error)
+                if retry_after is None:
+                    raise
+                time.sleep(retry_after)
+
+    def message_handler(chat_id: int, round_index: int) -> None:
+        # Задержка приёма: время от получения сообщения до начала его обработки
+        intake_latencies.append(time.perf_counter() - tracker.received_at[(chat_id, round_index)])
+        bot_outputs = [f"{chat_id}:{round_index}:{output_index}" for output_index in range(args.outputs)]
+        if send_scheduler is not None:
+            send_scheduler.submit_many(chat_id, bot_outputs)
+        else:
+            for bot_output in bot_outputs:
+                send_directly(chat_id, bot_output)
+
+    # Обработчики сообщений - пул потоков, как у TeleBot (по-умолчанию 2 потока)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=args.handler_threads)
+    start_time = time.perf_counter()
+    futures = []
+    for round_index in range(args.rounds):
+        for chat_id in range(1, args.chats + 1):
+            tracker.received_at[(chat_id, round_index)] = time.perf_counter()
+            futures.append(executor.submit(message_handler, chat_id, round_index))
+    for future in futures:
+        future.result()
+    if send_scheduler is not None:
+        send_scheduler.close()
+    seconds = time.perf_counter() - start_time
+    executor.shutdown()
+
+    print(f"{mode:>9}: {api.sent_message_count} сообщений ({len(tracker.delivery_latencies)} ответов) "
+          f"за {seconds:.1f} с, {api.sent_message_count / seconds:.1f} сообщ./с, "
+          f"ответов 429: {api.rejected_message_count}, "
+          f"задержка приёма p99 {percentile(intake_latencies, 0.99) * 1000:.1f} мс, "
+          f"задержка доставки p50 {percentile(tracker.delivery_latencies, 0.5):.2f} с, "
+          f"p99 {percentile(tracker.delivery_latencies, 0.99):.2f} с")
+    if send_scheduler is not None:
+        metrics = send_scheduler.get_metrics()
+        print(f"           планировщик: отправлено {metrics['delivered']}, объединено ответов "
+              f"{metrics['delivered_outputs']}, повторов {metrics['retries']}, ошибок {metrics['failed']}, "
+              f"задержка в очереди p99 {metrics['p99_queue_latency']:.2f} с")
+    api.stop()
+
+
+def main() -> None:
+    """
+    Функция для запуска бенчмарка из командной строки.
+    """
+
+    parser = argparse.ArgumentParser(description="Бенчмарк планировщика отправки сообщений")
+    parser.add_argument("--chats", type=int, default=100, help="количество чатов")
+    parser.add_argument("--rounds", type=int, default=2, help="количество сообщений от каждого чата подряд")
+    parser.add_argument("--outputs", type=int, default=3, help="количество ответов бота на сообщение")
+    parser.add_argument("--chat-rate", type=float, default=1.0, help="допустимая частота сообщений в чат")
+    parser.add_argument("--chat-burst", type=float, default=3.0, help="допустимый всплеск сообщений в чат")
+    parser.add_argument("--global-rate", type=float, default=30.0, help="допустимая частота всех сообщений")
+    parser.add_argument("--handler-threads", type=int, default=2, help="количество потоков обработчиков")
+    parser.add_argument("--mode", choices=["direct", "scheduler", "both"], default="both", help="режим отправки")
+    args = parser.parse_args()
+
+    for mode in ("direct", "scheduler"):
+        if args.mode in (mode, "both"):
+            run_mode(mode, args)
+
+
+if __name__ == "__main__":
+    main()
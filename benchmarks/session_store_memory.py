@@ -0,0 +1,106 @@
+"""
+Тест потребления памяти хранилищем сессий на большом количестве чатов.
+
+Каждый искусственный чат отправляет команду /create_new_portfolio (после неё сессия находится не в начальном
+состоянии и должна сохраняться при вытеснении), после чего часть чатов пишет повторно.
+Сравниваются обычный словарь (как chat_dict в исходной версии main.py) и SessionStore с ограничением размера.
+
+Запуск из корня репозитория:
+    python -m benchmarks.session_store_memory --chats 1000000
+"""
+
+# Импорты библиотек
+import argparse
+import itertools
+import os
+import tempfile
+import time
+import tracemalloc
+import typing as tp
+
+# Импорты файлов
+from bot_chat_session import BotChatSession, State
+from session_store import SessionStore, DiskSessionStore
+
+
+def run_plain_dict(chat_count: int, returning_chats: int) -> dict[str, tp.Any]:
+    """
+    Функция для проверки обычного словаря сессий.
+
+    :param chat_count: Количество чатов.
+    :param returning_chats: Количество чатов, которые пишут повторно.
+    :return: Словарь с результатами.
+    """
+
+    chat_dict: dict[int, BotChatSession] = {}
+
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    for chat_id in itertools.chain(range(chat_count), range(returning_chats)):
+        if chat_id not in chat_dict:
+            chat_dict[chat_id] = BotChatSession(chat_id, None)
+        chat_dict[chat_id].processing("/create_new_portfolio")
+    seconds = time.perf_counter() - start_time
+    current_memory, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"store": "dict", "seconds": seconds, "current_mb": current_memory / 2 ** 20,
+            "peak_mb": peak_memory / 2 ** 20, "sessions": len(chat_dict)}
+
+
+def run_session_store(chat_count: int, returning_chats: int, max_sessions: int) -> dict[str, tp.Any]:
+    """
+    Функция для проверки хранилища сессий с вытеснением на диск.
+
+    :param chat_count: Количество чатов.
+    :param returning_chats: Количество чатов, которые пишут повторно.
+    :param max_sessions: Максимальное количество сессий в памяти.
+    :return: Словарь с результатами.
+    """
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        session_store = SessionStore(lambda chat_id: BotChatSession(chat_id, None), max_sessions=max_sessions,
+                                     ttl=None, disk_store=DiskSessionStore(os.path.join(temp_dir, "sessions.db")))
+
+        tracemalloc.start()
+        start_time = time.perf_counter()
+        for chat_id in itertools.chain(range(chat_count), range(returning_chats)):
+            session = session_store.get_session(chat_id)
+
+            # Повторно пишущие чаты должны восстановиться в состоянии создания портфеля
+            if chat_id < returning_chats and session.state != State.MAIN_MENU:
+                session.processing("/main_menu")
+            else:
+                session.processing("/create_new_portfolio")
+        seconds = time.perf_counter() - start_time
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        metrics = session_store.get_metrics()
+        disk_sessions = len(session_store.disk_store)
+        session_store.close()
+        disk_mb = os.path.getsize(os.path.join(temp_dir, "sessions.db")) / 2 ** 20
+
+    return {"store": f"SessionStore({max_sessions})", "seconds": seconds, "current_mb": current_memory / 2 ** 20,
+            "peak_mb": peak_memory / 2 ** 20, "disk_sessions": disk_sessions, "disk_mb": disk_mb, **metrics}
+
+
+def main() -> None:
+    """
+    Функция для запуска теста из командной строки.
+    """
+
+    parser = argparse.ArgumentParser(description="Потребление памяти хранилищем сессий")
+    parser.add_argument("--chats", type=int, default=1_000_000, help="количество искусственных чатов")
+    parser.add_argument("--returning", type=int, default=100_000, help="количество чатов, которые пишут повторно")
+    parser.add_argument("--max-sessions", type=int, default=10_000, help="ограничение хранилища в памяти")
+    args = parser.parse_args()
+
+    for results in (run_plain_dict(args.chats, args.returning),
+                    run_session_store(args.chats, args.returning, args.max_sessions)):
+        print(", ".join(f"{key} = {value:.2f}" if isinstance(value, float) else f"{key} = {value}"
+                        for key, value in results.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Время запуска процесса-обработчика (webhook_worker.py): от начала выполнения кода до первого ответа боту.
+
+Каждый прогон запускает новый процесс Python, который импортирует webhook_worker и обрабатывает через worker_main
+сценарий создания портфеля (/start, /create_new_portfolio, имя портфеля), а ответы отправляются в локальную
+имитацию Telegram Bot API. Время отсчитывается по time.monotonic (общие часы для всех процессов) и делится на:
+    - запуск интерпретатора - от запуска процесса до первой строки кода;
+    - импорт - импорт webhook_worker со всеми зависимостями;
+    - первый ответ - от первой строки кода до получения ответа на /start имитацией API (цель - меньше 100 мс);
+    - первое обращение к базе данных - до ответа на имя портфеля (ответы на сообщения не ждут открытия базы
+      данных: её открывает и проверяет фоновая загрузка агрегатов рейтинга).
+Варианты: новая база данных (схема создаётся при первом обращении), заполненная база данных (схема только
+проверяется) и заполненная база данных с предварительным импортом telebot (для сравнения с путём отправки
+через telebot). Для каждого варианта выводятся медианы по прогонам.
+
+Запуск из корня репозитория:
+    python -m benchmarks.startup --runs 10 --portfolios 100000
+"""
+
+# Импорты библиотек
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Импорты файлов
+from benchmarks.fake_telegram_api import FakeTelegramApi
+from benchmarks.query_plans import fill_database
+from portfolio_database import PortfolioDatabase
+
+# Цель для времени от первой строки кода до первого ответа (в секундах)
+TARGET_SECONDS = 0.1
+
+# Код процесса-обработчика: {preload} - дополнительные импорты до импорта webhook_worker
+WORKER_CODE = """
+import time
+start_time = time.monotonic()
+
+import json
+import queue
+import sys
+import threading
+{preload}
+from webhook_worker import WorkerConfig, worker_main
+
+import_time = time.monotonic()
+
+
+class Counter:
+    # Замена multiprocessing.Value: процесс обрабатывает сообщения сам, без маршрутизатора
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def get_lock(self):
+        return self.lock
+
+
+update_queue = queue.Queue()
+for message_text in ("/start", "/create_new_portfolio", "Портфель"):
+    update_queue.put((int(sys.argv[1]), message_text))
+update_queue.put(None)
+config = WorkerConfig(sys.argv[2], sys.argv[3], token="123:TEST", api_url=sys.argv[4])
+worker_main(0, 1, update_queue, config, Counter(), threading.Event())
+print(json.dumps({{"start_time": start_time, "import_time": import_time}}))
+"""
+
+
+def run_worker(api: FakeTelegramApi, reply_times: dict[int, list[float]], chat_id: int, db_path: str,
+               sessions_path: str, preload: str) -> dict[str, float]:
+    """
+    Функция для одного запуска процесса-обработчика.
+
+    :param api: Имитация Telegram Bot API.
+    :param reply_times: Время получения ответов по ID чата (заполняется имитацией API).
+    :param chat_id: ID чата сценария.
+    :param db_path: Путь к базе данных портфелей.
+    :param sessions_path: Путь к базе данных сессий.
+    :param preload: Дополнительные импорты до импорта webhook_worker.
+    :return: Словарь с длительностями этапов в секундах.
+    """
+
+    launch_time = time.monotonic()
+    result = subprocess.run([sys.executable, "-c", WORKER_CODE.format(preload=preload), str(chat_id), db_path,
+                             sessions_path, api.api_url], capture_output=True, text=True, check=True)
+    times = json.loads(result.stdout.strip().splitlines()[-1])
+
+    return {
+        "interpreter": times["start_time"] - launch_time,
+        "import": times["import_time"] - times["start_time"],
+        "first_reply": reply_times[chat_id][0] - times["start_time"],
+        "first_query": reply_times[chat_id][-1] - times["start_time"],
+    }
+
+
+def main() -> None:
+    """
+    Функция для запуска бенчмарка из командной строки.
+    """
+
+    parser = argparse.ArgumentParser(description="Время запуска процесса-обработчика до первого ответа")
+    parser.add_argument("--runs", type=int, default=10, help="количество запусков каждого варианта")
+    parser.add_argument("--portfolios", type=int, default=100_000, help="количество портфелей в заполненной базе")
+    args = parser.parse_args()
+
+    # Имитация API запоминает время ответов в каждый чат
+    reply_times: dict[int, list[float]] = {}
+    lock = threading.Lock()
+
+    def on_send_message(chat_id: int, message_text: str) -> None:
+        with lock:
+            reply_times.setdefault(chat_id, []).append(time.monotonic())
+
+    api = FakeTelegramApi(on_send_message).start()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filled_path = os.path.join(temp_dir, "filled.db")
+        portfolio_database = PortfolioDatabase(filled_path)
+        fill_database(portfolio_database, args.portfolios)
+        portfolio_database.close()
+
+        variants = [
+            ("новая база данных", None, ""),
+            (f"база данных из {args.portfolios:,} портфелей", filled_path, ""),
+            (f"база данных из {args.portfolios:,} портфелей, импорт telebot", filled_path, "import telebot"),
+        ]
+        chat_id = 1
+        for name, source_path, preload in variants:
+            runs = []
+            for _ in range(args.runs):
+                db_path = os.path.join(temp_dir, f"run_{chat_id}.db")
+                if source_path is not None:
+                    shutil.copyfile(source_path, db_path)
+                runs.append(run_worker(api, reply_times, chat_id, db_path,
+                                       os.path.join(temp_dir, f"sessions_{chat_id}.db"), preload))
+                if os.path.exists(db_path):
+                    os.remove(db_path)
+                chat_id += 1
+
+            medians = {stage: statistics.median(run[stage] for run in runs) * 1e3 for stage in runs[0]}
+            print(f"{name}: запуск интерпретатора {medians['interpreter']:.1f} мс, импорт {medians['import']:.1f} мс, "
+                  f"первый ответ {medians['first_reply']:.1f} мс "
+                  f"({'в пределах' if medians['first_reply'] < TARGET_SECONDS * 1e3 else 'больше'} цели "
+                  f"{TARGET_SECONDS * 1e3:.0f} мс), первое обращение к базе данных {medians['first_query']:.1f} мс")
+    api.stop()
+
+
+if __name__ == "__main__":
+    main()
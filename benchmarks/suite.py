@@ -0,0 +1,378 @@
+"""
+Воспроизводимый набор бенчмарков ядра бота (BotChatSession и PortfolioDatabase).
+
+Сообщения проходят путь обработчика main.py (SessionStore -> BotChatSession.processing -> отправка ответов),
+но вместо Telegram используется заглушка, которая только запоминает ответы, поэтому измеряется только ядро бота.
+Сценарии:
+    onboarding        - новые пользователи: /start, создание первого портфеля;
+    creation_storm    - много потоков одновременно создают портфели;
+    duplicate_retries - пользователи повторяют занятое имя портфеля, пока не введут свободное;
+    menu_navigation   - пользователи с портфелями перемещаются по меню без изменения базы данных;
+    db_scaling_<N>    - методы PortfolioDatabase на базе данных из N портфелей (от 1 тыс. до 10 млн).
+
+Нагрузка детерминирована (фиксированные ID, имена и порядок сообщений). Для каждого сценария берётся лучший
+из нескольких прогонов. Результаты выводятся в JSON и могут сравниваться с сохранённым эталоном: если пропускная
+способность сценария ниже эталонной больше, чем на допуск, или сценарий завершился с ошибкой, то набор
+завершается с кодом 1.
+Эталон зависит от машины, поэтому после смены машины его нужно сохранить заново (--save-baseline).
+
+Запуск из корня репозитория:
+    python -m benchmarks.suite --baseline benchmarks/baseline.json
+    python -m benchmarks.suite --size full --output results.json
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+"""
+
+# Импорты библиотек
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import typing as tp
+
+# Импорты файлов
+from benchmarks.query_plans import PORTFOLIOS_PER_USER, fill_database
+from bot_chat_session import BotChatSession
+from portfolio_database import PortfolioDatabase
+from session_store import SessionStore
+
+# Размеры нагрузки: количество пользователей сценариев с сообщениями и размеры баз данных для db_scaling
+SIZES: dict[str, dict[str, tp.Any]] = {
+    "quick": {"users": 2000, "storm_threads": 8, "db_rows": [1_000, 10_000, 100_000], "db_lookups": 5000},
+    "full": {"users": 10000, "storm_threads": 16, "db_rows": [1_000, 10_000, 100_000, 1_000_000, 10_000_000],
+             "db_lookups": 20000},
+}
+
+# Допустимое снижение пропускной способности относительно эталона (доля)
+DEFAULT_TOLERANCE = 0.2
+
+
+class FakeBot:
+    """
+    Класс заглушки Telegram-бота: запоминает количество отправленных ответов вместо их отправки.
+    """
+
+    def __init__(self) -> None:
+        self.sent_message_count = 0
+        self.lock = threading.Lock()
+
+    def send_message(self, chat_id: int, message_text: str) -> None:
+        with self.lock:
+            self.sent_message_count += 1
+
+
+class BotHarness:
+    """
+    Класс ядра бота для бенчмарков: база данных во временной папке, хранилище сессий и заглушка Telegram.
+    """
+
+    def __init__(self, temp_dir: str, **database_options: tp.Any) -> None:
+        """
+        Функция для создания ядра бота.
+
+        :param temp_dir: Временная папка для базы данных.
+        :param database_options: Дополнительные параметры PortfolioDatabase.
+        """
+
+        self.portfolio_database = PortfolioDatabase(os.path.join(temp_dir, "portfolios.db"), **database_options)
+        self.session_store = SessionStore(lambda chat_id: BotChatSession(chat_id, self.portfolio_database),
+                                          max_sessions=1_000_000, ttl=None)
+        self.bot = FakeBot()
+
+    def handle(self, chat_id: int, user_message_text: str) -> None:
+        """
+        Функция для обработки сообщения пользователя (повторяет main.message_handler).
+
+        :param chat_id: ID чата.
+        :param user_message_text: Текст сообщения.
+        """
+
+        for bot_output in self.session_store.get_session(chat_id).processing(user_message_text):
+            self.bot.send_message(chat_id, bot_output)
+
+    def close(self) -> None:
+        self.session_store.close()
+        self.portfolio_database.close()
+
+
+def summarize(latencies: list[float], seconds: float, operations: str = "messages") -> dict[str, float]:
+    """
+    Функция для подсчёта итоговых метрик сценария.
+
+    :param latencies: Задержки отдельных операций в секундах.
+    :param seconds: Общее время сценария в секундах.
+    :param operations: Название операций (для имени метрики пропускной способности).
+    :return: Словарь с количеством операций, пропускной способностью и задержками (p50, p99) в микросекундах.
+    """
+
+    latencies = sorted(latencies)
+    return {
+        operations: len(latencies),
+        "throughput": len(latencies) / seconds if seconds else 0.0,
+        "p50_us": latencies[len(latencies) // 2] * 1e6 if latencies else 0.0,
+        "p99_us": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e6 if latencies else 0.0,
+    }
+
+
+def replay(harness: BotHarness, messages: tp.Iterable[tuple[int, str]]) -> tuple[list[float], float]:
+    """
+    Функция для обработки последовательности сообщений с измерением задержки каждого.
+
+    :param harness: Ядро бота.
+    :param messages: Сообщения (ID чата, текст).
+    :return: Задержки сообщений в секундах и общее время в секундах.
+    """
+
+    latencies: list[float] = []
+    start_time = time.perf_counter()
+    for chat_id, user_message_text in messages:
+        message_start_time = time.perf_counter()
+        harness.handle(chat_id, user_message_text)
+        latencies.append(time.perf_counter() - message_start_time)
+    return latencies, time.perf_counter() - start_time
+
+
+#* Сценарии
+
+def onboarding(temp_dir: str, size: dict[str, tp.Any]) -> dict[str, float]:
+    """
+    Сценарий: новые пользователи запускают бота и создают первый портфель.
+    """
+
+    harness = BotHarness(temp_dir)
+    messages = [(chat_id, user_message_text) for chat_id in range(size["users"])
+                for user_message_text in ("/start", "/main_menu", "/create_new_portfolio", f"Портфель {chat_id}")]
+    latencies, seconds = replay(harness, messages)
+    harness.close()
+    return summarize(latencies, seconds)
+
+
+def creation_storm(temp_dir: str, size: dict[str, tp.Any]) -> dict[str, float]:
+    """
+    Сценарий: потоки (как рабочие потоки telebot) одновременно создают по несколько портфелей для своих чатов.
+    """
+
+    harness = BotHarness(temp_dir)
+    thread_count = size["storm_threads"]
+    users_per_thread = size["users"] // thread_count
+    thread_latencies: list[list[float]] = [[] for _ in range(thread_count)]
+    errors: list[BaseException] = []
+
+    def worker(index: int) -> None:
+        chat_ids = range(index * users_per_thread, (index + 1) * users_per_thread)
+        messages = [(chat_id, user_message_text) for number in range(3) for chat_id in chat_ids
+                    for user_message_text in ("/create_new_portfolio", f"Портфель {number}")]
+        try:
+            thread_latencies[index] = replay(harness, messages)[0]
+        except BaseException as error:
+            # Исключение потока threading только выводит, поэтому передаём его в основной поток
+            errors.append(error)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(thread_count)]
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start_time
+    harness.close()
+    if errors:
+        raise errors[0]
+    return summarize([latency for latencies in thread_latencies for latency in latencies], seconds)
+
+
+def duplicate_retries(temp_dir: str, size: dict[str, tp.Any]) -> dict[str, float]:
+    """
+    Сценарий: пользователи с портфелем несколько раз вводят его имя повторно, а затем вводят свободное имя.
+    """
+
+    harness = BotHarness(temp_dir)
+    user_count = size["users"]
+    replay(harness, [(chat_id, user_message_text) for chat_id in range(user_count)
+                     for user_message_text in ("/create_new_portfolio", "Портфель")])
+
+    messages = [(chat_id, "/create_new_portfolio") for chat_id in range(user_count)]
+    messages += [(chat_id, "Портфель") for _ in range(3) for chat_id in range(user_count)]
+    messages += [(chat_id, "Второй портфель") for chat_id in range(user_count)]
+    latencies, seconds = replay(harness, messages)
+    harness.close()
+    return summarize(latencies, seconds)
+
+
+def menu_navigation(temp_dir: str, size: dict[str, tp.Any]) -> dict[str, float]:
+    """
+    Сценарий: пользователи перемещаются по меню (без создания портфелей).
+    """
+
+    harness = BotHarness(temp_dir)
+    messages = [(chat_id, user_message_text) for _ in range(2) for chat_id in range(size["users"])
+                for user_message_text in ("/start", "/main_menu", "привет", "/create_new_portfolio", "/main_menu",
+                                          "/delete_portfolio")]
+    latencies, seconds = replay(harness, messages)
+    harness.close()
+    return summarize(latencies, seconds)
+
+
+def db_scaling(temp_dir: str, size: dict[str, tp.Any], row_count: int) -> dict[str, float]:
+    """
+    Сценарий: горячие методы PortfolioDatabase (без кэша) на базе данных из заданного количества портфелей.
+    """
+
+    # Кэш списков портфелей отключаем, чтобы каждый вызов обращался к базе данных
+    portfolio_database = PortfolioDatabase(os.path.join(temp_dir, "portfolios.db"), cache_size=0)
+    fill_database(portfolio_database, row_count)
+    user_count = row_count // PORTFOLIOS_PER_USER
+
+    # Пользователи выбираются с постоянным шагом, чтобы обращения были разбросаны по всей таблице
+    lookups = size["db_lookups"]
+    step = max(1, user_count // lookups) | 1
+    user_ids = [(index * step) % user_count for index in range(lookups)]
+
+    latencies: list[float] = []
+    start_time = time.perf_counter()
+    for index, user_id in enumerate(user_ids):
+        operation_start_time = time.perf_counter()
+        portfolio_database.get_user_portfolios(user_id)
+        portfolio_database.is_portfolio_id_in_database(f"{user_id * PORTFOLIOS_PER_USER:010x}")
+        portfolio_database.add_new_portfolio(f"Портфель {index % 2 + PORTFOLIOS_PER_USER - 1}", user_id)
+        latencies.append(time.perf_counter() - operation_start_time)
+    seconds = time.perf_counter() - start_time
+    portfolio_database.close()
+    return summarize(latencies, seconds, "operations")
+
+
+def get_scenarios(size: dict[str, tp.Any]) -> dict[str, tp.Callable[[str], dict[str, float]]]:
+    """
+    Функция для получения сценариев набора.
+
+    :param size: Размеры нагрузки.
+    :return: Словарь {имя сценария: функция сценария (получает временную папку)}.
+    """
+
+    scenarios: dict[str, tp.Callable[[str], dict[str, float]]] = {
+        "onboarding": lambda temp_dir: onboarding(temp_dir, size),
+        "creation_storm": lambda temp_dir: creation_storm(temp_dir, size),
+        "duplicate_retries": lambda temp_dir: duplicate_retries(temp_dir, size),
+        "menu_navigation": lambda temp_dir: menu_navigation(temp_dir, size),
+    }
+    for row_count in size["db_rows"]:
+        scenarios[f"db_scaling_{row_count}"] = lambda temp_dir, row_count=row_count: db_scaling(temp_dir, size,
+                                                                                                row_count)
+    return scenarios
+
+
+def run_suite(size_name: str, repeats: int, selected: tp.Optional[list[str]] = None) -> dict[str, tp.Any]:
+    """
+    Функция для запуска набора бенчмарков.
+
+    :param size_name: Размер нагрузки (quick или full).
+    :param repeats: Количество прогонов каждого сценария (берётся прогон с наибольшей пропускной способностью).
+    :param selected: Имена запускаемых сценариев (None - все сценарии).
+    :return: Результаты в формате JSON-объекта (упавшие сценарии с ошибками перечислены в failed).
+    """
+
+    results: dict[str, dict[str, float]] = {}
+    failed: dict[str, str] = {}
+    for name, scenario in get_scenarios(SIZES[size_name]).items():
+        if selected is not None and name not in selected:
+            continue
+
+        best_result: tp.Optional[dict[str, float]] = None
+        try:
+            for _ in range(repeats):
+                # Каждый прогон работает с новой базой данных, поэтому прогоны не влияют друг на друга
+                with tempfile.TemporaryDirectory() as temp_dir:
+                    result = scenario(temp_dir)
+                if best_result is None or result["throughput"] > best_result["throughput"]:
+                    best_result = result
+        except Exception as error:
+            # Упавший сценарий не даёт результата, но остальные сценарии продолжают выполняться
+            failed[name] = f"{type(error).__name__}: {error}"
+            print(f"{name}: ОШИБКА {failed[name]}", file=sys.stderr)
+            continue
+        results[name] = {key: round(value, 2) for key, value in best_result.items()}
+        print(f"{name}: {results[name]['throughput']:,.0f} в секунду, p50 = {results[name]['p50_us']:.1f} мкс, "
+              f"p99 = {results[name]['p99_us']:.1f} мкс", file=sys.stderr)
+
+    return {
+        "size": size_name,
+        "environment": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                        "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "results": results,
+        "failed": failed,
+    }
+
+
+def compare(results: dict[str, tp.Any], baseline: dict[str, tp.Any], tolerance: float) -> list[str]:
+    """
+    Функция для сравнения результатов с эталоном.
+
+    :param results: Результаты набора.
+    :param baseline: Эталонные результаты.
+    :param tolerance: Допустимое снижение пропускной способности (доля).
+    :return: Список строк с описанием регрессий (пустой - регрессий нет).
+    """
+
+    if results["size"] != baseline["size"]:
+        raise ValueError(f"Размер нагрузки эталона ({baseline['size']}) не совпадает с текущим ({results['size']})")
+
+    regressions: list[str] = []
+    for name, result in results["results"].items():
+        baseline_result = baseline["results"].get(name)
+        if baseline_result is None:
+            continue
+        change = result["throughput"] / baseline_result["throughput"] - 1
+        print(f"{name}: {change * 100:+.1f}% к эталону", file=sys.stderr)
+        if change < -tolerance:
+            regressions.append(f"{name}: {result['throughput']:,.0f} в секунду, эталон - "
+                               f"{baseline_result['throughput']:,.0f} ({change * 100:+.1f}%)")
+    return regressions
+
+
+def main() -> None:
+    """
+    Функция для запуска набора бенчмарков из командной строки.
+    """
+
+    parser = argparse.ArgumentParser(description="Набор бенчмарков ядра бота")
+    parser.add_argument("--size", choices=list(SIZES), default="quick", help="размер нагрузки")
+    parser.add_argument("--repeats", type=int, default=3, help="количество прогонов каждого сценария")
+    parser.add_argument("--scenario", nargs="+", default=None, help="запускаемые сценарии (по-умолчанию - все)")
+    parser.add_argument("--output", default=None, help="файл для результатов в JSON (по-умолчанию - stdout)")
+    parser.add_argument("--baseline", default=None, help="файл эталона для сравнения")
+    parser.add_argument("--save-baseline", default=None, help="сохранить результаты как эталон в заданный файл")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="допустимое снижение пропускной способности относительно эталона (доля)")
+    args = parser.parse_args()
+
+    results = run_suite(args.size, args.repeats, args.scenario)
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+    if args.save_baseline is not None:
+        with open(args.save_baseline, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+
+    # Возвращаем ненулевой код, если есть упавшие сценарии или регрессии
+    regressions: list[str] = []
+    if args.baseline is not None:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"РЕГРЕССИЯ: {regression}", file=sys.stderr)
+    for name, error in results["failed"].items():
+        print(f"ОШИБКА: {name}: {error}", file=sys.stderr)
+    raise SystemExit(1 if regressions or results["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Нагрузочный тест режима webhook (webhook_main.py): пропускная способность обработки сообщений в зависимости
+от количества процессов-обработчиков.
+
+Искусственные чаты проходят сценарий создания портфеля, а затем отправляют ещё несколько команд. Обновления
+передаются маршрутизатору напрямую (или, с флагом --http, POST-запросами на webhook-сервер), ответы не
+отправляются. Для каждого количества процессов выводятся сообщения в секунду и ускорение относительно одного
+процесса (ускорение ограничено количеством ядер процессора).
+
+Запуск из корня репозитория:
+    python -m benchmarks.webhook_sharding --workers 1,2,4 --chats 2000
+"""
+
+# Импорты библиотек
+import argparse
+import concurrent.futures
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Импорты файлов
+from webhook_main import WebhookRouter, WebhookServer, WorkerConfig
+
+# Сценарий одного чата
+SCENARIO = ["/start", "/create_new_portfolio", "Портфель {chat_id}"]
+
+
+def make_update(update_id: int, chat_id: int, message_text: str) -> dict:
+    """
+    Функция для создания обновления с текстовым сообщением в формате Telegram Bot API.
+
+    :param update_id: ID обновления.
+    :param chat_id: ID чата.
+    :param message_text: Текст сообщения.
+    :return: Обновление.
+    """
+
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"user_{chat_id}"},
+            "chat": {"id": chat_id, "type": "private"},
+            "date": int(time.time()),
+            "text": message_text,
+        },
+    }
+
+
+def post_updates(port: int, path: str, updates: list[dict], thread_count: int) -> None:
+    """
+    Функция для отправки обновлений POST-запросами на webhook-сервер из нескольких потоков.
+    (Обновления одного чата отправляет один поток, чтобы не нарушить их порядок).
+
+    :param port: Порт сервера.
+    :param path: Путь webhook.
+    :param updates: Обновления.
+    :param thread_count: Количество потоков (подключений).
+    """
+
+    def sender(thread_index: int) -> None:
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        for update in updates:
+            if update["message"]["chat"]["id"] % thread_count == thread_index:
+                connection.request("POST", path, json.dumps(update), {"Content-Type": "application/json"})
+                connection.getresponse().read()
+        connection.close()
+
+    with concurrent.futures.ThreadPoolExecutor(thread_count) as executor:
+        list(executor.map(sender, range(thread_count)))
+
+
+def run(worker_count: int, updates: list[dict], use_http: bool, max_seconds: float) -> float:
+    """
+    Функция для обработки обновлений заданным количеством процессов.
+
+    :param worker_count: Количество процессов-обработчиков.
+    :param updates: Обновления.
+    :param use_http: Отправлять ли обновления через webhook-сервер.
+    :param max_seconds: Максимальная длительность в секундах.
+    :return: Количество обработанных сообщений в секунду.
+    """
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        router = WebhookRouter(worker_count, WorkerConfig(os.path.join(temp_dir, "portfolios.db"),
+                                                          os.path.join(temp_dir, "sessions.db")))
+        router.wait_ready()
+
+        server = None
+        if use_http:
+            server = WebhookServer(("127.0.0.1", 0), router, "/webhook")
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        start_time = time.perf_counter()
+        if server is not None:
+            post_updates(server.server_address[1], "/webhook", updates, 16)
+        else:
+            for update in updates:
+                router.route_update(update)
+
+        # Ждём обработки всех сообщений
+        deadline = time.monotonic() + max_seconds
+        while router.get_processed_count() < len(updates) and time.monotonic() < deadline:
+            time.sleep(0.005)
+        seconds = time.perf_counter() - start_time
+        processed_count = router.get_processed_count()
+
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        router.close()
+    return processed_count / seconds
+
+
+def main() -> None:
+    """
+    Функция для запуска нагрузочного теста из командной строки.
+    """
+
+    parser = argparse.ArgumentParser(description="Нагрузочный тест режима webhook с несколькими процессами")
+    parser.add_argument("--workers", default="1,2,4", help="количества процессов-обработчиков через запятую")
+    parser.add_argument("--chats", type=int, default=2000, help="количество чатов")
+    parser.add_argument("--extra-messages", type=int, default=7,
+                        help="количество команд /start от каждого чата после сценария создания портфеля")
+    parser.add_argument("--http", action="store_true", help="отправлять обновления через webhook-сервер")
+    parser.add_argument("--max-seconds", type=float, default=120.0, help="максимальная длительность одного запуска")
+    args = parser.parse_args()
+
+    # Сообщения чатов чередуются, как при одновременной работе пользователей
+    messages = SCENARIO + ["/start"] * args.extra_messages
+    updates = [make_update(step * args.chats + index + 1, 1_000_000 + index, message.format(chat_id=index))
+               for step, message in enumerate(messages) for index in range(args.chats)]
+
+    print(f"ядер процессора: {os.cpu_count()}, сообщений: {len(updates):,}")
+    base_throughput = None
+    for worker_count in map(int, args.workers.split(",")):
+        throughput = run(worker_count, updates, args.http, args.max_seconds)
+        base_throughput = base_throughput or throughput
+        print(f"процессов: {worker_count}, {throughput:,.0f} сообщ./с, "
+              f"ускорение {throughput / base_throughput:.2f}")
+
+
+if __name__ == "__main__":
+    main()
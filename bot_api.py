@@ -0,0 +1,125 @@
+# Импорты библиотек
+import http.client
+import json
+import threading
+import typing as tp
+import urllib.parse
+
+# Шаблон адреса Telegram Bot API в формате telebot (apihelper.API_URL): {0} - токен, {1} - имя метода
+API_URL = "https://api.telegram.org/bot{0}/{1}"
+
+
+class BotApiError(Exception):
+    """
+    Ошибка Telegram Bot API (ответ с "ok": false).
+    (Атрибуты совпадают с telebot.apihelper.ApiTelegramException, поэтому ответ 429 обрабатывается одинаково).
+    """
+
+    def __init__(self, method_name: str, result_json: dict) -> None:
+        """
+        Функция для инициализации ошибки.
+
+        :param method_name: Имя метода API.
+        :param result_json: Ответ API.
+        """
+
+        self.function_name = method_name
+        self.result_json = result_json
+        self.error_code = result_json.get("error_code")
+        self.description = result_json.get("description")
+        super().__init__(f"A request to the Telegram API was unsuccessful. Error code: {self.error_code}. "
+                         f"Description: {self.description}")
+
+
+class BotApiClient:
+    """
+    Класс лёгкого клиента Telegram Bot API для отправки ответов (только стандартная библиотека).
+    (Процессам-обработчикам нужен только метод sendMessage, а импорт telebot вместе с requests занимает большую часть
+    времени запуска процесса. Каждый поток отправляет запросы через своё постоянное подключение).
+    """
+
+    # Ошибки, после которых запрос повторяется через новое подключение (сервер закрыл простаивавшее подключение)
+    RECONNECT_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+
+    def __init__(self, token: str, api_url: tp.Optional[str] = None, timeout: float = 30.0) -> None:
+        """
+        Функция для инициализации клиента.
+
+        :param token: Токен бота.
+        :param api_url: Шаблон адреса API в формате telebot (None - настоящий API).
+        :param timeout: Время ожидания ответа в секундах.
+        """
+
+        # Разбираем адрес API: схема и сервер для подключения, путь - общая часть адресов методов
+        url = urllib.parse.urlsplit((api_url or API_URL).format(token, ""))
+        self.connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self.host = url.netloc
+        self.path = url.path
+        self.timeout = timeout
+
+        # Подключение текущего потока и все созданные подключения (для их закрытия)
+        self.local = threading.local()
+        self.connections: list[http.client.HTTPConnection] = []
+        self.lock = threading.Lock()
+
+    def call(self, method_name: str, params: dict[str, tp.Any]) -> tp.Any:
+        """
+        Функция для вызова метода API.
+
+        :param method_name: Имя метода.
+        :param params: Параметры метода.
+        :return: Результат метода.
+        """
+
+        body = json.dumps(params, ensure_ascii=False).encode()
+        headers = {"Content-Type": "application/json"}
+
+        connection: tp.Optional[http.client.HTTPConnection] = getattr(self.local, "connection", None)
+        reused = connection is not None
+        while True:
+            if connection is None:
+                connection = self.local.connection = self.connection_class(self.host, timeout=self.timeout)
+                with self.lock:
+                    self.connections.append(connection)
+            try:
+                connection.request("POST", self.path + method_name, body, headers)
+                data = connection.getresponse().read()
+                break
+
+            # Повторяем запрос только через новое подключение: если сервер закрыл уже использованное подключение,
+            # то запрос до него не дошёл
+            except self.RECONNECT_ERRORS:
+                connection.close()
+                with self.lock:
+                    if connection in self.connections:
+                        self.connections.remove(connection)
+                connection = self.local.connection = None
+                if not reused:
+                    raise
+                reused = False
+
+        result = json.loads(data)
+        if not result.get("ok"):
+            raise BotApiError(method_name, result)
+        return result["result"]
+
+    def send_message(self, chat_id: int, text: str) -> dict:
+        """
+        Функция для отправки текстового сообщения (сигнатура совпадает с TeleBot.send_message).
+
+        :param chat_id: ID чата.
+        :param text: Текст сообщения.
+        :return: Отправленное сообщение в формате Telegram Bot API.
+        """
+
+        return self.call("sendMessage", {"chat_id": chat_id, "text": text})
+
+    def close(self) -> None:
+        """
+        Функция для закрытия всех подключений.
+        """
+
+        with self.lock:
+            for connection in self.connections:
+                connection.close()
+            self.connections.clear()
@@ -1,4 +1,7 @@
 # Импорты библиотек
+import enum
+import logging
+import time
 import typing as tp
 
 # Импорты файлов
@@ -6,8 +9,53 @@ import text
 
 # Импорты файлов для задания типов
 if tp.TYPE_CHECKING:
+    from metrics import BotMetrics
     from portfolio_database import PortfolioDatabase
 
+# Журнал telebot (ошибки обработки сообщений пакета пишутся туда же, куда ошибки отдельных сообщений)
+logger = logging.getLogger("TeleBot")
+
+
+class State(enum.IntEnum):
+    """
+    Состояния сессии бота (конечного автомата).
+    """
+
+    # Цикл главного меню
+    MAIN_MENU = 0
+
+    # Ожидание имени нового портфеля
+    SET_NEW_PORTFOLIO_NAME = 1
+
+    # Удаление портфеля
+    DELETE_PORTFOLIO = 2
+
+
+class Transition(tp.NamedTuple):
+    """
+    Статический переход конечного автомата (не требующий обращения к базе данных).
+    """
+
+    # Состояние, в которое переходит сессия
+    next_state: State
+
+    # Ответы бота
+    bot_outputs: tuple[str, ...] = ()
+
+    # Команда, которую нужно обработать сразу после перехода (например, переход в главное меню)
+    next_command: tp.Optional[str] = None
+
+
+# Функция-обработчик динамического перехода: получает сессию, текст сообщения и список ответов бота (в который
+# добавляет свои ответы) и возвращает команду, которую нужно обработать следующей, или None
+Handler = tp.Callable[['BotChatSession', str, list[str]], tp.Optional[str]]
+
+# Скомпилированный переход: (следующее состояние, ответы бота, обработчик динамического перехода или None)
+CompiledTransition = tuple[State, tuple[str, ...], tp.Optional[Handler]]
+
+# Ключ таблицы переходов для любого текста, для которого в данном состоянии нет отдельного перехода
+ANY_TEXT = None
+
 
 class BotChatSession:
     """"
@@ -15,6 +63,23 @@ class BotChatSession:
     (Это позволяет использовать бота в многопользовательском режиме).
     """
 
+    # Сессий может быть очень много, поэтому не создаём для каждой из них словарь атрибутов
+    __slots__ = ("user_id", "portfolio_database", "state")
+
+    # Таблица переходов: (состояние, команда) -> статический переход или обработчик
+    # (Заполняется после объявления класса)
+    transitions: tp.ClassVar[dict[tuple[State, tp.Optional[str]], tp.Union[Transition, Handler]]] = {}
+
+    # Скомпилированная таблица переходов: номер состояния -> (команда -> переход, переход для любого текста)
+    compiled_transitions: tp.ClassVar[list[tuple[dict[str, CompiledTransition], CompiledTransition]]] = []
+
+    # Имена состояний по номерам для меток метрик (State.name - вычисляемое свойство, которое медленнее поиска
+    # в списке, а метка нужна при каждом переходе)
+    state_names: tp.ClassVar[list[str]] = [state.name for state in State]
+
+    # Метрики обработки сообщений, общие для всех сессий (None - время обработки и переходы не измеряются)
+    metrics: tp.ClassVar[tp.Optional['BotMetrics']] = None
+
     def __init__(self, user_id: int, portfolio_database: 'PortfolioDatabase') -> None:
         """
         Функция для инициализации сессии с пользователем.
@@ -25,14 +90,14 @@ class BotChatSession:
 
         # Сохраняем ID пользователя
         self.user_id = user_id
-        
+
         # Сохраняем базу данных с портфелями пользователей
         self.portfolio_database = portfolio_database
 
-        # Указатель того, какое действие сейчас реализуется
+        # Текущее состояние сессии
         # По-умолчанию реализуется цикл главного меню
-        self.action_list = ["main_menu"]
-    
+        self.state = State.MAIN_MENU
+
     def processing(self, user_message_text: str) -> list[str]:
         """
         Функция для обработки пользовательского ввода.
@@ -41,106 +106,264 @@ class BotChatSession:
         :return: Список, содержащий строки с ответами бота.
         """
 
-        # Главное меню
-        if self.get_action(0) == "main_menu":
-
-            # Первый запуск бота
-            if user_message_text == "/start":
-                
-                # Возвращаем приветственное сообщение для пользователя
-                return [text.welcome_message]
-
-            # Запуск главного меню
-            elif user_message_text == "/main_menu":
-                
-                # Возвращаем информацию для главного меню
-                return [text.start_main_menu]
-
-            # Создание нового портфеля
-            elif user_message_text == "/create_new_portfolio":
-                
-                # Переводим пользователя в цикл создания портфеля
-                self.action_list = ["create_new_portfolio"]
-                return self.processing(user_message_text)
-    
-            # Удаление портфеля
-            elif user_message_text == "/delete_portfolio":
-                
-                # Переводим пользователя в цикл удаления портфеля
-                self.action_list = ["delete_portfolio"]
-                return self.processing(user_message_text)
-
-            # Если не удалось распознать пользовательский ввод
-            else:
-                
-                # Возвращаем сообщение об ошибке
-                return [text.main_menu_failed_recognize_input]
-
-        # Создание нового портфеля
-        elif self.get_action(0) == "create_new_portfolio":
-            
-            # Начало создания нового портфеля
-            if user_message_text == "/create_new_portfolio":
-
-                # Добавляем действие получения имени нового портфеля
-                self.action_list.append("set_new_portfolio_name")
-                
-                # Возвращаем сообщение с просьбой ввести имя нового портфеля
-                return [text.ask_new_portfolio_name]
-
-            # Возвращение в главное меню
-            elif user_message_text == "/main_menu":
-                
-                # Возвращаем пользователя в главное меню
-                self.action_list = ["main_menu"]
-                bot_outputs = [text.stop_portfolio_creation]
-                bot_outputs.append(self.processing("/main_menu"))
-                return bot_outputs
-
-            # Задание имени нового портфеля
-            elif self.get_action(1) == "set_new_portfolio_name":
-                
-                # Получаем имя нового портфеля
-                new_portfolio_name = user_message_text
-
-                # Добавляем новый портфель в базу данных и получаем результат данной операции
-                result = self.portfolio_database.add_new_portfolio(new_portfolio_name, self.user_id)
-
-                # Если добавление портфеля прошло успешно
-                if result == 0:
-
-                    # Сообщаем пользователю об успешном создании портфеля и переводим его в главное меню
-                    self.action_list = ["main_menu"]
-                    bot_outputs = [text.successful_new_portfolio_creation.format(new_portfolio_name=new_portfolio_name)]
-                    bot_outputs.append(self.processing("/main_menu"))
-                    return bot_outputs
-
-                # Если портфель с таким именем уже есть у пользователя
-                elif result == 1:
-
-                    # Сообщаем пользователю о данной ошибке и остаёмся в том же цикле
-                    return [text.repeated_portfolio_name_error]
-
-        # Удаление портфеля
-        elif self.get_action(0) == "delete_portfolio":
-            pass
-
-
-    def get_action(self, position: int) -> str:
-        """
-        Функция для получения текущего действия с заданной позицией.
-
-        :param position: Позиция действия в списке действий.
-        :return: Строка с действием с заданной позицией или строка "none", если действия с заданной позицией не найдено.
-        """
-        
-        # Возвращаем действие с заданной позицией
+        # Список с ответами бота
+        bot_outputs: list[str] = []
+
+        # Если метрики включены, то измеряем время обработки и учитываем переходы
+        metrics = self.metrics
+        if metrics is not None:
+            start_time = time.perf_counter()
+
+        # Обрабатываем сообщение, пока обработчики перенаправляют его на следующую команду
+        # (Например, после создания портфеля пользователь автоматически переводится в главное меню)
+        command: tp.Optional[str] = user_message_text
+        while command is not None:
+
+            # Ищем переход для текущего состояния и команды, а если его нет - переход для любого текста
+            state_transitions, any_text_transition = self.compiled_transitions[self.state]
+            next_state, transition_outputs, handler = state_transitions.get(command, any_text_transition)
+
+            # Произвольный текст учитываем одной меткой, чтобы количество меток не зависело от ввода пользователей
+            if metrics is not None:
+                label_command = command if command in state_transitions else "*"
+                metrics.transitions.inc((self.state_names[self.state], label_command))
+
+            # Статический переход: цепочки статических переходов уже объединены при компиляции таблицы
+            if handler is None:
+                self.state = next_state
+                bot_outputs += transition_outputs
+                break
+
+            # Динамический переход: обработчик сам меняет состояние и может перенаправить на следующую команду
+            command = handler(self, command, bot_outputs)
+
+        if metrics is not None:
+            metrics.processing_seconds.observe(time.perf_counter() - start_time)
+
+        # Возвращаем ответы бота
+        return bot_outputs
+
+    def process_messages(self, user_message_texts: tp.Iterable[str]) -> list[str]:
+        """
+        Функция для обработки нескольких сообщений пользователя, накопившихся в очереди чата.
+        (Сообщения обрабатываются по порядку так же, как отдельными вызовами processing, но изменения базы данных
+        фиксируются одной транзакцией, а ответы на все сообщения возвращаются одним списком для одной отправки.
+        Ошибка при обработке сообщения записывается в журнал и не мешает обработке остальных сообщений).
+
+        :param user_message_texts: Сообщения пользователя в порядке поступления.
+        :return: Список, содержащий строки с ответами бота на все сообщения по порядку.
+        """
+
+        # Список с ответами бота и состояние сессии, соответствующее зафиксированным изменениям базы данных
+        bot_outputs: list[str] = []
+        state = self.state
+
         try:
-            return self.action_list[position]
-        
-        # При выходе за пределы диапазона возвращаем строку "none"
-        except IndexError:
-            return "none"
+            with self.portfolio_database.batch():
+                for user_message_text in user_message_texts:
+                    try:
+                        bot_outputs += self.processing(user_message_text)
+                    except Exception:
+                        logger.exception("Ошибка при обработке сообщения чата %s", self.user_id)
+
+                    # Если у пакета нет незафиксированных изменений (сообщение ничего не изменило или обработчик
+                    # зафиксировал пакет, например, перед чтением рейтинга), то ошибка фиксации следующих
+                    # сообщений не отменит изменения уже обработанных сообщений
+                    if not self.portfolio_database.is_batch_changed():
+                        state = self.state
+
+        # Если транзакцию пакета не удалось зафиксировать, то отменены изменения только после последней фиксации:
+        # возвращаем сессию в состояние на момент этой фиксации
+        except BaseException:
+            self.state = state
+            raise
+
+        # Возвращаем ответы бота
+        return bot_outputs
+
+    @classmethod
+    def compile_transitions(cls) -> None:
+        """
+        Функция для компиляции таблицы переходов.
+        (Цепочки статических переходов объединяются в один переход, а таблица превращается в список словарей,
+        индексируемый номером состояния, поэтому при обработке сообщения выполняется один поиск в словаре).
+        """
+
+        def compile_transition(state: State, command: tp.Optional[str]) -> CompiledTransition:
+            transition = cls.transitions.get((state, command)) or cls.transitions[(state, ANY_TEXT)]
+
+            # Динамический переход компилируется как есть
+            if not isinstance(transition, Transition):
+                return state, (), transition
+
+            # Проходим по цепочке статических переходов, собирая все ответы бота
+            bot_outputs = transition.bot_outputs
+            while transition.next_command is not None:
+                transition = cls.transitions.get((transition.next_state, transition.next_command)) or \
+                             cls.transitions[(transition.next_state, ANY_TEXT)]
+                if not isinstance(transition, Transition):
+                    raise ValueError("Статический переход не может перенаправлять на динамический переход")
+                bot_outputs += transition.bot_outputs
+            return transition.next_state, bot_outputs, None
+
+        cls.compiled_transitions = [
+            ({command: compile_transition(state, command) for from_state, command in cls.transitions
+              if from_state == state and command is not ANY_TEXT}, compile_transition(state, ANY_TEXT))
+            for state in State
+        ]
+
+    #* Создание нового портфеля
+
+    def set_new_portfolio_name(self, user_message_text: str, bot_outputs: list[str]) -> tp.Optional[str]:
+        """
+        Функция для задания имени нового портфеля (динамический переход).
+
+        :param user_message_text: Строка с именем нового портфеля.
+        :param bot_outputs: Список с ответами бота.
+        :return: Команда, которую нужно обработать следующей, или None.
+        """
+
+        # Получаем имя нового портфеля
+        new_portfolio_name = user_message_text
+
+        # Добавляем новый портфель в базу данных и получаем результат данной операции
+        result = self.portfolio_database.add_new_portfolio(new_portfolio_name, self.user_id)
+
+        # Если добавление портфеля прошло успешно
+        if result == 0:
+
+            # Сообщаем пользователю об успешном создании портфеля и переводим его в главное меню
+            self.state = State.MAIN_MENU
+            bot_outputs.append(text.successful_new_portfolio_creation.format(new_portfolio_name=new_portfolio_name))
+            return "/main_menu"
+
+        # Если портфель с таким именем уже есть у пользователя, то сообщаем об ошибке и остаёмся в том же состоянии
+        bot_outputs.append(text.repeated_portfolio_name_error)
+        return None
+
+    #* Рейтинг портфелей
+
+    def show_leaderboard(self, user_message_text: str, bot_outputs: list[str]) -> tp.Optional[str]:
+        """
+        Функция для вывода рейтинга портфелей и сводки по портфелям пользователя (динамический переход).
+        (Рейтинг берётся из агрегатов в памяти, поэтому команда не обращается к базе данных).
+
+        :param user_message_text: Строка с командой.
+        :param bot_outputs: Список с ответами бота.
+        :return: Команда, которую нужно обработать следующей, или None.
+        """
+
+        # Агрегаты изменяются только после фиксации, поэтому фиксируем изменения предыдущих сообщений пакета
+        self.portfolio_database.commit_batch()
+
+        # Если агрегаты рейтингов не подключены к базе данных или ещё загружаются, то сообщаем, что рейтинг недоступен
+        analytics = self.portfolio_database.analytics
+        if analytics is None or not analytics.loaded:
+            bot_outputs.append(text.leaderboard_unavailable)
+            return None
+
+        # Рейтинг портфелей по стоимости (доходность выводится в процентах)
+        top_portfolios = analytics.get_top_portfolios(10)
+        if top_portfolios:
+            leaderboard = text.leaderboard.format(top_portfolios="\n".join(
+                text.leaderboard_row.format(rank=portfolio.rank, portfolio_name=portfolio.portfolio_name,
+                                            value=portfolio.value, return_rate=portfolio.return_rate * 100)
+                for portfolio in top_portfolios))
+            median_return = analytics.get_return_percentiles((50,)).get(50)
+            if median_return is not None:
+                leaderboard += text.leaderboard_median_return.format(median_return=median_return * 100)
+            bot_outputs.append(leaderboard)
+        else:
+            bot_outputs.append(text.leaderboard_empty)
+
+        # Сводка по портфелям пользователя (если они у него есть)
+        summary = analytics.get_user_summary(self.user_id)
+        if summary is not None:
+            user_summary = text.user_summary.format(portfolio_count=summary.portfolio_count, value=summary.value,
+                                                    pnl=summary.pnl, return_rate=summary.return_rate * 100,
+                                                    rank=summary.rank, user_count=summary.user_count)
+            if summary.return_percentile is not None:
+                user_summary += text.user_summary_return_percentile.format(
+                    return_percentile=summary.return_percentile)
+            bot_outputs.append(user_summary)
+
+        # Остаёмся в главном меню
+        return None
+
+    def get_state(self) -> str:
+        """
+        Функция для получения состояния сессии в компактном строковом виде (для сохранения сессии на диск).
+
+        :return: Строка с номером текущего состояния сессии.
+        """
+
+        return str(int(self.state))
+
+    def set_state(self, state: str) -> None:
+        """
+        Функция для восстановления состояния сессии из строки, полученной функцией get_state.
+
+        :param state: Строка с состоянием сессии.
+        """
+
+        # Сессии, сохранённые до перехода на таблицу переходов, хранят список действий через запятую
+        if not state.isdigit():
+            self.state = LEGACY_ACTIONS.get(state.rsplit(",", 1)[-1], State.MAIN_MENU)
+            return
+
+        self.state = State(int(state))
+
+
+# Соответствие последнего действия из старого списка действий (action_list) состоянию сессии
+LEGACY_ACTIONS: dict[str, State] = {
+    "main_menu": State.MAIN_MENU,
+    "set_new_portfolio_name": State.SET_NEW_PORTFOLIO_NAME,
+    "delete_portfolio": State.DELETE_PORTFOLIO,
+}
+
+# Заполняем таблицу переходов
+BotChatSession.transitions.update({
+
+    #* Главное меню
+
+    # Первый запуск бота: возвращаем приветственное сообщение для пользователя
+    (State.MAIN_MENU, "/start"): Transition(State.MAIN_MENU, (text.welcome_message,)),
+
+    # Запуск главного меню: возвращаем информацию для главного меню
+    (State.MAIN_MENU, "/main_menu"): Transition(State.MAIN_MENU, (text.start_main_menu,)),
+
+    # Создание нового портфеля: просим ввести имя нового портфеля
+    (State.MAIN_MENU, "/create_new_portfolio"): Transition(State.SET_NEW_PORTFOLIO_NAME,
+                                                           (text.ask_new_portfolio_name,)),
+
+    # Удаление портфеля (пока не реализовано, поэтому бот ничего не отвечает)
+    (State.MAIN_MENU, "/delete_portfolio"): Transition(State.DELETE_PORTFOLIO),
+
+    # Рейтинг портфелей и сводка по портфелям пользователя
+    (State.MAIN_MENU, "/leaderboard"): BotChatSession.show_leaderboard,
+
+    # Если не удалось распознать пользовательский ввод, то возвращаем сообщение об ошибке
+    (State.MAIN_MENU, ANY_TEXT): Transition(State.MAIN_MENU, (text.main_menu_failed_recognize_input,)),
+
+    #* Создание нового портфеля
+
+    # Повторный запуск создания портфеля: снова просим ввести имя
+    (State.SET_NEW_PORTFOLIO_NAME, "/create_new_portfolio"): Transition(State.SET_NEW_PORTFOLIO_NAME,
+                                                                        (text.ask_new_portfolio_name,)),
+
+    # Возвращение в главное меню
+    (State.SET_NEW_PORTFOLIO_NAME, "/main_menu"): Transition(State.MAIN_MENU, (text.stop_portfolio_creation,),
+                                                             "/main_menu"),
+
+    # Задание имени нового портфеля
+    (State.SET_NEW_PORTFOLIO_NAME, ANY_TEXT): BotChatSession.set_new_portfolio_name,
+
+    #* Удаление портфеля
+
+    # Удаление портфеля пока не реализовано, поэтому бот ничего не отвечает
+    (State.DELETE_PORTFOLIO, ANY_TEXT): Transition(State.DELETE_PORTFOLIO),
+})
+BotChatSession.compile_transitions()
 
 
 # Область для отладки
@@ -0,0 +1,189 @@
+# Импорты библиотек
+import contextlib
+import queue
+import sqlite3
+import threading
+import typing as tp
+
+
+class ConnectionPool:
+    """
+    Класс пула подключений к базе данных SQLite.
+    (Каждый поток работает со своим подключением, поэтому запросы разных потоков не мешают друг другу).
+    """
+
+    # Настройки, применяемые к каждому новому подключению
+    # (WAL позволяет читать параллельно с записью, synchronous = NORMAL в режиме WAL не теряет целостность базы)
+    PRAGMAS: tp.ClassVar[dict[str, tp.Union[str, int]]] = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "temp_store": "MEMORY",
+        "cache_size": -16000,
+        "mmap_size": 268435456,
+        "foreign_keys": "ON",
+    }
+
+    def __init__(self, db_path: str = "portfolios.db", pool_size: tp.Optional[int] = None, timeout: float = 30.0,
+                 cached_statements: int = 256, pragmas: tp.Optional[dict[str, tp.Union[str, int]]] = None,
+                 initializer: tp.Optional[tp.Callable[[sqlite3.Connection], None]] = None) -> None:
+        """
+        Функция для инициализации пула подключений.
+
+        :param db_path: Путь к файлу базы данных.
+        :param pool_size: Максимальное количество подключений (None - отдельное подключение для каждого потока).
+        :param timeout: Время ожидания в секундах снятия блокировки базы данных другим подключением.
+        :param cached_statements: Размер кэша подготовленных запросов каждого подключения.
+        :param pragmas: Настройки подключений, дополняющие или заменяющие настройки по-умолчанию.
+        :param initializer: Функция, которая один раз выполняется с первым созданным подключением до его выдачи
+        (например, приведение схемы базы данных к последней версии).
+        """
+
+        # Сохраняем параметры подключений
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.pragmas = {**self.PRAGMAS, **(pragmas or {})}
+
+        # Подключение, используемое текущим потоком, и глубина вложенности его использования
+        self.local = threading.local()
+
+        # Свободные подключения (используются, только если размер пула ограничен)
+        self.idle_connections: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+
+        # Все созданные подключения (для их закрытия), количество подключений пула и блокировка для их изменения
+        # (Без ограничения размера пула подключение завершившегося потока остаётся открытым до закрытия пула,
+        # поэтому этот режим рассчитан на постоянный набор рабочих потоков)
+        self.all_connections: list[sqlite3.Connection] = []
+        self.connection_count = 0
+        self.lock = threading.Lock()
+
+        # Функция инициализации базы данных и блокировка, под которой её ждут другие потоки
+        # (Файл базы данных открывается только при первом запросе, поэтому создание пула не обращается к диску)
+        self.initializer = initializer
+        self.initializer_lock = threading.Lock()
+
+    def create_connection(self) -> sqlite3.Connection:
+        """
+        Функция для создания и настройки нового подключения.
+
+        :return: Новое подключение к базе данных.
+        """
+
+        # Инициализируем базу данных первым подключением, а остальные потоки открывают свои подключения только
+        # после окончания инициализации (подключение, открытое во время изменения схемы, могло бы прочитать
+        # старую схему и работать с ней дальше)
+        if self.initializer is not None:
+            with self.initializer_lock:
+                if self.initializer is not None:
+                    connection = self.open_connection()
+                    try:
+                        self.initializer(connection)
+                    except BaseException:
+                        connection.close()
+                        raise
+                    self.initializer = None
+                    return self.register_connection(connection)
+
+        return self.register_connection(self.open_connection())
+
+    def open_connection(self) -> sqlite3.Connection:
+        """
+        Функция для открытия подключения и применения его настроек.
+
+        :return: Новое подключение к базе данных.
+        """
+
+        # Создаём подключение
+        # (Подключение из пула может использоваться разными потоками, но только одним потоком одновременно)
+        connection = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False,
+                                     cached_statements=self.cached_statements)
+
+        # Применяем настройки подключения
+        for pragma, value in self.pragmas.items():
+            connection.execute(f"PRAGMA {pragma} = {value}")
+        return connection
+
+    def register_connection(self, connection: sqlite3.Connection) -> sqlite3.Connection:
+        """
+        Функция для запоминания подключения, чтобы закрыть его при закрытии пула.
+
+        :param connection: Новое подключение к базе данных.
+        :return: То же подключение.
+        """
+
+        with self.lock:
+            self.all_connections.append(connection)
+        return connection
+
+    @contextlib.contextmanager
+    def connection(self) -> tp.Iterator[sqlite3.Connection]:
+        """
+        Функция для получения подключения текущим потоком (используется в конструкции with).
+        (Вложенные вызовы в одном потоке получают одно и то же подключение).
+
+        :return: Подключение к базе данных.
+        """
+
+        # Если поток уже использует подключение, то отдаём его же
+        connection: tp.Optional[sqlite3.Connection] = getattr(self.local, "connection", None)
+        if connection is not None and self.local.depth > 0:
+            self.local.depth += 1
+            try:
+                yield connection
+            finally:
+                self.local.depth -= 1
+            return
+
+        # Иначе берём подключение потока, а если его нет - создаём его или берём из пула
+        if connection is None:
+            connection = self.acquire()
+            self.local.connection = connection
+        self.local.depth = 1
+        try:
+            yield connection
+        except BaseException:
+            # Отменяем незавершённую транзакцию, чтобы не вернуть в пул подключение с открытой транзакцией
+            connection.rollback()
+            raise
+        finally:
+            self.local.depth = 0
+            if self.pool_size is not None:
+                self.local.connection = None
+                self.idle_connections.put(connection)
+
+    def acquire(self) -> sqlite3.Connection:
+        """
+        Функция для получения свободного подключения.
+
+        :return: Подключение к базе данных.
+        """
+
+        # Без ограничения размера пула каждый поток получает собственное подключение
+        if self.pool_size is None:
+            return self.create_connection()
+
+        # Берём свободное подключение, а если его нет - создаём новое (пока не достигнут размер пула)
+        try:
+            return self.idle_connections.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                can_create = self.connection_count < self.pool_size
+                if can_create:
+                    self.connection_count += 1
+            if can_create:
+                return self.create_connection()
+
+        # Иначе ждём, пока другой поток вернёт подключение
+        return self.idle_connections.get()
+
+    def close(self) -> None:
+        """
+        Функция для закрытия всех подключений пула.
+        """
+
+        with self.lock:
+            for connection in self.all_connections:
+                connection.close()
+            self.all_connections.clear()
+            self.connection_count = 0
@@ -0,0 +1,210 @@
+# Импорты библиотек
+import concurrent.futures
+import sqlite3
+import threading
+import time
+import typing as tp
+
+# Импорты файлов для задания типов
+if tp.TYPE_CHECKING:
+    from connection_pool import ConnectionPool
+    from metrics import BotMetrics
+
+# Тип результата операции записи
+T = tp.TypeVar("T")
+
+
+class GroupCommitWriter:
+    """
+    Класс для групповой фиксации изменений базы данных.
+    (Операции записи из разных потоков накапливаются в очереди и выполняются одной транзакцией, поэтому синхронизация
+    с диском происходит один раз на группу операций, а не на каждую операцию).
+    """
+
+    def __init__(self, pool: 'ConnectionPool', max_batch_size: int = 64, max_delay_ms: float = 0.0,
+                 metrics: tp.Optional['BotMetrics'] = None) -> None:
+        """
+        Функция для инициализации писателя.
+
+        :param pool: Пул подключений к базе данных.
+        :param max_batch_size: Количество операций, при накоплении которого группа фиксируется сразу.
+        :param max_delay_ms: Максимальное время в миллисекундах, которое операция ждёт фиксации группы
+        (0 - группа состоит из операций, накопившихся за время фиксации предыдущей группы).
+        :param metrics: Метрики бота для измерения времени фиксации групп (None - время не измеряется).
+        """
+
+        # Сохраняем параметры
+        self.pool = pool
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.metrics = metrics
+
+        # Очередь операций: (время постановки в очередь, операция, объект для возврата результата)
+        self.queue: list[tuple[float, tp.Callable[[sqlite3.Connection], tp.Any], concurrent.futures.Future]] = []
+        self.condition = threading.Condition()
+        self.closed = False
+
+        # Счётчики зафиксированных групп и операций
+        self.batch_count = 0
+        self.operation_count = 0
+
+        # Запускаем поток, фиксирующий группы операций
+        self.thread = threading.Thread(target=self.run, name="group_commit_writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, operation: tp.Callable[[sqlite3.Connection], T]) -> 'concurrent.futures.Future[T]':
+        """
+        Функция для постановки операции записи в очередь.
+
+        :param operation: Функция, выполняющая операцию через переданное подключение (без фиксации транзакции).
+        :return: Объект, из которого можно получить результат операции после фиксации её группы.
+        """
+
+        future: concurrent.futures.Future[T] = concurrent.futures.Future()
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Писатель групповой фиксации уже закрыт")
+
+            # Будим поток записи, только если это первая операция группы или группа заполнена
+            self.queue.append((time.monotonic(), operation, future))
+            if len(self.queue) == 1 or len(self.queue) >= self.max_batch_size:
+                self.condition.notify()
+        return future
+
+    def run(self) -> None:
+        """
+        Функция потока записи: собирает операции в группы и фиксирует их.
+        (Если поток завершается из-за ошибки, то операции, оставшиеся в очереди, завершаются с этой ошибкой).
+        """
+
+        try:
+            self.collect_batches()
+
+        # Если поток записи завершается из-за ошибки, то закрываем писатель и завершаем с ошибкой операции из очереди,
+        # иначе они ждали бы фиксации бесконечно
+        except BaseException as error:
+            with self.condition:
+                self.closed = True
+                batch = self.queue[:]
+                self.queue.clear()
+            self.fail(batch, error)
+            raise
+
+    def collect_batches(self) -> None:
+        """
+        Функция для сбора операций в группы и их фиксации (до закрытия писателя).
+        """
+
+        while True:
+            with self.condition:
+
+                # Ждём первую операцию группы
+                while not self.queue and not self.closed:
+                    self.condition.wait()
+                if not self.queue:
+                    return
+
+                # Ждём, пока группа заполнится или истечёт время ожидания первой операции группы
+                deadline = self.queue[0][0] + self.max_delay
+                while len(self.queue) < self.max_batch_size and not self.closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+
+                # Забираем группу из очереди
+                batch = self.queue[:self.max_batch_size]
+                del self.queue[:self.max_batch_size]
+
+            # Группа уже забрана из очереди, поэтому при ошибке вне транзакции (например, при получении подключения)
+            # её операции завершаются здесь
+            try:
+                self.flush(batch)
+            except BaseException as error:
+                self.fail(batch, error)
+                raise
+
+    def flush(self, batch: list[tuple[float, tp.Callable[[sqlite3.Connection], tp.Any], concurrent.futures.Future]]
+              ) -> None:
+        """
+        Функция для выполнения группы операций одной транзакцией.
+        (Каждая операция выполняется в своей точке сохранения, поэтому ошибка одной операции не отменяет остальные).
+
+        :param batch: Группа операций.
+        """
+
+        results: list[tuple[concurrent.futures.Future, tp.Any, tp.Optional[BaseException]]] = []
+        with self.pool.connection() as connection:
+            try:
+                connection.execute("BEGIN IMMEDIATE")
+                for _, operation, future in batch:
+                    connection.execute("SAVEPOINT group_commit_operation")
+                    try:
+                        results.append((future, operation(connection), None))
+                    except Exception as error:
+                        connection.execute("ROLLBACK TO group_commit_operation")
+                        results.append((future, None, error))
+                    connection.execute("RELEASE group_commit_operation")
+                commit_start_time = time.perf_counter()
+                connection.commit()
+                if self.metrics is not None:
+                    self.metrics.commit_seconds.observe(time.perf_counter() - commit_start_time, ("group",))
+
+            # Если не удалось зафиксировать транзакцию, то сообщаем об ошибке всем операциям группы
+            # (BaseException тоже перехватываем, иначе вызывающий код бесконечно ждал бы результат операции)
+            except BaseException as error:
+                try:
+                    connection.rollback()
+                finally:
+                    self.fail(batch, error)
+                if not isinstance(error, Exception):
+                    raise
+                return
+
+        # Результаты возвращаются только после фиксации, поэтому вызывающий код получает уже сохранённые изменения
+        self.batch_count += 1
+        self.operation_count += len(batch)
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    @staticmethod
+    def fail(batch: list[tuple[float, tp.Callable[[sqlite3.Connection], tp.Any], concurrent.futures.Future]],
+             error: BaseException) -> None:
+        """
+        Функция для завершения операций группы с ошибкой.
+        (BaseException (например, KeyboardInterrupt) заменяется на RuntimeError, чтобы не завершать потоки,
+        ждущие результата).
+
+        :param batch: Группа операций.
+        :param error: Ошибка.
+        """
+
+        if not isinstance(error, Exception):
+            wrapped_error = RuntimeError(f"Поток записи остановлен: {type(error).__name__}")
+            wrapped_error.__cause__ = error
+            error = wrapped_error
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def get_metrics(self) -> dict[str, int]:
+        """
+        Функция для получения метрик писателя.
+
+        :return: Словарь с количеством зафиксированных групп и операций.
+        """
+
+        return {"batches": self.batch_count, "operations": self.operation_count}
+
+    def close(self) -> None:
+        """
+        Функция для фиксации оставшихся операций и остановки потока записи.
+        """
+
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
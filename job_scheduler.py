@@ -0,0 +1,578 @@
+# Импорты библиотек
+import concurrent.futures
+import datetime
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+import typing as tp
+
+# Импорты файлов для задания типов
+if tp.TYPE_CHECKING:
+    from metrics import BotMetrics
+    from portfolio_database import PortfolioDatabase
+    from price_feed import PriceFeedService, QuoteCache
+    from session_store import SessionStore
+
+# Журнал telebot (ошибки заданий пишутся туда же, куда ошибки обработки сообщений)
+logger = logging.getLogger("TeleBot")
+
+# Максимальное время непрерывного ожидания потока планировщика в секундах
+# (Планировщик работает по системным часам, поэтому периодически сверяется с ними, если часы перевели)
+MAX_WAIT_SECONDS = 30.0
+
+
+#* Расписания
+
+def parse_cron_field(field: str, minimum: int, maximum: int) -> frozenset[int]:
+    """
+    Функция для разбора поля cron-выражения: "*", число, диапазон "a-b", список через запятую и шаг "/n"
+    (например, "*/15", "1-5", "0,30", "10-50/20").
+
+    :param field: Поле выражения.
+    :param minimum: Наименьшее допустимое значение.
+    :param maximum: Наибольшее допустимое значение.
+    :return: Множество значений поля.
+    """
+
+    values: set[int] = set()
+    for part in field.split(","):
+        range_part, _, step_part = part.partition("/")
+        step = int(step_part) if step_part else 1
+        if range_part == "*":
+            start, end = minimum, maximum
+        elif "-" in range_part:
+            start, end = (int(value) for value in range_part.split("-", 1))
+        else:
+            start = int(range_part)
+            end = maximum if step_part else start
+        if step <= 0 or start < minimum or end > maximum or start > end:
+            raise ValueError(f"Неверное поле cron-выражения: {field}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronSchedule:
+    """
+    Класс расписания в формате cron: "минуты часы дни_месяца месяцы дни_недели" по местному времени
+    (дни недели - от 0 до 6, начиная с воскресенья, 7 - тоже воскресенье). Если заданы и дни месяца, и дни недели,
+    то подходит день, совпадающий с любым из них (как в cron).
+    """
+
+    def __init__(self, expression: str, tz: tp.Optional[datetime.tzinfo] = None) -> None:
+        """
+        Функция для инициализации расписания.
+
+        :param expression: Cron-выражение (например, "55 23 * * *" - каждый день в 23:55).
+        :param tz: Часовой пояс (None - местное время).
+        """
+
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron-выражение должно состоять из 5 полей: {expression}")
+
+        self.expression = expression
+        self.tz = tz
+        self.minutes = sorted(parse_cron_field(fields[0], 0, 59))
+        self.hours = parse_cron_field(fields[1], 0, 23)
+        self.days = parse_cron_field(fields[2], 1, 31)
+        self.months = parse_cron_field(fields[3], 1, 12)
+        self.weekdays = frozenset(weekday % 7 for weekday in parse_cron_field(fields[4], 0, 7))
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+        # Проверяем, что выражение когда-нибудь срабатывает (например, "0 0 31 2 *" - никогда)
+        self.next_time(time.time())
+
+    def is_day_matching(self, moment: datetime.datetime) -> bool:
+        """
+        Функция для проверки, подходит ли день расписанию.
+
+        :param moment: Момент времени.
+        :return: True - если подходит, False - если нет.
+        """
+
+        day_matches = moment.day in self.days
+        weekday_matches = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_matches and weekday_matches
+        return day_matches or weekday_matches
+
+    def next_time(self, after: float) -> float:
+        """
+        Функция для получения ближайшего времени срабатывания строго после заданного.
+        (Неподходящие месяцы, дни и часы пропускаются целиком, поэтому поиск занимает не больше нескольких сотен
+        шагов).
+
+        :param after: Время в секундах Unix.
+        :return: Время срабатывания в секундах Unix.
+        """
+
+        moment = datetime.datetime.fromtimestamp(after, self.tz).replace(second=0, microsecond=0) + \
+            datetime.timedelta(minutes=1)
+        last_year = moment.year + 5
+        while moment.year <= last_year:
+            if moment.month not in self.months:
+                year, month = (moment.year + 1, 1) if moment.month == 12 else (moment.year, moment.month + 1)
+                moment = moment.replace(year=year, month=month, day=1, hour=0, minute=0)
+            elif not self.is_day_matching(moment):
+                moment = moment.replace(hour=0, minute=0) + datetime.timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + datetime.timedelta(hours=1)
+            else:
+                # Ближайшая подходящая минута в этом часе или первая минута следующего часа
+                minute = next((minute for minute in self.minutes if minute >= moment.minute), None)
+                if minute is None:
+                    moment = moment.replace(minute=0) + datetime.timedelta(hours=1)
+                else:
+                    return moment.replace(minute=minute).timestamp()
+        raise ValueError(f"Cron-выражение никогда не срабатывает: {self.expression}")
+
+
+class IntervalSchedule:
+    """
+    Класс расписания с постоянным интервалом между запусками.
+    """
+
+    def __init__(self, seconds: float) -> None:
+        """
+        Функция для инициализации расписания.
+
+        :param seconds: Интервал в секундах.
+        """
+
+        if seconds <= 0:
+            raise ValueError("Интервал должен быть положительным")
+        self.seconds = seconds
+
+    def next_time(self, after: float) -> float:
+        """
+        Функция для получения времени следующего запуска.
+
+        :param after: Время предыдущего запуска в секундах Unix.
+        :return: Время следующего запуска в секундах Unix.
+        """
+
+        return after + self.seconds
+
+
+# Расписание задания
+Schedule = tp.Union[CronSchedule, IntervalSchedule]
+
+
+#* Планировщик заданий
+
+class Job:
+    """
+    Класс фонового задания: функция, расписание и статистика запусков.
+    """
+
+    def __init__(self, name: str, function: tp.Callable[[], tp.Any], schedule: Schedule, jitter: float,
+                 max_defer: float) -> None:
+        """
+        Функция для инициализации задания.
+
+        :param name: Имя задания.
+        :param function: Функция задания (без аргументов).
+        :param schedule: Расписание.
+        :param jitter: Наибольшая случайная задержка запуска в секундах.
+        :param max_defer: Наибольшее время в секундах, на которое запуск откладывается, пока бот занят.
+        """
+
+        self.name = name
+        self.function = function
+        self.schedule = schedule
+        self.jitter = jitter
+        self.max_defer = max_defer
+
+        # Плановое время запуска (без случайной задержки, от него считается следующий запуск),
+        # время запуска с задержкой и время, с которого запуск откладывается
+        self.planned_time = 0.0
+        self.next_run_time = 0.0
+        self.deferred_since: tp.Optional[float] = None
+
+        # Выполняется ли задание (одновременно выполняется не больше одного запуска задания)
+        self.running = False
+
+        # Статистика: запуски, ошибки, пропущенные и отложенные запуски, длительности в секундах
+        self.run_count = 0
+        self.error_count = 0
+        self.skipped_count = 0
+        self.deferred_count = 0
+        self.last_seconds = 0.0
+        self.max_seconds = 0.0
+        self.total_seconds = 0.0
+
+
+class JobScheduler:
+    """
+    Класс планировщика фоновых заданий (снимки стоимости портфелей, вытеснение сессий, обслуживание базы данных).
+    (Задания выполняются собственным небольшим пулом потоков, отдельно от обработки сообщений. Один запуск задания
+    не начинается, пока не закончился предыдущий, а при нехватке потоков пула или пока бот занят запуск
+    откладывается, поэтому фоновые задания не отнимают время у обработки сообщений).
+    """
+
+    def __init__(self, max_workers: int = 1, busy: tp.Optional[tp.Callable[[], bool]] = None,
+                 defer_delay: float = 1.0, max_pause: float = 0.05,
+                 metrics: tp.Optional['BotMetrics'] = None) -> None:
+        """
+        Функция для инициализации планировщика.
+
+        :param max_workers: Количество потоков для выполнения заданий (и наибольшее количество заданий,
+        выполняемых одновременно).
+        :param busy: Функция, возвращающая True, пока бот занят обработкой сообщений (например, пока очередь
+        отправки ответов длинная); запуски заданий в это время откладываются (None - не откладываются).
+        :param defer_delay: Время в секундах, через которое проверяется, можно ли запустить отложенное задание.
+        :param max_pause: Наибольшая пауза выполняемого задания в секундах за один вызов pause_while_busy.
+        :param metrics: Метрики бота для записи длительности заданий (None - длительность только в статистике).
+        """
+
+        self.max_workers = max_workers
+        self.busy = busy
+        self.defer_delay = defer_delay
+        self.max_pause = max_pause
+        self.metrics = metrics
+
+        # Задания по именам и очередь запусков (время запуска, порядковый номер, имя задания)
+        # (Записи очереди не удаляются при изменении расписания: устаревшая запись пропускается при извлечении)
+        self.jobs: dict[str, Job] = {}
+        self.queue: list[tuple[float, int, str]] = []
+        self.counter = itertools.count()
+
+        # Условие для ожидания времени запуска, количество выполняемых заданий и признак остановки
+        self.condition = threading.Condition()
+        self.running_count = 0
+        self.closed = False
+
+        # Поток планировщика и пул потоков заданий (создаются при запуске)
+        self.thread: tp.Optional[threading.Thread] = None
+        self.executor: tp.Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+    def add_job(self, name: str, function: tp.Callable[[], tp.Any], schedule: Schedule, jitter: float = 0.0,
+                max_defer: float = 300.0, run_immediately: bool = False) -> Job:
+        """
+        Функция для добавления задания (задание с тем же именем заменяется).
+
+        :param name: Имя задания.
+        :param function: Функция задания (без аргументов).
+        :param schedule: Расписание.
+        :param jitter: Наибольшая случайная задержка каждого запуска в секундах (разносит запуски заданий
+        нескольких процессов и заданий с одинаковым расписанием).
+        :param max_defer: Наибольшее время в секундах, на которое запуск откладывается, пока бот занят
+        (после него задание запускается, чтобы не откладываться бесконечно).
+        :param run_immediately: Запустить ли задание сразу, а затем - по расписанию.
+        :return: Задание.
+        """
+
+        job = Job(name, function, schedule, jitter, max_defer)
+        with self.condition:
+            now = time.time()
+            job.planned_time = now if run_immediately else schedule.next_time(now)
+            self.jobs[name] = job
+            self._push(job, job.planned_time + random.uniform(0.0, jitter))
+        return job
+
+    def add_interval_job(self, name: str, function: tp.Callable[[], tp.Any], seconds: float,
+                         **options: tp.Any) -> Job:
+        """
+        Функция для добавления задания, запускаемого через равные интервалы.
+
+        :param name: Имя задания.
+        :param function: Функция задания.
+        :param seconds: Интервал в секундах.
+        :param options: Остальные параметры add_job.
+        :return: Задание.
+        """
+
+        return self.add_job(name, function, IntervalSchedule(seconds), **options)
+
+    def add_cron_job(self, name: str, function: tp.Callable[[], tp.Any], expression: str,
+                     **options: tp.Any) -> Job:
+        """
+        Функция для добавления задания по cron-выражению.
+
+        :param name: Имя задания.
+        :param function: Функция задания.
+        :param expression: Cron-выражение (например, "55 23 * * *").
+        :param options: Остальные параметры add_job.
+        :return: Задание.
+        """
+
+        return self.add_job(name, function, CronSchedule(expression), **options)
+
+    def remove_job(self, name: str) -> None:
+        """
+        Функция для удаления задания (уже начатый запуск выполняется до конца).
+
+        :param name: Имя задания.
+        """
+
+        with self.condition:
+            self.jobs.pop(name, None)
+
+    def run_job(self, name: str) -> tp.Optional[concurrent.futures.Future]:
+        """
+        Функция для запуска задания вне расписания (расписание не меняется).
+
+        :param name: Имя задания.
+        :return: Future запуска или None, если задание уже выполняется или все потоки пула заняты.
+        """
+
+        with self.condition:
+            job = self.jobs[name]
+            if job.running or self.running_count >= self.max_workers or self.executor is None:
+                return None
+            return self._submit(job)
+
+    def pause_while_busy(self) -> None:
+        """
+        Функция для паузы выполняемого задания, пока бот занят обработкой сообщений.
+        (Вызывается длинными заданиями между частями работы: откладывание запуска не останавливает уже начатое
+        задание, а на одном ядре процессора задание делит его с обработкой сообщений. Пауза ограничена max_pause,
+        чтобы задание, удерживающее транзакцию, не задерживало надолго запись из обработки сообщений).
+        """
+
+        deadline = time.monotonic() + self.max_pause
+        while self.busy is not None and self.busy() and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+    def start(self) -> 'JobScheduler':
+        """
+        Функция для запуска потока планировщика и пула потоков заданий.
+        """
+
+        self.closed = False
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers,
+                                                              thread_name_prefix="job")
+        self.thread = threading.Thread(target=self.run, name="job_scheduler", daemon=True)
+        self.thread.start()
+        return self
+
+    def run(self) -> None:
+        """
+        Функция потока планировщика: запускает задания, время которых наступило.
+        """
+
+        with self.condition:
+            while not self.closed:
+                if not self.queue:
+                    self.condition.wait()
+                    continue
+
+                now = time.time()
+                run_time, _, name = self.queue[0]
+                if run_time > now:
+                    self.condition.wait(min(run_time - now, MAX_WAIT_SECONDS))
+                    continue
+
+                heapq.heappop(self.queue)
+                job = self.jobs.get(name)
+                if job is not None and job.next_run_time == run_time:
+                    self._dispatch(job, now)
+
+    def _dispatch(self, job: Job, now: float) -> None:
+        """
+        Функция для запуска задания, время которого наступило (вызывается под блокировкой).
+
+        :param job: Задание.
+        :param now: Текущее время.
+        """
+
+        # Предыдущий запуск ещё выполняется: пропускаем этот запуск
+        if job.running:
+            job.skipped_count += 1
+            self._schedule(job, now)
+            return
+
+        # Все потоки пула заняты или бот занят: откладываем запуск, но не дольше max_defer
+        full = self.running_count >= self.max_workers
+        if full or (self.busy is not None and self.busy()):
+            if job.deferred_since is None:
+                job.deferred_since = now
+            if now - job.deferred_since < job.max_defer:
+                job.deferred_count += 1
+                self._push(job, now + self.defer_delay)
+                return
+
+            # Запуск откладывался слишком долго: если потоков нет, то пропускаем его, иначе запускаем
+            if full:
+                job.skipped_count += 1
+                job.deferred_since = None
+                self._schedule(job, now)
+                return
+
+        job.deferred_since = None
+        self._schedule(job, now)
+        self._submit(job)
+
+    def _schedule(self, job: Job, now: float) -> None:
+        """
+        Функция для планирования следующего запуска задания по расписанию (вызывается под блокировкой).
+        (Пропущенные запуски не наверстываются: если плановое время уже прошло, то оно считается от текущего).
+
+        :param job: Задание.
+        :param now: Текущее время.
+        """
+
+        planned_time = job.schedule.next_time(job.planned_time)
+        if planned_time <= now:
+            planned_time = job.schedule.next_time(now)
+        job.planned_time = planned_time
+        self._push(job, planned_time + random.uniform(0.0, job.jitter))
+
+    def _push(self, job: Job, run_time: float) -> None:
+        """
+        Функция для постановки запуска задания в очередь (вызывается под блокировкой).
+
+        :param job: Задание.
+        :param run_time: Время запуска.
+        """
+
+        job.next_run_time = run_time
+        heapq.heappush(self.queue, (run_time, next(self.counter), job.name))
+        self.condition.notify_all()
+
+    def _submit(self, job: Job) -> concurrent.futures.Future:
+        """
+        Функция для передачи задания в пул потоков (вызывается под блокировкой).
+
+        :param job: Задание.
+        :return: Future запуска.
+        """
+
+        job.running = True
+        self.running_count += 1
+        return self.executor.submit(self._execute, job)
+
+    def _execute(self, job: Job) -> None:
+        """
+        Функция для выполнения задания в потоке пула и записи его длительности.
+
+        :param job: Задание.
+        """
+
+        start_time = time.perf_counter()
+        outcome = "error"
+        try:
+            job.function()
+            outcome = "ok"
+
+        # Ошибка задания не останавливает планировщик: задание будет запущено по расписанию
+        except Exception:
+            logger.exception("Ошибка при выполнении фонового задания %s", job.name)
+
+        finally:
+            seconds = time.perf_counter() - start_time
+            with self.condition:
+                job.running = False
+                self.running_count -= 1
+                job.run_count += 1
+                job.error_count += outcome == "error"
+                job.last_seconds = seconds
+                job.max_seconds = max(job.max_seconds, seconds)
+                job.total_seconds += seconds
+                self.condition.notify_all()
+            if self.metrics is not None:
+                self.metrics.job_seconds.observe(seconds, (job.name, outcome))
+
+    def get_job_metrics(self) -> dict[str, dict[str, tp.Union[int, float]]]:
+        """
+        Функция для получения статистики каждого задания.
+
+        :return: Словарь {имя задания: {количество запусков, ошибок, пропущенных и отложенных запусков, последняя,
+        средняя и максимальная длительность в секундах, время до следующего запуска в секундах}}.
+        """
+
+        with self.condition:
+            now = time.time()
+            return {name: {
+                "runs": job.run_count,
+                "errors": job.error_count,
+                "skipped": job.skipped_count,
+                "deferred": job.deferred_count,
+                "last_seconds": job.last_seconds,
+                "average_seconds": job.total_seconds / job.run_count if job.run_count else 0.0,
+                "max_seconds": job.max_seconds,
+                "next_run_in": max(0.0, job.next_run_time - now),
+            } for name, job in self.jobs.items()}
+
+    def get_metrics(self) -> dict[str, int]:
+        """
+        Функция для получения метрик планировщика.
+
+        :return: Словарь с количеством заданий, выполняемых заданий, запусков, ошибок, пропущенных и отложенных
+        запусков всех заданий.
+        """
+
+        with self.condition:
+            jobs = list(self.jobs.values())
+            return {
+                "jobs": len(jobs),
+                "running": self.running_count,
+                "runs": sum(job.run_count for job in jobs),
+                "errors": sum(job.error_count for job in jobs),
+                "skipped": sum(job.skipped_count for job in jobs),
+                "deferred": sum(job.deferred_count for job in jobs),
+            }
+
+    def close(self, wait: bool = True) -> None:
+        """
+        Функция для остановки планировщика (новые запуски не начинаются).
+
+        :param wait: Дожидаться ли окончания выполняемых заданий.
+        """
+
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+            self.executor = None
+
+
+#* Задания бота
+
+def add_maintenance_jobs(job_scheduler: JobScheduler, portfolio_database: 'PortfolioDatabase',
+                         session_store: 'SessionStore', quote_cache: 'QuoteCache',
+                         price_feed: tp.Optional['PriceFeedService'] = None, prices_interval: float = 5.0,
+                         database_jobs: bool = True) -> None:
+    """
+    Функция для добавления фоновых заданий бота.
+
+    :param job_scheduler: Планировщик заданий.
+    :param portfolio_database: База данных портфелей.
+    :param session_store: Хранилище сессий.
+    :param quote_cache: Таблица котировок, по которой оцениваются портфели.
+    :param price_feed: Сервис котировок, плановые обновления которого запускает планировщик (сервис должен быть
+    создан без периода обновления, None - котировки не обновляются).
+    :param prices_interval: Период обновления котировок в секундах.
+    :param database_jobs: Добавлять ли задания для всей базы данных: снимок стоимости портфелей и обслуживание
+    (если базу данных используют несколько процессов, их выполняет только один из них).
+    """
+
+    # Плановое обновление котировок (обновления вне очереди выполняет поток сервиса котировок)
+    # (Обновление откладывается не дольше своего периода: иначе котировки устареют)
+    if price_feed is not None:
+        job_scheduler.add_interval_job("refresh_prices", price_feed.refresh, prices_interval,
+                                       max_defer=prices_interval, run_immediately=True)
+
+    # Вытеснение неактивных сессий (без него сессии вытесняются только при обращении к хранилищу)
+    job_scheduler.add_interval_job("evict_sessions", session_store.evict_expired, 60.0, jitter=5.0)
+    if not database_jobs:
+        return
+
+    # Снимок стоимости всех портфелей на конец дня одной транзакцией с паузами, пока бот занят
+    # (Дата снимка - дата запуска, поэтому задержка и откладывание запуска не выходят за полночь)
+    job_scheduler.add_cron_job("daily_snapshot",
+                               lambda: portfolio_database.save_daily_snapshot(
+                                   quote_cache, pause=job_scheduler.pause_while_busy),
+                               "55 23 * * *", jitter=60.0, max_defer=120.0)
+
+    # Обслуживание базы данных ночью: статистика планировщика запросов и сжатие файла, если он сильно разрежен
+    job_scheduler.add_cron_job("optimize_database", portfolio_database.optimize, "30 3 * * *", jitter=300.0)
+    job_scheduler.add_cron_job("vacuum_database", portfolio_database.vacuum, "0 4 * * 0", jitter=300.0)
@@ -1,12 +1,17 @@
 # Импорты библиотек
 import telebot
-import typing as tp
 
 # Импорты файлов
 import get_token
-import text
 from portfolio_database import PortfolioDatabase
 from bot_chat_session import BotChatSession
+from job_scheduler import JobScheduler, add_maintenance_jobs
+from metrics import BotMetrics, SamplingProfiler
+from metrics_server import start_metrics_server
+from portfolio_analytics import PortfolioAnalytics
+from price_feed import CsvReplayProvider, PriceFeedService, QuoteCache
+from send_scheduler import SendScheduler
+from session_store import SessionStore, DiskSessionStore
 
 # Получаем токен для бота
 bot_token = get_token.TOKEN
@@ -14,11 +19,43 @@ bot_token = get_token.TOKEN
 # Создаём экземпляр бота
 bot = telebot.TeleBot(bot_token)
 
-# Создаём базу данных для хранения информации о портфелях пользователя
-portfolio_database = PortfolioDatabase()
+# Метрики горячего пути: время обработки сообщений, запросов к базе данных и отправки ответов
+metrics = BotMetrics()
+BotChatSession.metrics = metrics
+
+# Агрегаты для рейтингов портфелей (изменяются базой данных после каждой операции с портфелями)
+# (Загружаются в фоновом потоке, чтобы бот начал отвечать сразу после запуска)
+analytics = PortfolioAnalytics()
 
-# Словарь для хранения сессий пользователей
-chat_dict: dict[int, BotChatSession] = {}
+# Создаём базу данных для хранения информации о портфелях пользователя
+portfolio_database = PortfolioDatabase(metrics=metrics, analytics=analytics)
+analytics.start_loading(portfolio_database)
+metrics.registry.gauges_from_metrics("bot_analytics", analytics.get_metrics)
+
+# Общая таблица котировок: оценка портфелей читает из неё цены без ввода-вывода, а агрегаты рейтинга
+# пересчитываются при каждом обновлении цен
+# (Таблицу заполняет сервис котировок, если при запуске задан источник цен, иначе портфели оцениваются
+# по стоимости покупки)
+quote_cache = QuoteCache()
+quote_cache.add_listener(analytics.on_prices)
+metrics.registry.gauges_from_metrics("bot_quote_cache", quote_cache.get_metrics)
+
+# Хранилище сессий пользователей
+# (В памяти хранятся только последние активные сессии, остальные сохраняются на диск)
+session_store = SessionStore(lambda chat_id: BotChatSession(chat_id, portfolio_database),
+                             max_sessions=10000, ttl=3600.0, disk_store=DiskSessionStore("sessions.db"))
+metrics.watch_session_store(session_store.__len__)
+
+# Планировщик отправки ответов
+# (Соблюдает ограничения Telegram на частоту сообщений, поэтому ответ 429 не блокирует обработку сообщений)
+send_scheduler = SendScheduler(metrics.timed_send(bot.send_message))
+metrics.registry.gauges_from_metrics("bot_send_scheduler", send_scheduler.get_metrics)
+
+# Планировщик фоновых заданий: обновление котировок, снимки стоимости портфелей, вытеснение сессий
+# и обслуживание базы данных (задания добавляются при запуске бота, когда известен источник цен)
+# (Запуски откладываются, пока в очереди отправки много ответов, т.е. пока бот не успевает отвечать.
+# Два потока - чтобы долгое обслуживание базы данных не задерживало обновление котировок)
+job_scheduler = JobScheduler(max_workers=2, busy=lambda: send_scheduler.pending_count > 100, metrics=metrics)
 
 
 @bot.message_handler(content_types=["text"])
@@ -29,135 +66,56 @@ def message_handler(message: telebot.types.Message):
     :param message: Сообщение пользователя, содержащее текст ввода.
     """
     
-    # Если ID данного чата не содержится в списке текущих сессий, то создаём новую сессию для данного чата
-    if message.chat.id not in chat_dict:
-        chat_dict[message.chat.id] = BotChatSession(message.chat.id, portfolio_database)
+    # Получаем сессию данного чата (хранилище само создаст новую сессию или восстановит вытесненную)
+    session = session_store.get_session(message.chat.id)
 
     # Отправляем боту сообщение пользователя и получаем список с ответами на него
-    bot_outputs: list[str] = chat_dict[message.chat.id].processing(message.text)
+    bot_outputs: list[str] = session.processing(message.text)
 
-    # Перебираем все ответы бота и отправляем их в чат пользователю
-    for bot_output in bot_outputs:
-        bot.send_message(message.chat.id, bot_output)
+    # Ставим все ответы бота в очередь отправки в чат пользователю
+    send_scheduler.submit_many(message.chat.id, bot_outputs)
 
 
 # Запускаем бота
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Запуск бота")
+    parser.add_argument("--metrics-port", type=int, default=9464, help="порт локального сервера метрик (0 - любой)")
+    parser.add_argument("--profile", action="store_true", help="включить выборочный профилировщик (/profile)")
+    parser.add_argument("--prices-csv", default=None,
+                        help="CSV-файл с ценами (timestamp,symbol,price) для сервиса котировок")
+    parser.add_argument("--prices-interval", type=float, default=5.0, help="период обновления котировок в секундах")
+    args = parser.parse_args()
+
+    # Запускаем локальный сервер метрик (и профилировщик, если он включён)
+    profiler = SamplingProfiler() if args.profile else None
+    if profiler is not None:
+        profiler.start()
+    metrics_server = start_metrics_server(metrics.registry, port=args.metrics_port, profiler=profiler)
+
+    # Запускаем сервис котировок (плановые обновления цен бумаг из портфелей запускает планировщик заданий,
+    # а поток сервиса обновляет котировки вне очереди)
+    price_feed = PriceFeedService(CsvReplayProvider(args.prices_csv), quote_cache, portfolio_database.get_held_symbols,
+                                  None).start() if args.prices_csv else None
+    if price_feed is not None:
+        metrics.registry.gauges_from_metrics("bot_price_feed", price_feed.get_metrics)
+
+    add_maintenance_jobs(job_scheduler, portfolio_database, session_store, quote_cache, price_feed,
+                         args.prices_interval)
+    metrics.registry.gauges_from_metrics("bot_jobs", job_scheduler.get_metrics)
+    job_scheduler.start()
     print("Telegram-бот запущен...")
     bot.infinity_polling()
 
-
-#* ------------------------------------------------------------------------------------------------
-
-# Данная функция вызывается при текстовом вводе пользователя
-@bot.message_handler(content_types=["text"])
-def main_menu(message: telebot.types.Message, action: tp.Union[str, None] = None) -> None:
-    """
-    Главное меню: функция для обработки текстового ввода пользователя.
-
-    :param message: Сообщение пользователя.
-    :param action: Действие для главного меню.
-    """
-
-    # Начало работы с ботом и базовое главное меню
-    if (message.text == "/start") or (message.text == "/main_menu") or (action == "main_menu"):
-    
-        # Получаем ID пользователя
-        user_id: int = message.from_user.id
-
-        # Если текущий пользователь уже имеет хотя бы один портфель
-        if portfolio_database.is_user_has_portfolio(user_id):
-            
-            # Отправляем приветственное сообщение для уже зарегистрированного пользователя
-            user_input = bot.send_message(message.chat.id, text.start_main_menu)
-
-            # Обрабатываем ответ пользователя в этой же функции
-            bot.register_next_step_handler(user_input, main_menu)
-
-        # Иначе (если у пользователя нет ни одного портфеля)
-        else:
-            
-            # Отправляем приветственное сообщение с предложением создать новый портфель и ждём ответа от пользователя
-            user_input = bot.send_message(message.chat.id, text.start_new_user)
-
-            # Отправляем ответ пользователя текущей функции
-            bot.register_next_step_handler(user_input, main_menu)
-
-    # Создание нового портфеля
-    elif message.text == "/create_new_portfolio":
-        
-        # Запускаем функцию для создания нового портфеля
-        create_new_portfolio(message)
-
-    # Удаление доступного портфеля
-    elif message.text == "/delete_portfolio":
-        
-        # Запускаем функцию для удаления доступного портфеля
-        delete_portfolio(message)
-
-
-def create_new_portfolio(message: telebot.types.Message, action: tp.Union[str, None] = None) -> None:
-    """
-    Функция для создания нового портфеля.
-
-    :param message: Сообщение пользователя.
-    :param action: Действие при создании портфеля.
-    """
-
-    # Вернуться в главное меню
-    if message.text == "/main_menu":
-        
-        # Возвращаемся в главное меню
-        main_menu(message, "main_menu")
-    
-    # Начало создания нового портфеля
-    elif message.text == "/create_new_portfolio":
-        
-        # Выводим сообщение с просьбой ввести имя нового портфеля
-        user_input = bot.send_message(message.chat.id, text.ask_new_portfolio_name)
-
-        # Отправляем ответ пользователя текущей функции, указывая, что реализуется действие задания имени портфелю
-        bot.register_next_step_handler(user_input, create_new_portfolio, "set_new_portfolio_name")
-
-    # Задание имени портфеля
-    elif action == "set_new_portfolio_name":
-        
-        # Получаем имя нового портфеля
-        new_portfolio_name = message.text
-
-        # Добавляем новый портфель в базу данных и получаем результат
-        result = portfolio_database.add_new_portfolio(new_portfolio_name, message.from_user.id)
-
-        # Если добавление портфеля прошло успешно
-        if result == 0:
-            
-            # Отправляем пользователю сообщение об успешном создании портфеля
-            bot.send_message(message.chat.id, 
-                             text.successful_new_portfolio_creation.format(new_portfolio_name = new_portfolio_name))
-
-            # Возвращаемся в главное меню
-            main_menu(message, "main_menu")
-        
-        # Если портфель с таким именем уже есть у пользователя
-        elif result == 1:
-            
-            # Отправляем пользователю сообщение о повторяющемся имени портфеля
-            user_input = bot.send_message(message.chat.id, text.repeated_portfolio_name_error)
-
-            # Повторяем цикл задания имени портфеля
-            bot.register_next_step_handler(user_input, create_new_portfolio, "set_new_portfolio_name")
-
-
-def delete_portfolio(message: telebot.types.Message, action: tp.Union[str, None] = None) -> None:
-    """
-    Функция для удаления доступного портфеля.
-
-    :param message: Сообщение пользователя.
-    :param action: Действие при удалении портфеля.
-    """
-    
-    # Начало процесса удаления портфеля
-    if message.text == "/delete_portfolio":
-        pass
-
-
+    # Отправляем ответы, оставшиеся в очереди, сохраняем сессии пользователей на диск, чтобы не потерять их
+    # состояние при перезапуске, и закрываем базу данных (с фиксацией операций, ожидающих групповой фиксации)
+    job_scheduler.close()
+    if price_feed is not None:
+        price_feed.stop()
+    send_scheduler.close(timeout=30.0)
+    session_store.close()
+    portfolio_database.close()
+    metrics_server.close()
+    if profiler is not None:
+        profiler.stop()
@@ -0,0 +1,520 @@
+# Импорты библиотек
+import bisect
+import collections
+import functools
+import math
+import sys
+import threading
+import time
+import typing as tp
+
+# Границы интервалов гистограмм задержек по-умолчанию (в секундах: от 50 мкс до 10 с)
+DEFAULT_BUCKETS: tuple[float, ...] = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                                      0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Границы интервалов гистограммы длительности фоновых заданий (в секундах: от 1 мс до 30 минут)
+JOB_BUCKETS: tuple[float, ...] = (0.001, 0.01, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 600.0, 1800.0)
+
+# Тип результата измеряемой функции
+T = tp.TypeVar("T")
+
+
+def format_labels(label_names: tuple[str, ...], label_values: tuple[str, ...], extra: str = "") -> str:
+    """
+    Функция для форматирования меток метрики в текстовом формате Prometheus.
+
+    :param label_names: Имена меток.
+    :param label_values: Значения меток.
+    :param extra: Дополнительная метка, уже отформатированная (например, le="0.1" для интервала гистограммы).
+    :return: Строка вида {name="value",...} или пустая строка, если меток нет.
+    """
+
+    labels = [f'{name}="' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+              for name, value in zip(label_names, label_values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def format_value(value: float) -> str:
+    """
+    Функция для форматирования значения метрики в текстовом формате Prometheus.
+
+    :param value: Значение.
+    :return: Строка со значением.
+    """
+
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class ThreadShards:
+    """
+    Класс для хранения отдельной копии данных метрики для каждого потока.
+    (Поток изменяет только свою копию, поэтому обновление метрики не требует блокировки,
+    а копии разных потоков суммируются только при чтении метрики).
+    """
+
+    def __init__(self, shard_factory: tp.Callable[[], tp.Any]) -> None:
+        """
+        Функция для инициализации хранилища копий.
+
+        :param shard_factory: Функция для создания копии данных нового потока.
+        """
+
+        self.shard_factory = shard_factory
+        self.local = threading.local()
+
+        # Копии всех потоков (копия завершившегося потока остаётся, чтобы не потерять его данные)
+        self.shards: list[tp.Any] = []
+        self.lock = threading.Lock()
+
+    def get(self) -> tp.Any:
+        """
+        Функция для получения копии данных текущего потока.
+
+        :return: Копия данных.
+        """
+
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = self.local.shard = self.shard_factory()
+            with self.lock:
+                self.shards.append(shard)
+            return shard
+
+    def all(self) -> list[tp.Any]:
+        """
+        Функция для получения копий данных всех потоков.
+
+        :return: Список копий.
+        """
+
+        with self.lock:
+            return list(self.shards)
+
+
+class Counter:
+    """
+    Класс счётчика с метками (например, количество переходов конечного автомата по состоянию и команде).
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...] = ()) -> None:
+        """
+        Функция для инициализации счётчика.
+
+        :param name: Имя метрики.
+        :param help_text: Описание метрики.
+        :param label_names: Имена меток.
+        """
+
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+
+        # У каждого потока свой словарь значений: значения меток -> значение счётчика
+        # (Обычный словарь, а не collections.Counter: изменение значения в подклассе словаря заметно медленнее)
+        self.shards = ThreadShards(dict)
+
+    def inc(self, label_values: tuple[str, ...] = (), amount: float = 1) -> None:
+        """
+        Функция для увеличения счётчика.
+
+        :param label_values: Значения меток (в порядке имён меток).
+        :param amount: Величина увеличения.
+        """
+
+        # (Копия текущего потока берётся напрямую, без вызова ThreadShards.get: счётчик изменяется при каждом
+        # сообщении)
+        try:
+            shard = self.shards.local.shard
+        except AttributeError:
+            shard = self.shards.get()
+        shard[label_values] = shard.get(label_values, 0) + amount
+
+    def get_values(self) -> dict[tuple[str, ...], float]:
+        """
+        Функция для получения значений счётчика.
+
+        :return: Словарь {значения меток: значение счётчика}.
+        """
+
+        values: collections.Counter[tuple[str, ...]] = collections.Counter()
+        for shard in self.shards.all():
+            values.update(dict(shard))
+        return dict(values)
+
+    def render(self) -> list[str]:
+        """
+        Функция для получения строк метрики в текстовом формате Prometheus.
+
+        :return: Список строк.
+        """
+
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self.get_values().items()):
+            lines.append(f"{self.name}{format_labels(self.label_names, label_values)} {format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Класс гистограммы с метками (например, задержки запросов к базе данных по методам).
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...] = (),
+                 buckets: tp.Sequence[float] = DEFAULT_BUCKETS) -> None:
+        """
+        Функция для инициализации гистограммы.
+
+        :param name: Имя метрики.
+        :param help_text: Описание метрики.
+        :param label_names: Имена меток.
+        :param buckets: Возрастающие верхние границы интервалов (интервал +Inf добавляется автоматически).
+        """
+
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+
+        # У каждого потока свой словарь: значения меток -> [количество по интервалам..., сумма значений]
+        # (Последний интервал - +Inf, поэтому общее количество - это сумма количеств по всем интервалам)
+        self.shards = ThreadShards(dict)
+
+    def observe(self, value: float, label_values: tuple[str, ...] = ()) -> None:
+        """
+        Функция для добавления значения в гистограмму.
+
+        :param value: Значение (например, задержка в секундах).
+        :param label_values: Значения меток (в порядке имён меток).
+        """
+
+        try:
+            shard = self.shards.local.shard
+        except AttributeError:
+            shard = self.shards.get()
+        counts = shard.get(label_values)
+        if counts is None:
+            counts = shard[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def get_values(self) -> dict[tuple[str, ...], list[float]]:
+        """
+        Функция для получения значений гистограммы.
+
+        :return: Словарь {значения меток: [количество по интервалам (не накопленное)..., сумма значений]}.
+        """
+
+        values: dict[tuple[str, ...], list[float]] = {}
+        for shard in self.shards.all():
+            for label_values, counts in list(shard.items()):
+                total = values.setdefault(label_values, [0] * len(counts))
+                for index, count in enumerate(counts):
+                    total[index] += count
+        return values
+
+    def render(self) -> list[str]:
+        """
+        Функция для получения строк метрики в текстовом формате Prometheus.
+
+        :return: Список строк.
+        """
+
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, counts in sorted(self.get_values().items()):
+            cumulative_count = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative_count += count
+                labels = format_labels(self.label_names, label_values, f'le="{format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative_count}")
+            labels = format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative_count}")
+        return lines
+
+
+class Gauge:
+    """
+    Класс метрики-индикатора, значение которой вычисляется при чтении (например, количество сессий в памяти).
+    """
+
+    def __init__(self, name: str, help_text: str, callback: tp.Callable[[], float]) -> None:
+        """
+        Функция для инициализации индикатора.
+
+        :param name: Имя метрики.
+        :param help_text: Описание метрики.
+        :param callback: Функция для получения текущего значения.
+        """
+
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+
+    def render(self) -> list[str]:
+        """
+        Функция для получения строк метрики в текстовом формате Prometheus.
+
+        :return: Список строк.
+        """
+
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge",
+                f"{self.name} {format_value(self.callback())}"]
+
+
+class MetricsRegistry:
+    """
+    Класс реестра метрик: хранит метрики и выводит их в текстовом формате Prometheus.
+    """
+
+    def __init__(self) -> None:
+        self.metrics: dict[str, tp.Union[Counter, Histogram, Gauge]] = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric: tp.Union[Counter, Histogram, Gauge]) -> tp.Any:
+        """
+        Функция для добавления метрики в реестр.
+
+        :param metric: Метрика.
+        :return: Та же метрика.
+        """
+
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, label_names: tuple[str, ...] = ()) -> Counter:
+        """
+        Функция для создания и регистрации счётчика (параметры - как у Counter).
+        """
+
+        return self.register(Counter(name, help_text, label_names))
+
+    def histogram(self, name: str, help_text: str, label_names: tuple[str, ...] = (),
+                  buckets: tp.Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """
+        Функция для создания и регистрации гистограммы (параметры - как у Histogram).
+        """
+
+        return self.register(Histogram(name, help_text, label_names, buckets))
+
+    def gauge(self, name: str, help_text: str, callback: tp.Callable[[], float]) -> Gauge:
+        """
+        Функция для создания и регистрации индикатора (параметры - как у Gauge).
+        """
+
+        return self.register(Gauge(name, help_text, callback))
+
+    def gauges_from_metrics(self, prefix: str, get_metrics: tp.Callable[[], dict[str, float]]) -> None:
+        """
+        Функция для регистрации индикаторов по словарю метрик компонента (например, SessionStore.get_metrics).
+
+        :param prefix: Префикс имён метрик (например, bot_session_store).
+        :param get_metrics: Функция компонента, возвращающая словарь {имя метрики: значение}.
+        """
+
+        for key in get_metrics():
+            self.gauge(f"{prefix}_{key}", f"{prefix} {key}", lambda key=key: get_metrics()[key])
+
+    def render(self) -> str:
+        """
+        Функция для вывода всех метрик в текстовом формате Prometheus.
+
+        :return: Текст с метриками.
+        """
+
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines: list[str] = []
+        for metric in metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+class BotMetrics:
+    """
+    Класс метрик горячего пути бота: обработка сообщений, запросы к базе данных и отправка ответов.
+    (Один экземпляр передаётся компонентам бота, которые без него не тратят время на измерения).
+    """
+
+    def __init__(self, registry: tp.Optional[MetricsRegistry] = None) -> None:
+        """
+        Функция для создания метрик бота.
+
+        :param registry: Реестр метрик (None - новый реестр).
+        """
+
+        self.registry = registry if registry is not None else MetricsRegistry()
+
+        # Задержка обработки сообщения сессией (BotChatSession.processing) и переходы конечного автомата
+        self.processing_seconds = self.registry.histogram(
+            "bot_processing_seconds", "Время обработки сообщения сессией чата")
+        self.transitions = self.registry.counter(
+            "bot_fsm_transitions_total", "Количество переходов конечного автомата по состоянию и команде",
+            ("state", "command"))
+
+        # Задержка методов базы данных портфелей и фиксации транзакций
+        self.database_seconds = self.registry.histogram(
+            "bot_database_seconds", "Время выполнения методов базы данных портфелей", ("method",))
+        self.commit_seconds = self.registry.histogram(
+            "bot_database_commit_seconds", "Время фиксации транзакций базы данных портфелей", ("mode",))
+
+        # Задержка отправки сообщения в Telegram
+        self.send_message_seconds = self.registry.histogram(
+            "bot_send_message_seconds", "Время отправки сообщения в Telegram", ("outcome",))
+
+        # Длительность фоновых заданий (JobScheduler)
+        self.job_seconds = self.registry.histogram(
+            "bot_job_seconds", "Время выполнения фоновых заданий", ("job", "outcome"), JOB_BUCKETS)
+
+    def watch_session_store(self, get_session_count: tp.Callable[[], int]) -> None:
+        """
+        Функция для регистрации индикатора количества сессий в памяти.
+
+        :param get_session_count: Функция для получения количества сессий (например, SessionStore.__len__).
+        """
+
+        self.registry.gauge("bot_sessions", "Количество сессий чатов в памяти", get_session_count)
+
+    def timed_send(self, send: tp.Callable[..., T]) -> tp.Callable[..., T]:
+        """
+        Функция для обёртки функции отправки сообщения измерением её времени.
+
+        :param send: Функция отправки сообщения (например, TeleBot.send_message).
+        :return: Функция с тем же поведением, записывающая время отправки в гистограмму.
+        """
+
+        histogram = self.send_message_seconds
+
+        @functools.wraps(send)
+        def timed_send(*args: tp.Any, **kwargs: tp.Any) -> T:
+            start_time = time.perf_counter()
+            outcome = "error"
+            try:
+                result = send(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                histogram.observe(time.perf_counter() - start_time, (outcome,))
+
+        return timed_send
+
+
+def timed_method(method: tp.Callable[..., T]) -> tp.Callable[..., T]:
+    """
+    Декоратор метода базы данных портфелей, записывающий время его выполнения в гистограмму BotMetrics.
+    (Если метрики у базы данных не заданы, то метод вызывается без измерения).
+
+    :param method: Метод класса с атрибутом metrics.
+    :return: Метод с измерением времени.
+    """
+
+    label_values = (method.__name__,)
+
+    @functools.wraps(method)
+    def wrapper(self: tp.Any, *args: tp.Any, **kwargs: tp.Any) -> T:
+        metrics: tp.Optional[BotMetrics] = self.metrics
+        if metrics is None:
+            return method(self, *args, **kwargs)
+        start_time = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            metrics.database_seconds.observe(time.perf_counter() - start_time, label_values)
+
+    return wrapper
+
+
+class SamplingProfiler:
+    """
+    Класс выборочного профилировщика: фоновый поток периодически снимает стеки всех потоков процесса
+    и считает, сколько раз встретился каждый стек (формат «свёрнутых стеков» для построения flame graph).
+    (Профилировщик не вмешивается в выполнение кода, поэтому нагрузка зависит только от частоты выборки).
+    """
+
+    def __init__(self, interval: float = 0.01, max_depth: int = 64) -> None:
+        """
+        Функция для инициализации профилировщика.
+
+        :param interval: Интервал между выборками в секундах.
+        :param max_depth: Максимальная глубина сохраняемого стека.
+        """
+
+        self.interval = interval
+        self.max_depth = max_depth
+
+        # Количество выборок для каждого стека ("функция;функция;..." от внешней к внутренней)
+        self.stacks: collections.Counter[str] = collections.Counter()
+        self.sample_count = 0
+        self.lock = threading.Lock()
+
+        self.stop_event = threading.Event()
+        self.thread: tp.Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Функция для запуска фонового потока выборки.
+        """
+
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="sampling_profiler", daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        """
+        Функция фонового потока: снимает стеки всех потоков, кроме собственного, с заданным интервалом.
+        """
+
+        own_thread_id = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            samples = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread_id:
+                    continue
+                names: list[str] = []
+                while frame is not None and len(names) < self.max_depth:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                samples.append(";".join(reversed(names)))
+            with self.lock:
+                self.stacks.update(samples)
+                self.sample_count += 1
+
+    def stop(self) -> None:
+        """
+        Функция для остановки фонового потока выборки (собранные стеки сохраняются).
+        """
+
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+
+    def render_folded(self) -> str:
+        """
+        Функция для вывода собранных стеков в формате «свёрнутых стеков» (стек и количество выборок в строке).
+
+        :return: Текст со стеками, упорядоченными по убыванию количества выборок.
+        """
+
+        with self.lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def reset(self) -> None:
+        """
+        Функция для удаления собранных стеков.
+        """
+
+        with self.lock:
+            self.stacks.clear()
+            self.sample_count = 0
@@ -0,0 +1,100 @@
+# Импорты библиотек
+import http.server
+import threading
+import typing as tp
+
+# Импорты файлов
+from metrics import MetricsRegistry, SamplingProfiler
+
+
+class MetricsServer(http.server.ThreadingHTTPServer):
+    """
+    Локальный HTTP-сервер метрик: /metrics - метрики в текстовом формате Prometheus,
+    /profile - стеки выборочного профилировщика (если он задан).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], registry: MetricsRegistry,
+                 profiler: tp.Optional[SamplingProfiler] = None) -> None:
+        """
+        Функция для инициализации сервера.
+
+        :param address: Адрес и порт сервера (по-умолчанию сервер должен слушать только локальный адрес).
+        :param registry: Реестр метрик.
+        :param profiler: Выборочный профилировщик (None - /profile недоступен).
+        """
+
+        self.registry = registry
+        self.profiler = profiler
+        self.thread: tp.Optional[threading.Thread] = None
+        super().__init__(address, MetricsRequestHandler)
+
+    def start(self) -> None:
+        """
+        Функция для запуска сервера в фоновом потоке.
+        """
+
+        self.thread = threading.Thread(target=self.serve_forever, name="metrics_server", daemon=True)
+        self.thread.start()
+
+    def close(self) -> None:
+        """
+        Функция для остановки сервера.
+        """
+
+        if self.thread is not None:
+            self.shutdown()
+            self.thread.join()
+            self.thread = None
+        self.server_close()
+
+
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Обработчик запросов сервера метрик.
+    """
+
+    server: MetricsServer
+
+    def do_GET(self) -> None:
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            body = self.server.registry.render()
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/profile" and self.server.profiler is not None:
+            body = self.server.profiler.render_folded()
+            content_type = "text/plain; charset=utf-8"
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: tp.Any) -> None:
+        # Не засоряем вывод логами каждого запроса
+        pass
+
+
+def start_metrics_server(registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9464,
+                         profiler: tp.Optional[SamplingProfiler] = None) -> MetricsServer:
+    """
+    Функция для запуска локального сервера метрик в фоновом потоке.
+
+    :param registry: Реестр метрик.
+    :param host: Адрес сервера (по-умолчанию - только локальные подключения).
+    :param port: Порт сервера (0 - любой свободный порт).
+    :param profiler: Выборочный профилировщик (None - /profile недоступен).
+    :return: Запущенный сервер.
+    """
+
+    server = MetricsServer((host, port), registry, profiler)
+    server.start()
+    return server
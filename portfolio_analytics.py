@@ -0,0 +1,900 @@
+# Импорты библиотек
+import array
+import bisect
+import threading
+import typing as tp
+
+# Импорты файлов для задания типов
+if tp.TYPE_CHECKING:
+    from portfolio_database import PortfolioDatabase
+
+# Стоимость покупки, меньше которой доходность не считается (портфель пуст или позиции проданы)
+MIN_COST_BASIS = 1e-9
+
+# Доля портфелей, при изменении стоимости которых рейтинги строятся заново сортировкой, а не обновляются по одному
+# (перестановка портфеля в четырёх рейтингах по одному обходится примерно в 6 раз дороже, чем его доля
+# в построении рейтингов сортировкой)
+REBUILD_FRACTION = 0.15
+
+
+class SortedRanking:
+    """
+    Класс упорядоченного индекса рейтинга: элементы упорядочены по убыванию оценки (при равной оценке - по элементу).
+    (Элементы хранятся в отсортированных блоках ограниченного размера, а размеры блоков - в дереве Фенвика, поэтому
+    изменение оценки, место элемента и элемент по месту находятся за O(log n), без пересортировки всего индекса).
+    """
+
+    def __init__(self, load: int = 1000) -> None:
+        """
+        Функция для инициализации индекса.
+
+        :param load: Размер блока (блок, выросший вдвое, делится пополам).
+        """
+
+        self.load = load
+
+        # Блоки: оценки со знаком минус (по возрастанию) и элементы в том же порядке
+        # (Оценки хранятся в массивах double: двоичный поиск по ним не обращается к разбросанным по памяти объектам)
+        self.bucket_scores: list[array.array] = []
+        self.bucket_items: list[list[tp.Any]] = []
+
+        # Последние ключи блоков (-оценка, элемент) для поиска блока
+        self.maxes: list[tuple[float, tp.Any]] = []
+
+        # Дерево Фенвика по размерам блоков (индексация с 1)
+        self.tree: list[int] = [0]
+
+        # Текущие оценки элементов
+        self.scores: dict[tp.Any, float] = {}
+
+    def set(self, item: tp.Any, score: float) -> None:
+        """
+        Функция для добавления элемента или изменения его оценки.
+
+        :param item: Элемент.
+        :param score: Оценка.
+        """
+
+        old_score = self.scores.get(item)
+        if old_score == score:
+            return
+        self.scores[item] = score
+        key = (-score, item)
+
+        if old_score is not None:
+            bucket_index = bisect.bisect_left(self.maxes, (-old_score, item))
+            scores = self.bucket_scores[bucket_index]
+            items = self.bucket_items[bucket_index]
+
+            # Если новый ключ остаётся в том же блоке (обычно оценка меняется ненамного), то переставляем его
+            # внутри блока: размеры блоков не меняются, поэтому дерево Фенвика не изменяется
+            if (bucket_index == 0 or self.maxes[bucket_index - 1] < key) and \
+                    (bucket_index == len(self.maxes) - 1 or
+                     key < (self.bucket_scores[bucket_index + 1][0], self.bucket_items[bucket_index + 1][0])):
+                position = self._position(scores, items, -old_score, item)
+                del scores[position]
+                del items[position]
+                position = self._position(scores, items, -score, item)
+                scores.insert(position, -score)
+                items.insert(position, item)
+                self.maxes[bucket_index] = (scores[-1], items[-1])
+                return
+
+            self._remove(bucket_index, -old_score, item)
+        self._insert(key)
+
+    def discard(self, item: tp.Any) -> None:
+        """
+        Функция для удаления элемента (если он есть в индексе).
+
+        :param item: Элемент.
+        """
+
+        score = self.scores.pop(item, None)
+        if score is not None:
+            self._remove(bisect.bisect_left(self.maxes, (-score, item)), -score, item)
+
+    def rebuild(self, scores: dict[tp.Any, float]) -> None:
+        """
+        Функция для построения индекса заново одной сортировкой (при загрузке и полном пересчёте).
+
+        :param scores: Оценки элементов (словарь переходит во владение индекса).
+        """
+
+        # Сортируем элементы только по оценке (сравнение чисел быстрее сравнения кортежей),
+        # а затем упорядочиваем по элементу группы элементов с равной оценкой
+        items = sorted(scores, key=scores.__getitem__, reverse=True)
+        negative_scores = array.array("d", [-scores[item] for item in items])
+        if len(set(negative_scores)) < len(items):
+            start = 0
+            for end in range(1, len(items) + 1):
+                if end == len(items) or negative_scores[end] != negative_scores[start]:
+                    if end - start > 1:
+                        items[start:end] = sorted(items[start:end])
+                    start = end
+
+        starts = range(0, len(items), self.load)
+        self.bucket_scores = [negative_scores[start:start + self.load] for start in starts]
+        self.bucket_items = [items[start:start + self.load] for start in starts]
+        self.maxes = [(bucket_scores[-1], bucket_items[-1])
+                      for bucket_scores, bucket_items in zip(self.bucket_scores, self.bucket_items)]
+        self.scores = scores
+        self._rebuild_tree()
+
+    def rank(self, item: tp.Any) -> tp.Optional[int]:
+        """
+        Функция для получения места элемента (O(log n)).
+
+        :param item: Элемент.
+        :return: Место элемента, начиная с 0, или None, если элемента нет в индексе.
+        """
+
+        score = self.scores.get(item)
+        if score is None:
+            return None
+        bucket_index = bisect.bisect_left(self.maxes, (-score, item))
+        return self._prefix(bucket_index) + self._position(self.bucket_scores[bucket_index],
+                                                           self.bucket_items[bucket_index], -score, item)
+
+    def score_at(self, position: int) -> float:
+        """
+        Функция для получения оценки элемента на месте position (O(log n)).
+
+        :param position: Место, начиная с 0.
+        :return: Оценка.
+        """
+
+        bucket_index, offset = self._locate(position)
+        return -self.bucket_scores[bucket_index][offset]
+
+    def items(self, start: int = 0, count: int = 10) -> list[tuple[tp.Any, float]]:
+        """
+        Функция для получения элементов на местах [start, start + count).
+
+        :param start: Первое место, начиная с 0.
+        :param count: Количество элементов.
+        :return: Список (элемент, оценка) по убыванию оценки.
+        """
+
+        result: list[tuple[tp.Any, float]] = []
+        if start >= len(self.scores) or count <= 0:
+            return result
+
+        bucket_index, offset = self._locate(start)
+        while bucket_index < len(self.maxes) and len(result) < count:
+            end = offset + count - len(result)
+            for negative_score, item in zip(self.bucket_scores[bucket_index][offset:end],
+                                            self.bucket_items[bucket_index][offset:end]):
+                result.append((item, -negative_score))
+            bucket_index += 1
+            offset = 0
+        return result
+
+    def __len__(self) -> int:
+        """
+        Функция для получения количества элементов.
+        """
+
+        return len(self.scores)
+
+    def __contains__(self, item: tp.Any) -> bool:
+        """
+        Функция для проверки, есть ли элемент в индексе.
+        """
+
+        return item in self.scores
+
+    @staticmethod
+    def _position(scores: array.array, items: list[tp.Any], negative_score: float, item: tp.Any) -> int:
+        """
+        Функция для поиска места ключа в блоке (элементы сравниваются только при равных оценках).
+
+        :param scores: Оценки блока со знаком минус.
+        :param items: Элементы блока.
+        :param negative_score: Оценка со знаком минус.
+        :param item: Элемент.
+        :return: Место ключа в блоке.
+        """
+
+        position = bisect.bisect_left(scores, negative_score)
+        if position < len(scores) and scores[position] == negative_score and items[position] != item:
+            position = bisect.bisect_left(items, item, position, bisect.bisect_right(scores, negative_score, position))
+        return position
+
+    def _insert(self, key: tuple[float, tp.Any]) -> None:
+        """
+        Функция для добавления ключа в блок (с делением переполненного блока).
+
+        :param key: Ключ (-оценка, элемент).
+        """
+
+        negative_score, item = key
+        if not self.maxes:
+            self.bucket_scores.append(array.array("d", [negative_score]))
+            self.bucket_items.append([item])
+            self.maxes.append(key)
+            self._rebuild_tree()
+            return
+
+        bucket_index = min(bisect.bisect_left(self.maxes, key), len(self.maxes) - 1)
+        scores = self.bucket_scores[bucket_index]
+        items = self.bucket_items[bucket_index]
+        position = self._position(scores, items, negative_score, item)
+        scores.insert(position, negative_score)
+        items.insert(position, item)
+        self.maxes[bucket_index] = (scores[-1], items[-1])
+
+        # Деление блока меняет нумерацию блоков, поэтому дерево строится заново (раз на load добавлений)
+        if len(items) > 2 * self.load:
+            self.bucket_scores[bucket_index:bucket_index + 1] = [scores[:self.load], scores[self.load:]]
+            self.bucket_items[bucket_index:bucket_index + 1] = [items[:self.load], items[self.load:]]
+            self.maxes[bucket_index:bucket_index + 1] = [(scores[self.load - 1], items[self.load - 1]),
+                                                         (scores[-1], items[-1])]
+            self._rebuild_tree()
+        else:
+            self._tree_add(bucket_index, 1)
+
+    def _remove(self, bucket_index: int, negative_score: float, item: tp.Any) -> None:
+        """
+        Функция для удаления ключа из блока (пустой блок удаляется).
+
+        :param bucket_index: Номер блока, в котором находится ключ.
+        :param negative_score: Оценка со знаком минус.
+        :param item: Элемент.
+        """
+
+        scores = self.bucket_scores[bucket_index]
+        items = self.bucket_items[bucket_index]
+        position = self._position(scores, items, negative_score, item)
+        del scores[position]
+        del items[position]
+
+        if items:
+            self.maxes[bucket_index] = (scores[-1], items[-1])
+            self._tree_add(bucket_index, -1)
+        else:
+            del self.bucket_scores[bucket_index]
+            del self.bucket_items[bucket_index]
+            del self.maxes[bucket_index]
+            self._rebuild_tree()
+
+    def _rebuild_tree(self) -> None:
+        """
+        Функция для построения дерева Фенвика по размерам блоков (O(количество блоков)).
+        """
+
+        tree = [0] * (len(self.bucket_items) + 1)
+        for index, items in enumerate(self.bucket_items, 1):
+            tree[index] += len(items)
+            parent = index + (index & -index)
+            if parent < len(tree):
+                tree[parent] += tree[index]
+        self.tree = tree
+
+    def _tree_add(self, bucket_index: int, delta: int) -> None:
+        """
+        Функция для изменения размера блока в дереве Фенвика.
+
+        :param bucket_index: Номер блока, начиная с 0.
+        :param delta: Изменение размера.
+        """
+
+        index = bucket_index + 1
+        while index < len(self.tree):
+            self.tree[index] += delta
+            index += index & -index
+
+    def _prefix(self, bucket_index: int) -> int:
+        """
+        Функция для получения количества ключей в блоках перед блоком bucket_index.
+
+        :param bucket_index: Номер блока, начиная с 0.
+        :return: Количество ключей.
+        """
+
+        total = 0
+        while bucket_index > 0:
+            total += self.tree[bucket_index]
+            bucket_index -= bucket_index & -bucket_index
+        return total
+
+    def _locate(self, position: int) -> tuple[int, int]:
+        """
+        Функция для поиска блока, в котором находится ключ на месте position (спуском по дереву Фенвика).
+
+        :param position: Место, начиная с 0 (меньше количества элементов).
+        :return: Номер блока и место ключа в блоке.
+        """
+
+        if not 0 <= position < len(self.scores):
+            raise IndexError("Место вне рейтинга")
+
+        bucket_index = 0
+        step = 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            next_index = bucket_index + step
+            if next_index < len(self.tree) and self.tree[next_index] <= position:
+                bucket_index = next_index
+                position -= self.tree[next_index]
+            step >>= 1
+        return bucket_index, position
+
+
+class PortfolioRank(tp.NamedTuple):
+    """
+    Портфель в рейтинге по стоимости.
+    """
+
+    # Место в рейтинге (начиная с 1)
+    rank: int
+
+    # ID, имя портфеля и ID владельца
+    portfolio_id: str
+    portfolio_name: str
+    user_id: int
+
+    # Стоимость, прибыль и доходность портфеля (доля стоимости покупки: 0.1 - 10%)
+    value: float
+    pnl: float
+    return_rate: float
+
+
+class UserSummary(tp.NamedTuple):
+    """
+    Сводка по всем портфелям пользователя.
+    """
+
+    # Количество портфелей, их суммарная стоимость, стоимость покупки, прибыль и доходность
+    portfolio_count: int
+    value: float
+    cost_basis: float
+    pnl: float
+    return_rate: float
+
+    # Место пользователя по суммарной стоимости портфелей (начиная с 1) и количество пользователей в рейтинге
+    rank: int
+    user_count: int
+
+    # Процент пользователей с меньшей доходностью (None - у пользователя нет купленных бумаг)
+    return_percentile: tp.Optional[float]
+
+
+class PortfolioAnalytics:
+    """
+    Класс агрегатов для рейтингов портфелей: стоимость и доходность каждого портфеля, суммы по пользователям
+    и упорядоченные индексы по ним.
+    (Агрегаты изменяются на разницу при каждой сделке и изменении цены, поэтому рейтинг не требует просмотра
+    portfolio_info и holdings: изменение цены бумаги пересчитывает только портфели, в которых она есть).
+    """
+
+    def __init__(self, load: int = 1000) -> None:
+        """
+        Функция для инициализации агрегатов.
+
+        :param load: Размер блока упорядоченных индексов.
+        """
+
+        # Портфели: ID портфеля -> [имя портфеля, ID владельца, стоимость, стоимость покупки]
+        self.portfolios: dict[str, list] = {}
+
+        # Позиции портфелей: ID портфеля -> {тикер: [количество бумаг, стоимость покупки]}
+        # и те же позиции по тикерам (тикер -> {ID портфеля: позиция}) для пересчёта при изменении цены
+        self.positions: dict[str, dict[str, list[float]]] = {}
+        self.holders: dict[str, dict[str, list[float]]] = {}
+
+        # Суммы по пользователям: ID пользователя -> [стоимость, стоимость покупки, количество портфелей]
+        self.users: dict[int, list[float]] = {}
+
+        # Последние известные цены (позиции без цены оцениваются по стоимости покупки, как при оценке портфелей)
+        self.prices: dict[str, float] = {}
+
+        # Рейтинги портфелей по стоимости и доходности и пользователей по суммарной стоимости и доходности
+        self.portfolio_values = SortedRanking(load)
+        self.portfolio_returns = SortedRanking(load)
+        self.user_values = SortedRanking(load)
+        self.user_returns = SortedRanking(load)
+
+        # Блокировка агрегатов (их изменяют потоки обработки сообщений и поток котировок)
+        self.lock = threading.Lock()
+
+        # Состояние загрузки: загружены ли агрегаты, идёт ли загрузка, номер последней загрузки
+        # и изменения, отложенные до конца загрузки (функция изменения агрегатов, аргументы)
+        self.loaded = False
+        self.loading = False
+        self.load_generation = 0
+        self.pending: list[tuple[tp.Callable[..., None], tuple]] = []
+
+        # Счётчики для метрик
+        self.price_updates = 0
+        self.revalued_portfolios = 0
+        self.recomputes = 0
+        self.ranking_rebuilds = 0
+
+    #* Загрузка и полный пересчёт
+
+    def load(self, portfolio_database: 'PortfolioDatabase', prices: tp.Optional[dict[str, float]] = None) -> None:
+        """
+        Функция для загрузки портфелей и позиций из базы данных и полного расчёта агрегатов.
+        (Агрегаты строятся без блокировки и подменяются целиком, поэтому чтение рейтингов и изменения не ждут
+        загрузки: изменения, пришедшие во время неё, применяются после подмены и не искажают агрегаты - позиции
+        задаются целиком, а повторное добавление и удаление портфеля ничего не меняют).
+
+        :param portfolio_database: База данных портфелей.
+        :param prices: Словарь {тикер: цена} (None - последние известные цены).
+        """
+
+        self._load(portfolio_database, self._begin_load(prices))
+
+    def start_loading(self, portfolio_database: 'PortfolioDatabase') -> threading.Thread:
+        """
+        Функция для загрузки агрегатов в фоновом потоке (бот отвечает на сообщения, не дожидаясь загрузки,
+        а рейтинг становится доступен после неё).
+
+        :param portfolio_database: База данных портфелей.
+        :return: Поток загрузки.
+        """
+
+        generation = self._begin_load(None)
+        thread = threading.Thread(target=self._load, args=(portfolio_database, generation),
+                                  name="portfolio_analytics_load", daemon=True)
+        thread.start()
+        return thread
+
+    def _begin_load(self, prices: tp.Optional[dict[str, float]]) -> int:
+        """
+        Функция для начала загрузки: с этого момента изменения откладываются до подмены агрегатов.
+
+        :param prices: Словарь {тикер: цена} (None - последние известные цены).
+        :return: Номер загрузки (агрегаты подменяет только последняя начатая загрузка).
+        """
+
+        # Загруженные агрегаты остаются доступными до подмены (при перезагрузке рейтинг не пропадает)
+        with self.lock:
+            if prices is not None:
+                self.prices = dict(prices)
+            self.loading = True
+            self.pending = []
+            self.load_generation += 1
+            return self.load_generation
+
+    def _load(self, portfolio_database: 'PortfolioDatabase', generation: int) -> None:
+        """
+        Функция для построения агрегатов по базе данных и их подмены.
+
+        :param portfolio_database: База данных портфелей.
+        :param generation: Номер загрузки.
+        """
+
+        with self.lock:
+            loaded = PortfolioAnalytics(self.portfolio_values.load)
+            loaded.prices = dict(self.prices)
+
+        try:
+            loaded.portfolios = {portfolio_id: [portfolio_name, user_id, 0.0, 0.0]
+                                 for portfolio_id, portfolio_name, user_id in portfolio_database.iter_portfolios()}
+            for portfolio_id, symbol, quantity, cost_basis in portfolio_database.iter_holdings():
+                if portfolio_id in loaded.portfolios:
+                    position = [quantity, cost_basis]
+                    loaded.positions.setdefault(portfolio_id, {})[symbol] = position
+                    loaded.holders.setdefault(symbol, {})[portfolio_id] = position
+            loaded._recompute()
+        except BaseException:
+            with self.lock:
+                if generation == self.load_generation:
+                    self.loading = False
+                    self.pending = []
+            raise
+
+        with self.lock:
+            if generation != self.load_generation:
+                return
+
+            self.portfolios = loaded.portfolios
+            self.positions = loaded.positions
+            self.holders = loaded.holders
+            self.users = loaded.users
+            self.prices = loaded.prices
+            self.portfolio_values = loaded.portfolio_values
+            self.portfolio_returns = loaded.portfolio_returns
+            self.user_values = loaded.user_values
+            self.user_returns = loaded.user_returns
+            self.recomputes += 1
+
+            # Применяем изменения, пришедшие во время загрузки
+            for handler, args in self.pending:
+                handler(*args)
+            self.pending = []
+            self.loading = False
+            self.loaded = True
+
+    def recompute(self) -> None:
+        """
+        Функция для полного пересчёта агрегатов по позициям и последним ценам (O(n log n)).
+        (Устраняет накопленную погрешность сложения разниц с плавающей точкой).
+        """
+
+        with self.lock:
+            self._recompute()
+
+    def _recompute(self) -> None:
+        """
+        Функция для полного пересчёта агрегатов (вызывается под блокировкой).
+        """
+
+        prices = self.prices
+        users: dict[int, list[float]] = {}
+        for portfolio_id, portfolio in self.portfolios.items():
+            value = 0.0
+            cost_basis = 0.0
+            for symbol, (quantity, position_cost_basis) in self.positions.get(portfolio_id, {}).items():
+                price = prices.get(symbol)
+                value += quantity * price if price is not None else position_cost_basis
+                cost_basis += position_cost_basis
+            portfolio[2] = value
+            portfolio[3] = cost_basis
+
+            user = users.get(portfolio[1])
+            if user is None:
+                users[portfolio[1]] = [value, cost_basis, 1]
+            else:
+                user[0] += value
+                user[1] += cost_basis
+                user[2] += 1
+        self.users = users
+        self._rebuild_rankings()
+        self.recomputes += 1
+
+    def _rebuild_rankings(self) -> None:
+        """
+        Функция для построения рейтингов заново по агрегатам портфелей и пользователей (вызывается под блокировкой).
+        """
+
+        users = self.users
+        self.portfolio_values.rebuild({portfolio_id: portfolio[2]
+                                       for portfolio_id, portfolio in self.portfolios.items()})
+        self.portfolio_returns.rebuild({portfolio_id: (portfolio[2] - portfolio[3]) / portfolio[3]
+                                        for portfolio_id, portfolio in self.portfolios.items()
+                                        if portfolio[3] > MIN_COST_BASIS})
+        self.user_values.rebuild({user_id: user[0] for user_id, user in users.items()})
+        self.user_returns.rebuild({user_id: (user[0] - user[1]) / user[1]
+                                   for user_id, user in users.items() if user[1] > MIN_COST_BASIS})
+
+    #* Инкрементальное обновление
+
+    def on_portfolio_added(self, portfolio_id: str, portfolio_name: str, user_id: int) -> None:
+        """
+        Функция для учёта нового портфеля.
+
+        :param portfolio_id: ID портфеля.
+        :param portfolio_name: Имя портфеля.
+        :param user_id: ID владельца.
+        """
+
+        self._dispatch(self._add_portfolio, portfolio_id, portfolio_name, user_id)
+
+    def on_portfolio_removed(self, portfolio_id: str) -> None:
+        """
+        Функция для учёта удаления портфеля.
+
+        :param portfolio_id: ID портфеля.
+        """
+
+        self._dispatch(self._remove_portfolio, portfolio_id)
+
+    def on_position_change(self, portfolio_id: str, symbol: str, quantity: float, cost_basis: float) -> None:
+        """
+        Функция для учёта позиции портфеля после сделки.
+
+        :param portfolio_id: ID портфеля.
+        :param symbol: Тикер.
+        :param quantity: Количество бумаг после сделки (0 - позиция закрыта).
+        :param cost_basis: Стоимость покупки позиции после сделки.
+        """
+
+        self._dispatch(self._change_position, portfolio_id, symbol, quantity, cost_basis)
+
+    def on_prices(self, prices: dict[str, float]) -> None:
+        """
+        Функция для учёта новых цен: пересчитываются только портфели, в которых есть бумаги с изменившейся ценой
+        (подходит как слушатель таблицы котировок QuoteCache.add_listener).
+
+        :param prices: Словарь {тикер: цена}.
+        """
+
+        with self.lock:
+            # До загрузки агрегатов только запоминаем цены для неё
+            if not self.loaded and not self.loading:
+                self.prices.update(prices)
+                return
+        self._dispatch(self._update_prices, dict(prices))
+
+    def _dispatch(self, handler: tp.Callable[..., None], *args: tp.Any) -> None:
+        """
+        Функция для применения изменения к агрегатам под блокировкой.
+        (Во время загрузки изменение откладывается до подмены агрегатов, а при перезагрузке ещё и применяется
+        к текущим агрегатам; до загрузки изменение не нужно: загрузка прочитает его из базы данных).
+
+        :param handler: Функция изменения агрегатов.
+        :param args: Аргументы функции.
+        """
+
+        with self.lock:
+            if self.loaded:
+                handler(*args)
+            if self.loading:
+                self.pending.append((handler, args))
+
+    def _add_portfolio(self, portfolio_id: str, portfolio_name: str, user_id: int) -> None:
+        """
+        Функция для добавления портфеля в агрегаты (вызывается под блокировкой).
+
+        :param portfolio_id: ID портфеля.
+        :param portfolio_name: Имя портфеля.
+        :param user_id: ID владельца.
+        """
+
+        if portfolio_id in self.portfolios:
+            return
+        portfolio = self.portfolios[portfolio_id] = [portfolio_name, user_id, 0.0, 0.0]
+        user = self.users.setdefault(user_id, [0.0, 0.0, 0])
+        user[2] += 1
+        self._rank(portfolio_id, portfolio, user)
+
+    def _remove_portfolio(self, portfolio_id: str) -> None:
+        """
+        Функция для удаления портфеля из агрегатов (вызывается под блокировкой).
+
+        :param portfolio_id: ID портфеля.
+        """
+
+        portfolio = self.portfolios.pop(portfolio_id, None)
+        if portfolio is None:
+            return
+
+        for symbol in self.positions.pop(portfolio_id, {}):
+            holders = self.holders[symbol]
+            del holders[portfolio_id]
+            if not holders:
+                del self.holders[symbol]
+        self.portfolio_values.discard(portfolio_id)
+        self.portfolio_returns.discard(portfolio_id)
+
+        user_id = portfolio[1]
+        user = self.users[user_id]
+        user[2] -= 1
+        if user[2] == 0:
+            del self.users[user_id]
+            self.user_values.discard(user_id)
+            self.user_returns.discard(user_id)
+            return
+        user[0] -= portfolio[2]
+        user[1] -= portfolio[3]
+        self._rank_user(user_id, user)
+
+    def _change_position(self, portfolio_id: str, symbol: str, quantity: float, cost_basis: float) -> None:
+        """
+        Функция для изменения позиции портфеля в агрегатах (вызывается под блокировкой).
+
+        :param portfolio_id: ID портфеля.
+        :param symbol: Тикер.
+        :param quantity: Количество бумаг после сделки (0 - позиция закрыта).
+        :param cost_basis: Стоимость покупки позиции после сделки.
+        """
+
+        portfolio = self.portfolios.get(portfolio_id)
+        if portfolio is None:
+            return
+
+        price = self.prices.get(symbol)
+        positions = self.positions.setdefault(portfolio_id, {})
+        position = positions.get(symbol)
+
+        # Вклад позиции в стоимость портфеля до сделки
+        value_delta = 0.0
+        cost_basis_delta = cost_basis
+        if position is not None:
+            value_delta -= position[0] * price if price is not None else position[1]
+            cost_basis_delta -= position[1]
+
+        # Закрытую позицию удаляем, остальные изменяем на месте (позиция общая с self.holders)
+        if quantity <= 0:
+            if position is not None:
+                del positions[symbol]
+                del self.holders[symbol][portfolio_id]
+        else:
+            if position is None:
+                position = positions[symbol] = [quantity, cost_basis]
+                self.holders.setdefault(symbol, {})[portfolio_id] = position
+            else:
+                position[0] = quantity
+                position[1] = cost_basis
+            value_delta += quantity * price if price is not None else cost_basis
+
+        self._apply(portfolio_id, portfolio, value_delta, cost_basis_delta)
+
+    def _update_prices(self, prices: dict[str, float]) -> None:
+        """
+        Функция для пересчёта агрегатов по новым ценам (вызывается под блокировкой).
+
+        :param prices: Словарь {тикер: цена}.
+        """
+
+        # Собираем изменения стоимости по портфелям, чтобы переставить в рейтинге каждый портфель один раз
+        value_deltas: dict[str, float] = {}
+        for symbol, price in prices.items():
+            old_price = self.prices.get(symbol)
+            if old_price == price:
+                continue
+            self.prices[symbol] = price
+
+            for portfolio_id, (quantity, cost_basis) in self.holders.get(symbol, {}).items():
+                value_delta = quantity * price - (quantity * old_price if old_price is not None else cost_basis)
+                value_deltas[portfolio_id] = value_deltas.get(portfolio_id, 0.0) + value_delta
+
+        # Если изменилась стоимость большой доли портфелей, то изменяем агрегаты и строим рейтинги заново
+        if len(value_deltas) > REBUILD_FRACTION * len(self.portfolios):
+            for portfolio_id, value_delta in value_deltas.items():
+                portfolio = self.portfolios[portfolio_id]
+                portfolio[2] += value_delta
+                self.users[portfolio[1]][0] += value_delta
+            self._rebuild_rankings()
+            self.ranking_rebuilds += 1
+        else:
+            for portfolio_id, value_delta in value_deltas.items():
+                self._apply(portfolio_id, self.portfolios[portfolio_id], value_delta, 0.0)
+
+        self.price_updates += 1
+        self.revalued_portfolios += len(value_deltas)
+
+    def _apply(self, portfolio_id: str, portfolio: list, value_delta: float, cost_basis_delta: float) -> None:
+        """
+        Функция для изменения стоимости портфеля и сумм его владельца на разницу (вызывается под блокировкой).
+
+        :param portfolio_id: ID портфеля.
+        :param portfolio: Агрегаты портфеля.
+        :param value_delta: Изменение стоимости.
+        :param cost_basis_delta: Изменение стоимости покупки.
+        """
+
+        portfolio[2] += value_delta
+        portfolio[3] += cost_basis_delta
+        user = self.users[portfolio[1]]
+        user[0] += value_delta
+        user[1] += cost_basis_delta
+        self._rank(portfolio_id, portfolio, user)
+
+    def _rank(self, portfolio_id: str, portfolio: list, user: list[float]) -> None:
+        """
+        Функция для обновления мест портфеля и его владельца в рейтингах (вызывается под блокировкой).
+
+        :param portfolio_id: ID портфеля.
+        :param portfolio: Агрегаты портфеля.
+        :param user: Суммы владельца.
+        """
+
+        self.portfolio_values.set(portfolio_id, portfolio[2])
+        if portfolio[3] > MIN_COST_BASIS:
+            self.portfolio_returns.set(portfolio_id, (portfolio[2] - portfolio[3]) / portfolio[3])
+        else:
+            self.portfolio_returns.discard(portfolio_id)
+        self._rank_user(portfolio[1], user)
+
+    def _rank_user(self, user_id: int, user: list[float]) -> None:
+        """
+        Функция для обновления мест пользователя в рейтингах (вызывается под блокировкой).
+
+        :param user_id: ID пользователя.
+        :param user: Суммы пользователя.
+        """
+
+        self.user_values.set(user_id, user[0])
+        if user[1] > MIN_COST_BASIS:
+            self.user_returns.set(user_id, (user[0] - user[1]) / user[1])
+        else:
+            self.user_returns.discard(user_id)
+
+    #* Чтение рейтингов
+
+    def get_top_portfolios(self, count: int = 10, start: int = 0) -> list[PortfolioRank]:
+        """
+        Функция для получения страницы рейтинга портфелей по стоимости.
+
+        :param count: Количество портфелей.
+        :param start: Первое место страницы (начиная с 0).
+        :return: Список портфелей по убыванию стоимости.
+        """
+
+        with self.lock:
+            return [self._portfolio_rank(start + offset + 1, portfolio_id)
+                    for offset, (portfolio_id, _) in enumerate(self.portfolio_values.items(start, count))]
+
+    def get_portfolio_rank(self, portfolio_id: str) -> tp.Optional[PortfolioRank]:
+        """
+        Функция для получения места портфеля в рейтинге по стоимости.
+
+        :param portfolio_id: ID портфеля.
+        :return: Портфель в рейтинге или None, если портфеля нет.
+        """
+
+        with self.lock:
+            rank = self.portfolio_values.rank(portfolio_id)
+            return self._portfolio_rank(rank + 1, portfolio_id) if rank is not None else None
+
+    def _portfolio_rank(self, rank: int, portfolio_id: str) -> PortfolioRank:
+        """
+        Функция для создания записи рейтинга портфеля (вызывается под блокировкой).
+
+        :param rank: Место (начиная с 1).
+        :param portfolio_id: ID портфеля.
+        :return: Портфель в рейтинге.
+        """
+
+        portfolio_name, user_id, value, cost_basis = self.portfolios[portfolio_id]
+        pnl = value - cost_basis
+        return PortfolioRank(rank, portfolio_id, portfolio_name, user_id, value, pnl,
+                             pnl / cost_basis if cost_basis > MIN_COST_BASIS else 0.0)
+
+    def get_user_summary(self, user_id: int) -> tp.Optional[UserSummary]:
+        """
+        Функция для получения сводки по портфелям пользователя.
+
+        :param user_id: ID пользователя.
+        :return: Сводка или None, если у пользователя нет портфелей.
+        """
+
+        with self.lock:
+            user = self.users.get(user_id)
+            if user is None:
+                return None
+
+            value, cost_basis, portfolio_count = user
+            pnl = value - cost_basis
+
+            # Процент пользователей с меньшей доходностью по месту пользователя в рейтинге доходности
+            return_percentile = None
+            return_rank = self.user_returns.rank(user_id)
+            if return_rank is not None:
+                lower_count = len(self.user_returns) - 1 - return_rank
+                return_percentile = lower_count / (len(self.user_returns) - 1) * 100 \
+                    if len(self.user_returns) > 1 else 100.0
+
+            return UserSummary(int(portfolio_count), value, cost_basis, pnl,
+                               pnl / cost_basis if cost_basis > MIN_COST_BASIS else 0.0,
+                               self.user_values.rank(user_id) + 1, len(self.user_values), return_percentile)
+
+    def get_return_percentiles(self, percentiles: tp.Iterable[float] = (10, 25, 50, 75, 90)) -> dict[float, float]:
+        """
+        Функция для получения процентилей доходности портфелей (каждый - за O(log n)).
+
+        :param percentiles: Процентили (от 0 до 100).
+        :return: Словарь {процентиль: доходность} (пустой, если ни в одном портфеле нет бумаг).
+        """
+
+        with self.lock:
+            count = len(self.portfolio_returns)
+            if count == 0:
+                return {}
+
+            # Рейтинг упорядочен по убыванию доходности, а процентиль отсчитывается от наименьшей доходности
+            return {percentile: self.portfolio_returns.score_at(count - 1 - round(percentile / 100 * (count - 1)))
+                    for percentile in percentiles}
+
+    def get_metrics(self) -> dict[str, int]:
+        """
+        Функция для получения метрик агрегатов.
+
+        :return: Словарь с количеством портфелей, пользователей, тикеров в позициях, обновлений цен,
+        пересчитанных при них портфелей, полных пересчётов, построений рейтингов заново при обновлении цен
+        и признаком загрузки агрегатов.
+        """
+
+        return {
+            "loaded": int(self.loaded),
+            "portfolios": len(self.portfolios),
+            "users": len(self.users),
+            "symbols": len(self.holders),
+            "price_updates": self.price_updates,
+            "revalued_portfolios": self.revalued_portfolios,
+            "recomputes": self.recomputes,
+            "ranking_rebuilds": self.ranking_rebuilds,
+        }
@@ -0,0 +1,172 @@
+# Импорты библиотек
+import collections
+import threading
+import typing as tp
+
+
+class PortfolioCache:
+    """
+    Класс для кэширования списков портфелей пользователей (имя портфеля -> ID портфеля) с вытеснением LRU.
+    (Список портфелей пользователя меняется редко, поэтому проверки наличия портфелей и повторов имён можно выполнять
+    без обращения к базе данных, а изменения портфелей сразу вносятся и в кэш).
+    """
+
+    def __init__(self, max_users: int = 10000, negative_caching: bool = True) -> None:
+        """
+        Функция для инициализации кэша.
+
+        :param max_users: Максимальное количество пользователей, списки портфелей которых хранятся в кэше.
+        :param negative_caching: Кэшировать ли пустые списки портфелей (пользователей без портфелей).
+        """
+
+        # Сохраняем параметры кэша
+        self.max_users = max_users
+        self.negative_caching = negative_caching
+
+        # Списки портфелей в порядке последнего обращения (ID пользователя -> {имя портфеля: ID портфеля})
+        self.portfolios: collections.OrderedDict[int, dict[str, str]] = collections.OrderedDict()
+
+        # Номер последнего изменения портфелей
+        # (Список, загруженный из базы данных до изменения, уже может быть устаревшим, поэтому не кэшируется)
+        self.version = 0
+
+        # Блокировка для работы из нескольких потоков
+        self.lock = threading.Lock()
+
+        # Счётчики для метрик
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: int) -> tp.Optional[dict[str, str]]:
+        """
+        Функция для получения списка портфелей пользователя из кэша.
+
+        :param user_id: ID пользователя.
+        :return: Словарь {имя портфеля: ID портфеля} (его нельзя изменять) или None, если пользователя нет в кэше.
+        """
+
+        with self.lock:
+            portfolios = self.portfolios.get(user_id)
+            if portfolios is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.portfolios.move_to_end(user_id)
+            return portfolios
+
+    def get_version(self) -> int:
+        """
+        Функция для получения номера последнего изменения портфелей (перед загрузкой списка из базы данных).
+
+        :return: Номер последнего изменения.
+        """
+
+        with self.lock:
+            return self.version
+
+    def put(self, user_id: int, portfolios: dict[str, str], version: int) -> None:
+        """
+        Функция для сохранения в кэш списка портфелей пользователя, загруженного из базы данных.
+
+        :param user_id: ID пользователя.
+        :param portfolios: Словарь {имя портфеля: ID портфеля}.
+        :param version: Номер последнего изменения, полученный перед загрузкой списка.
+        """
+
+        with self.lock:
+            # Если во время загрузки портфели изменились или список пуст без кэширования пустых списков, то не кэшируем
+            if version != self.version or (not portfolios and not self.negative_caching):
+                return
+
+            self.portfolios[user_id] = portfolios
+            self.portfolios.move_to_end(user_id)
+
+            # Вытесняем списки, к которым дольше всего не обращались
+            while len(self.portfolios) > self.max_users:
+                self.portfolios.popitem(last=False)
+                self.evictions += 1
+
+    def add(self, user_id: int, portfolio_name: str, portfolio_id: str) -> None:
+        """
+        Функция для добавления портфеля в кэш после его добавления в базу данных.
+
+        :param user_id: ID пользователя.
+        :param portfolio_name: Имя портфеля.
+        :param portfolio_id: ID портфеля.
+        """
+
+        with self.lock:
+            self.version += 1
+
+            # Словари из кэша могут использоваться другими потоками, поэтому не изменяем их, а заменяем копией
+            portfolios = self.portfolios.get(user_id)
+            if portfolios is not None:
+                self.portfolios[user_id] = {**portfolios, portfolio_name: portfolio_id}
+
+    def remove(self, user_id: int, portfolio_name: str) -> None:
+        """
+        Функция для удаления портфеля из кэша после его удаления из базы данных.
+
+        :param user_id: ID пользователя.
+        :param portfolio_name: Имя портфеля.
+        """
+
+        with self.lock:
+            self.version += 1
+
+            portfolios = self.portfolios.get(user_id)
+            if portfolios is not None:
+                portfolios = {name: portfolio_id for name, portfolio_id in portfolios.items() if name != portfolio_name}
+
+                # Пустой список без кэширования пустых списков не храним
+                if portfolios or self.negative_caching:
+                    self.portfolios[user_id] = portfolios
+                else:
+                    del self.portfolios[user_id]
+
+    def invalidate(self, user_id: int) -> None:
+        """
+        Функция для удаления списка портфелей пользователя из кэша (при следующем обращении он загрузится заново).
+
+        :param user_id: ID пользователя.
+        """
+
+        with self.lock:
+            self.version += 1
+            self.portfolios.pop(user_id, None)
+
+    def clear(self) -> None:
+        """
+        Функция для удаления всех списков портфелей из кэша (например, после массового добавления портфелей).
+        """
+
+        with self.lock:
+            self.version += 1
+            self.portfolios.clear()
+
+    def get_metrics(self) -> dict[str, tp.Union[int, float]]:
+        """
+        Функция для получения метрик кэша.
+
+        :return: Словарь с количеством попаданий, промахов, вытеснений, долей попаданий и количеством пользователей
+        в кэше.
+        """
+
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "users": len(self.portfolios),
+            }
+
+    def __len__(self) -> int:
+        """
+        Функция для получения количества пользователей в кэше.
+        """
+
+        return len(self.portfolios)
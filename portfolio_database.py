@@ -1,7 +1,42 @@
 # Импорты библиотек
+import contextlib
+import datetime
+import itertools
 import sqlite3
-import hashlib
-import secrets
+import threading
+import time
+import typing as tp
+
+# Импорты файлов
+from connection_pool import ConnectionPool
+from group_commit import GroupCommitWriter
+from metrics import BotMetrics, timed_method
+from portfolio_cache import PortfolioCache
+from portfolio_id_generator import PortfolioIdGenerator, TimeOrderedIdGenerator
+from schema_migrations import migrate
+
+# Импорты файлов для задания типов
+# (Модули оценки портфелей и истории цен используют NumPy, поэтому импортируются только при первом расчёте)
+if tp.TYPE_CHECKING:
+    from portfolio_analytics import PortfolioAnalytics
+    from portfolio_valuation import PositionSnapshot, PriceSource, Valuation
+    from price_history import Performance, PriceHistoryStore
+
+# Тип результата операции записи
+T = tp.TypeVar("T")
+
+
+class BatchLocal(threading.local):
+    """
+    Класс пакета операций потока (см. PortfolioDatabase.batch): у каждого потока свои значения атрибутов.
+    (Значения по-умолчанию заданы атрибутами класса, поэтому проверка пакета в потоке, который не выполнял
+    пакетов, не ищет отсутствующий атрибут через исключение, как getattr со значением по-умолчанию).
+    """
+
+    # Подключение с транзакцией пакета (None - поток не выполняет пакет) и изменения данных в памяти,
+    # ожидающие её фиксации
+    connection: tp.Optional[sqlite3.Connection] = None
+    after_commit: tp.Optional[list[tp.Callable[[], None]]] = None
 
 
 class PortfolioDatabase:
@@ -9,28 +44,67 @@ class PortfolioDatabase:
     Класс для реализации базы данных виртуальных инвестиционных портфелей.
     """
     
-    def __init__(self) -> None:
+    def __init__(self, db_path: str = "portfolios.db", pool_size: tp.Optional[int] = None,
+                 group_commit: bool = False, max_batch_size: int = 64, max_delay_ms: float = 0.0,
+                 pragmas: tp.Optional[dict[str, tp.Union[str, int]]] = None,
+                 id_generator: tp.Optional[PortfolioIdGenerator] = None, cache_size: int = 10000,
+                 negative_caching: bool = True, price_history: tp.Optional['PriceHistoryStore'] = None,
+                 metrics: tp.Optional[BotMetrics] = None,
+                 analytics: tp.Optional['PortfolioAnalytics'] = None) -> None:
         """
         Функция для инициализации класса.
+
+        :param db_path: Путь к файлу базы данных.
+        :param pool_size: Максимальное количество подключений к базе данных (None - отдельное подключение для
+        каждого потока).
+        :param group_commit: Фиксировать ли изменения портфелей группами (одной транзакцией на несколько операций).
+        :param max_batch_size: Количество операций, при накоплении которого группа фиксируется сразу.
+        :param max_delay_ms: Максимальное время в миллисекундах, которое операция ждёт фиксации группы
+        (0 - группа состоит из операций, накопившихся за время фиксации предыдущей группы).
+        :param pragmas: Дополнительные настройки подключений к базе данных.
+        :param id_generator: Генератор ID новых портфелей (по-умолчанию - упорядоченные по времени ID).
+        :param cache_size: Максимальное количество пользователей в кэше списков портфелей (0 - без кэша).
+        :param negative_caching: Кэшировать ли пустые списки портфелей (пользователей без портфелей).
+        :param price_history: Хранилище истории цен для расчёта доходности портфелей (None - расчёт недоступен).
+        :param metrics: Метрики бота для измерения времени методов и фиксаций (None - время не измеряется).
+        :param analytics: Агрегаты рейтингов портфелей, изменяемые после каждой операции с портфелями
+        (None - рейтинги недоступны; агрегаты нужно загрузить функцией PortfolioAnalytics.load).
         """
-        
-        # Создаём подключение к базе данных
-        # (Указываем, что данное подключение может работать из разных потоков)
-        self.connection = sqlite3.connect("portfolios.db", check_same_thread=False)
-
-        # Создаём для реализации запросов к базе данных
-        self.cursor = self.connection.cursor()
-
-        # Создаём таблицу с общей информацией о портфелях (ID портфеля, имя портфеля, ID владельца)
-        self.cursor.execute("""
-        CREATE TABLE IF NOT EXISTS portfolio_info (
-            portfolio_id TEXT PRIMARY KEY,
-            portfolio_name TEXT,
-            user_id INTEGER
-        )
-        """)
-        self.connection.commit()
-    
+
+        # Сохраняем метрики (их используют декорированные методы, поэтому задаём их первыми)
+        self.metrics = metrics
+
+        # Сохраняем генератор ID портфелей
+        self.id_generator = id_generator if id_generator is not None else TimeOrderedIdGenerator()
+
+        # Создаём кэш списков портфелей пользователей
+        # (Кэш верен, пока портфели пользователя изменяются только через данный экземпляр класса)
+        self.portfolio_cache = PortfolioCache(cache_size, negative_caching) if cache_size > 0 else None
+
+        # Снимок позиций всех портфелей для их оценки (загружается при первой оценке) и блокировка для работы с ним
+        self.position_snapshot: tp.Optional['PositionSnapshot'] = None
+        self.position_snapshot_lock = threading.Lock()
+
+        # Сохраняем хранилище истории цен
+        self.price_history = price_history
+
+        # Сохраняем агрегаты рейтингов портфелей
+        self.analytics = analytics
+
+        # Создаём пул подключений к базе данных
+        # (Каждый поток работает через своё подключение, а подключения кэшируют подготовленные запросы.
+        # База данных открывается и схема приводится к последней версии при первом запросе, а не при запуске бота)
+        self.pool = ConnectionPool(db_path, pool_size, pragmas=pragmas, initializer=migrate)
+
+        # Создаём писатель для групповой фиксации изменений, если она включена
+        self.group_commit_writer = GroupCommitWriter(self.pool, max_batch_size, max_delay_ms, metrics) \
+            if group_commit else None
+
+        # Пакет операций текущего потока: подключение с транзакцией пакета и изменения данных в памяти,
+        # ожидающие её фиксации (см. batch)
+        self.batch_local = BatchLocal()
+
+    @timed_method
     def is_portfolio_id_in_database(self, portfolio_id: str) -> bool:
         """
         Функция для проверки, существует ли уже портфель с заданным ID в базе данных.
@@ -40,10 +114,39 @@ class PortfolioDatabase:
         """
         
         # Проверяем, существует ли уже заданный портфель в базе данных и возвращаем результат
-        self.cursor.execute("SELECT EXISTS(SELECT 1 FROM portfolio_info WHERE portfolio_id = ? LIMIT 1)", 
-                            (portfolio_id,))
-        return bool(self.cursor.fetchone()[0])
+        with self.pool.connection() as connection:
+            row = connection.execute("SELECT EXISTS(SELECT 1 FROM portfolio_info WHERE portfolio_id = ? LIMIT 1)",
+                                     (portfolio_id,)).fetchone()
+        return bool(row[0])
+
+    @timed_method
+    def get_user_portfolios(self, user_id: int) -> dict[str, str]:
+        """
+        Функция для получения всех портфелей пользователя (из кэша или из базы данных).
+
+        :param user_id: ID пользователя.
+        :return: Словарь {имя портфеля: ID портфеля} (его нельзя изменять).
+        """
+
+        # Если список портфелей пользователя есть в кэше, то возвращаем его
+        # (В пакете с незафиксированными изменениями кэш ещё не изменён, поэтому он не используется)
+        use_cache = self.portfolio_cache is not None and not self.is_batch_changed()
+        if use_cache:
+            portfolios = self.portfolio_cache.get(user_id)
+            if portfolios is not None:
+                return portfolios
+            version = self.portfolio_cache.get_version()
+
+        # Иначе загружаем список из базы данных и сохраняем его в кэш
+        with self.pool.connection() as connection:
+            portfolios = dict(connection.execute("""
+            SELECT portfolio_name, portfolio_id FROM portfolio_info WHERE user_id = ?
+            """, (user_id,)).fetchall())
+        if use_cache:
+            self.portfolio_cache.put(user_id, portfolios, version)
+        return portfolios
 
+    @timed_method
     def is_user_has_portfolio_name(self, portfolio_name: str, user_id: int) -> bool:
         """
         Функция для проверки, имеет ли уже пользователь портфель с заданным именем.
@@ -54,11 +157,9 @@ class PortfolioDatabase:
         """
 
         # Проверяем, имеет ли пользователь уже портфель с заданным именем и возвращаем результат
-        self.cursor.execute("""
-        SELECT EXISTS(SELECT 1 FROM portfolio_info WHERE portfolio_name = ? AND user_id = ? LIMIT 1)
-        """, (portfolio_name, user_id))
-        return bool(self.cursor.fetchone()[0])
+        return portfolio_name in self.get_user_portfolios(user_id)
 
+    @timed_method
     def is_user_has_portfolio(self, user_id: int) -> bool:
         """
         Функция для проверки, владеет ли пользователь хотя бы одним портфелем.
@@ -68,8 +169,7 @@ class PortfolioDatabase:
         """
         
         # Проверяем, владеет ли пользователь хотя бы одним портфелем и возвращаем результат
-        self.cursor.execute("SELECT EXISTS(SELECT 1 FROM portfolio_info WHERE user_id = ? LIMIT 1)", (user_id,))
-        return bool(self.cursor.fetchone()[0])
+        return bool(self.get_user_portfolios(user_id))
 
     def get_portfolio_id(self, portfolio_name: str, user_id: int) -> str:
         """
@@ -79,19 +179,9 @@ class PortfolioDatabase:
         :param user_id: ID владельца портфеля.
         """
 
-        # Генерируем соль для обеспечения уникальности хеша
-        salt = secrets.token_hex(10)
-        
-        # Создаём базовую строку для генерации ID портфеля
-        id_str = f"{portfolio_name}_{user_id}_{salt}"
-
-        # Генерируем ID портфеля, используя базовую строку
-        hash_object = hashlib.sha256(id_str.encode())
-        id_hash = hash_object.hexdigest()
-
-        # Возвращаем первые 10 символов ID-хеша портфеля
-        return id_hash[:10]
+        return self.id_generator.generate(portfolio_name, user_id)
 
+    @timed_method
     def add_new_portfolio(self, new_portfolio_name: str, user_id: int) -> int:
         """
         Функция для добавления нового портфеля в базу данных.
@@ -102,35 +192,634 @@ class PortfolioDatabase:
         существует у пользователя.
         """
 
-        # Если у пользователя уже есть портфель с таким именем, то возвращаем 1 (портфель с таким именем уже существует)
-        if self.is_user_has_portfolio_name(new_portfolio_name, user_id):
-            return 1
+        # Если по кэшу видно, что у пользователя уже есть портфель с таким именем, то не обращаемся к базе данных
+        # (В пакете с незафиксированными изменениями кэш мог устареть, поэтому проверяем по базе данных)
+        if self.portfolio_cache is not None and not self.is_batch_changed():
+            portfolios = self.portfolio_cache.get(user_id)
+            if portfolios is not None and new_portfolio_name in portfolios:
+                return 1
 
-        # Генерируем ID для нового портфеля
-        new_portfolio_id = self.get_portfolio_id(new_portfolio_name, user_id)
+        portfolio_id = self._write(lambda connection: self._add_new_portfolio(connection, new_portfolio_name, user_id))
+        self._after_commit(lambda: self._on_portfolio_added(portfolio_id, new_portfolio_name, user_id))
 
-        # Добиваемся того, что ID нового портфеля ещё не было в базе данных
-        while self.is_portfolio_id_in_database(new_portfolio_id):
-            new_portfolio_id = self.get_portfolio_id(new_portfolio_name, user_id)
-        
-        # Добавляем новый портфель в базу данных
-        self.cursor.execute("INSERT INTO portfolio_info (portfolio_id, portfolio_name, user_id) VALUES (?, ?, ?)", 
-                            (new_portfolio_id, new_portfolio_name, user_id))
-        self.connection.commit()
+        # Возвращаем 0, если добавление прошло успешно, или 1, если портфель с таким именем уже существует
+        return 0 if portfolio_id is not None else 1
 
-        # Возвращаем 0 (добавление прошло успешно)
-        return 0
+    def _add_new_portfolio(self, connection: sqlite3.Connection, new_portfolio_name: str,
+                           user_id: int) -> tp.Optional[str]:
+        """
+        Функция для добавления нового портфеля без фиксации транзакции.
+
+        :param connection: Подключение к базе данных текущего потока.
+        :param new_portfolio_name: Название нового портфеля.
+        :param user_id: ID пользователя владельца портфеля.
+        :return: ID добавленного портфеля или None, если портфель с таким именем уже существует у пользователя.
+        """
+
+        # Генератор добавляет портфель одним запросом и назначает ему ID
+        return self.id_generator.insert_portfolio(connection, new_portfolio_name, user_id)
+
+    def _on_portfolio_added(self, portfolio_id: tp.Optional[str], new_portfolio_name: str, user_id: int) -> None:
+        """
+        Функция для изменения кэша и агрегатов рейтингов после фиксации добавления портфеля.
 
+        :param portfolio_id: ID добавленного портфеля или None, если портфель с таким именем уже существует.
+        :param new_portfolio_name: Название нового портфеля.
+        :param user_id: ID пользователя владельца портфеля.
+        """
+
+        # Изменяем кэш только после фиксации, чтобы в нём не оказался отменённый портфель
+        # (Если портфель с таким именем уже есть в базе данных, но его нет в кэше, то кэш устарел или список
+        # портфелей пользователя не загружен: загружаем список заново, чтобы повторы имени, которые пользователи
+        # обычно вводят несколько раз подряд, проверялись по кэшу без транзакции записи)
+        if self.portfolio_cache is not None:
+            if portfolio_id is not None:
+                self.portfolio_cache.add(user_id, new_portfolio_name, portfolio_id)
+            else:
+                self.portfolio_cache.invalidate(user_id)
+                self.get_user_portfolios(user_id)
+        if self.analytics is not None and portfolio_id is not None:
+            self.analytics.on_portfolio_added(portfolio_id, new_portfolio_name, user_id)
+
+    @timed_method
     def delete_portfolio(self, portfolio_id: str) -> None:
         """
         Функция для удаления портфеля из базы данных.
 
         :param portfolio_id: ID портфеля.
         """
-        
+
+        deleted_portfolio = self._write(lambda connection: self._delete_portfolio(connection, portfolio_id))
+        if deleted_portfolio is not None:
+            self._after_commit(lambda: self._on_portfolio_deleted(portfolio_id, *deleted_portfolio))
+
+    def _delete_portfolio(self, connection: sqlite3.Connection, portfolio_id: str) -> tp.Optional[tuple[int, str]]:
+        """
+        Функция для удаления портфеля без фиксации транзакции.
+
+        :param connection: Подключение к базе данных текущего потока.
+        :param portfolio_id: ID портфеля.
+        :return: ID владельца и имя удалённого портфеля или None, если портфеля с таким ID нет.
+        """
+
         # Удаляем портфель с переданным ID из базы данных
-        self.cursor.execute("DELETE FROM portfolio_info WHERE portfolio_id = ?", (portfolio_id,))
-        self.connection.commit()
+        rows = connection.execute("DELETE FROM portfolio_info WHERE portfolio_id = ? RETURNING user_id, portfolio_name",
+                                  (portfolio_id,)).fetchall()
+        return rows[0] if rows else None
+
+    def _on_portfolio_deleted(self, portfolio_id: str, user_id: int, portfolio_name: str) -> None:
+        """
+        Функция для изменения кэша, снимка позиций и агрегатов рейтингов после фиксации удаления портфеля.
+
+        :param portfolio_id: ID удалённого портфеля.
+        :param user_id: ID владельца удалённого портфеля.
+        :param portfolio_name: Имя удалённого портфеля.
+        """
+
+        # Удаляем портфель из кэша и его позиции из снимка после фиксации
+        if self.portfolio_cache is not None:
+            self.portfolio_cache.remove(user_id, portfolio_name)
+        with self.position_snapshot_lock:
+            if self.position_snapshot is not None:
+                self.position_snapshot.remove_portfolio(portfolio_id)
+        if self.analytics is not None:
+            self.analytics.on_portfolio_removed(portfolio_id)
+
+    #* Массовый перенос портфелей
+
+    def iter_portfolios(self, chunk_size: int = 10000) -> tp.Iterator[tuple[str, str, int]]:
+        """
+        Функция для потокового чтения всех портфелей (в порядке их добавления).
+        (Строки читаются из базы данных частями, поэтому в памяти находится не больше одной части).
+
+        :param chunk_size: Количество строк, читаемых за один раз.
+        :return: Итератор портфелей (ID портфеля, имя портфеля, ID владельца).
+        """
+
+        with self.pool.connection() as connection:
+            cursor = connection.execute("""
+            SELECT portfolio_id, portfolio_name, user_id FROM portfolio_info ORDER BY portfolio_key
+            """)
+            for rows in iter(lambda: cursor.fetchmany(chunk_size), []):
+                yield from rows
+
+    @timed_method
+    def import_portfolios(self, portfolios: tp.Iterable[tuple[tp.Optional[str], str, int]],
+                          chunk_size: int = 10000) -> tuple[int, int]:
+        """
+        Функция для массового добавления портфелей (например, при переносе пользователей из другой системы).
+        (Портфели добавляются частями: каждая часть - одна транзакция, поэтому память не зависит от количества
+        портфелей, а прерванный перенос можно продолжить, т.к. уже добавленные портфели будут пропущены).
+
+        :param portfolios: Портфели (ID портфеля или None для нового ID, имя портфеля, ID владельца).
+        :param chunk_size: Количество портфелей в одной транзакции.
+        :return: Количество добавленных портфелей и количество пропущенных портфелей (имя уже есть у пользователя
+        или ID портфеля уже занят).
+        """
+
+        # Портфелям без ID назначаем новые ID генератором ID (генератор, которому ID назначает база данных,
+        # здесь не подходит: он выбрасывает TypeError)
+        generate = self.id_generator.generate
+        portfolios = ((portfolio_id if portfolio_id else generate(portfolio_name, user_id), portfolio_name, user_id)
+                      for portfolio_id, portfolio_name, user_id in portfolios)
+
+        imported_count = 0
+        skipped_count = 0
+        with self.pool.connection() as connection:
+            # Промежуточная таблица части портфелей (у каждого подключения - своя временная таблица)
+            connection.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS portfolio_import (portfolio_id TEXT, portfolio_name TEXT, user_id INTEGER)
+            """)
+
+            while chunk := list(itertools.islice(portfolios, chunk_size)):
+                connection.execute("BEGIN IMMEDIATE")
+                connection.execute("DELETE FROM temp.portfolio_import")
+                connection.executemany("INSERT INTO temp.portfolio_import VALUES (?, ?, ?)", chunk)
+
+                # Уникальность имён проверяется одним запросом для всей части: повторы внутри части отбрасываются
+                # группировкой (остаётся первый портфель), а повторы с портфелями в базе данных - уникальными
+                # индексами (ON CONFLICT DO NOTHING)
+                cursor = connection.execute("""
+                INSERT INTO portfolio_info (portfolio_id, portfolio_name, user_id)
+                SELECT portfolio_id, portfolio_name, user_id FROM temp.portfolio_import
+                WHERE rowid IN (SELECT MIN(rowid) FROM temp.portfolio_import GROUP BY user_id, portfolio_name)
+                ORDER BY rowid
+                ON CONFLICT DO NOTHING
+                """)
+                imported_count += cursor.rowcount
+                skipped_count += len(chunk) - cursor.rowcount
+                self._commit(connection)
+
+        # Списки портфелей в кэше могли устареть
+        if self.portfolio_cache is not None:
+            self.portfolio_cache.clear()
+
+        # Агрегаты рейтингов загружаем заново: массовый перенос редок, а портфелей в нём много
+        if self.analytics is not None and imported_count:
+            self.analytics.load(self)
+
+        return imported_count, skipped_count
+
+    #* Сделки и оценка портфелей
+
+    @timed_method
+    def buy(self, portfolio_id: str, symbol: str, quantity: float, price: float) -> int:
+        """
+        Функция для покупки бумаг в портфель.
+
+        :param portfolio_id: ID портфеля.
+        :param symbol: Тикер бумаги.
+        :param quantity: Количество бумаг (больше 0).
+        :param price: Цена одной бумаги (больше 0).
+        :return: Код результата действия: 0 - если покупка прошла успешно, 1 - если портфеля с таким ID нет.
+        """
+
+        if quantity <= 0 or price <= 0:
+            raise ValueError("Количество бумаг и цена должны быть больше 0")
+        return self._execute_trade(portfolio_id, symbol, quantity, price)
+
+    @timed_method
+    def sell(self, portfolio_id: str, symbol: str, quantity: float, price: float) -> int:
+        """
+        Функция для продажи бумаг из портфеля.
+
+        :param portfolio_id: ID портфеля.
+        :param symbol: Тикер бумаги.
+        :param quantity: Количество бумаг (больше 0).
+        :param price: Цена одной бумаги (больше 0).
+        :return: Код результата действия: 0 - если продажа прошла успешно, 1 - если в портфеле нет такого
+        количества бумаг (или портфеля с таким ID нет).
+        """
+
+        if quantity <= 0 or price <= 0:
+            raise ValueError("Количество бумаг и цена должны быть больше 0")
+        return self._execute_trade(portfolio_id, symbol, -quantity, price)
+
+    def _execute_trade(self, portfolio_id: str, symbol: str, quantity: float, price: float) -> int:
+        """
+        Функция для выполнения и фиксации сделки.
+
+        :param portfolio_id: ID портфеля.
+        :param symbol: Тикер бумаги.
+        :param quantity: Количество бумаг (больше 0 - покупка, меньше 0 - продажа).
+        :param price: Цена одной бумаги.
+        :return: Код результата действия (как у buy и sell).
+        """
+
+        position = self._write(lambda connection: self._trade(connection, portfolio_id, symbol, quantity, price))
+        if position is None:
+            return 1
+
+        self._after_commit(lambda: self._on_position_changed(portfolio_id, symbol, *position))
+        return 0
+
+    def _trade(self, connection: sqlite3.Connection, portfolio_id: str, symbol: str, quantity: float,
+               price: float) -> tp.Optional[tuple[float, float]]:
+        """
+        Функция для выполнения сделки без фиксации транзакции.
+        (Сделка записывается в журнал сделок, а позиция портфеля сразу изменяется, поэтому для оценки портфеля
+        не нужно проходить по журналу).
+
+        :param connection: Подключение к базе данных текущего потока.
+        :param portfolio_id: ID портфеля.
+        :param symbol: Тикер бумаги.
+        :param quantity: Количество бумаг (больше 0 - покупка, меньше 0 - продажа).
+        :param price: Цена одной бумаги.
+        :return: Количество бумаг и стоимость покупки позиции после сделки или None, если сделку выполнить нельзя.
+        """
+
+        # Покупка: увеличиваем количество бумаг и стоимость покупки позиции (или открываем позицию)
+        if quantity > 0:
+            try:
+                rows = connection.execute("""
+                INSERT INTO holdings (portfolio_id, symbol, quantity, cost_basis) VALUES (?, ?, ?, ?)
+                ON CONFLICT (portfolio_id, symbol) DO UPDATE
+                SET quantity = quantity + excluded.quantity, cost_basis = cost_basis + excluded.cost_basis
+                RETURNING quantity, cost_basis
+                """, (portfolio_id, symbol, quantity, quantity * price)).fetchall()
+
+            # Портфеля с таким ID нет (нарушен внешний ключ)
+            except sqlite3.IntegrityError:
+                return None
+
+        # Продажа: уменьшаем количество бумаг, а стоимость покупки - пропорционально (по средней цене покупки)
+        else:
+            rows = connection.execute("""
+            UPDATE holdings SET cost_basis = cost_basis * (quantity + ?1) / quantity, quantity = quantity + ?1
+            WHERE portfolio_id = ?2 AND symbol = ?3 AND quantity >= -?1
+            RETURNING quantity, cost_basis
+            """, (quantity, portfolio_id, symbol)).fetchall()
+
+            # В портфеле нет такого количества бумаг
+            if not rows:
+                return None
+
+            # Проданную полностью позицию удаляем (остаток мог появиться из-за погрешности дробных количеств)
+            if rows[0][0] <= 1e-9:
+                connection.execute("DELETE FROM holdings WHERE portfolio_id = ? AND symbol = ?", (portfolio_id, symbol))
+                rows = [(0.0, 0.0)]
+
+        # Записываем сделку в журнал
+        connection.execute("""
+        INSERT INTO transactions (portfolio_id, symbol, quantity, price, executed_at) VALUES (?, ?, ?, ?, ?)
+        """, (portfolio_id, symbol, quantity, price, time.time()))
+
+        return rows[0][0], rows[0][1]
+
+    def _on_position_changed(self, portfolio_id: str, symbol: str, quantity: float, cost_basis: float) -> None:
+        """
+        Функция для изменения снимка позиций и агрегатов рейтингов после фиксации сделки.
+
+        :param portfolio_id: ID портфеля.
+        :param symbol: Тикер бумаги.
+        :param quantity: Количество бумаг позиции после сделки.
+        :param cost_basis: Стоимость покупки позиции после сделки.
+        """
+
+        # Изменяем позицию в снимке только после фиксации
+        with self.position_snapshot_lock:
+            if self.position_snapshot is not None:
+                self.position_snapshot.set_position(portfolio_id, symbol, quantity, cost_basis)
+        if self.analytics is not None:
+            self.analytics.on_position_change(portfolio_id, symbol, quantity, cost_basis)
+
+    @timed_method
+    def get_holdings(self, portfolio_id: str) -> list[tuple[str, float, float]]:
+        """
+        Функция для получения позиций портфеля.
+
+        :param portfolio_id: ID портфеля.
+        :return: Список позиций (тикер, количество бумаг, стоимость покупки), упорядоченный по тикерам.
+        """
+
+        with self.pool.connection() as connection:
+            return connection.execute("""
+            SELECT symbol, quantity, cost_basis FROM holdings WHERE portfolio_id = ? ORDER BY symbol
+            """, (portfolio_id,)).fetchall()
+
+    def iter_holdings(self, chunk_size: int = 10000) -> tp.Iterator[tuple[str, str, float, float]]:
+        """
+        Функция для потокового чтения позиций всех портфелей (упорядоченных по портфелям и тикерам).
+
+        :param chunk_size: Количество строк, читаемых за один раз.
+        :return: Итератор позиций (ID портфеля, тикер, количество бумаг, стоимость покупки).
+        """
+
+        with self.pool.connection() as connection:
+            cursor = connection.execute("""
+            SELECT portfolio_id, symbol, quantity, cost_basis FROM holdings ORDER BY portfolio_id, symbol
+            """)
+            for rows in iter(lambda: cursor.fetchmany(chunk_size), []):
+                yield from rows
+
+    def get_position_snapshot(self) -> 'PositionSnapshot':
+        """
+        Функция для получения снимка позиций всех портфелей (при первом обращении он загружается из базы данных).
+        (Снимок нужно использовать под блокировкой position_snapshot_lock).
+
+        :return: Снимок позиций.
+        """
+
+        if self.position_snapshot is None:
+            from portfolio_valuation import PositionSnapshot
+
+            # Загружаем позиции по частям, чтобы не держать в памяти сразу все строки запроса
+            self.position_snapshot = PositionSnapshot(self.iter_holdings())
+        return self.position_snapshot
+
+    @timed_method
+    def get_held_symbols(self) -> list[str]:
+        """
+        Функция для получения тикеров всех бумаг, которые есть (или были) в портфелях (для обновления котировок).
+        (Тикеры берутся из снимка позиций, поэтому после его загрузки запрос не обращается к базе данных).
+
+        :return: Список тикеров.
+        """
+
+        with self.position_snapshot_lock:
+            return list(self.get_position_snapshot().symbols)
+
+    @timed_method
+    def value_portfolios(self, prices: 'PriceSource',
+                         portfolio_ids: tp.Optional[tp.Iterable[str]] = None) -> 'Valuation':
+        """
+        Функция для оценки портфелей (стоимость, прибыль и доли позиций) одним векторным проходом.
+
+        :param prices: Словарь {тикер: цена} или таблица котировок (позиции без цены оцениваются по стоимости
+        покупки).
+        :param portfolio_ids: ID оцениваемых портфелей (None - все портфели).
+        :return: Оценка портфелей.
+        """
+
+        # Снимок позиций изменяется только после фиксации, поэтому изменения пакета фиксируются до оценки
+        self.commit_batch()
+        with self.position_snapshot_lock:
+            return self.get_position_snapshot().valuate(prices, portfolio_ids)
+
+    @timed_method
+    def value_portfolio(self, portfolio_id: str, prices: 'PriceSource') -> 'Valuation':
+        """
+        Функция для оценки одного портфеля.
+
+        :param portfolio_id: ID портфеля.
+        :param prices: Словарь {тикер: цена} или таблица котировок (позиции без цены оцениваются по стоимости
+        покупки).
+        :return: Оценка портфеля.
+        """
+
+        return self.value_portfolios(prices, [portfolio_id])
+
+    @timed_method
+    def get_transactions(self, portfolio_id: str) -> list[tuple[str, float, float, float]]:
+        """
+        Функция для получения журнала сделок портфеля.
+
+        :param portfolio_id: ID портфеля.
+        :return: Список сделок (тикер, количество бумаг со знаком, цена, время), упорядоченный по времени.
+        """
+
+        with self.pool.connection() as connection:
+            return connection.execute("""
+            SELECT symbol, quantity, price, executed_at FROM transactions
+            WHERE portfolio_id = ? ORDER BY transaction_key
+            """, (portfolio_id,)).fetchall()
+
+    @timed_method
+    def get_performance(self, portfolio_id: str, start: tp.Optional[float] = None,
+                        end: tp.Optional[float] = None) -> 'Performance':
+        """
+        Функция для расчёта взвешенной по времени доходности и просадки портфеля по истории цен.
+
+        :param portfolio_id: ID портфеля.
+        :param start: Начало периода в секундах Unix (None - время первой сделки).
+        :param end: Конец периода в секундах Unix включительно (None - до конца истории).
+        :return: Доходность портфеля.
+        """
+
+        if self.price_history is None:
+            raise ValueError("Хранилище истории цен не задано")
+        from price_history import calculate_performance
+
+        return calculate_performance(self.price_history, self.get_transactions(portfolio_id), start, end)
+
+    #* Снимки стоимости и обслуживание базы данных
+
+    @timed_method
+    def save_daily_snapshot(self, prices: 'PriceSource', snapshot_date: tp.Optional[datetime.date] = None,
+                            chunk_size: int = 5000, pause: tp.Optional[tp.Callable[[], None]] = None) -> int:
+        """
+        Функция для записи стоимости всех портфелей на конец дня одной транзакцией.
+        (Портфели оцениваются одним векторным проходом по снимку позиций, портфели без позиций записываются
+        с нулевой стоимостью; повторная запись за ту же дату заменяет снимок).
+
+        :param prices: Словарь {тикер: цена} или таблица котировок (позиции без цены оцениваются по стоимости
+        покупки).
+        :param snapshot_date: Дата снимка (None - сегодня).
+        :param chunk_size: Количество портфелей, обрабатываемых между вызовами pause.
+        :param pause: Функция, вызываемая между частями записи (например, JobScheduler.pause_while_busy, чтобы
+        уступать процессор обработке сообщений; None - запись без пауз).
+        :return: Количество записанных портфелей.
+        """
+
+        # Словарь {ID портфеля: (стоимость, стоимость покупки)} собирается частями
+        # (dict(zip(...)) по всем портфелям - это один вызов, который не отпускает GIL десятки миллисекунд)
+        valuation = self.value_portfolios(prices)
+        values: dict[str, tuple[float, float]] = {}
+        for start in range(0, len(valuation.portfolio_ids), chunk_size):
+            stop = start + chunk_size
+            values.update(zip(valuation.portfolio_ids[start:stop],
+                              zip(valuation.values[start:stop].tolist(), valuation.cost_bases[start:stop].tolist())))
+            if pause is not None:
+                pause()
+        snapshot_date = (snapshot_date if snapshot_date is not None else datetime.date.today()).isoformat()
+
+        written_count = 0
+        with self.pool.connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            cursor = connection.execute("SELECT portfolio_id FROM portfolio_info")
+            for rows in iter(lambda: cursor.fetchmany(chunk_size), []):
+                connection.executemany("""
+                INSERT OR REPLACE INTO portfolio_snapshots (portfolio_id, snapshot_date, value, cost_basis)
+                VALUES (?, ?, ?, ?)
+                """, [(portfolio_id, snapshot_date, *values.get(portfolio_id, (0.0, 0.0)))
+                      for portfolio_id, in rows])
+                written_count += len(rows)
+                if pause is not None:
+                    pause()
+            self._commit(connection)
+        return written_count
+
+    @timed_method
+    def get_snapshots(self, portfolio_id: str) -> list[tuple[str, float, float]]:
+        """
+        Функция для получения ежедневных снимков стоимости портфеля.
+
+        :param portfolio_id: ID портфеля.
+        :return: Список снимков (дата, стоимость, стоимость покупки), упорядоченный по дате.
+        """
+
+        with self.pool.connection() as connection:
+            return connection.execute("""
+            SELECT snapshot_date, value, cost_basis FROM portfolio_snapshots
+            WHERE portfolio_id = ? ORDER BY snapshot_date
+            """, (portfolio_id,)).fetchall()
+
+    def optimize(self) -> None:
+        """
+        Функция для обновления статистики планировщика запросов (ANALYZE только для изменившихся таблиц)
+        и переноса журнала WAL в файл базы данных.
+        """
+
+        with self.pool.connection() as connection:
+            connection.execute("PRAGMA optimize")
+            connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def vacuum(self, min_free_fraction: float = 0.2) -> bool:
+        """
+        Функция для сжатия файла базы данных (VACUUM), если в нём много свободных страниц.
+        (VACUUM перезаписывает всю базу данных и на это время блокирует запись, поэтому выполняется только тогда,
+        когда освобождает заметную часть файла).
+
+        :param min_free_fraction: Доля свободных страниц, начиная с которой файл сжимается.
+        :return: Был ли файл сжат.
+        """
+
+        with self.pool.connection() as connection:
+            page_count = connection.execute("PRAGMA page_count").fetchone()[0]
+            free_page_count = connection.execute("PRAGMA freelist_count").fetchone()[0]
+            if page_count == 0 or free_page_count / page_count < min_free_fraction:
+                return False
+            connection.execute("VACUUM")
+            return True
+
+    #* Пакеты операций
+
+    @contextlib.contextmanager
+    def batch(self) -> tp.Iterator[None]:
+        """
+        Функция для выполнения операций текущего потока одной транзакцией (используется в конструкции with).
+        (Операции записи выполняются сразу, поэтому их результаты и чтения в том же потоке такие же, как без пакета,
+        но фиксация одна на весь пакет. Кэш, снимок позиций и агрегаты рейтингов изменяются после фиксации, поэтому
+        код, читающий их внутри пакета, должен сначала вызвать commit_batch. Пакет без операций записи транзакцию
+        не открывает, вложенный пакет входит во внешний, а при ошибке отменяется весь пакет. При групповой фиксации
+        пакет фиксируется своей транзакцией, а не потоком записи).
+        """
+
+        # Вложенный пакет входит во внешний
+        if self.batch_local.connection is not None:
+            yield
+            return
+
+        with self.pool.connection() as connection:
+            self.batch_local.connection = connection
+            self.batch_local.after_commit = []
+            try:
+                yield
+                self.commit_batch()
+            except BaseException:
+                connection.rollback()
+                raise
+            finally:
+                self.batch_local.connection = None
+                self.batch_local.after_commit = None
+
+    def commit_batch(self) -> None:
+        """
+        Функция для фиксации изменений текущего пакета до его окончания (вне пакета ничего не делает).
+        (После фиксации изменяются кэш, снимок позиций и агрегаты рейтингов, а следующая операция записи пакета
+        открывает новую транзакцию).
+        """
+
+        connection = self.batch_local.connection
+        if connection is None:
+            return
+        if connection.in_transaction:
+            self._commit(connection, "batch")
+        after_commit, self.batch_local.after_commit = self.batch_local.after_commit, []
+        for callback in after_commit:
+            callback()
+
+    def is_batch_changed(self) -> bool:
+        """
+        Функция для проверки, есть ли в пакете текущего потока незафиксированные изменения.
+
+        :return: True - если есть, False - если нет (или поток не выполняет пакет).
+        """
+
+        connection = self.batch_local.connection
+        return connection is not None and connection.in_transaction
+
+    def _write(self, operation: tp.Callable[[sqlite3.Connection], T]) -> T:
+        """
+        Функция для выполнения операции записи и фиксации её транзакции.
+
+        :param operation: Функция, выполняющая операцию через переданное подключение (без фиксации транзакции).
+        :return: Результат операции.
+        """
+
+        # В пакете операция выполняется в его транзакции и фиксируется вместе с пакетом
+        # (Каждая операция - в своей точке сохранения, поэтому ошибка операции не отменяет предыдущие операции)
+        connection = self.batch_local.connection
+        if connection is not None:
+            if not connection.in_transaction:
+                connection.execute("BEGIN IMMEDIATE")
+            connection.execute("SAVEPOINT batch_operation")
+            try:
+                return operation(connection)
+            except BaseException:
+                connection.execute("ROLLBACK TO batch_operation")
+                raise
+            finally:
+                connection.execute("RELEASE batch_operation")
+
+        # При групповой фиксации операция выполняется потоком записи вместе с операциями других чатов
+        if self.group_commit_writer is not None:
+            return self.group_commit_writer.submit(operation).result()
+
+        # Иначе выполняем операцию и сразу фиксируем её
+        with self.pool.connection() as connection:
+            result = operation(connection)
+            self._commit(connection)
+        return result
+
+    def _after_commit(self, callback: tp.Callable[[], None]) -> None:
+        """
+        Функция для изменения данных в памяти (кэш, снимок позиций, агрегаты рейтингов) после фиксации операции.
+        (Вне пакета операция уже зафиксирована, поэтому функция вызывается сразу, а в пакете - после его фиксации).
+
+        :param callback: Функция, изменяющая данные в памяти.
+        """
+
+        after_commit = self.batch_local.after_commit
+        if after_commit is not None:
+            after_commit.append(callback)
+        else:
+            callback()
+
+    def _commit(self, connection: sqlite3.Connection, mode: str = "single") -> None:
+        """
+        Функция для фиксации транзакции отдельной операции или пакета (с измерением времени, если метрики заданы).
+
+        :param connection: Подключение к базе данных текущего потока.
+        :param mode: Метка режима фиксации для метрик ("single" - отдельная операция, "batch" - пакет операций).
+        """
+
+        if self.metrics is None:
+            connection.commit()
+            return
+        start_time = time.perf_counter()
+        connection.commit()
+        self.metrics.commit_seconds.observe(time.perf_counter() - start_time, (mode,))
+
+    def close(self) -> None:
+        """
+        Функция для закрытия всех подключений к базе данных.
+        (Перед закрытием фиксируются все операции, ожидающие групповой фиксации).
+        """
+
+        if self.group_commit_writer is not None:
+            self.group_commit_writer.close()
+        self.pool.close()
 
 
 # Область для отладки
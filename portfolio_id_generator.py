@@ -0,0 +1,160 @@
+# Импорты библиотек
+import binascii
+import hashlib
+import random
+import secrets
+import sqlite3
+import threading
+import time
+import typing as tp
+
+
+class PortfolioIdGenerator:
+    """
+    Базовый класс генератора ID портфелей.
+    (Генератор сам добавляет строку портфеля в базу данных, т.к. некоторые ID назначает сама база данных).
+    """
+
+    # Наибольшее количество попыток добавления портфеля, если новый ID портфеля уже занят
+    # (Повтор ID несколько раз подряд практически невозможен, поэтому после стольких попыток ошибка передаётся дальше)
+    MAX_ATTEMPTS = 10
+
+    def generate(self, portfolio_name: str, user_id: int) -> str:
+        """
+        Функция для генерации нового ID портфеля.
+
+        :param portfolio_name: Имя портфеля.
+        :param user_id: ID владельца портфеля.
+        :return: ID портфеля.
+        """
+
+        raise NotImplementedError
+
+    def insert_portfolio(self, connection: sqlite3.Connection, portfolio_name: str,
+                         user_id: int) -> tp.Optional[str]:
+        """
+        Функция для добавления портфеля с новым ID одним запросом (без фиксации транзакции).
+
+        :param connection: Подключение к базе данных.
+        :param portfolio_name: Имя портфеля.
+        :param user_id: ID владельца портфеля.
+        :return: ID добавленного портфеля или None, если у пользователя уже есть портфель с таким именем.
+        """
+
+        # Если у пользователя уже есть портфель с таким именем, то уникальный индекс (user_id, portfolio_name)
+        # не даст добавить строку (проверка и добавление не разделены во времени)
+        for attempt in range(self.MAX_ATTEMPTS):
+            portfolio_id = self.generate(portfolio_name, user_id)
+            try:
+                cursor = connection.execute("""
+                INSERT INTO portfolio_info (portfolio_id, portfolio_name, user_id) VALUES (?, ?, ?)
+                ON CONFLICT (user_id, portfolio_name) DO NOTHING
+                """, (portfolio_id, portfolio_name, user_id))
+                return portfolio_id if cursor.rowcount > 0 else None
+
+            # Если сгенерированный ID портфеля уже занят, то генерируем новый ID
+            except sqlite3.IntegrityError:
+                if attempt == self.MAX_ATTEMPTS - 1:
+                    raise
+        return None
+
+
+class HashIdGenerator(PortfolioIdGenerator):
+    """
+    Генератор ID портфелей из первых 10 символов SHA-256 хеша (ID портфелей до появления генераторов).
+    (ID случайны, поэтому при большом количестве портфелей возможны повторы, которые приходится перегенерировать).
+    """
+
+    def generate(self, portfolio_name: str, user_id: int) -> str:
+        # Генерируем соль для обеспечения уникальности хеша
+        salt = secrets.token_hex(10)
+
+        # Создаём базовую строку для генерации ID портфеля
+        id_str = f"{portfolio_name}_{user_id}_{salt}"
+
+        # Генерируем ID портфеля, используя базовую строку, и возвращаем первые 10 символов ID-хеша портфеля
+        return hashlib.sha256(id_str.encode()).hexdigest()[:10]
+
+
+class TimeOrderedIdGenerator(PortfolioIdGenerator):
+    """
+    Генератор упорядоченных по времени ID портфелей (128 бит, как в ULID: 48 бит времени в миллисекундах
+    и 80 случайных бит).
+    (ID не требует обращения к базе данных, а новые ID больше старых, поэтому добавляются в конец индекса
+    по ID портфеля).
+    """
+
+    # Перевод алфавита Base64 в алфавит из тех же 64 символов, упорядоченных по возрастанию кодов
+    # (Так строки ID сравниваются так же, как числа, а кодирование Base64 выполняется быстрым binascii)
+    TRANSLATION = bytes.maketrans(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/",
+                                  b"-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz")
+
+    def __init__(self) -> None:
+        """
+        Функция для инициализации генератора.
+        """
+
+        # Время и значение последнего сгенерированного ID (для монотонности ID внутри одной миллисекунды)
+        self.last_timestamp = 0
+        self.last_value = 0
+        self.lock = threading.Lock()
+
+    def generate(self, portfolio_name: str, user_id: int) -> str:
+        timestamp = time.time_ns() // 1_000_000
+        with self.lock:
+
+            # В одной миллисекунде (или если часы сдвинулись назад) увеличиваем предыдущий ID на 1,
+            # иначе берём текущее время и случайную часть
+            if timestamp <= self.last_timestamp:
+                value = self.last_value + 1
+            else:
+                value = timestamp << 80 | random.getrandbits(80)
+                self.last_timestamp = timestamp
+            self.last_value = value
+
+        # 128 бит ID кодируются 22 символами по 6 бит (первые 22 символа из 24 для 18 байт)
+        encoded = binascii.b2a_base64((value << 16).to_bytes(18, "big"), newline=False)[:22]
+        return encoded.translate(self.TRANSLATION).decode()
+
+
+class RowidIdGenerator(PortfolioIdGenerator):
+    """
+    Генератор ID портфелей из целочисленного ключа строки (portfolio_key - псевдоним rowid).
+    (ID назначает сама база данных при добавлении строки, поэтому повторов не бывает, а ID портфеля - это
+    десятичная запись ключа, которая короче 10 символов старых ID и поэтому с ними не совпадает).
+    """
+
+    def generate(self, portfolio_name: str, user_id: int) -> str:
+        raise TypeError("ID портфеля назначается базой данных при добавлении портфеля")
+
+    def insert_portfolio(self, connection: sqlite3.Connection, portfolio_name: str,
+                         user_id: int) -> tp.Optional[str]:
+        # Новый ключ - максимальный ключ + 1 (поиск по первичному ключу, а запись в базу данных уже заблокирована
+        # этим запросом, поэтому два запроса не получат один ключ)
+        # (Ключ вычисляется подзапросами в VALUES: с подзапросом во FROM SQLite просматривает всю таблицу)
+        for attempt in range(self.MAX_ATTEMPTS):
+            try:
+                cursor = connection.execute("""
+                INSERT INTO portfolio_info (portfolio_key, portfolio_id, portfolio_name, user_id) VALUES (
+                    (SELECT IFNULL(MAX(portfolio_key), 0) + ?1 FROM portfolio_info),
+                    (SELECT CAST(IFNULL(MAX(portfolio_key), 0) + ?1 AS TEXT) FROM portfolio_info), ?2, ?3)
+                ON CONFLICT (user_id, portfolio_name) DO NOTHING
+                RETURNING portfolio_id
+                """, (attempt + 1, portfolio_name, user_id))
+                rows = cursor.fetchall()
+                return rows[0][0] if rows else None
+
+            # Такой ID уже есть у портфеля с другим ключом (например, перенесённого с заданным ID), поэтому
+            # пропускаем ключ: следующая попытка берёт ключ на 1 больше
+            except sqlite3.IntegrityError:
+                if attempt == self.MAX_ATTEMPTS - 1:
+                    raise
+        return None
+
+
+# Генераторы ID портфелей по названиям
+ID_GENERATORS: dict[str, type[PortfolioIdGenerator]] = {
+    "hash": HashIdGenerator,
+    "time_ordered": TimeOrderedIdGenerator,
+    "rowid": RowidIdGenerator,
+}
@@ -0,0 +1,259 @@
+# Импорты библиотек
+import csv
+import io
+import json
+import os
+import struct
+import typing as tp
+
+# Импорты файлов для задания типов
+if tp.TYPE_CHECKING:
+    from portfolio_database import PortfolioDatabase
+
+# Портфель при переносе: (ID портфеля или None, имя портфеля, ID владельца)
+PortfolioRecord = tuple[tp.Optional[str], str, int]
+
+# Заголовок CSV-файла
+CSV_HEADER = ("portfolio_id", "portfolio_name", "user_id")
+
+# Двоичный формат: сигнатура с номером версии, затем записи портфелей подряд
+# (запись - ID владельца, длины ID и имени портфеля в байтах UTF-8, затем сами ID и имя)
+BINARY_SIGNATURE = b"VIPF\x01"
+BINARY_RECORD_HEADER = struct.Struct("<qBH")
+
+# Размер блока, которым читается двоичный файл
+BINARY_READ_SIZE = 1 << 20
+
+
+#* Чтение и запись CSV
+
+def read_csv(file: tp.TextIO) -> tp.Iterator[PortfolioRecord]:
+    """
+    Функция для потокового чтения портфелей из CSV-файла с заголовком portfolio_id,portfolio_name,user_id.
+
+    :param file: Текстовый файл (открытый с newline="").
+    :return: Итератор портфелей (пустой ID портфеля читается как None).
+    """
+
+    reader = csv.reader(file)
+    header = next(reader, None)
+    if header is None:
+        return
+    if tuple(header) != CSV_HEADER:
+        raise ValueError(f"Неверный заголовок CSV-файла: {','.join(header)}")
+
+    for portfolio_id, portfolio_name, user_id in reader:
+        yield portfolio_id or None, portfolio_name, int(user_id)
+
+
+def write_csv(file: tp.TextIO, portfolios: tp.Iterable[PortfolioRecord]) -> int:
+    """
+    Функция для потоковой записи портфелей в CSV-файл.
+
+    :param file: Текстовый файл (открытый с newline="").
+    :param portfolios: Портфели.
+    :return: Количество записанных портфелей.
+    """
+
+    writer = csv.writer(file)
+    writer.writerow(CSV_HEADER)
+    count = 0
+    for portfolio_id, portfolio_name, user_id in portfolios:
+        writer.writerow((portfolio_id or "", portfolio_name, user_id))
+        count += 1
+    return count
+
+
+#* Чтение и запись JSONL
+
+def read_jsonl(file: tp.TextIO) -> tp.Iterator[PortfolioRecord]:
+    """
+    Функция для потокового чтения портфелей из файла JSON Lines (один объект портфеля в строке).
+
+    :param file: Текстовый файл.
+    :return: Итератор портфелей (отсутствующий ID портфеля читается как None).
+    """
+
+    for line in file:
+        if not line.strip():
+            continue
+        portfolio = json.loads(line)
+        yield portfolio.get("portfolio_id") or None, portfolio["portfolio_name"], int(portfolio["user_id"])
+
+
+def write_jsonl(file: tp.TextIO, portfolios: tp.Iterable[PortfolioRecord]) -> int:
+    """
+    Функция для потоковой записи портфелей в файл JSON Lines.
+
+    :param file: Текстовый файл.
+    :param portfolios: Портфели.
+    :return: Количество записанных портфелей.
+    """
+
+    count = 0
+    for portfolio_id, portfolio_name, user_id in portfolios:
+        file.write(json.dumps({"portfolio_id": portfolio_id, "portfolio_name": portfolio_name, "user_id": user_id},
+                              ensure_ascii=False))
+        file.write("\n")
+        count += 1
+    return count
+
+
+#* Чтение и запись двоичного формата
+
+def read_binary(file: tp.BinaryIO) -> tp.Iterator[PortfolioRecord]:
+    """
+    Функция для потокового чтения портфелей из двоичного файла.
+    (Файл читается блоками, а записи разбираются прямо из блока без копирования заголовков).
+
+    :param file: Двоичный файл.
+    :return: Итератор портфелей (пустой ID портфеля читается как None).
+    """
+
+    if file.read(len(BINARY_SIGNATURE)) != BINARY_SIGNATURE:
+        raise ValueError("Файл не является двоичным файлом портфелей")
+
+    header_size = BINARY_RECORD_HEADER.size
+    unpack_header = BINARY_RECORD_HEADER.unpack_from
+    buffer = b""
+    while block := file.read(BINARY_READ_SIZE):
+        buffer += block
+        offset = 0
+        while len(buffer) - offset >= header_size:
+            user_id, id_length, name_length = unpack_header(buffer, offset)
+            end = offset + header_size + id_length + name_length
+            if end > len(buffer):
+                break
+            id_start = offset + header_size
+            portfolio_id = buffer[id_start:id_start + id_length].decode()
+            yield portfolio_id or None, buffer[id_start + id_length:end].decode(), user_id
+            offset = end
+
+        # Неполную запись в конце блока оставляем до следующего блока
+        buffer = buffer[offset:]
+
+    if buffer:
+        raise ValueError("Двоичный файл портфелей обрывается посреди записи")
+
+
+def write_binary(file: tp.BinaryIO, portfolios: tp.Iterable[PortfolioRecord]) -> int:
+    """
+    Функция для потоковой записи портфелей в двоичный файл.
+
+    :param file: Двоичный файл.
+    :param portfolios: Портфели.
+    :return: Количество записанных портфелей.
+    """
+
+    file.write(BINARY_SIGNATURE)
+    pack_header = BINARY_RECORD_HEADER.pack
+    count = 0
+    for portfolio_id, portfolio_name, user_id in portfolios:
+        id_bytes = (portfolio_id or "").encode()
+        name_bytes = portfolio_name.encode()
+        file.write(pack_header(user_id, len(id_bytes), len(name_bytes)) + id_bytes + name_bytes)
+        count += 1
+    return count
+
+
+# Форматы: название -> (функция чтения, функция записи, двоичный ли формат)
+FORMATS: dict[str, tuple[tp.Callable[[tp.Any], tp.Iterator[PortfolioRecord]],
+                         tp.Callable[[tp.Any, tp.Iterable[PortfolioRecord]], int], bool]] = {
+    "csv": (read_csv, write_csv, False),
+    "jsonl": (read_jsonl, write_jsonl, False),
+    "binary": (read_binary, write_binary, True),
+}
+
+# Форматы по расширениям файлов
+EXTENSIONS: dict[str, str] = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".vipf": "binary"}
+
+
+def get_format(path: str, format_name: tp.Optional[str] = None) -> str:
+    """
+    Функция для определения формата файла.
+
+    :param path: Путь к файлу.
+    :param format_name: Название формата (None - по расширению файла).
+    :return: Название формата.
+    """
+
+    if format_name is None:
+        format_name = EXTENSIONS.get(os.path.splitext(path)[1].lower())
+        if format_name is None:
+            raise ValueError(f"Не удалось определить формат файла {path} по расширению")
+    if format_name not in FORMATS:
+        raise ValueError(f"Неизвестный формат {format_name}")
+    return format_name
+
+
+def open_file(path: str, mode: str, binary: bool) -> tp.IO:
+    """
+    Функция для открытия файла переноса (текстовые файлы - в UTF-8 с большим буфером).
+
+    :param path: Путь к файлу.
+    :param mode: Режим ("r" или "w").
+    :param binary: Двоичный ли формат.
+    :return: Открытый файл.
+    """
+
+    if binary:
+        return open(path, mode + "b", buffering=BINARY_READ_SIZE)
+    return open(path, mode, encoding="utf-8", newline="", buffering=io.DEFAULT_BUFFER_SIZE * 16)
+
+
+def export_portfolios(portfolio_database: 'PortfolioDatabase', path: str,
+                      format_name: tp.Optional[str] = None) -> int:
+    """
+    Функция для выгрузки всех портфелей в файл (строки читаются и записываются потоком).
+
+    :param portfolio_database: База данных портфелей.
+    :param path: Путь к файлу.
+    :param format_name: Название формата (None - по расширению файла).
+    :return: Количество выгруженных портфелей.
+    """
+
+    _, write, binary = FORMATS[get_format(path, format_name)]
+    with open_file(path, "w", binary) as file:
+        return write(file, portfolio_database.iter_portfolios())
+
+
+def import_portfolios(portfolio_database: 'PortfolioDatabase', path: str, format_name: tp.Optional[str] = None,
+                      chunk_size: int = 10000) -> tuple[int, int]:
+    """
+    Функция для загрузки портфелей из файла (файл читается потоком, портфели добавляются частями).
+
+    :param portfolio_database: База данных портфелей.
+    :param path: Путь к файлу.
+    :param format_name: Название формата (None - по расширению файла).
+    :param chunk_size: Количество портфелей в одной транзакции.
+    :return: Количество добавленных и пропущенных портфелей.
+    """
+
+    read, _, binary = FORMATS[get_format(path, format_name)]
+    with open_file(path, "r", binary) as file:
+        return portfolio_database.import_portfolios(read(file), chunk_size)
+
+
+# Перенос портфелей из командной строки
+if __name__ == "__main__":
+    import argparse
+
+    from portfolio_database import PortfolioDatabase
+
+    parser = argparse.ArgumentParser(description="Массовая выгрузка и загрузка портфелей")
+    parser.add_argument("action", choices=["export", "import"], help="выгрузка или загрузка")
+    parser.add_argument("path", help="файл портфелей (.csv, .jsonl или .vipf)")
+    parser.add_argument("--db", default="portfolios.db", help="путь к базе данных портфелей")
+    parser.add_argument("--format", choices=list(FORMATS), default=None, help="формат (по-умолчанию - по расширению)")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="количество портфелей в одной транзакции")
+    args = parser.parse_args()
+
+    database = PortfolioDatabase(args.db)
+    try:
+        if args.action == "export":
+            print(f"Выгружено портфелей: {export_portfolios(database, args.path, args.format)}")
+        else:
+            imported_count, skipped_count = import_portfolios(database, args.path, args.format, args.chunk_size)
+            print(f"Добавлено портфелей: {imported_count}, пропущено: {skipped_count}")
+    finally:
+        database.close()
@@ -0,0 +1,268 @@
+# Импорты библиотек
+import typing as tp
+
+import numpy as np
+
+
+class PriceSource(tp.Protocol):
+    """
+    Источник цен для оценки: словарь {тикер: цена} или таблица котировок (price_feed.QuoteCache).
+    """
+
+    def get(self, symbol: str, default: float, /) -> tp.Optional[float]:
+        ...
+
+
+class Valuation(tp.NamedTuple):
+    """
+    Оценка портфелей по текущим ценам.
+    (Позиция i принадлежит портфелю portfolio_ids[position_portfolios[i]] и относится к тикеру
+    symbols[position_symbols[i]]).
+    """
+
+    # ID оценённых портфелей и их стоимость, стоимость покупки и прибыль (нереализованная)
+    portfolio_ids: list[str]
+    values: np.ndarray
+    cost_bases: np.ndarray
+    pnl: np.ndarray
+
+    # Тикеры, встречающиеся в позициях
+    symbols: list[str]
+
+    # Позиции: номер портфеля, номер тикера, количество бумаг, стоимость, прибыль и доля в стоимости портфеля
+    position_portfolios: np.ndarray
+    position_symbols: np.ndarray
+    position_quantities: np.ndarray
+    position_values: np.ndarray
+    position_pnl: np.ndarray
+    position_weights: np.ndarray
+
+
+class PositionSnapshot:
+    """
+    Класс снимка позиций всех портфелей в виде столбцов NumPy.
+    (Снимок загружается из таблицы holdings один раз, а затем обновляется после каждой сделки, поэтому оценка
+    портфелей - это несколько векторных операций без обращения к базе данных и без прохода по сделкам).
+    (Класс не потокобезопасен: обращения к снимку должны быть защищены блокировкой вызывающего кода).
+    """
+
+    def __init__(self, positions: tp.Iterable[tuple[str, str, float, float]] = ()) -> None:
+        """
+        Функция для инициализации снимка.
+
+        :param positions: Позиции (ID портфеля, тикер, количество бумаг, стоимость покупки), упорядоченные
+        по ID портфеля.
+        """
+
+        # Портфели и тикеры снимка (номер портфеля или тикера - индекс в списке)
+        self.portfolio_ids: list[str] = []
+        self.portfolio_indexes: dict[str, int] = {}
+        self.symbols: list[str] = []
+        self.symbol_indexes: dict[str, int] = {}
+
+        # Столбцы позиций (заполнены первые size строк, остальные строки - запас для новых позиций)
+        self.size = 0
+        self.position_portfolios = np.zeros(1024, dtype=np.int64)
+        self.position_symbols = np.zeros(1024, dtype=np.int64)
+        self.quantities = np.zeros(1024, dtype=np.float64)
+        self.cost_bases = np.zeros(1024, dtype=np.float64)
+
+        # Строки позиций каждого портфеля (номер портфеля -> массив номеров строк)
+        self.portfolio_rows: dict[int, np.ndarray] = {}
+
+        self._load(positions)
+
+    def _load(self, positions: tp.Iterable[tuple[str, str, float, float]]) -> None:
+        """
+        Функция для заполнения пустого снимка позициями.
+
+        :param positions: Позиции (ID портфеля, тикер, количество бумаг, стоимость покупки), упорядоченные
+        по ID портфеля.
+        """
+
+        portfolio_column: list[int] = []
+        symbol_column: list[int] = []
+        quantity_column: list[float] = []
+        cost_basis_column: list[float] = []
+        for portfolio_id, symbol, quantity, cost_basis in positions:
+            portfolio_index = self.portfolio_indexes.get(portfolio_id)
+            if portfolio_index is None:
+                portfolio_index = self.portfolio_indexes[portfolio_id] = len(self.portfolio_ids)
+                self.portfolio_ids.append(portfolio_id)
+            symbol_index = self.symbol_indexes.get(symbol)
+            if symbol_index is None:
+                symbol_index = self.symbol_indexes[symbol] = len(self.symbols)
+                self.symbols.append(symbol)
+
+            portfolio_column.append(portfolio_index)
+            symbol_column.append(symbol_index)
+            quantity_column.append(quantity)
+            cost_basis_column.append(cost_basis)
+
+        self._reserve(len(portfolio_column))
+        self.size = len(portfolio_column)
+        self.position_portfolios[:self.size] = portfolio_column
+        self.position_symbols[:self.size] = symbol_column
+        self.quantities[:self.size] = quantity_column
+        self.cost_bases[:self.size] = cost_basis_column
+
+        # Позиции упорядочены по портфелям, поэтому строки каждого портфеля идут подряд
+        portfolios = self.position_portfolios[:self.size]
+        starts = np.flatnonzero(np.diff(portfolios, prepend=-1))
+        ends = np.append(starts[1:], self.size)
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            self.portfolio_rows[int(portfolios[start])] = np.arange(start, end)
+
+    def _reserve(self, size: int) -> None:
+        """
+        Функция для увеличения запаса строк столбцов (вдвое, чтобы добавление позиций было дешёвым).
+
+        :param size: Необходимое количество строк.
+        """
+
+        capacity = len(self.quantities)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+
+        for name in ("position_portfolios", "position_symbols", "quantities", "cost_bases"):
+            column = getattr(self, name)
+            new_column = np.zeros(capacity, dtype=column.dtype)
+            new_column[:self.size] = column[:self.size]
+            setattr(self, name, new_column)
+
+    def set_position(self, portfolio_id: str, symbol: str, quantity: float, cost_basis: float) -> None:
+        """
+        Функция для изменения позиции после сделки (значения берутся из таблицы holdings после изменения).
+
+        :param portfolio_id: ID портфеля.
+        :param symbol: Тикер.
+        :param quantity: Количество бумаг (0 - позиция закрыта).
+        :param cost_basis: Стоимость покупки бумаг позиции.
+        """
+
+        # Получаем номера портфеля и тикера (новые портфели и тикеры добавляются в конец списков)
+        portfolio_index = self.portfolio_indexes.get(portfolio_id)
+        if portfolio_index is None:
+            portfolio_index = self.portfolio_indexes[portfolio_id] = len(self.portfolio_ids)
+            self.portfolio_ids.append(portfolio_id)
+        symbol_index = self.symbol_indexes.get(symbol)
+        if symbol_index is None:
+            symbol_index = self.symbol_indexes[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+
+        # Ищем строку позиции среди строк портфеля (в портфеле немного позиций)
+        rows = self.portfolio_rows.get(portfolio_index, np.empty(0, dtype=np.int64))
+        matching_rows = rows[self.position_symbols[rows] == symbol_index]
+
+        # Если позиции ещё нет, то добавляем строку в конец столбцов
+        if len(matching_rows) == 0:
+            if quantity == 0:
+                return
+            self._reserve(self.size + 1)
+            row = self.size
+            self.size += 1
+            self.position_portfolios[row] = portfolio_index
+            self.position_symbols[row] = symbol_index
+            self.portfolio_rows[portfolio_index] = np.append(rows, row)
+        else:
+            row = int(matching_rows[0])
+
+        # Закрытая позиция остаётся нулевой строкой (она не влияет на стоимость и прибыль портфеля)
+        self.quantities[row] = quantity
+        self.cost_bases[row] = cost_basis
+
+    def remove_portfolio(self, portfolio_id: str) -> None:
+        """
+        Функция для удаления всех позиций портфеля (после удаления портфеля).
+        (Номер портфеля не освобождается, поэтому при оценке всех портфелей он получает нулевую стоимость).
+
+        :param portfolio_id: ID портфеля.
+        """
+
+        portfolio_index = self.portfolio_indexes.get(portfolio_id)
+        if portfolio_index is None:
+            return
+
+        rows = self.portfolio_rows.pop(portfolio_index, None)
+        if rows is not None:
+            self.quantities[rows] = 0
+            self.cost_bases[rows] = 0
+
+    def get_prices(self, prices: PriceSource) -> np.ndarray:
+        """
+        Функция для получения массива цен, упорядоченного по номерам тикеров снимка.
+
+        :param prices: Словарь {тикер: цена} или таблица котировок.
+        :return: Массив цен (NaN - цены тикера нет).
+        """
+
+        return np.fromiter((prices.get(symbol, np.nan) for symbol in self.symbols), dtype=np.float64,
+                           count=len(self.symbols))
+
+    def valuate(self, prices: tp.Union[PriceSource, np.ndarray],
+                portfolio_ids: tp.Optional[tp.Iterable[str]] = None) -> Valuation:
+        """
+        Функция для оценки портфелей одним проходом по всем их позициям.
+
+        :param prices: Словарь {тикер: цена}, таблица котировок или массив цен, полученный функцией get_prices.
+        :param portfolio_ids: ID оцениваемых портфелей (None - все портфели снимка).
+        :return: Оценка портфелей (позиции без цены оцениваются по стоимости покупки).
+        """
+
+        # Выбираем строки оцениваемых портфелей
+        if portfolio_ids is None:
+            valued_portfolio_ids = list(self.portfolio_ids)
+            rows: tp.Union[slice, np.ndarray] = slice(0, self.size)
+            position_portfolios = self.position_portfolios[rows].copy()
+        else:
+            valued_portfolio_ids = list(portfolio_ids)
+            empty_rows = np.empty(0, dtype=np.int64)
+            portfolio_rows = [self.portfolio_rows.get(self.portfolio_indexes.get(portfolio_id, -1), empty_rows)
+                              for portfolio_id in valued_portfolio_ids]
+            rows = np.concatenate(portfolio_rows) if portfolio_rows else np.empty(0, dtype=np.int64)
+
+            # Нумеруем портфели в порядке переданного списка
+            position_portfolios = np.repeat(np.arange(len(valued_portfolio_ids)), [len(r) for r in portfolio_rows])
+
+        # (Срез столбцов - это представление, которое изменится при следующей сделке, поэтому копируем его)
+        position_symbols = self.position_symbols[rows].copy()
+        quantities = self.quantities[rows].copy()
+        cost_bases = self.cost_bases[rows]
+
+        # Получаем цены тикеров (для части портфелей - только тикеров их позиций)
+        if not isinstance(prices, np.ndarray):
+            if portfolio_ids is None:
+                prices = self.get_prices(prices)
+            else:
+                price_source = prices
+                prices = np.full(len(self.symbols), np.nan)
+                for symbol_index in np.unique(position_symbols).tolist():
+                    prices[symbol_index] = price_source.get(self.symbols[symbol_index], np.nan)
+
+        # Стоимость и прибыль позиций (проверка цен без значения делается по массиву тикеров, а не позиций)
+        position_prices = prices[position_symbols]
+        position_values = quantities * position_prices
+        if np.isnan(prices).any():
+            position_values = np.where(np.isnan(position_prices), cost_bases, position_values)
+        position_pnl = position_values - cost_bases
+
+        # Суммы по портфелям и доли позиций в стоимости их портфелей
+        # (Делим на стоимость портфеля один раз на портфель, а для позиций только умножаем)
+        portfolio_count = len(valued_portfolio_ids)
+        values = np.bincount(position_portfolios, weights=position_values, minlength=portfolio_count)
+        portfolio_cost_bases = np.bincount(position_portfolios, weights=cost_bases, minlength=portfolio_count)
+        inverse_values = np.divide(1.0, values, out=np.zeros_like(values), where=values != 0)
+        position_weights = position_values * inverse_values[position_portfolios]
+
+        return Valuation(valued_portfolio_ids, values, portfolio_cost_bases, values - portfolio_cost_bases,
+                         list(self.symbols), position_portfolios, position_symbols, quantities, position_values,
+                         position_pnl, position_weights)
+
+    def __len__(self) -> int:
+        """
+        Функция для получения количества строк позиций в снимке.
+        """
+
+        return self.size
@@ -0,0 +1,348 @@
+# Импорты библиотек
+import csv
+import threading
+import time
+import typing as tp
+
+
+class Quote(tp.NamedTuple):
+    """
+    Котировка бумаги.
+    """
+
+    # Цена бумаги
+    price: float
+
+    # Время получения котировки (time.monotonic)
+    updated_at: float
+
+
+class PriceProvider:
+    """
+    Базовый класс источника котировок.
+    """
+
+    def get_prices(self, symbols: list[str]) -> dict[str, float]:
+        """
+        Функция для получения цен группы бумаг одним запросом.
+
+        :param symbols: Список тикеров.
+        :return: Словарь {тикер: цена} (тикеров, цен которых нет у источника, в словаре нет).
+        """
+
+        raise NotImplementedError
+
+
+class CsvReplayProvider(PriceProvider):
+    """
+    Источник котировок, воспроизводящий цены из CSV-файла (для работы без доступа к бирже).
+    (Файл содержит строки "время,тикер,цена", упорядоченные по времени, и каждый запрос цен переходит
+    к следующему моменту времени файла, а после последнего - начинает сначала).
+    """
+
+    def __init__(self, path: str, latency: float = 0.0) -> None:
+        """
+        Функция для инициализации источника.
+
+        :param path: Путь к CSV-файлу с заголовком timestamp,symbol,price.
+        :param latency: Искусственная задержка каждого запроса в секундах (имитация сетевого источника).
+        """
+
+        self.latency = latency
+
+        # Читаем цены и группируем их по моментам времени
+        self.steps: list[dict[str, float]] = []
+        last_timestamp: tp.Optional[str] = None
+        with open(path, newline="", encoding="utf-8") as file:
+            for row in csv.DictReader(file):
+                if row["timestamp"] != last_timestamp:
+                    self.steps.append({})
+                    last_timestamp = row["timestamp"]
+                self.steps[-1][row["symbol"]] = float(row["price"])
+
+        # Текущие цены (последняя известная цена каждого тикера) и номер следующего момента времени
+        self.prices: dict[str, float] = {}
+        self.next_step = 0
+        self.lock = threading.Lock()
+
+    def get_prices(self, symbols: list[str]) -> dict[str, float]:
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self.lock:
+            if self.steps:
+                self.prices.update(self.steps[self.next_step])
+                self.next_step = (self.next_step + 1) % len(self.steps)
+            return {symbol: self.prices[symbol] for symbol in symbols if symbol in self.prices}
+
+
+class QuoteCache:
+    """
+    Класс общей таблицы котировок в памяти со временем жизни и выдачей устаревших котировок на время обновления
+    (stale-while-revalidate).
+    (Обработчики читают цены без ввода-вывода, а устаревшие котировки запрашиваются у сервиса котировок вне очереди).
+    """
+
+    def __init__(self, ttl: float = 10.0, stale_ttl: float = 60.0) -> None:
+        """
+        Функция для инициализации таблицы котировок.
+
+        :param ttl: Время в секундах, в течение которого котировка считается свежей.
+        :param stale_ttl: Время в секундах после истечения ttl, в течение которого устаревшая котировка ещё выдаётся
+        (с запросом её обновления).
+        """
+
+        # Сохраняем параметры
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+        # Котировки (тикер -> котировка)
+        # (Котировка заменяется целиком, поэтому чтение из словаря не требует блокировки)
+        self.quotes: dict[str, Quote] = {}
+
+        # Тикеры, котировки которых нужно обновить вне очереди, и событие для пробуждения сервиса котировок
+        self.revalidate_symbols: set[str] = set()
+        self.revalidate_event = threading.Event()
+
+        # Функции, получающие каждую группу сохранённых цен (например, PortfolioAnalytics.on_prices)
+        self.listeners: list[tp.Callable[[dict[str, float]], None]] = []
+
+        # Счётчики для метрик (изменяются без блокировки, поэтому при чтении из многих потоков приблизительны)
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.staleness_sum = 0.0
+        self.max_staleness = 0.0
+
+    def get(self, symbol: str, default: tp.Optional[float] = None) -> tp.Optional[float]:
+        """
+        Функция для получения цены бумаги (O(1), без ввода-вывода).
+        (Сигнатура совпадает с dict.get, поэтому таблицу можно передать в оценку портфелей вместо словаря цен).
+
+        :param symbol: Тикер.
+        :param default: Значение, возвращаемое, если котировки нет или она слишком устарела.
+        :return: Цена бумаги или default.
+        """
+
+        quote = self.quotes.get(symbol)
+        if quote is None:
+            self.misses += 1
+            self.request_revalidation(symbol)
+            return default
+
+        # Свежая котировка
+        age = time.monotonic() - quote.updated_at
+        if age <= self.ttl:
+            self.fresh_hits += 1
+        else:
+            # Слишком устаревшую котировку не выдаём, а устаревшую выдаём, но запрашиваем её обновление
+            self.request_revalidation(symbol)
+            if age > self.ttl + self.stale_ttl:
+                self.misses += 1
+                return default
+            self.stale_hits += 1
+
+        self.staleness_sum += age
+        if age > self.max_staleness:
+            self.max_staleness = age
+        return quote.price
+
+    def request_revalidation(self, symbol: str) -> None:
+        """
+        Функция для запроса обновления котировки вне очереди.
+
+        :param symbol: Тикер.
+        """
+
+        if symbol not in self.revalidate_symbols:
+            self.revalidate_symbols.add(symbol)
+            self.revalidate_event.set()
+
+    def take_revalidate_symbols(self) -> list[str]:
+        """
+        Функция для получения (и очистки) списка тикеров, котировки которых нужно обновить вне очереди.
+
+        :return: Список тикеров.
+        """
+
+        self.revalidate_event.clear()
+        symbols = list(self.revalidate_symbols)
+        self.revalidate_symbols.difference_update(symbols)
+        return symbols
+
+    def update(self, prices: dict[str, float]) -> None:
+        """
+        Функция для сохранения полученных цен.
+
+        :param prices: Словарь {тикер: цена}.
+        """
+
+        updated_at = time.monotonic()
+        for symbol, price in prices.items():
+            self.quotes[symbol] = Quote(price, updated_at)
+        for listener in self.listeners:
+            listener(prices)
+
+    def add_listener(self, listener: tp.Callable[[dict[str, float]], None]) -> None:
+        """
+        Функция для добавления функции, получающей каждую группу сохранённых цен (в потоке сервиса котировок).
+
+        :param listener: Функция, получающая словарь {тикер: цена}.
+        """
+
+        self.listeners.append(listener)
+
+    def get_metrics(self) -> dict[str, tp.Union[int, float]]:
+        """
+        Функция для получения метрик таблицы котировок.
+
+        :return: Словарь с количеством свежих и устаревших выдач, промахов, средним и максимальным возрастом
+        выданных котировок в секундах и количеством котировок.
+        """
+
+        hits = self.fresh_hits + self.stale_hits
+        return {
+            "fresh_hits": self.fresh_hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "average_staleness": self.staleness_sum / hits if hits else 0.0,
+            "max_staleness": self.max_staleness,
+            "quotes": len(self.quotes),
+        }
+
+    def __len__(self) -> int:
+        """
+        Функция для получения количества котировок.
+        """
+
+        return len(self.quotes)
+
+
+class PriceFeedService:
+    """
+    Класс сервиса котировок: по расписанию обновляет цены всех бумаг, которые есть в портфелях, группами запросов
+    к источнику котировок и сохраняет их в общую таблицу котировок.
+    """
+
+    def __init__(self, provider: PriceProvider, quote_cache: QuoteCache,
+                 symbols_source: tp.Callable[[], tp.Iterable[str]], interval: tp.Optional[float] = 5.0,
+                 batch_size: int = 200) -> None:
+        """
+        Функция для инициализации сервиса.
+
+        :param provider: Источник котировок.
+        :param quote_cache: Таблица котировок.
+        :param symbols_source: Функция, возвращающая тикеры, цены которых нужно обновлять
+        (например, PortfolioDatabase.get_held_symbols).
+        :param interval: Период обновления всех котировок в секундах (None - плановые обновления запускает
+        вызывающий код, например, планировщик заданий, а поток сервиса только обновляет котировки вне очереди).
+        :param batch_size: Количество тикеров в одном запросе к источнику.
+        """
+
+        # Сохраняем параметры
+        self.provider = provider
+        self.quote_cache = quote_cache
+        self.symbols_source = symbols_source
+        self.interval = interval
+        self.batch_size = batch_size
+
+        # Блокировка обновлений (плановое обновление и обновление вне очереди могут запускаться разными потоками)
+        self.refresh_lock = threading.Lock()
+
+        # Поток обновления котировок
+        self.stopped = threading.Event()
+        self.thread: tp.Optional[threading.Thread] = None
+
+        # Метрики обновлений: количество, ошибки, суммарная, последняя и максимальная длительность в секундах
+        self.refresh_count = 0
+        self.refresh_errors = 0
+        self.refresh_seconds_sum = 0.0
+        self.last_refresh_seconds = 0.0
+        self.max_refresh_seconds = 0.0
+
+    def refresh(self, symbols: tp.Optional[tp.Iterable[str]] = None) -> None:
+        """
+        Функция для обновления котировок группами запросов к источнику.
+
+        :param symbols: Тикеры (None - все тикеры из symbols_source).
+        """
+
+        with self.refresh_lock:
+            symbols = list(self.symbols_source() if symbols is None else symbols)
+            start_time = time.monotonic()
+            try:
+                for start in range(0, len(symbols), self.batch_size):
+                    self.quote_cache.update(self.provider.get_prices(symbols[start:start + self.batch_size]))
+            except Exception:
+                self.refresh_errors += 1
+                raise
+            finally:
+                seconds = time.monotonic() - start_time
+                self.refresh_count += 1
+                self.refresh_seconds_sum += seconds
+                self.last_refresh_seconds = seconds
+                self.max_refresh_seconds = max(self.max_refresh_seconds, seconds)
+
+    def run(self) -> None:
+        """
+        Функция потока обновления котировок.
+        (Между плановыми обновлениями поток обновляет котировки, обновление которых запрошено вне очереди).
+        """
+
+        # Без периода плановых обновлений поток только обновляет котировки вне очереди
+        next_refresh_time = time.monotonic() if self.interval is not None else None
+        while not self.stopped.is_set():
+            try:
+                # Плановое обновление всех котировок
+                if next_refresh_time is not None and time.monotonic() >= next_refresh_time:
+                    next_refresh_time = time.monotonic() + self.interval
+                    self.quote_cache.take_revalidate_symbols()
+                    self.refresh()
+
+                # Обновление вне очереди
+                elif self.quote_cache.revalidate_event.is_set():
+                    self.refresh(self.quote_cache.take_revalidate_symbols())
+
+            # Ошибка источника не останавливает сервис: котировки останутся в таблице до следующего обновления
+            except Exception:
+                pass
+
+            self.quote_cache.revalidate_event.wait(max(0.0, next_refresh_time - time.monotonic())
+                                                   if next_refresh_time is not None else None)
+
+    def start(self) -> 'PriceFeedService':
+        """
+        Функция для запуска потока обновления котировок.
+        """
+
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name="price_feed", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Функция для остановки потока обновления котировок.
+        """
+
+        self.stopped.set()
+        self.quote_cache.revalidate_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def get_metrics(self) -> dict[str, tp.Union[int, float]]:
+        """
+        Функция для получения метрик сервиса.
+
+        :return: Словарь с количеством обновлений и ошибок, средней, последней и максимальной длительностью
+        обновления в секундах.
+        """
+
+        return {
+            "refreshes": self.refresh_count,
+            "refresh_errors": self.refresh_errors,
+            "average_refresh_seconds": self.refresh_seconds_sum / self.refresh_count if self.refresh_count else 0.0,
+            "last_refresh_seconds": self.last_refresh_seconds,
+            "max_refresh_seconds": self.max_refresh_seconds,
+        }
@@ -0,0 +1,280 @@
+# Импорты библиотек
+import os
+import re
+import threading
+import typing as tp
+
+import numpy as np
+
+# Столбцы истории цен и их типы (время - секунды Unix)
+COLUMNS: dict[str, np.dtype] = {
+    "timestamp": np.dtype("<i8"),
+    "open": np.dtype("<f8"),
+    "high": np.dtype("<f8"),
+    "low": np.dtype("<f8"),
+    "close": np.dtype("<f8"),
+}
+
+# Допустимые тикеры (тикер - имя каталога, поэтому разделители путей запрещены, а первый символ - буква или цифра,
+# чтобы имена "." и ".." не указывали на каталог хранилища или его родительский каталог)
+SYMBOL_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]*")
+
+
+class PriceSeries(tp.NamedTuple):
+    """
+    Свечи (OHLC) одной бумаги за период.
+    (Массивы - представления отображённых в память файлов без копирования, их нельзя изменять).
+    """
+
+    timestamp: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+
+
+class PriceHistoryStore:
+    """
+    Класс хранилища истории цен: для каждой бумаги - каталог с файлами столбцов, в которые свечи только дописываются.
+    (Файлы отображаются в память, поэтому запрос периода - это двоичный поиск по столбцу времени и срезы столбцов
+    без копирования и без чтения лишних данных).
+    """
+
+    def __init__(self, directory: str = "price_history") -> None:
+        """
+        Функция для инициализации хранилища.
+
+        :param directory: Каталог хранилища.
+        """
+
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        # Отображённые в память столбцы бумаг (тикер -> {столбец: массив})
+        # (Отображение пересоздаётся, только если в файлы дописаны новые свечи)
+        self.series: dict[str, dict[str, np.ndarray]] = {}
+        self.lock = threading.Lock()
+
+    def get_symbol_directory(self, symbol: str) -> str:
+        """
+        Функция для получения каталога бумаги.
+
+        :param symbol: Тикер.
+        :return: Путь к каталогу.
+        """
+
+        if not SYMBOL_PATTERN.fullmatch(symbol):
+            raise ValueError(f"Недопустимый тикер: {symbol!r}")
+        return os.path.join(self.directory, symbol)
+
+    def append(self, symbol: str, timestamps: tp.Sequence[int], opens: tp.Sequence[float],
+               highs: tp.Sequence[float], lows: tp.Sequence[float], closes: tp.Sequence[float]) -> None:
+        """
+        Функция для дописывания свечей в конец истории бумаги.
+
+        :param symbol: Тикер.
+        :param timestamps: Время свечей (строго возрастает и больше времени последней свечи в истории).
+        :param opens: Цены открытия.
+        :param highs: Максимальные цены.
+        :param lows: Минимальные цены.
+        :param closes: Цены закрытия.
+        """
+
+        columns = {name: np.ascontiguousarray(values, dtype=COLUMNS[name])
+                   for name, values in zip(COLUMNS, (timestamps, opens, highs, lows, closes))}
+        if len({len(values) for values in columns.values()}) != 1:
+            raise ValueError("Столбцы свечей должны быть одной длины")
+        if len(columns["timestamp"]) == 0:
+            return
+
+        # Двоичный поиск по времени работает, только если время строго возрастает
+        if np.any(np.diff(columns["timestamp"]) <= 0):
+            raise ValueError("Время свечей должно строго возрастать")
+
+        symbol_directory = self.get_symbol_directory(symbol)
+        with self.lock:
+            last_timestamps = self._get_columns(symbol)["timestamp"]
+            if len(last_timestamps) and columns["timestamp"][0] <= last_timestamps[-1]:
+                raise ValueError("Время свечей должно быть больше времени последней свечи в истории")
+
+            # Столбец времени пишем последним: длина истории определяется по нему, поэтому если запись прервётся,
+            # то недописанные значения других столбцов будут перезаписаны при следующем дописывании
+            os.makedirs(symbol_directory, exist_ok=True)
+            row_count = len(last_timestamps)
+            for name in reversed(COLUMNS):
+                path = os.path.join(symbol_directory, name)
+                with open(path, "r+b" if os.path.exists(path) else "wb") as file:
+                    file.seek(row_count * COLUMNS[name].itemsize)
+                    file.write(columns[name].tobytes())
+                    file.truncate()
+
+            # Отображение нужно пересоздать
+            self.series.pop(symbol, None)
+
+    def _get_columns(self, symbol: str) -> dict[str, np.ndarray]:
+        """
+        Функция для получения отображённых в память столбцов бумаги (вызывается под блокировкой).
+
+        :param symbol: Тикер.
+        :return: Словарь {столбец: массив} (пустые массивы, если истории нет).
+        """
+
+        columns = self.series.get(symbol)
+        if columns is not None:
+            return columns
+
+        symbol_directory = self.get_symbol_directory(symbol)
+        timestamp_path = os.path.join(symbol_directory, "timestamp")
+        row_count = os.path.getsize(timestamp_path) // COLUMNS["timestamp"].itemsize \
+            if os.path.exists(timestamp_path) else 0
+
+        # Пустой файл нельзя отобразить в память
+        if row_count == 0:
+            columns = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+        else:
+            columns = {name: np.memmap(os.path.join(symbol_directory, name), dtype=dtype, mode="r", shape=(row_count,))
+                       for name, dtype in COLUMNS.items()}
+        self.series[symbol] = columns
+        return columns
+
+    def get_range(self, symbol: str, start: tp.Optional[int] = None, end: tp.Optional[int] = None) -> PriceSeries:
+        """
+        Функция для получения свечей бумаги за период (без копирования данных).
+
+        :param symbol: Тикер.
+        :param start: Начало периода включительно (None - с начала истории).
+        :param end: Конец периода не включительно (None - до конца истории).
+        :return: Свечи за период.
+        """
+
+        with self.lock:
+            columns = self._get_columns(symbol)
+
+        # Двоичный поиск границ периода по столбцу времени
+        timestamps = columns["timestamp"]
+        first = 0 if start is None else int(np.searchsorted(timestamps, start, side="left"))
+        last = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side="left"))
+        return PriceSeries(*(columns[name][first:last] for name in COLUMNS))
+
+    def get_closes_as_of(self, symbol: str, timestamps: np.ndarray) -> np.ndarray:
+        """
+        Функция для получения цен закрытия последних свечей не позже заданных моментов времени.
+
+        :param symbol: Тикер.
+        :param timestamps: Моменты времени (по возрастанию).
+        :return: Массив цен (NaN - до первой свечи истории).
+        """
+
+        with self.lock:
+            columns = self._get_columns(symbol)
+
+        indexes = np.searchsorted(columns["timestamp"], timestamps, side="right") - 1
+        closes = np.full(len(timestamps), np.nan)
+        found = indexes >= 0
+        closes[found] = columns["close"][indexes[found]]
+        return closes
+
+    def get_symbols(self) -> list[str]:
+        """
+        Функция для получения тикеров, история которых есть в хранилище.
+
+        :return: Список тикеров.
+        """
+
+        return sorted(name for name in os.listdir(self.directory)
+                      if os.path.isdir(os.path.join(self.directory, name)) and SYMBOL_PATTERN.fullmatch(name))
+
+    def close(self) -> None:
+        """
+        Функция для закрытия отображений файлов в память.
+        """
+
+        with self.lock:
+            self.series.clear()
+
+
+class Performance(tp.NamedTuple):
+    """
+    Доходность портфеля за период.
+    """
+
+    # Моменты времени (свечи бумаг портфеля и сделки), стоимость портфеля и денежные потоки (покупки - пополнения,
+    # продажи - изъятия), пришедшиеся на промежуток до каждого момента
+    timestamps: np.ndarray
+    values: np.ndarray
+    cash_flows: np.ndarray
+
+    # Рост 1 рубля, вложенного в начале периода, без учёта пополнений и изъятий, и просадка от предыдущего максимума
+    wealth: np.ndarray
+    drawdowns: np.ndarray
+
+    # Взвешенная по времени доходность за период и максимальная просадка (доли)
+    time_weighted_return: float
+    max_drawdown: float
+
+
+def calculate_performance(price_history: PriceHistoryStore,
+                          transactions: tp.Sequence[tuple[str, float, float, float]],
+                          start: tp.Optional[float] = None, end: tp.Optional[float] = None) -> Performance:
+    """
+    Функция для расчёта взвешенной по времени доходности и просадки портфеля по журналу сделок и истории цен.
+    (Период делится на промежутки между соседними моментами времени (в том числе моментами сделок), доходность
+    промежутка считается без учёта денежного потока, пришедшегося на него, а доходности промежутков перемножаются).
+
+    :param price_history: Хранилище истории цен.
+    :param transactions: Сделки (тикер, количество бумаг со знаком, цена, время), упорядоченные по времени.
+    :param start: Начало периода в секундах Unix (None - время первой сделки).
+    :param end: Конец периода в секундах Unix включительно (None - до конца истории).
+    :return: Доходность портфеля.
+    """
+
+    # Сделки по бумагам
+    trades: dict[str, tuple[list[float], list[float], list[float]]] = {}
+    for symbol, quantity, price, executed_at in transactions:
+        times, quantities, prices = trades.setdefault(symbol, ([], [], []))
+        times.append(executed_at)
+        quantities.append(quantity)
+        prices.append(price)
+    all_times = np.array([executed_at for _, _, _, executed_at in transactions], dtype=np.float64)
+    if start is None:
+        start = float(all_times[0]) if len(all_times) else 0.0
+    bar_end = None if end is None else int(np.floor(end)) + 1
+
+    # Моменты времени - свечи бумаг портфеля и сделки за период
+    parts = [price_history.get_range(symbol, int(np.ceil(start)), bar_end).timestamp for symbol in trades]
+    parts.append(all_times[(all_times >= start) & (all_times <= (np.inf if end is None else end))])
+    timestamps = np.unique(np.concatenate(parts).astype(np.float64))
+
+    # Стоимость портфеля в каждый момент: количество бумаг по сделкам до этого момента, умноженное на последнюю
+    # цену закрытия (до первой свечи истории - на цену последней сделки)
+    values = np.zeros(len(timestamps))
+    for symbol, (times, quantities, prices) in trades.items():
+        trade_indexes = np.searchsorted(np.array(times), timestamps, side="right")
+        held = np.concatenate(([0.0], np.cumsum(quantities)))[trade_indexes]
+        closes = price_history.get_closes_as_of(symbol, timestamps)
+        missing = np.isnan(closes)
+        if missing.any():
+            closes[missing] = np.concatenate(([np.nan], prices))[trade_indexes[missing]]
+        values += np.where(held > 1e-9, held * np.nan_to_num(closes), 0.0)
+
+    # Денежные потоки в моменты сделок (сделки до начала периода входят в начальную стоимость)
+    cash_flows = np.zeros(len(timestamps))
+    if len(timestamps):
+        in_period = (all_times > timestamps[0]) & (all_times <= timestamps[-1])
+        amounts = np.array([quantity * price for _, quantity, price, _ in transactions], dtype=np.float64)
+        cash_flows = np.bincount(np.searchsorted(timestamps, all_times[in_period], side="left"),
+                                 weights=amounts[in_period], minlength=len(timestamps))
+
+    # Доходности промежутков: сделка совершается в конце своего промежутка, поэтому её поток вычитается из стоимости
+    # в конце промежутка (промежутки, в начале которых портфель пуст, доходности не дают)
+    growth = np.ones(len(timestamps))
+    if len(timestamps) > 1:
+        invested = values[:-1]
+        positive = invested > 1e-9
+        growth[1:][positive] = (values[1:] - cash_flows[1:])[positive] / invested[positive]
+    wealth = np.cumprod(growth)
+    drawdowns = wealth / np.maximum.accumulate(wealth) - 1 if len(wealth) else np.empty(0)
+
+    return Performance(timestamps, values, cash_flows, wealth, drawdowns,
+                       float(wealth[-1] - 1) if len(wealth) else 0.0,
+                       float(-drawdowns.min()) if len(drawdowns) else 0.0)
@@ -0,0 +1,204 @@
+# Импорты библиотек
+import sqlite3
+import typing as tp
+
+
+class Migration(tp.NamedTuple):
+    """
+    Миграция схемы базы данных.
+    """
+
+    # Номер версии схемы после применения миграции
+    version: int
+
+    # Описание миграции
+    description: str
+
+    # Функция, применяющая миграцию через переданное подключение (без фиксации транзакции)
+    apply: tp.Callable[[sqlite3.Connection], None]
+
+
+def create_portfolio_info(connection: sqlite3.Connection) -> None:
+    """
+    Миграция 1: создание таблицы с общей информацией о портфелях (ID портфеля, имя портфеля, ID владельца).
+    (Базы данных, созданные до появления миграций, уже содержат эту таблицу, поэтому она создаётся, только если её нет).
+
+    :param connection: Подключение к базе данных.
+    """
+
+    connection.execute("""
+    CREATE TABLE IF NOT EXISTS portfolio_info (
+        portfolio_id TEXT PRIMARY KEY,
+        portfolio_name TEXT,
+        user_id INTEGER
+    )
+    """)
+
+
+def add_user_portfolio_name_index(connection: sqlite3.Connection) -> None:
+    """
+    Миграция 2: уникальный индекс по (ID владельца, имя портфеля).
+    (Индекс используется и для поиска всех портфелей пользователя, т.к. ID владельца - первый столбец индекса).
+
+    :param connection: Подключение к базе данных.
+    """
+
+    # Старая проверка имени перед добавлением не защищала от одновременного добавления портфелей с одним именем,
+    # поэтому переименовываем такие повторы (дописываем к имени ID портфеля), чтобы индекс можно было создать
+    connection.execute("""
+    UPDATE portfolio_info SET portfolio_name = portfolio_name || ' (' || portfolio_id || ')'
+    WHERE rowid NOT IN (SELECT MIN(rowid) FROM portfolio_info GROUP BY user_id, portfolio_name)
+    """)
+
+    connection.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS portfolio_info_user_id_portfolio_name
+    ON portfolio_info (user_id, portfolio_name)
+    """)
+
+
+def add_portfolio_key(connection: sqlite3.Connection) -> None:
+    """
+    Миграция 3: целочисленный ключ портфеля (portfolio_key - псевдоним rowid) вместо текстового первичного ключа.
+    (Существующие 10-символьные ID портфелей сохраняются в столбце portfolio_id, который остаётся уникальным).
+
+    :param connection: Подключение к базе данных.
+    """
+
+    # SQLite не позволяет изменить первичный ключ таблицы, поэтому пересоздаём таблицу
+    # (Ключи назначаются в порядке добавления портфелей)
+    connection.execute("""
+    CREATE TABLE portfolio_info_new (
+        portfolio_key INTEGER PRIMARY KEY,
+        portfolio_id TEXT NOT NULL UNIQUE,
+        portfolio_name TEXT,
+        user_id INTEGER
+    )
+    """)
+    connection.execute("""
+    INSERT INTO portfolio_info_new (portfolio_id, portfolio_name, user_id)
+    SELECT portfolio_id, portfolio_name, user_id FROM portfolio_info ORDER BY rowid
+    """)
+    connection.execute("DROP TABLE portfolio_info")
+    connection.execute("ALTER TABLE portfolio_info_new RENAME TO portfolio_info")
+
+    # Индекс удалён вместе со старой таблицей, поэтому создаём его заново
+    add_user_portfolio_name_index(connection)
+
+
+def create_holdings_and_transactions(connection: sqlite3.Connection) -> None:
+    """
+    Миграция 4: таблицы позиций портфелей и сделок.
+    (Позиции - это текущее состояние портфеля, которое изменяется при каждой сделке, поэтому для оценки портфеля
+    не нужно заново проходить по всем сделкам).
+
+    :param connection: Подключение к базе данных.
+    """
+
+    # Позиции портфелей: количество бумаг и суммарная стоимость их покупки (для расчёта прибыли)
+    # (Позиции хранятся в порядке (ID портфеля, тикер), поэтому позиции одного портфеля лежат рядом)
+    connection.execute("""
+    CREATE TABLE IF NOT EXISTS holdings (
+        portfolio_id TEXT NOT NULL REFERENCES portfolio_info (portfolio_id) ON DELETE CASCADE,
+        symbol TEXT NOT NULL,
+        quantity REAL NOT NULL,
+        cost_basis REAL NOT NULL,
+        PRIMARY KEY (portfolio_id, symbol)
+    ) WITHOUT ROWID
+    """)
+
+    # Сделки портфелей (количество положительно при покупке и отрицательно при продаже)
+    connection.execute("""
+    CREATE TABLE IF NOT EXISTS transactions (
+        transaction_key INTEGER PRIMARY KEY,
+        portfolio_id TEXT NOT NULL REFERENCES portfolio_info (portfolio_id) ON DELETE CASCADE,
+        symbol TEXT NOT NULL,
+        quantity REAL NOT NULL,
+        price REAL NOT NULL,
+        executed_at REAL NOT NULL
+    )
+    """)
+    connection.execute("""
+    CREATE INDEX IF NOT EXISTS transactions_portfolio_id ON transactions (portfolio_id, transaction_key)
+    """)
+
+
+def create_portfolio_snapshots(connection: sqlite3.Connection) -> None:
+    """
+    Миграция 5: таблица ежедневных снимков стоимости портфелей.
+    (Снимки хранятся в порядке (ID портфеля, дата), поэтому история одного портфеля лежит рядом,
+    а удаление портфеля удаляет его снимки без просмотра всей таблицы).
+
+    :param connection: Подключение к базе данных.
+    """
+
+    # Стоимость и стоимость покупки портфеля на конец дня (дата в формате ГГГГ-ММ-ДД)
+    connection.execute("""
+    CREATE TABLE IF NOT EXISTS portfolio_snapshots (
+        portfolio_id TEXT NOT NULL REFERENCES portfolio_info (portfolio_id) ON DELETE CASCADE,
+        snapshot_date TEXT NOT NULL,
+        value REAL NOT NULL,
+        cost_basis REAL NOT NULL,
+        PRIMARY KEY (portfolio_id, snapshot_date)
+    ) WITHOUT ROWID
+    """)
+
+
+# Список миграций в порядке применения (номера версий идут подряд, начиная с 1)
+MIGRATIONS: list[Migration] = [
+    Migration(1, "Создание таблицы portfolio_info", create_portfolio_info),
+    Migration(2, "Уникальный индекс по (user_id, portfolio_name)", add_user_portfolio_name_index),
+    Migration(3, "Целочисленный ключ портфеля portfolio_key", add_portfolio_key),
+    Migration(4, "Таблицы позиций holdings и сделок transactions", create_holdings_and_transactions),
+    Migration(5, "Таблица ежедневных снимков стоимости портфелей portfolio_snapshots", create_portfolio_snapshots),
+]
+
+
+def get_schema_version(connection: sqlite3.Connection) -> int:
+    """
+    Функция для получения текущей версии схемы базы данных.
+
+    :param connection: Подключение к базе данных.
+    :return: Номер версии схемы (0 - миграции ещё не применялись).
+    """
+
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(connection: sqlite3.Connection, migrations: tp.Optional[list[Migration]] = None) -> list[Migration]:
+    """
+    Функция для применения к базе данных всех ещё не применённых миграций.
+    (Каждая миграция выполняется в своей транзакции вместе с изменением версии схемы, поэтому прерванная миграция
+    не оставляет базу данных в промежуточном состоянии).
+
+    :param connection: Подключение к базе данных.
+    :param migrations: Список миграций (по-умолчанию - MIGRATIONS).
+    :return: Список применённых миграций.
+    """
+
+    # Если схема уже последней версии, то не блокируем базу данных на запись
+    migrations = migrations if migrations is not None else MIGRATIONS
+    if get_schema_version(connection) >= migrations[-1].version:
+        return []
+
+    applied_migrations: list[Migration] = []
+    for migration in migrations:
+
+        # Сразу блокируем базу данных на запись и перечитываем версию схемы внутри транзакции
+        # (Так одна миграция не будет применена дважды, если несколько процессов запускаются одновременно)
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if get_schema_version(connection) >= migration.version:
+                connection.rollback()
+                continue
+
+            migration.apply(connection)
+            connection.execute(f"PRAGMA user_version = {int(migration.version)}")
+            connection.commit()
+
+        except BaseException:
+            connection.rollback()
+            raise
+
+        applied_migrations.append(migration)
+
+    return applied_migrations
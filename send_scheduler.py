@@ -0,0 +1,438 @@
+# Импорты библиотек
+import collections
+import heapq
+import itertools
+import logging
+import threading
+import time
+import typing as tp
+
+# Журнал telebot (планировщик не импортирует telebot, чтобы не замедлять запуск процессов, которые его не используют)
+logger = logging.getLogger("TeleBot")
+
+# Приоритеты сообщений (меньше - важнее): ответы пользователю и рассылки (уведомления)
+PRIORITY_REPLY = 0
+PRIORITY_BROADCAST = 10
+
+# Максимальная длина сообщения Telegram и разделитель объединённых сообщений
+MAX_MESSAGE_LENGTH = 4096
+COALESCE_SEPARATOR = "\n\n"
+
+
+class TokenBucket:
+    """
+    Класс ограничителя частоты «ведро токенов»: токены пополняются с заданной скоростью до ёмкости ведра,
+    а каждое действие забирает один токен (ёмкость - допустимый всплеск действий).
+    (Класс не потокобезопасен: обращения должны быть защищены блокировкой вызывающего кода).
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        """
+        Функция для инициализации ведра (изначально оно полное).
+
+        :param rate: Скорость пополнения в токенах в секунду.
+        :param capacity: Ёмкость ведра.
+        """
+
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        """
+        Функция для пополнения ведра за время, прошедшее с прошлого обращения.
+
+        :param now: Текущее время (time.monotonic).
+        """
+
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def get_wait_time(self, now: float) -> float:
+        """
+        Функция для получения времени до появления токена.
+
+        :param now: Текущее время (time.monotonic).
+        :return: Время в секундах (0 - токен есть).
+        """
+
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> bool:
+        """
+        Функция для получения токена.
+
+        :param now: Текущее время (time.monotonic).
+        :return: Получен ли токен.
+        """
+
+        self._refill(now)
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def is_full(self, now: float) -> bool:
+        """
+        Функция для проверки, что ведро полное (его состояние можно забыть без нарушения ограничения).
+
+        :param now: Текущее время (time.monotonic).
+        :return: Полное ли ведро.
+        """
+
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class ChatOutbox:
+    """
+    Очередь исходящих сообщений одного чата.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        """
+        Функция для инициализации очереди.
+
+        :param rate: Допустимая частота сообщений чата в секунду.
+        :param capacity: Допустимый всплеск сообщений чата.
+        """
+
+        # Сообщения (текст, приоритет, время постановки в очередь) в порядке отправки
+        self.messages: collections.deque[tuple[str, int, float]] = collections.deque()
+
+        # Ограничитель частоты чата и время, до которого Telegram запретил отправку в чат (ответ 429)
+        self.bucket = TokenBucket(rate, capacity)
+        self.blocked_until = 0.0
+
+        # Стоит ли чат в очереди планировщика (и с каким приоритетом) и отправляется ли сейчас сообщение чата
+        self.scheduled = False
+        self.priority = PRIORITY_REPLY
+        self.sending = False
+
+
+class SendScheduler:
+    """
+    Класс планировщика исходящих сообщений: соблюдает ограничения Telegram на частоту сообщений в один чат
+    и всего бота, отправляет сообщения по приоритету, объединяет несколько ответов одному чату в одно сообщение
+    и повторяет отправку после ответа 429 (retry_after), не блокируя приём сообщений.
+    (Сообщения ставятся в очередь без ожидания, а отправляют их фоновые потоки; сообщения одного чата
+    отправляются строго по очереди).
+    """
+
+    def __init__(self, send: tp.Callable[[int, str], tp.Any], chat_rate: float = 1.0, chat_burst: float = 3.0,
+                 global_rate: float = 30.0, global_burst: float = 30.0, coalesce: bool = True,
+                 worker_count: int = 4, max_attempts: int = 5) -> None:
+        """
+        Функция для инициализации планировщика и запуска потоков отправки.
+
+        :param send: Функция отправки сообщения (ID чата, текст), например, TeleBot.send_message.
+        :param chat_rate: Допустимая частота сообщений в один чат в секунду.
+        :param chat_burst: Допустимый всплеск сообщений в один чат.
+        :param global_rate: Допустимая частота всех сообщений бота в секунду.
+        :param global_burst: Допустимый всплеск всех сообщений бота.
+        :param coalesce: Объединять ли сообщения чата, накопившиеся в очереди, в одно сообщение.
+        :param worker_count: Количество потоков отправки.
+        :param max_attempts: Максимальное количество попыток отправки сообщения после ответов 429.
+        """
+
+        # Сохраняем параметры
+        self.send = send
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.coalesce = coalesce
+        self.max_attempts = max_attempts
+
+        # Очереди чатов (ID чата -> очередь) и общий ограничитель частоты бота
+        self.outboxes: dict[int, ChatOutbox] = {}
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+
+        # Чаты, готовые к отправке: куча (приоритет, порядковый номер, ID чата),
+        # и чаты, ожидающие токена или окончания запрета: куча (время готовности, порядковый номер, ID чата)
+        self.ready_heap: list[tuple[int, int, int]] = []
+        self.delayed_heap: list[tuple[float, int, int]] = []
+        self.sequence = itertools.count()
+
+        # Количество сообщений в очередях и количество попыток отправки первого сообщения каждого чата
+        self.pending_count = 0
+        self.attempts: dict[int, int] = {}
+
+        # Условие для пробуждения потоков отправки и ожидания опустошения очередей
+        self.condition = threading.Condition()
+        self.closed = False
+
+        # Метрики: поставлено в очередь, отправлено сообщений Telegram (и сколько исходных сообщений в них),
+        # ответов 429, ошибок отправки, задержки в очереди последних сообщений (в секундах)
+        self.started_at = time.monotonic()
+        self.submitted_count = 0
+        self.delivered_count = 0
+        self.delivered_outputs = 0
+        self.retry_count = 0
+        self.failed_count = 0
+        self.queue_latencies: collections.deque[float] = collections.deque(maxlen=10000)
+
+        # Запускаем потоки отправки
+        self.threads = [threading.Thread(target=self.worker, name=f"send_scheduler_{index}", daemon=True)
+                        for index in range(worker_count)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, chat_id: int, message_text: str, priority: int = PRIORITY_REPLY) -> None:
+        """
+        Функция для постановки сообщения в очередь отправки (без ожидания).
+
+        :param chat_id: ID чата.
+        :param message_text: Текст сообщения.
+        :param priority: Приоритет сообщения (меньше - важнее).
+        """
+
+        self.submit_many(chat_id, [message_text], priority)
+
+    def submit_many(self, chat_id: int, message_texts: tp.Iterable[str], priority: int = PRIORITY_REPLY) -> None:
+        """
+        Функция для постановки в очередь нескольких сообщений одного чата (например, всех ответов на сообщение
+        пользователя), чтобы они могли быть отправлены одним сообщением.
+
+        :param chat_id: ID чата.
+        :param message_texts: Тексты сообщений.
+        :param priority: Приоритет сообщений (меньше - важнее).
+        """
+
+        now = time.monotonic()
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Планировщик отправки закрыт")
+
+            outbox = self.outboxes.get(chat_id)
+            if outbox is None:
+                outbox = self.outboxes[chat_id] = ChatOutbox(self.chat_rate, self.chat_burst)
+
+            count = len(outbox.messages)
+            outbox.messages.extend((message_text, priority, now) for message_text in message_texts)
+            added = len(outbox.messages) - count
+            self.pending_count += added
+            self.submitted_count += added
+
+            # Чат, который уже стоит в очереди, переставляем, только если новые сообщения важнее
+            # (устаревшая запись в куче будет пропущена)
+            if added and not outbox.sending and (not outbox.scheduled or priority < outbox.priority):
+                self._schedule(chat_id, outbox, now)
+
+    def _schedule(self, chat_id: int, outbox: ChatOutbox, now: float) -> None:
+        """
+        Функция для постановки чата в очередь планировщика с приоритетом самого важного его сообщения
+        (вызывается под блокировкой).
+
+        :param chat_id: ID чата.
+        :param outbox: Очередь сообщений чата.
+        :param now: Текущее время (time.monotonic).
+        """
+
+        outbox.priority = min(message_priority for _, message_priority, _ in outbox.messages)
+        ready_at = max(outbox.blocked_until, now + outbox.bucket.get_wait_time(now))
+        if ready_at > now:
+            heapq.heappush(self.delayed_heap, (ready_at, next(self.sequence), chat_id))
+        else:
+            heapq.heappush(self.ready_heap, (outbox.priority, next(self.sequence), chat_id))
+        outbox.scheduled = True
+        self.condition.notify()
+
+    def _take_batch(self, now: float) -> tp.Union[tuple[int, list[tuple[str, int, float]]], float, None]:
+        """
+        Функция для выбора следующего чата и сообщений для отправки (вызывается под блокировкой).
+
+        :param now: Текущее время (time.monotonic).
+        :return: ID чата и сообщения для отправки одним сообщением или время ожидания в секундах
+        (None - ждать до постановки новых сообщений).
+        """
+
+        # Переносим дождавшиеся чаты в очередь готовых
+        while self.delayed_heap and self.delayed_heap[0][0] <= now:
+            _, _, chat_id = heapq.heappop(self.delayed_heap)
+            outbox = self.outboxes.get(chat_id)
+            if outbox is not None and outbox.scheduled and not outbox.sending:
+                heapq.heappush(self.ready_heap, (outbox.priority, next(self.sequence), chat_id))
+
+        while self.ready_heap:
+            # Общее ограничение частоты бота
+            global_wait = self.global_bucket.get_wait_time(now)
+            if global_wait > 0:
+                return global_wait
+
+            _, _, chat_id = heapq.heappop(self.ready_heap)
+            outbox = self.outboxes.get(chat_id)
+
+            # Устаревшая запись (чат уже отправлен или переставлен в очереди)
+            if outbox is None or not outbox.scheduled or outbox.sending:
+                continue
+
+            # Ограничение частоты чата и запрет отправки после ответа 429
+            ready_at = max(outbox.blocked_until, now + outbox.bucket.get_wait_time(now))
+            if ready_at > now:
+                heapq.heappush(self.delayed_heap, (ready_at, next(self.sequence), chat_id))
+                continue
+
+            outbox.bucket.take(now)
+            self.global_bucket.take(now)
+            outbox.scheduled = False
+            outbox.sending = True
+
+            # Объединяем сообщения чата, пока не превышена максимальная длина сообщения
+            batch = [outbox.messages.popleft()]
+            length = len(batch[0][0])
+            while self.coalesce and outbox.messages and \
+                    length + len(COALESCE_SEPARATOR) + len(outbox.messages[0][0]) <= MAX_MESSAGE_LENGTH:
+                length += len(COALESCE_SEPARATOR) + len(outbox.messages[0][0])
+                batch.append(outbox.messages.popleft())
+            return chat_id, batch
+
+        return self.delayed_heap[0][0] - now if self.delayed_heap else None
+
+    def worker(self) -> None:
+        """
+        Функция потока отправки сообщений.
+        """
+
+        while True:
+            with self.condition:
+                while True:
+                    now = time.monotonic()
+                    result = self._take_batch(now)
+                    if isinstance(result, tuple):
+                        break
+                    if self.closed and self.pending_count == 0:
+                        return
+                    self.condition.wait(result)
+            chat_id, batch = result
+
+            # Отправляем сообщение без блокировки, чтобы не задерживать приём сообщений и другие потоки
+            retry_after: tp.Optional[float] = None
+            failed = False
+            try:
+                self.send(chat_id, COALESCE_SEPARATOR.join(message_text for message_text, _, _ in batch))
+            except Exception as error:
+                retry_after = get_retry_after(error)
+                if retry_after is None:
+                    failed = True
+                    logger.exception("Ошибка при отправке сообщения в чат %s", chat_id)
+
+            now = time.monotonic()
+            with self.condition:
+                outbox = self.outboxes[chat_id]
+                outbox.sending = False
+
+                # Telegram запретил отправку: возвращаем сообщения в начало очереди чата до окончания запрета
+                # (после max_attempts ответов 429 подряд сообщения отбрасываются)
+                if retry_after is not None:
+                    self.retry_count += 1
+                    attempts = self.attempts[chat_id] = self.attempts.get(chat_id, 0) + 1
+                    if attempts < self.max_attempts:
+                        outbox.messages.extendleft(reversed(batch))
+                        outbox.blocked_until = now + retry_after
+                    else:
+                        failed = True
+                        logger.error("Сообщения в чат %s отброшены после %s ответов 429", chat_id, attempts)
+
+                if retry_after is None or failed:
+                    self.attempts.pop(chat_id, None)
+                    self.pending_count -= len(batch)
+                    if failed:
+                        self.failed_count += len(batch)
+                    else:
+                        self.delivered_count += 1
+                        self.delivered_outputs += len(batch)
+                        self.queue_latencies.extend(now - enqueued_at for _, _, enqueued_at in batch)
+
+                # Планируем следующие сообщения чата, а состояние чата без сообщений забываем,
+                # когда его ограничитель частоты полон (иначе ограничение частоты можно было бы обойти)
+                if outbox.messages:
+                    self._schedule(chat_id, outbox, now)
+                elif outbox.bucket.is_full(now):
+                    del self.outboxes[chat_id]
+                self._forget_idle_chats(now)
+
+                if self.pending_count == 0:
+                    self.condition.notify_all()
+
+    def _forget_idle_chats(self, now: float) -> None:
+        """
+        Функция для удаления состояния чатов без сообщений, ограничители частоты которых полны
+        (вызывается под блокировкой, проверяет не больше нескольких чатов за вызов).
+
+        :param now: Текущее время (time.monotonic).
+        """
+
+        for chat_id in list(itertools.islice(self.outboxes, 4)):
+            outbox = self.outboxes[chat_id]
+            if outbox.messages or outbox.sending or not outbox.bucket.is_full(now):
+                # Чат, который ещё нельзя забыть, переносим в конец словаря
+                self.outboxes[chat_id] = self.outboxes.pop(chat_id)
+            else:
+                del self.outboxes[chat_id]
+
+    def flush(self, timeout: tp.Optional[float] = None) -> bool:
+        """
+        Функция для ожидания отправки всех сообщений из очередей.
+
+        :param timeout: Максимальное время ожидания в секундах (None - без ограничения).
+        :return: Отправлены ли все сообщения.
+        """
+
+        with self.condition:
+            return self.condition.wait_for(lambda: self.pending_count == 0, timeout)
+
+    def close(self, timeout: tp.Optional[float] = None) -> None:
+        """
+        Функция для отправки оставшихся сообщений и остановки потоков отправки.
+
+        :param timeout: Максимальное время ожидания отправки в секундах (None - без ограничения).
+        """
+
+        self.flush(timeout)
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def get_metrics(self) -> dict[str, tp.Union[int, float]]:
+        """
+        Функция для получения метрик планировщика.
+
+        :return: Словарь с количеством поставленных в очередь и ожидающих сообщений, отправленных сообщений
+        Telegram (и исходных сообщений в них), ответов 429, ошибок, скоростью отправки (сообщений в секунду)
+        и задержками в очереди (средняя, p50, p99, максимальная) в секундах.
+        """
+
+        with self.condition:
+            latencies = sorted(self.queue_latencies)
+            seconds = time.monotonic() - self.started_at
+            return {
+                "submitted": self.submitted_count,
+                "pending": self.pending_count,
+                "delivered": self.delivered_count,
+                "delivered_outputs": self.delivered_outputs,
+                "retries": self.retry_count,
+                "failed": self.failed_count,
+                "delivered_per_second": self.delivered_count / seconds if seconds > 0 else 0.0,
+                "average_queue_latency": sum(latencies) / len(latencies) if latencies else 0.0,
+                "p50_queue_latency": latencies[len(latencies) // 2] if latencies else 0.0,
+                "p99_queue_latency": latencies[int(len(latencies) * 0.99)] if latencies else 0.0,
+                "max_queue_latency": latencies[-1] if latencies else 0.0,
+            }
+
+
+def get_retry_after(error: Exception) -> tp.Optional[float]:
+    """
+    Функция для получения времени запрета отправки из ошибки Telegram Bot API (ответ 429 Too Many Requests).
+
+    :param error: Ошибка отправки.
+    :return: Время запрета в секундах или None, если ошибка не связана с ограничением частоты.
+    """
+
+    # Ошибки telebot (ApiTelegramException) и bot_api.BotApiClient (BotApiError) содержат код и ответ API
+    if getattr(error, "error_code", None) == 429 and isinstance(getattr(error, "result_json", None), dict):
+        return float(error.result_json.get("parameters", {}).get("retry_after", 1))
+    return None
@@ -0,0 +1,293 @@
+# Импорты библиотек
+import collections
+import sqlite3
+import threading
+import time
+import typing as tp
+
+# Импорты файлов для задания типов
+if tp.TYPE_CHECKING:
+    from bot_chat_session import BotChatSession
+
+
+class DiskSessionStore:
+    """
+    Класс для хранения вытесненных из памяти сессий на диске (в отдельной базе данных SQLite).
+    """
+
+    def __init__(self, db_path: str = "sessions.db", batch_size: int = 1000) -> None:
+        """
+        Функция для инициализации дискового хранилища сессий.
+
+        :param db_path: Путь к файлу базы данных с сессиями.
+        :param batch_size: Количество изменений, после накопления которых они записываются на диск одной транзакцией.
+        """
+
+        # Подключение к базе данных создаётся при первом обращении к диску, чтобы не замедлять запуск бота
+        # (Доступ к подключению защищается блокировкой SessionStore, поэтому его можно использовать из разных потоков)
+        self.db_path = db_path
+        self.connection: tp.Optional[sqlite3.Connection] = None
+
+        # Изменения, ещё не записанные на диск (ID чата -> состояние или None для удаления сессии)
+        self.batch_size = batch_size
+        self.pending: dict[int, tp.Optional[str]] = {}
+
+    def get_connection(self) -> sqlite3.Connection:
+        """
+        Функция для получения подключения к базе данных (при первом вызове база данных открывается, а таблица
+        сессий создаётся, если её ещё нет).
+
+        :return: Подключение к базе данных.
+        """
+
+        if self.connection is None:
+            connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+
+            # Создаём таблицу с состояниями сессий (ID чата, состояние сессии)
+            connection.execute("""
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                chat_id INTEGER PRIMARY KEY,
+                state TEXT NOT NULL
+            )
+            """)
+            connection.commit()
+            self.connection = connection
+        return self.connection
+
+    def save(self, chat_id: int, state: tp.Optional[str]) -> None:
+        """
+        Функция для сохранения состояния сессии.
+
+        :param chat_id: ID чата.
+        :param state: Состояние сессии или None, если сессию нужно удалить с диска.
+        """
+
+        # Откладываем запись, чтобы записывать изменения пачками
+        self.pending[chat_id] = state
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def load(self, chat_id: int) -> tp.Optional[str]:
+        """
+        Функция для загрузки состояния сессии.
+
+        :param chat_id: ID чата.
+        :return: Состояние сессии или None, если сессия не сохранена на диске.
+        """
+
+        # Сначала проверяем ещё не записанные изменения
+        if chat_id in self.pending:
+            return self.pending[chat_id]
+
+        # Иначе ищем сессию в базе данных
+        row = self.get_connection().execute("SELECT state FROM chat_sessions WHERE chat_id = ?",
+                                            (chat_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def flush(self) -> None:
+        """
+        Функция для записи накопленных изменений на диск одной транзакцией.
+        """
+
+        # Если записывать нечего, то ничего не делаем
+        if not self.pending:
+            return
+
+        # Записываем сохранённые сессии и удаляем сессии, вернувшиеся в начальное состояние
+        connection = self.get_connection()
+        with connection:
+            connection.executemany("INSERT OR REPLACE INTO chat_sessions (chat_id, state) VALUES (?, ?)",
+                                   [(chat_id, state) for chat_id, state in self.pending.items()
+                                    if state is not None])
+            connection.executemany("DELETE FROM chat_sessions WHERE chat_id = ?",
+                                   [(chat_id,) for chat_id, state in self.pending.items() if state is None])
+        self.pending.clear()
+
+    def __len__(self) -> int:
+        """
+        Функция для получения количества сессий, сохранённых на диске.
+        """
+
+        self.flush()
+        return self.get_connection().execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0]
+
+    def close(self) -> None:
+        """
+        Функция для записи оставшихся изменений и закрытия базы данных.
+        """
+
+        self.flush()
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class SessionStore:
+    """
+    Класс для хранения сессий чатов с ограничением по количеству и времени жизни (LRU/TTL).
+    (Вытесненные сессии сохраняются в дисковое хранилище и восстанавливаются при следующем сообщении).
+    """
+
+    def __init__(self, session_factory: tp.Callable[[int], 'BotChatSession'], max_sessions: int = 10000,
+                 ttl: tp.Optional[float] = 3600.0, disk_store: tp.Optional[DiskSessionStore] = None) -> None:
+        """
+        Функция для инициализации хранилища сессий.
+
+        :param session_factory: Функция для создания новой сессии по ID чата.
+        :param max_sessions: Максимальное количество сессий в памяти.
+        :param ttl: Время в секундах, после которого неактивная сессия вытесняется из памяти (None - без ограничения).
+        :param disk_store: Дисковое хранилище для вытесненных сессий (None - вытесненные сессии не сохраняются).
+        """
+
+        # Сохраняем параметры хранилища
+        self.session_factory = session_factory
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.disk_store = disk_store
+
+        # Сессии в памяти в порядке последнего обращения (ID чата -> [сессия, время обращения, есть ли копия на диске])
+        self.sessions: collections.OrderedDict[int, list[tp.Any]] = collections.OrderedDict()
+
+        # Состояние, в котором находится новая сессия (такие сессии не нужно сохранять на диск)
+        self.initial_state: tp.Optional[str] = None
+
+        # Блокировка для работы из нескольких потоков
+        self.lock = threading.Lock()
+
+        # Счётчики для метрик
+        self.hits = 0
+        self.misses = 0
+        self.rehydrations = 0
+        self.evictions = 0
+
+    def get_session(self, chat_id: int) -> 'BotChatSession':
+        """
+        Функция для получения сессии чата (из памяти, с диска или новой).
+
+        :param chat_id: ID чата.
+        :return: Сессия чата.
+        """
+
+        with self.lock:
+            current_time = time.monotonic()
+
+            # Если сессия находится в памяти, то обновляем время обращения к ней
+            entry = self.sessions.get(chat_id)
+            if entry is not None:
+                self.hits += 1
+                entry[1] = current_time
+                self.sessions.move_to_end(chat_id)
+                return entry[0]
+
+            # Иначе создаём сессию и, если она была вытеснена ранее, восстанавливаем её состояние с диска
+            self.misses += 1
+            session = self.session_factory(chat_id)
+            if self.initial_state is None:
+                self.initial_state = session.get_state()
+
+            state = self.disk_store.load(chat_id) if self.disk_store is not None else None
+            if state is not None:
+                self.rehydrations += 1
+                session.set_state(state)
+
+            # Добавляем сессию в память и вытесняем лишние сессии
+            self.sessions[chat_id] = [session, current_time, state is not None]
+            self._evict(current_time)
+            return session
+
+    def evict_expired(self) -> int:
+        """
+        Функция для вытеснения всех сессий, неактивных дольше заданного времени жизни.
+
+        :return: Количество вытесненных сессий.
+        """
+
+        with self.lock:
+            evictions = self.evictions
+            self._evict(time.monotonic())
+            return self.evictions - evictions
+
+    def _evict(self, current_time: float) -> None:
+        """
+        Функция для вытеснения сессий сверх ограничения по количеству и с истёкшим временем жизни.
+        (Сессии упорядочены по времени обращения, поэтому вытесняются только сессии из начала словаря).
+
+        :param current_time: Текущее время.
+        """
+
+        while self.sessions:
+            chat_id, (session, access_time, on_disk) = next(iter(self.sessions.items()))
+
+            # Останавливаемся на первой сессии, которую не нужно вытеснять
+            if len(self.sessions) <= self.max_sessions and (self.ttl is None or current_time - access_time < self.ttl):
+                break
+
+            del self.sessions[chat_id]
+            self.evictions += 1
+            self._save(chat_id, session, on_disk)
+
+    def _save(self, chat_id: int, session: 'BotChatSession', on_disk: bool) -> None:
+        """
+        Функция для сохранения сессии в дисковое хранилище.
+
+        :param chat_id: ID чата.
+        :param session: Сессия чата.
+        :param on_disk: Есть ли на диске ранее сохранённая копия сессии.
+        """
+
+        # Если дискового хранилища нет, то сессия просто теряется
+        if self.disk_store is None:
+            return
+
+        # Сессию в начальном состоянии не храним: удаляем старую копию, если она есть
+        state = session.get_state()
+        if state == self.initial_state:
+            if on_disk:
+                self.disk_store.save(chat_id, None)
+        else:
+            self.disk_store.save(chat_id, state)
+
+    def get_metrics(self) -> dict[str, int]:
+        """
+        Функция для получения метрик хранилища.
+
+        :return: Словарь с количеством попаданий, промахов, восстановлений с диска, вытеснений и сессий в памяти.
+        """
+
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "rehydrations": self.rehydrations,
+                "evictions": self.evictions,
+                "sessions": len(self.sessions),
+            }
+
+    def __len__(self) -> int:
+        """
+        Функция для получения количества сессий в памяти.
+        """
+
+        return len(self.sessions)
+
+    def __contains__(self, chat_id: int) -> bool:
+        """
+        Функция для проверки, находится ли сессия чата в памяти.
+        """
+
+        return chat_id in self.sessions
+
+    def close(self) -> None:
+        """
+        Функция для сохранения всех сессий из памяти на диск при завершении работы.
+        """
+
+        with self.lock:
+            # Сохраняем все сессии и закрываем дисковое хранилище
+            for chat_id, (session, access_time, on_disk) in self.sessions.items():
+                self._save(chat_id, session, on_disk)
+            self.sessions.clear()
+            if self.disk_store is not None:
+                self.disk_store.close()
@@ -10,6 +10,7 @@ welcome_message = """
 - /select_portfolio: Выбрать виртуальный портфель.
 - /create_new_portfolio: Создать новый виртуальный портфель.
 - /delete_portfolio: Удалить виртуальный портфель.
+- /leaderboard: Рейтинг портфелей и сводка по вашим портфелям.
 """
 
 # Приветственное сообщение для пользователя при запуске главного меню
@@ -19,6 +20,7 @@ start_main_menu = """
 - /select_portfolio: Выбрать виртуальный портфель.
 - /create_new_portfolio: Создать новый виртуальный портфель.
 - /delete_portfolio: Удалить виртуальный портфель.
+- /leaderboard: Рейтинг портфелей и сводка по вашим портфелям.
 """
 
 # Сообщение о том, что ввод не был распознан
@@ -28,6 +30,7 @@ main_menu_failed_recognize_input = """
 - /select_portfolio: Выбрать виртуальный портфель.
 - /create_new_portfolio: Создать новый виртуальный портфель.
 - /delete_portfolio: Удалить виртуальный портфель.
+- /leaderboard: Рейтинг портфелей и сводка по вашим портфелям.
 """
 
 #* Создание нового портфеля
@@ -57,3 +60,36 @@ successful_new_portfolio_creation = """
 Поздравляю! Вы успешно создали новый портфель "{new_portfolio_name}".\n
 Сейчас вы будете автоматически перенаправлены в главное меню.
 """
+
+#* Рейтинг портфелей
+
+# Сообщение с рейтингом портфелей по стоимости
+leaderboard = """
+Топ портфелей по стоимости:\n
+{top_portfolios}
+"""
+
+# Строка рейтинга портфелей
+leaderboard_row = "{rank}. {portfolio_name}: {value:,.2f} ({return_rate:+.2f}%)"
+
+# Сообщение о том, что в рейтинге пока нет портфелей
+leaderboard_empty = """
+Пока никто не создал ни одного портфеля. Станьте первым: /create_new_portfolio
+"""
+
+# Строка с медианной доходностью портфелей (добавляется к рейтингу, если в портфелях есть бумаги)
+leaderboard_median_return = "\nМедианная доходность портфелей: {median_return:+.2f}%\n"
+
+# Сводка по портфелям пользователя
+user_summary = """
+Ваши портфели ({portfolio_count}): стоимость {value:,.2f}, прибыль {pnl:+,.2f} ({return_rate:+.2f}%).\n
+Место по суммарной стоимости портфелей: {rank} из {user_count}.
+"""
+
+# Строка с процентилем доходности пользователя (добавляется к сводке, если у пользователя есть бумаги)
+user_summary_return_percentile = "\nВаша доходность выше, чем у {return_percentile:.0f}% пользователей.\n"
+
+# Сообщение о том, что рейтинг сейчас недоступен
+leaderboard_unavailable = """
+Рейтинг портфелей сейчас недоступен. Попробуйте позже.
+"""
@@ -0,0 +1,213 @@
+# Импорты библиотек
+import http.server
+import json
+import multiprocessing
+import secrets
+import typing as tp
+
+# Импорты файлов
+# (Процессы-обработчики импортируют только webhook_worker: HTTP-сервер и multiprocessing нужны маршрутизатору)
+from webhook_worker import WorkerConfig, get_worker_index, worker_main
+
+
+class WebhookRouter:
+    """
+    Класс маршрутизатора обновлений: распределяет сообщения по процессам-обработчикам по ID чата.
+    (Сообщения одного чата всегда попадают в очередь одного процесса, поэтому его сессия живёт в одном процессе,
+    а сообщения обрабатываются в порядке поступления).
+    """
+
+    def __init__(self, worker_count: int, config: WorkerConfig = WorkerConfig()) -> None:
+        """
+        Функция для инициализации маршрутизатора и запуска процессов-обработчиков.
+
+        :param worker_count: Количество процессов-обработчиков.
+        :param config: Настройки процессов-обработчиков.
+        """
+
+        self.worker_count = worker_count
+
+        # Процессы запускаются заново (spawn), т.к. копирование процесса с потоками (fork) небезопасно
+        context = multiprocessing.get_context("spawn")
+        self.update_queues = [context.Queue() for _ in range(worker_count)]
+        self.processed_counts = [context.Value("q", 0) for _ in range(worker_count)]
+        self.ready_events = [context.Event() for _ in range(worker_count)]
+        self.processes = [context.Process(target=worker_main, name=f"webhook_worker_{index}",
+                                          args=(index, worker_count, self.update_queues[index], config,
+                                                self.processed_counts[index], self.ready_events[index]))
+                          for index in range(worker_count)]
+        for process in self.processes:
+            process.start()
+
+    def wait_ready(self, timeout: tp.Optional[float] = None) -> bool:
+        """
+        Функция для ожидания готовности всех процессов-обработчиков.
+
+        :param timeout: Максимальное время ожидания каждого процесса в секундах (None - без ограничения).
+        :return: Готовы ли все процессы.
+        """
+
+        return all(ready_event.wait(timeout) for ready_event in self.ready_events)
+
+    def route_update(self, update: dict) -> bool:
+        """
+        Функция для передачи обновления процессу-обработчику его чата.
+
+        :param update: Обновление в формате Telegram Bot API.
+        :return: Передано ли обновление (обновления без текстового сообщения пропускаются).
+        """
+
+        message = update.get("message")
+        if message is None or "text" not in message:
+            return False
+
+        chat_id = message["chat"]["id"]
+        self.update_queues[get_worker_index(chat_id, self.worker_count)].put((chat_id, message["text"]))
+        return True
+
+    def get_processed_count(self) -> int:
+        """
+        Функция для получения количества сообщений, обработанных всеми процессами.
+
+        :return: Количество сообщений.
+        """
+
+        return sum(processed_count.value for processed_count in self.processed_counts)
+
+    def close(self, timeout: tp.Optional[float] = None) -> None:
+        """
+        Функция для завершения процессов-обработчиков после обработки уже переданных сообщений.
+
+        :param timeout: Максимальное время ожидания каждого процесса в секундах (None - без ограничения).
+        """
+
+        for update_queue in self.update_queues:
+            update_queue.put(None)
+        for process in self.processes:
+            process.join(timeout)
+
+
+class WebhookServer(http.server.ThreadingHTTPServer):
+    """
+    HTTP-сервер, принимающий обновления от Telegram (webhook) и передающий их маршрутизатору.
+    """
+
+    request_queue_size = 1024
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], router: WebhookRouter, path: str,
+                 secret_token: tp.Optional[str] = None) -> None:
+        """
+        Функция для инициализации сервера.
+
+        :param address: Адрес и порт сервера.
+        :param router: Маршрутизатор обновлений.
+        :param path: Путь, на который Telegram отправляет обновления.
+        :param secret_token: Секрет, который Telegram передаёт в заголовке X-Telegram-Bot-Api-Secret-Token
+        (None - заголовок не проверяется).
+        """
+
+        self.router = router
+        self.webhook_path = path
+        self.secret_token = secret_token
+        super().__init__(address, WebhookRequestHandler)
+
+
+class WebhookRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Обработчик запросов webhook: обновление только ставится в очередь, поэтому ответ Telegram не ждёт обработки.
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: WebhookServer
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        # Проверяем путь и секрет запроса
+        if self.path != self.server.webhook_path:
+            self.send_empty_response(404)
+            return
+        if self.server.secret_token is not None and \
+                not secrets.compare_digest(self.headers.get("X-Telegram-Bot-Api-Secret-Token", ""),
+                                           self.server.secret_token):
+            self.send_empty_response(403)
+            return
+
+        try:
+            self.server.router.route_update(json.loads(body))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.send_empty_response(400)
+            return
+        self.send_empty_response(200)
+
+    def send_empty_response(self, status: int) -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format: str, *args: tp.Any) -> None:
+        # Не засоряем вывод логами каждого запроса
+        pass
+
+
+def run_webhook(webhook_url: str, host: str = "0.0.0.0", port: int = 8443,
+                worker_count: tp.Optional[int] = None, metrics_port: tp.Optional[int] = 9464,
+                prices_path: tp.Optional[str] = None) -> None:
+    """
+    Функция для запуска бота в режиме webhook с несколькими процессами-обработчиками.
+
+    :param webhook_url: Внешний адрес сервера (например, https://example.com), на который Telegram отправляет
+    обновления (HTTPS обеспечивает обратный прокси перед сервером).
+    :param host: Адрес, на котором сервер принимает запросы.
+    :param port: Порт сервера.
+    :param worker_count: Количество процессов-обработчиков (None - по количеству ядер процессора).
+    :param metrics_port: Порт сервера метрик первого процесса-обработчика (None - метрики не собираются).
+    :param prices_path: CSV-файл с ценами для сервиса котировок процессов-обработчиков (None - цены неизвестны,
+    портфели оцениваются по стоимости покупки).
+    """
+
+    # Импортируем токен и telebot только при запуске бота
+    import get_token
+    import telebot
+
+    # Путь и секрет webhook случайны, чтобы обновления мог отправлять только Telegram
+    path = f"/webhook/{secrets.token_urlsafe(16)}"
+    secret_token = secrets.token_urlsafe(32)
+
+    config = WorkerConfig(token=get_token.TOKEN, metrics_port=metrics_port, prices_path=prices_path)
+    router = WebhookRouter(worker_count or multiprocessing.cpu_count(), config)
+    server = WebhookServer((host, port), router, path, secret_token)
+
+    bot = telebot.TeleBot(get_token.TOKEN)
+    bot.set_webhook(url=webhook_url.rstrip("/") + path, secret_token=secret_token, max_connections=100,
+                    allowed_updates=["message"])
+    try:
+        server.serve_forever()
+    finally:
+        bot.remove_webhook()
+        server.server_close()
+        router.close()
+
+
+# Запускаем бота
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Запуск бота в режиме webhook")
+    parser.add_argument("webhook_url", help="внешний адрес сервера, на который Telegram отправляет обновления")
+    parser.add_argument("--host", default="0.0.0.0", help="адрес сервера")
+    parser.add_argument("--port", type=int, default=8443, help="порт сервера")
+    parser.add_argument("--workers", type=int, default=None, help="количество процессов-обработчиков")
+    parser.add_argument("--metrics-port", type=int, default=9464,
+                        help="порт сервера метрик первого процесса (процесс N - порт + N)")
+    parser.add_argument("--prices-csv", default=None,
+                        help="CSV-файл с ценами (timestamp,symbol,price) для сервиса котировок")
+    args = parser.parse_args()
+
+    print("Telegram-бот запущен в режиме webhook...")
+    try:
+        run_webhook(args.webhook_url, args.host, args.port, args.workers, args.metrics_port, args.prices_csv)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,176 @@
+# Импорты библиотек
+import logging
+import signal
+import typing as tp
+
+# Импорты файлов
+from bot_api import BotApiClient
+from portfolio_database import PortfolioDatabase
+from bot_chat_session import BotChatSession
+from job_scheduler import JobScheduler, add_maintenance_jobs
+from metrics import BotMetrics
+from portfolio_analytics import PortfolioAnalytics
+from price_feed import CsvReplayProvider, PriceFeedService, QuoteCache
+from send_scheduler import SendScheduler
+from session_store import SessionStore, DiskSessionStore
+
+# Импорты файлов для задания типов
+if tp.TYPE_CHECKING:
+    import multiprocessing
+    import multiprocessing.sharedctypes
+    import multiprocessing.synchronize
+
+# Журнал telebot (процессы-обработчики не импортируют telebot: он нужен только для установки webhook,
+# а его импорт вместе с requests замедлял бы каждый перезапуск процесса)
+logger = logging.getLogger("TeleBot")
+
+
+class WorkerConfig(tp.NamedTuple):
+    """
+    Настройки процессов-обработчиков (передаются в процессы, поэтому содержат только простые значения).
+    """
+
+    # Путь к базе данных портфелей (общая для всех процессов) и к базе данных сессий
+    db_path: str = "portfolios.db"
+    sessions_path: str = "sessions.db"
+
+    # Токен бота для отправки ответов (None - ответы не отправляются, например, в нагрузочных тестах)
+    token: tp.Optional[str] = None
+
+    # Шаблон адреса Telegram Bot API (None - настоящий API)
+    api_url: tp.Optional[str] = None
+
+    # Допустимая частота всех сообщений бота в секунду (делится поровну между процессами)
+    global_rate: float = 30.0
+
+    # Порт локального сервера метрик первого процесса (процесс с номером N использует порт metrics_port + N,
+    # None - метрики не собираются)
+    metrics_port: tp.Optional[int] = None
+
+    # CSV-файл с ценами для сервиса котировок (у каждого процесса - свой сервис и своя таблица котировок,
+    # None - цены неизвестны, портфели оцениваются по стоимости покупки) и период обновления котировок в секундах
+    prices_path: tp.Optional[str] = None
+    prices_interval: float = 5.0
+
+    # Период перезагрузки агрегатов рейтинга из базы данных в секундах (у каждого процесса - свои агрегаты,
+    # которые сразу учитывают только его собственные операции, а операции других процессов - после перезагрузки)
+    analytics_reload_interval: float = 60.0
+
+
+def get_worker_index(chat_id: int, worker_count: int) -> int:
+    """
+    Функция для получения номера процесса-обработчика чата.
+    (Номер зависит только от ID чата, поэтому все сообщения чата обрабатывает один процесс по очереди).
+
+    :param chat_id: ID чата.
+    :param worker_count: Количество процессов-обработчиков.
+    :return: Номер процесса.
+    """
+
+    return chat_id % worker_count
+
+
+def worker_main(worker_index: int, worker_count: int, update_queue: 'multiprocessing.Queue', config: WorkerConfig,
+                processed_count: 'multiprocessing.sharedctypes.Synchronized',
+                ready_event: 'multiprocessing.synchronize.Event') -> None:
+    """
+    Функция процесса-обработчика: обрабатывает сообщения своих чатов в порядке их поступления.
+    (Каждый процесс работает с базой данных портфелей через свои подключения, а блокировки SQLite в режиме WAL
+    разделяют запись между процессами. Кэш портфелей процесса остаётся верным, т.к. портфели пользователя
+    изменяет только процесс, обрабатывающий его чат. Агрегаты рейтинга /leaderboard у каждого процесса свои:
+    портфели других процессов попадают в них при периодической перезагрузке, т.е. с задержкой до
+    config.analytics_reload_interval. Фоновые задания для всей базы данных - снимок стоимости портфелей
+    и обслуживание - выполняет только процесс с номером 0).
+
+    :param worker_index: Номер процесса.
+    :param worker_count: Количество процессов-обработчиков.
+    :param update_queue: Очередь сообщений процесса (ID чата, текст), None - сигнал завершения.
+    :param config: Настройки процессов-обработчиков.
+    :param processed_count: Счётчик обработанных сообщений процесса.
+    :param ready_event: Событие готовности процесса к обработке сообщений.
+    """
+
+    # Процесс завершается по сигналу маршрутизатора, а не по Ctrl+C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # Метрики собираются каждым процессом отдельно и доступны на его собственном порту
+    metrics = BotMetrics() if config.metrics_port is not None else None
+    BotChatSession.metrics = metrics
+
+    # Агрегаты рейтинга загружаются в фоновом потоке (процесс отвечает на сообщения, не дожидаясь загрузки)
+    analytics = PortfolioAnalytics()
+    portfolio_database = PortfolioDatabase(config.db_path, metrics=metrics, analytics=analytics)
+    analytics.start_loading(portfolio_database)
+    session_store = SessionStore(lambda chat_id: BotChatSession(chat_id, portfolio_database),
+                                 max_sessions=10000, ttl=3600.0, disk_store=DiskSessionStore(config.sessions_path))
+
+    # Планировщик отправки ответов (у каждого процесса - свой, ограничения частоты чатов соблюдаются,
+    # т.к. чат обрабатывает один процесс, а общее ограничение бота делится между процессами)
+    send_scheduler: tp.Optional[SendScheduler] = None
+    api_client: tp.Optional[BotApiClient] = None
+    if config.token is not None:
+        api_client = BotApiClient(config.token, config.api_url)
+        global_rate = config.global_rate / worker_count
+        send_message = metrics.timed_send(api_client.send_message) if metrics is not None else api_client.send_message
+        send_scheduler = SendScheduler(send_message, global_rate=global_rate, global_burst=global_rate)
+
+    # Таблица котировок и сервис котировок, обновляющий в ней цены бумаг из портфелей
+    # (Плановые обновления запускает планировщик заданий, а поток сервиса обновляет котировки вне очереди)
+    quote_cache = QuoteCache()
+    quote_cache.add_listener(analytics.on_prices)
+    price_feed: tp.Optional[PriceFeedService] = None
+    if config.prices_path is not None:
+        price_feed = PriceFeedService(CsvReplayProvider(config.prices_path), quote_cache,
+                                      portfolio_database.get_held_symbols, None).start()
+
+    # Планировщик фоновых заданий (запуски откладываются, пока процесс не успевает отправлять ответы)
+    job_scheduler = JobScheduler(
+        max_workers=2, busy=lambda: send_scheduler is not None and send_scheduler.pending_count > 100,
+        metrics=metrics)
+    add_maintenance_jobs(job_scheduler, portfolio_database, session_store, quote_cache, price_feed,
+                         config.prices_interval, database_jobs=worker_index == 0)
+    if worker_count > 1:
+        job_scheduler.add_interval_job("reload_analytics", lambda: analytics.load(portfolio_database),
+                                       config.analytics_reload_interval, jitter=config.analytics_reload_interval / 10)
+    job_scheduler.start()
+
+    metrics_server = None
+    if metrics is not None:
+        metrics.watch_session_store(session_store.__len__)
+        metrics.registry.gauges_from_metrics("bot_analytics", analytics.get_metrics)
+        metrics.registry.gauges_from_metrics("bot_quote_cache", quote_cache.get_metrics)
+        if price_feed is not None:
+            metrics.registry.gauges_from_metrics("bot_price_feed", price_feed.get_metrics)
+        metrics.registry.gauges_from_metrics("bot_jobs", job_scheduler.get_metrics)
+
+        # Сервер метрик импортируется только при его запуске (http.server замедляет запуск процесса)
+        from metrics_server import start_metrics_server
+        metrics_server = start_metrics_server(metrics.registry, port=config.metrics_port + worker_index)
+
+    ready_event.set()
+    try:
+        while (item := update_queue.get()) is not None:
+            chat_id, user_message_text = item
+
+            # Ошибка при обработке одного сообщения не должна останавливать процесс
+            try:
+                bot_outputs = session_store.get_session(chat_id).processing(user_message_text)
+                if send_scheduler is not None:
+                    send_scheduler.submit_many(chat_id, bot_outputs)
+            except Exception:
+                logger.exception("Ошибка при обработке сообщения чата %s в процессе %s", chat_id, worker_index)
+
+            with processed_count.get_lock():
+                processed_count.value += 1
+    finally:
+        job_scheduler.close()
+        if price_feed is not None:
+            price_feed.stop()
+        if send_scheduler is not None:
+            send_scheduler.close(timeout=30.0)
+        if api_client is not None:
+            api_client.close()
+        session_store.close()
+        portfolio_database.close()
+        if metrics_server is not None:
+            metrics_server.close()